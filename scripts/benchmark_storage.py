@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+存储后端基准测试脚本
+
+比较 ChromaStore 与 NumpyStore 在不同数据规模下的表现：
+1. 以预先生成的随机向量批量写入文档（不调用嵌入服务）
+2. 测量无过滤和带元数据过滤的相似性搜索延迟（p50 / p95）
+3. 对照两种后端前 k 个结果的重合率（Chroma 为近似搜索，NumPy 为精确搜索）；
+   向量预先归一化，L2、内积和余弦距离的排序一致，召回率不受集合距离度量影响
+
+默认规模为 1k、100k 和 1M 条向量；1M 条 1024 维 float32 向量约占 4GB 磁盘，
+可用 --dtype float16 减半，或用 --sizes 只测较小规模
+"""
+
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent  # 从scripts目录回到项目根目录
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag_agent.storage import StorageDocument, create_storage_backend
+
+
+class QueueEmbeddings(Embeddings):
+    """按顺序返回预先生成的查询向量，避免把嵌入耗时计入搜索延迟"""
+    
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.position = 0
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.vectors[self.position % len(self.vectors)]
+        self.position += 1
+        return vector.tolist()
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="比较 ChromaStore 与 NumpyStore 的写入和搜索性能")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000], help="向量条数")
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy"], help="要测试的存储后端")
+    parser.add_argument("--dim", type=int, default=1024, help="向量维度")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"], help="NumpyStore 的向量精度")
+    parser.add_argument("--queries", type=int, default=50, help="每种搜索执行的查询数")
+    parser.add_argument("--k", type=int, default=10, help="每次搜索返回的数量")
+    parser.add_argument("--batch-size", type=int, default=5000, help="每次写入的文档数")
+    parser.add_argument("--work-dir", help="存储目录（默认临时目录，结束后删除）")
+    return parser.parse_args()
+
+
+def percentile_ms(samples: List[float], q: float) -> float:
+    return float(np.percentile(samples, q) * 1000)
+
+
+def unit_vectors(rng: np.random.Generator, count: int, dim: int) -> np.ndarray:
+    """生成按行归一化的随机向量"""
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run_backend(
+    backend: str,
+    size: int,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    args: argparse.Namespace,
+    work_dir: Path
+) -> Dict[str, Any]:
+    """在一个后端上执行写入和搜索测试"""
+    kwargs = {"dtype": args.dtype} if backend == "numpy" else {}
+    store = create_storage_backend(
+        backend,
+        collection_name=f"bench_{size}",
+        storage_dir=work_dir / f"{backend}_{size}",
+        embedding_model=QueueEmbeddings(queries),
+        enable_cache=False,
+        **kwargs
+    )
+    
+    timestamp = datetime.now()
+    started = time.perf_counter()
+    for start in range(0, size, args.batch_size):
+        end = min(size, start + args.batch_size)
+        store.store_documents([
+            StorageDocument(
+                id=f"doc-{i}",
+                content=f"document {i}",
+                metadata={"group": i % 10},
+                timestamp=timestamp,
+                embedding=vectors[i].tolist()
+            )
+            for i in range(start, end)
+        ])
+    insert_seconds = time.perf_counter() - started
+    
+    results = {"insert_s": insert_seconds, "top_ids": []}
+    if backend == "chroma":
+        space = (store.collection.metadata or {}).get("hnsw:space", "l2")
+        print(f"   Chroma 集合距离度量: {space}")
+    for name, metadata_filter in (("search", None), ("filtered", {"group": 3})):
+        latencies = []
+        store.embedding_model.position = 0
+        for _ in range(args.queries):
+            query_started = time.perf_counter()
+            hits = store.similarity_search("query", k=args.k, metadata_filter=metadata_filter)
+            latencies.append(time.perf_counter() - query_started)
+            if metadata_filter is None:
+                results["top_ids"].append([hit.document.id for hit in hits])
+        results[f"{name}_p50_ms"] = percentile_ms(latencies, 50)
+        results[f"{name}_p95_ms"] = percentile_ms(latencies, 95)
+    return results
+
+
+def main():
+    """基准测试主函数"""
+    args = parse_args()
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix="storage_bench_"))
+    rng = np.random.default_rng(0)
+    queries = unit_vectors(rng, args.queries, args.dim)
+    
+    print(f"📊 存储后端基准测试 (维度 {args.dim}, k={args.k}, 每种搜索 {args.queries} 次查询)")
+    print(f"   存储目录: {work_dir}")
+    try:
+        for size in args.sizes:
+            vectors = unit_vectors(rng, size, args.dim)
+            results = {}
+            for backend in args.backends:
+                print(f"\n⏳ {backend}: 写入 {size} 条向量...")
+                results[backend] = run_backend(backend, size, vectors, queries, args, work_dir)
+                r = results[backend]
+                print(
+                    f"   写入 {r['insert_s']:.2f} 秒 ({size / r['insert_s']:.0f} 条/秒) | "
+                    f"搜索 p50 {r['search_p50_ms']:.2f} ms, p95 {r['search_p95_ms']:.2f} ms | "
+                    f"过滤搜索 p50 {r['filtered_p50_ms']:.2f} ms, p95 {r['filtered_p95_ms']:.2f} ms"
+                )
+            if "chroma" in results and "numpy" in results:
+                overlaps = [
+                    len(set(approx) & set(exact)) / max(1, len(exact))
+                    for approx, exact in zip(results["chroma"]["top_ids"], results["numpy"]["top_ids"])
+                ]
+                print(f"   Chroma 近似结果对精确结果的召回率: {np.mean(overlaps):.3f}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
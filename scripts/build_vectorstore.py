@@ -2,107 +2,78 @@
 """
 向量数据库构建脚本
 
-该脚本负责：
-1. 加载原始文档
-2. 切分文档为语义块
-3. 生成嵌入向量
-4. 存储到ChromaDB
+该脚本把原始文档目录增量同步到 ChromaDB：
+1. 扫描文档目录，与导入清单比对
+2. 在进程池中切分新增或变化的文件，只嵌入集合中不存在的块
+3. 分批嵌入并写入，每批完成后保存检查点
+4. 删除源文件已消失或内容已变化的块
+5. 集合有变化时重建BM25词法索引并更新集合版本
+
+文档未变化时不发起任何嵌入请求；导入中断后重新运行即可从检查点继续
 """
 
-import os
 import sys
+import argparse
 from pathlib import Path
 
 # 添加项目根目录到Python路径
-project_root = Path(__file__).parent  # 从scripts目录回到项目根目录
+project_root = Path(__file__).parent.parent  # 从scripts目录回到项目根目录
 src_path = project_root / "src"
 if str(src_path) not in sys.path:
     sys.path.insert(0, str(src_path))
 
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from rag_agent.core.config import (
-    get_vector_db_path,
-    get_collection_name,
-    get_project_root,
-    DEFAULT_CHUNK_SIZE,
-    DEFAULT_CHUNK_OVERLAP
-)
-from rag_agent.core.embedding_provider import get_embedding_model
+from rag_agent.core.config import DEFAULT_INGEST_PATTERNS
+from rag_agent.ingestion import create_ingestor
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="增量构建知识库向量数据库")
+    parser.add_argument("--source-dir", help="原始文档目录（默认 INGEST_SOURCE_DIR 或 data/raw）")
+    parser.add_argument(
+        "--pattern", action="append", dest="patterns",
+        help=f"匹配源文件的 glob 模式，可重复指定（默认 {' '.join(DEFAULT_INGEST_PATTERNS)}）"
+    )
+    parser.add_argument("--full", action="store_true", help="忽略修改时间，重新比对所有文件的内容，并补齐已有块的序号和指纹元数据")
+    parser.add_argument("--dry-run", action="store_true", help="只输出变更，不写入向量数据库")
+    parser.add_argument("--workers", type=int, help="读取和切分文档的进程数")
+    parser.add_argument("--batch-size", type=int, help="每批嵌入并写入的块数")
+    return parser.parse_args()
+
 
 def main():
     """构建向量数据库的主函数"""
-    print("🚀 开始构建向量数据库...")
+    args = parse_args()
+    print("🚀 开始增量构建向量数据库...")
     
     try:
-        # 1. 加载配置
-        print("📋 加载配置...")
-        vector_store_path = get_vector_db_path()
-        collection_name = get_collection_name()
-        
-        print(f"   向量数据库路径: {vector_store_path}")
-        print(f"   集合名称: {collection_name}")
-        
-        # 2. 加载原始文档
-        print("📄 加载原始文档...")
-        # 使用get_project_root()获取项目根目录
-        doc_path = get_project_root() / "data" / "raw" / "internal_docs.txt"
-        if not doc_path.exists():
-            raise FileNotFoundError(f"文档文件不存在: {doc_path}")
-            
-        loader = TextLoader(str(doc_path), encoding='utf-8')
-        documents = loader.load()
-        print(f"   成功加载 {len(documents)} 个文档")
-        
-        # 3. 切分文档
-        print("✂️ 切分文档...")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=DEFAULT_CHUNK_SIZE,
-            chunk_overlap=DEFAULT_CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        kwargs = {}
+        if args.patterns:
+            kwargs["patterns"] = args.patterns
+        if args.workers:
+            kwargs["split_workers"] = args.workers
+        if args.batch_size:
+            kwargs["batch_size"] = args.batch_size
+        ingestor = create_ingestor(source_dir=args.source_dir, **kwargs)
         
-        chunks = text_splitter.split_documents(documents)
-        print(f"   文档切分完成，共 {len(chunks)} 个块")
+        print(f"   文档目录: {ingestor.source_dir}")
+        print(f"   向量数据库路径: {ingestor.vector_store_dir}")
+        print(f"   集合名称: {ingestor.collection_name}")
         
-        # 4. 初始化嵌入模型
-        print("🤖 初始化嵌入模型...")
-        embeddings = get_embedding_model()
-        print(f"   嵌入模型初始化成功: {embeddings.__class__.__name__}")
+        report = ingestor.run(full_scan=args.full, dry_run=args.dry_run)
         
-        # 5. 创建并持久化ChromaDB
-        print("💾 创建向量数据库...")
-        
-        # 确保向量存储目录存在
-        vector_store_dir = get_project_root() / vector_store_path
-        vector_store_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 创建ChromaDB实例
-        vectorstore = Chroma.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            collection_name=collection_name,
-            persist_directory=str(vector_store_dir)
-        )
-        
-        print(f"✅ 向量数据库构建成功！")
-        print(f"   存储位置: {vector_store_dir}")
-        print(f"   集合名称: {collection_name}")
-        print(f"   文档块数量: {len(chunks)}")
-        
-        # 6. 测试检索功能
-        print("🔍 测试检索功能...")
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-        test_results = retriever.invoke("LangGraph的核心优势")
-        print(f"   测试查询返回 {len(test_results)} 个结果")
-        
-        print("🎉 向量数据库构建完成！")
+        print("📋 变更摘要:")
+        for line in report.summary().splitlines():
+            print(f"   {line}")
         
+        if report.changed and not report.dry_run:
+            print("✅ 向量数据库已更新，词法索引和集合版本已刷新")
+        else:
+            print("✅ 向量数据库无需更新")
+    
     except Exception as e:
         print(f"❌ 构建向量数据库时发生错误: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
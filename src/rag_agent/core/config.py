@@ -39,12 +39,98 @@ def get_embedding_model_name():
     return os.getenv("EMBEDDING_MODEL_NAME", OPENAI_EMBEDDING_MODEL_NAME)
 
 
+def get_embedding_cache_enabled():
+    """获取嵌入向量缓存启用状态"""
+    return os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+
+def get_embedding_cache_path():
+    """获取嵌入向量持久化缓存路径
+    
+    相对路径相对于项目根目录解析
+    """
+    cache_path = Path(os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3"))
+    if not cache_path.is_absolute():
+        cache_path = get_project_root() / cache_path
+    return cache_path
+
+
+# 记忆后写队列配置
+DEFAULT_MEMORY_WRITE_BEHIND = True  # 记忆存储是否经后写队列批量落库
+DEFAULT_WRITE_BEHIND_INTERVAL_MS = 1000  # 后写队列的刷新间隔（毫秒）
+DEFAULT_WRITE_BEHIND_BATCH_SIZE = 64  # 待写入记录数达到该值时立即刷新
+
+
+def get_write_behind_config():
+    """获取记忆存储的后写队列配置
+    
+    启用后 store_memory 只追加到溢写文件即返回，
+    由后台线程按间隔或批大小一次嵌入、批量写入
+    
+    Returns:
+        dict: 传给 ChromaStore 的后写参数
+    """
+    return {
+        'write_behind': os.getenv('MEMORY_WRITE_BEHIND', str(DEFAULT_MEMORY_WRITE_BEHIND)).lower() == 'true',
+        'write_behind_interval_ms': float(os.getenv('MEMORY_WRITE_BEHIND_INTERVAL_MS', DEFAULT_WRITE_BEHIND_INTERVAL_MS)),
+        'write_behind_batch_size': int(os.getenv('MEMORY_WRITE_BEHIND_BATCH_SIZE', DEFAULT_WRITE_BEHIND_BATCH_SIZE))
+    }
+
+
+def get_retrieval_log_level():
+    """获取检索模块的日志级别
+    
+    INFO 时每次检索输出一行阶段耗时摘要，DEBUG 时输出每个阶段的详细记录
+    """
+    return os.getenv("RAG_RETRIEVAL_LOG_LEVEL", "INFO").upper()
+
+
+# 嵌入向量进程级缓存的最大条目数
+DEFAULT_EMBEDDING_MEMORY_CACHE_SIZE = 10000
+
+# 嵌入接口单次请求的文本数量上限
+DASHSCOPE_EMBEDDING_BATCH_SIZE = 25  # DashScope单次最多25条文本
+OPENAI_EMBEDDING_BATCH_SIZE = 256
+DEFAULT_EMBEDDING_MAX_CONCURRENCY = 4  # 同时在途的嵌入请求数
+
+
+def get_embedding_batch_size(provider_limit):
+    """获取嵌入批处理大小
+    
+    如果环境变量中设置了EMBEDDING_BATCH_SIZE，则使用该值，但不超过服务商上限
+    
+    Args:
+        provider_limit: 当前嵌入服务商的单次请求上限
+    """
+    batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", str(provider_limit)))
+    return max(1, min(batch_size, provider_limit))
+
+
+def get_embedding_max_concurrency():
+    """获取同时在途的嵌入请求数上限"""
+    return max(1, int(os.getenv("EMBEDDING_MAX_CONCURRENCY", str(DEFAULT_EMBEDDING_MAX_CONCURRENCY))))
+
+
 def get_collection_name():
     """获取ChromaDB集合名称"""
     collection_name = os.getenv("COLLECTION_NAME", "internal_docs")
     return collection_name
 
 
+def get_collection_names():
+    """获取检索使用的ChromaDB集合（分片）名称列表
+    
+    COLLECTION_NAMES 为逗号分隔的集合名称，未设置时只使用 COLLECTION_NAME。
+    第一个集合为主集合，词法索引和回退检索使用主集合
+    
+    Returns:
+        list: 集合名称列表
+    """
+    names_str = os.getenv("COLLECTION_NAMES", "")
+    names = [name.strip() for name in names_str.split(",") if name.strip()]
+    return list(dict.fromkeys(names)) or [get_collection_name()]
+
+
 # 项目路径相关函数
 def get_project_root():
     """获取项目根目录的绝对路径
@@ -58,9 +144,26 @@ def get_project_root():
     return Path(__file__).parent.parent.parent.parent
 
 
+def get_keywords_config_path():
+    """获取关键词词典配置文件路径"""
+    default_path = get_project_root() / "keywords.config.json"
+    return Path(os.getenv("KEYWORDS_CONFIG_FILE", str(default_path)))
+
+
+def get_ingest_source_dir():
+    """获取知识库原始文档目录"""
+    default_path = get_project_root() / "data" / "raw"
+    return Path(os.getenv("INGEST_SOURCE_DIR", str(default_path)))
+
+
 # RAG相关配置常量
 DEFAULT_CHUNK_SIZE = 1000
 DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_INGEST_PATTERNS = ("*.txt", "*.md")  # 知识库导入时匹配的文件
+DEFAULT_INGEST_BATCH_SIZE = 1000  # 每批嵌入并写入向量库的块数（Chroma 单批上限约 5000）
+DEFAULT_INGEST_SPLIT_WORKERS = 4  # 读取和切分文档的进程数，1表示在当前进程中执行
+DEFAULT_INGEST_MAX_RETRIES = 3  # 单批嵌入失败后的重试次数
+DEFAULT_INGEST_RETRY_BACKOFF = 2.0  # 嵌入重试的初始等待时间（秒），每次重试翻倍
 DEFAULT_RETRIEVAL_K = 3
 
 # RAG检索优化配置
@@ -70,6 +173,40 @@ DEFAULT_USE_QUERY_EXPANSION = True  # 是否使用查询扩展
 DEFAULT_USE_RERANKING = True  # 是否使用重排序
 DEFAULT_MMR_FETCH_K = 20  # MMR算法获取文档数
 DEFAULT_MMR_LAMBDA = 0.5  # MMR多样性参数
+DEFAULT_MAX_DOCS_BEFORE_RERANK = 20  # 参与重排序的最大候选文档数
+DEFAULT_RERANK_STRATEGY = "relevance"  # 重排序策略 (relevance, diversity, hybrid, embedding_mmr)
+DEFAULT_FANOUT_MAX_WORKERS = 4  # 扩展查询并发检索的最大线程数
+DEFAULT_RETRIEVAL_EXECUTOR_WORKERS = 8  # 异步检索中阻塞操作（向量库查询、重排序）使用的最大线程数
+DEFAULT_SHARD_TIMEOUT_MS = 2000  # 多集合检索时单个分片的查询超时（毫秒），超时的分片结果被忽略，0表示不限制
+DEFAULT_EXPANSION_MAX_SEARCHES = 4  # 查询扩展后最多检索次数（含原始查询）
+DEFAULT_EXPANSION_TIME_BUDGET_MS = 0  # 查询扩展的检索耗时预算（毫秒），0表示不限制
+DEFAULT_EXPANSION_DUPLICATE_SIMILARITY = 0.97  # 扩展查询视为近似重复的余弦相似度
+DEFAULT_USE_LEXICAL_SEARCH = True  # 是否启用BM25词法检索并与向量检索融合
+DEFAULT_LEXICAL_K = 10  # 词法检索返回的候选数
+DEFAULT_RRF_K = 60  # 倒数排名融合的平滑常数
+DEFAULT_USE_ADAPTIVE_K = True  # 设置相似度阈值时是否按轮次自适应扩大检索数量
+DEFAULT_ADAPTIVE_INITIAL_K = 3  # 自适应检索首轮获取的候选数
+DEFAULT_ADAPTIVE_MIN_CANDIDATES = 3  # 达到阈值的候选数达到该值即停止扩大
+DEFAULT_ADAPTIVE_MAX_K = 20  # 自适应检索单个查询最多获取的候选数
+DEFAULT_ADAPTIVE_GROWTH = 2  # 每轮获取数量的增长倍数
+DEFAULT_USE_QUERY_ROUTER = True  # 是否按查询复杂度为每个查询选择检索策略
+DEFAULT_ROUTER_SIMPLE_MAX_CHARS = 30  # 简单事实性查询的最大长度（字符）
+DEFAULT_ROUTER_COMPLEX_MIN_ENTITIES = 3  # 视为多实体查询的最少实体数
+DEFAULT_ROUTER_MIN_LEXICAL_COVERAGE = 0.5  # 简单查询的词元在词法索引中出现的最低比例
+DEFAULT_NEAR_DUPLICATE_SIMILARITY = 1.01  # SimHash 指纹相似度达到该值且词元被包含的块视为近似副本，大于1表示关闭
+DEFAULT_NEAR_DUPLICATE_STRATEGY = "keep_best"  # 近似重复块的处理策略 (keep_best, merge)
+DEFAULT_NEAR_DUPLICATE_MIN_OVERLAP = 50  # merge 策略下拼接相邻块所需的最少重叠字符数
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1200  # 知识库检索结果返回给模型的估算 token 上限
+DEFAULT_CONTEXT_REDUNDANCY = 0.6  # 与已选句子的词元 Jaccard 相似度超过该值的句子视为冗余
+
+# 检索结果缓存配置
+DEFAULT_ENABLE_CACHE = False  # 是否启用检索结果缓存
+DEFAULT_CACHE_MAX_ENTRIES = 256  # 最大缓存条目数
+DEFAULT_CACHE_TTL_SECONDS = 600  # 缓存条目存活时间（秒）
+DEFAULT_CACHE_MAX_BYTES = 16 * 1024 * 1024  # 缓存估算内存上限（字节）
+DEFAULT_USE_SEMANTIC_CACHE = False  # 是否启用语义查询缓存
+DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES = 512  # 语义缓存最大条目数
+DEFAULT_SEMANTIC_CACHE_DISTANCE = 0.05  # 语义缓存命中的最大余弦距离
 
 
 def get_retrieval_config():
@@ -84,7 +221,39 @@ def get_retrieval_config():
         'use_query_expansion': os.getenv('RAG_USE_QUERY_EXPANSION', str(DEFAULT_USE_QUERY_EXPANSION)).lower() == 'true',
         'use_reranking': os.getenv('RAG_USE_RERANKING', str(DEFAULT_USE_RERANKING)).lower() == 'true',
         'mmr_fetch_k': int(os.getenv('RAG_MMR_FETCH_K', DEFAULT_MMR_FETCH_K)),
-        'mmr_lambda': float(os.getenv('RAG_MMR_LAMBDA', DEFAULT_MMR_LAMBDA))
+        'mmr_lambda': float(os.getenv('RAG_MMR_LAMBDA', DEFAULT_MMR_LAMBDA)),
+        'max_docs_before_rerank': int(os.getenv('RAG_MAX_DOCS_BEFORE_RERANK', DEFAULT_MAX_DOCS_BEFORE_RERANK)),
+        'rerank_strategy': os.getenv('RAG_RERANK_STRATEGY', DEFAULT_RERANK_STRATEGY),
+        'fanout_max_workers': int(os.getenv('RAG_FANOUT_MAX_WORKERS', DEFAULT_FANOUT_MAX_WORKERS)),
+        'retrieval_executor_workers': int(os.getenv('RAG_RETRIEVAL_EXECUTOR_WORKERS', DEFAULT_RETRIEVAL_EXECUTOR_WORKERS)),
+        'shard_timeout_ms': float(os.getenv('RAG_SHARD_TIMEOUT_MS', DEFAULT_SHARD_TIMEOUT_MS)),
+        'expansion_max_searches': int(os.getenv('RAG_EXPANSION_MAX_SEARCHES', DEFAULT_EXPANSION_MAX_SEARCHES)),
+        'expansion_time_budget_ms': float(os.getenv('RAG_EXPANSION_TIME_BUDGET_MS', DEFAULT_EXPANSION_TIME_BUDGET_MS)),
+        'expansion_duplicate_similarity': float(os.getenv('RAG_EXPANSION_DUPLICATE_SIMILARITY', DEFAULT_EXPANSION_DUPLICATE_SIMILARITY)),
+        'use_lexical_search': os.getenv('RAG_USE_LEXICAL_SEARCH', str(DEFAULT_USE_LEXICAL_SEARCH)).lower() == 'true',
+        'lexical_k': int(os.getenv('RAG_LEXICAL_K', DEFAULT_LEXICAL_K)),
+        'rrf_k': int(os.getenv('RAG_RRF_K', DEFAULT_RRF_K)),
+        'use_adaptive_k': os.getenv('RAG_USE_ADAPTIVE_K', str(DEFAULT_USE_ADAPTIVE_K)).lower() == 'true',
+        'adaptive_initial_k': int(os.getenv('RAG_ADAPTIVE_INITIAL_K', DEFAULT_ADAPTIVE_INITIAL_K)),
+        'adaptive_min_candidates': int(os.getenv('RAG_ADAPTIVE_MIN_CANDIDATES', DEFAULT_ADAPTIVE_MIN_CANDIDATES)),
+        'adaptive_max_k': int(os.getenv('RAG_ADAPTIVE_MAX_K', DEFAULT_ADAPTIVE_MAX_K)),
+        'adaptive_growth': int(os.getenv('RAG_ADAPTIVE_GROWTH', DEFAULT_ADAPTIVE_GROWTH)),
+        'use_query_router': os.getenv('RAG_USE_QUERY_ROUTER', str(DEFAULT_USE_QUERY_ROUTER)).lower() == 'true',
+        'router_simple_max_chars': int(os.getenv('RAG_ROUTER_SIMPLE_MAX_CHARS', DEFAULT_ROUTER_SIMPLE_MAX_CHARS)),
+        'router_complex_min_entities': int(os.getenv('RAG_ROUTER_COMPLEX_MIN_ENTITIES', DEFAULT_ROUTER_COMPLEX_MIN_ENTITIES)),
+        'router_min_lexical_coverage': float(os.getenv('RAG_ROUTER_MIN_LEXICAL_COVERAGE', DEFAULT_ROUTER_MIN_LEXICAL_COVERAGE)),
+        'near_duplicate_similarity': float(os.getenv('RAG_NEAR_DUPLICATE_SIMILARITY', DEFAULT_NEAR_DUPLICATE_SIMILARITY)),
+        'near_duplicate_strategy': os.getenv('RAG_NEAR_DUPLICATE_STRATEGY', DEFAULT_NEAR_DUPLICATE_STRATEGY),
+        'near_duplicate_min_overlap': int(os.getenv('RAG_NEAR_DUPLICATE_MIN_OVERLAP', DEFAULT_NEAR_DUPLICATE_MIN_OVERLAP)),
+        'context_token_budget': int(os.getenv('RAG_CONTEXT_TOKEN_BUDGET', DEFAULT_CONTEXT_TOKEN_BUDGET)),
+        'context_redundancy': float(os.getenv('RAG_CONTEXT_REDUNDANCY', DEFAULT_CONTEXT_REDUNDANCY)),
+        'enable_cache': os.getenv('RAG_ENABLE_CACHE', str(DEFAULT_ENABLE_CACHE)).lower() == 'true',
+        'cache_max_entries': int(os.getenv('RAG_CACHE_MAX_ENTRIES', DEFAULT_CACHE_MAX_ENTRIES)),
+        'cache_ttl_seconds': float(os.getenv('RAG_CACHE_TTL_SECONDS', DEFAULT_CACHE_TTL_SECONDS)),
+        'cache_max_bytes': int(os.getenv('RAG_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)),
+        'use_semantic_cache': os.getenv('RAG_USE_SEMANTIC_CACHE', str(DEFAULT_USE_SEMANTIC_CACHE)).lower() == 'true',
+        'semantic_cache_max_entries': int(os.getenv('RAG_SEMANTIC_CACHE_MAX_ENTRIES', DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES)),
+        'semantic_cache_distance': float(os.getenv('RAG_SEMANTIC_CACHE_DISTANCE', DEFAULT_SEMANTIC_CACHE_DISTANCE))
     }
 
 
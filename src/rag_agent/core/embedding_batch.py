@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+嵌入批处理模块
+
+该模块把大批量文本按服务商上限切分成多个请求，并限制同时在途的请求数：
+- 批大小不超过服务商单次请求上限（DashScope 约 25 条）
+- 多个批次并发发送，导入和回填按服务商吞吐而不是单次请求延迟运行
+- 返回顺序与输入顺序一致
+- 查询文本逐条走服务商的查询模式（embed_query），同样以有界并发发送
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+def split_batches(texts: List[str], batch_size: int) -> List[List[str]]:
+    """按批大小切分文本列表"""
+    return [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+
+
+def embed_query_batch(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """以查询模式嵌入多条文本，嵌入模型提供 embed_queries 时交给它并发处理"""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+async def aembed_query_batch(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """embed_query_batch 的异步版本"""
+    if hasattr(embeddings, "aembed_queries"):
+        return await embeddings.aembed_queries(texts)
+    return list(await asyncio.gather(*(embeddings.aembed_query(text) for text in texts)))
+
+
+class BatchedEmbeddings(Embeddings):
+    """批处理嵌入模型包装器
+    
+    职责：
+    - 按批大小切分 embed_documents 的输入
+    - 以有界并发发送各批次请求
+    - 按输入顺序拼接结果
+    - 以有界并发逐条嵌入多个查询
+    """
+    
+    def __init__(self, embeddings: Embeddings, batch_size: int = 25, max_concurrency: int = 4):
+        """初始化批处理嵌入模型
+        
+        Args:
+            embeddings: 底层嵌入模型
+            batch_size: 单次请求的文本数量
+            max_concurrency: 同时在途的请求数上限
+        """
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """分批嵌入文档列表"""
+        if not texts:
+            return []
+        
+        batches = split_batches(texts, self.batch_size)
+        if len(batches) == 1 or self.max_concurrency == 1:
+            results = [self.embeddings.embed_documents(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                results = list(executor.map(self.embeddings.embed_documents, batches))
+        
+        return [vector for batch_vectors in results for vector in batch_vectors]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """嵌入查询文本"""
+        return self.embeddings.embed_query(text)
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """以查询模式嵌入多条文本，每条一次请求并发发送"""
+        if len(texts) <= 1 or self.max_concurrency == 1:
+            return [self.embeddings.embed_query(text) for text in texts]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(texts))) as executor:
+            return list(executor.map(self.embeddings.embed_query, texts))
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """异步分批嵌入文档列表"""
+        if not texts:
+            return []
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.embeddings.aembed_documents(batch)
+        
+        results = await asyncio.gather(
+            *(embed_batch(batch) for batch in split_batches(texts, self.batch_size))
+        )
+        return [vector for batch_vectors in results for vector in batch_vectors]
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步嵌入查询文本"""
+        return await self.embeddings.aembed_query(text)
+    
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """异步以查询模式嵌入多条文本"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def embed_one(text: str) -> List[float]:
+            async with semaphore:
+                return await self.embeddings.aembed_query(text)
+        
+        return list(await asyncio.gather(*(embed_one(text) for text in texts)))
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+嵌入向量缓存模块
+
+该模块为嵌入模型提供按内容寻址的多级缓存，缓存键为 (模型名称, sha256(文本))：
+- 请求级缓存：在 embedding_request_scope() 范围内有效，同一请求内重复文本只计算一次
+- 进程级缓存：有界 LRU，跨请求复用热点文本
+- 持久化缓存：SQLite 存储 float32 向量，重复导入未变更的语料不再调用嵌入接口
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Union, Iterator
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .embedding_batch import embed_query_batch, aembed_query_batch
+
+logger = logging.getLogger(__name__)
+
+
+# 请求级缓存，None 表示当前不在请求范围内
+_request_cache: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar(
+    "embedding_request_cache", default=None
+)
+
+
+@contextmanager
+def embedding_request_scope() -> Iterator[None]:
+    """开启请求级嵌入缓存
+    
+    在该上下文内，所有 CachedEmbeddings 共享同一个请求级缓存，退出时释放。
+    嵌套调用时复用外层缓存。
+    """
+    if _request_cache.get() is not None:
+        yield
+        return
+    
+    token = _request_cache.set({})
+    try:
+        yield
+    finally:
+        _request_cache.reset(token)
+
+
+def text_hash(text: str) -> str:
+    """计算文本的 sha256 摘要"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCacheStore:
+    """嵌入向量持久化存储
+    
+    使用 SQLite 保存 float32 向量，主键为 (模型名称, 文本哈希)
+    """
+    
+    def __init__(self, db_path: Union[str, Path]):
+        """初始化持久化存储
+        
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+    
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """批量读取向量
+        
+        Args:
+            model: 模型名称
+            hashes: 文本哈希列表
+        
+        Returns:
+            哈希到向量的映射，只包含命中的条目
+        """
+        found: Dict[str, List[float]] = {}
+        if not hashes:
+            return found
+        
+        # SQLite 默认单条语句最多 999 个参数
+        with self._lock:
+            for start in range(0, len(hashes), 900):
+                batch = hashes[start:start + 900]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digest] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+    
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """批量写入向量
+        
+        Args:
+            model: 模型名称
+            items: 哈希到向量的映射
+        """
+        if not items:
+            return
+        
+        rows = []
+        for digest, vector in items.items():
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((model, digest, int(array.shape[0]), array.tobytes()))
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+    
+    def count(self, model: Optional[str] = None) -> int:
+        """统计已缓存的向量数量"""
+        with self._lock:
+            if model is None:
+                return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (model,)
+            ).fetchone()[0]
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """带多级缓存的嵌入模型包装器
+    
+    职责：
+    - 按 (模型名称, sha256(文本)) 缓存向量，文档向量与查询向量分开存放
+    - 依次查找请求级、进程级和持久化缓存，只把未命中的文本交给底层模型
+    - 同一批次内的重复文本只计算一次
+    - 统计各级缓存的命中率和底层接口调用次数
+    """
+    
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        store: Optional[EmbeddingCacheStore] = None,
+        memory_max_entries: int = 10000
+    ):
+        """初始化缓存嵌入模型
+        
+        Args:
+            embeddings: 底层嵌入模型
+            model_name: 模型名称，作为缓存键的一部分
+            store: 持久化存储，为 None 时只使用内存缓存
+            memory_max_entries: 进程级缓存的最大条目数
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = store
+        self.memory_max_entries = memory_max_entries
+        
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self._stats = {
+            "request_hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "api_calls": 0,
+        }
+    
+    def _namespace(self, kind: str) -> str:
+        return f"{self.model_name}:{kind}"
+    
+    def _lookup(self, namespace: str, digests: List[str]) -> Dict[str, List[float]]:
+        """依次查找各级缓存"""
+        found: Dict[str, List[float]] = {}
+        request_cache = _request_cache.get()
+        
+        with self._lock:
+            for digest in digests:
+                key = f"{namespace}:{digest}"
+                if request_cache is not None and key in request_cache:
+                    found[digest] = request_cache[key]
+                    self._stats["request_hits"] += 1
+                elif key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[digest] = self._memory[key]
+                    self._stats["memory_hits"] += 1
+        
+        remaining = [digest for digest in digests if digest not in found]
+        if remaining and self.store is not None:
+            disk_found = self.store.get_many(namespace, remaining)
+            if disk_found:
+                self._remember(namespace, disk_found)
+                found.update(disk_found)
+                with self._lock:
+                    self._stats["disk_hits"] += len(disk_found)
+        
+        return found
+    
+    def _remember(self, namespace: str, items: Dict[str, List[float]]):
+        """写入请求级和进程级缓存"""
+        request_cache = _request_cache.get()
+        with self._lock:
+            for digest, vector in items.items():
+                key = f"{namespace}:{digest}"
+                if request_cache is not None:
+                    request_cache[key] = vector
+                self._memory[key] = vector
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_max_entries:
+                self._memory.popitem(last=False)
+    
+    def _store_computed(self, namespace: str, computed: Dict[str, List[float]]):
+        """保存新计算的向量到所有缓存层"""
+        self._remember(namespace, computed)
+        if self.store is not None:
+            try:
+                self.store.put_many(namespace, computed)
+            except Exception as e:
+                logger.warning(f"写入嵌入缓存失败: {e}")
+    
+    def _prepare(self, texts: List[str], kind: str):
+        namespace = self._namespace(kind)
+        digests = [text_hash(text) for text in texts]
+        found = self._lookup(namespace, list(dict.fromkeys(digests)))
+        
+        missing: Dict[str, str] = {}
+        for text, digest in zip(texts, digests):
+            if digest not in found and digest not in missing:
+                missing[digest] = text
+        
+        with self._lock:
+            self._stats["misses"] += len(missing)
+        return namespace, digests, found, missing
+    
+    @staticmethod
+    def _to_float32(vectors: List[List[float]]) -> List[List[float]]:
+        # 与持久化缓存保持相同精度，保证命中与未命中时返回一致的向量
+        return np.asarray(vectors, dtype=np.float32).tolist()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """嵌入文档列表，只计算未命中缓存的文本"""
+        if not texts:
+            return []
+        
+        namespace, digests, found, missing = self._prepare(texts, "document")
+        if missing:
+            with self._lock:
+                self._stats["api_calls"] += 1
+            vectors = self._to_float32(self.embeddings.embed_documents(list(missing.values())))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store_computed(namespace, computed)
+            found.update(computed)
+        
+        return [found[digest] for digest in digests]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """嵌入查询文本"""
+        namespace, digests, found, missing = self._prepare([text], "query")
+        if missing:
+            with self._lock:
+                self._stats["api_calls"] += 1
+            vector = self._to_float32([self.embeddings.embed_query(text)])[0]
+            self._store_computed(namespace, {digests[0]: vector})
+            return vector
+        return found[digests[0]]
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """以查询模式嵌入多条文本，只计算未命中缓存的文本"""
+        if not texts:
+            return []
+        
+        namespace, digests, found, missing = self._prepare(texts, "query")
+        if missing:
+            with self._lock:
+                self._stats["api_calls"] += 1
+            vectors = self._to_float32(embed_query_batch(self.embeddings, list(missing.values())))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store_computed(namespace, computed)
+            found.update(computed)
+        
+        return [found[digest] for digest in digests]
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """异步嵌入文档列表，只计算未命中缓存的文本"""
+        if not texts:
+            return []
+        
+        namespace, digests, found, missing = self._prepare(texts, "document")
+        if missing:
+            with self._lock:
+                self._stats["api_calls"] += 1
+            vectors = self._to_float32(await self.embeddings.aembed_documents(list(missing.values())))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store_computed(namespace, computed)
+            found.update(computed)
+        
+        return [found[digest] for digest in digests]
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步嵌入查询文本"""
+        namespace, digests, found, missing = self._prepare([text], "query")
+        if missing:
+            with self._lock:
+                self._stats["api_calls"] += 1
+            vector = self._to_float32([await self.embeddings.aembed_query(text)])[0]
+            self._store_computed(namespace, {digests[0]: vector})
+            return vector
+        return found[digests[0]]
+    
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """异步以查询模式嵌入多条文本，只计算未命中缓存的文本"""
+        if not texts:
+            return []
+        
+        namespace, digests, found, missing = self._prepare(texts, "query")
+        if missing:
+            with self._lock:
+                self._stats["api_calls"] += 1
+            vectors = self._to_float32(await aembed_query_batch(self.embeddings, list(missing.values())))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store_computed(namespace, computed)
+            found.update(computed)
+        
+        return [found[digest] for digest in digests]
+    
+    def clear_memory(self):
+        """清空进程级缓存"""
+        with self._lock:
+            self._memory.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息
+        
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_size"] = len(self._memory)
+        
+        hits = stats["request_hits"] + stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        stats["model_name"] = self.model_name
+        stats["persistent"] = self.store is not None
+        if self.store is not None:
+            stats["store_path"] = str(self.store.db_path)
+        return stats
@@ -3,28 +3,39 @@
 嵌入模型提供者模块
 
 该模块负责提供统一的嵌入模型获取接口，解耦嵌入模型的选择逻辑
+返回的嵌入模型带有按内容寻址的向量缓存，所有调用方共享同一个实例
 """
 
 import os
-from typing import Any
+from functools import lru_cache
+from typing import Any, Dict, Tuple
 
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.embeddings import DashScopeEmbeddings
 
 from .config import (
     get_embedding_model_name,
+    get_embedding_cache_enabled,
+    get_embedding_cache_path,
+    get_embedding_batch_size,
+    get_embedding_max_concurrency,
     DASHSCOPE_EMBEDDING_MODEL_NAME,
-    OPENAI_EMBEDDING_MODEL_NAME
+    OPENAI_EMBEDDING_MODEL_NAME,
+    DASHSCOPE_EMBEDDING_BATCH_SIZE,
+    OPENAI_EMBEDDING_BATCH_SIZE,
+    DEFAULT_EMBEDDING_MEMORY_CACHE_SIZE
 )
+from .embedding_batch import BatchedEmbeddings
+from .embedding_cache import CachedEmbeddings, EmbeddingCacheStore
 
-def get_embedding_model() -> Any:
+def _create_base_embedding_model() -> Tuple[Any, str, int]:
     """
-    获取嵌入模型实例
+    创建底层嵌入模型实例
     
     根据环境变量配置，优先使用DashScope嵌入模型，如果没有则使用OpenAI嵌入模型
     
     Returns:
-        嵌入模型实例
+        (嵌入模型实例, 模型名称, 单次请求的文本数量上限)
     
     Raises:
         ValueError: 如果没有配置有效的API密钥
@@ -37,15 +48,66 @@ def get_embedding_model() -> Any:
         return DashScopeEmbeddings(
             model=DASHSCOPE_EMBEDDING_MODEL_NAME,
             dashscope_api_key=dashscope_api_key
-        )
+        ), f"dashscope/{DASHSCOPE_EMBEDDING_MODEL_NAME}", DASHSCOPE_EMBEDDING_BATCH_SIZE
     elif openai_api_key and openai_api_key != "your_openai_api_key_here":
         # 对于OpenAI，使用环境变量中配置的模型名称
         openai_model = get_embedding_model_name() 
         return OpenAIEmbeddings(
             model=openai_model,
             openai_api_key=openai_api_key
-        )
+        ), f"openai/{openai_model}", OPENAI_EMBEDDING_BATCH_SIZE
     else:
         raise ValueError(
             "请在.env文件中设置有效的DASHSCOPE_API_KEY或OPENAI_API_KEY"
-        )
\ No newline at end of file
+        )
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model() -> Any:
+    """
+    获取嵌入模型实例
+    
+    返回包装了向量缓存的嵌入模型，进程内所有调用方共享同一实例，
+    因此检索、构建脚本和记忆存储都会复用已经计算过的向量。
+    未命中缓存的文本按服务商上限分批，并以有界并发发送
+    
+    Returns:
+        嵌入模型实例
+    
+    Raises:
+        ValueError: 如果没有配置有效的API密钥
+    """
+    base_embeddings, model_name, provider_batch_limit = _create_base_embedding_model()
+    embeddings = BatchedEmbeddings(
+        base_embeddings,
+        batch_size=get_embedding_batch_size(provider_batch_limit),
+        max_concurrency=get_embedding_max_concurrency()
+    )
+    
+    if not get_embedding_cache_enabled():
+        return embeddings
+    
+    store = EmbeddingCacheStore(get_embedding_cache_path())
+    return CachedEmbeddings(
+        embeddings,
+        model_name=model_name,
+        store=store,
+        memory_max_entries=DEFAULT_EMBEDDING_MEMORY_CACHE_SIZE
+    )
+
+
+def get_embedding_cache_stats() -> Dict[str, Any]:
+    """
+    获取嵌入缓存统计信息
+    
+    Returns:
+        统计信息字典，嵌入缓存未启用时返回空字典
+    """
+    try:
+        embeddings = get_embedding_model()
+    except ValueError:
+        return {}
+    
+    if isinstance(embeddings, CachedEmbeddings):
+        return embeddings.get_stats()
+    return {}
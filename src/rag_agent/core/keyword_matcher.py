@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+关键词匹配引擎
+
+该模块为查询扩展、记忆重要性评估和模糊性检测提供统一的多模式匹配：
+- 每个词典只编译一次 Aho-Corasick 自动机，对文本单次扫描找出全部命中
+- 匹配耗时与文本长度和命中数有关，与词典大小无关
+- 词典从项目根目录的 keywords.config.json 加载，可以扩充到上千个词条
+"""
+
+import json
+import logging
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Iterable, Iterator, NamedTuple, Set, Union
+
+from .config import get_keywords_config_path
+
+logger = logging.getLogger(__name__)
+
+_LATIN_CHAR = re.compile(r'[0-9a-z_]')
+
+
+class KeywordMatch(NamedTuple):
+    """一次关键词命中"""
+    start: int  # 起始位置
+    end: int  # 结束位置（不含）
+    keyword: str  # 命中的关键词（词典中的原始写法）
+    index: int  # 关键词在词典中的顺序
+
+
+class KeywordMatcher:
+    """Aho-Corasick 多模式匹配器
+    
+    职责：
+    - 把一组关键词编译为带失败指针的字典树
+    - 单次扫描文本，返回全部（可重叠的）命中
+    - 可选地要求含拉丁字母的关键词按整词匹配，避免 "AI" 命中 "detail"
+    """
+    
+    def __init__(self, keywords: Iterable[str], case_sensitive: bool = False, word_boundary: bool = False):
+        """初始化匹配器
+        
+        Args:
+            keywords: 关键词列表，重复的关键词只保留第一次出现
+            case_sensitive: 是否区分大小写
+            word_boundary: 含拉丁字母或数字的关键词是否按整词匹配
+        """
+        self.case_sensitive = case_sensitive
+        self.word_boundary = word_boundary
+        self.keywords: List[str] = []
+        
+        # 节点 i 的转移表、失败指针和输出（关键词下标列表）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        
+        seen: Set[str] = set()
+        for keyword in keywords:
+            normalized = self._normalize(keyword)
+            if not normalized or normalized in seen:
+                continue
+            seen.add(normalized)
+            self._insert(normalized, len(self.keywords))
+            self.keywords.append(keyword)
+        
+        self._lengths = [len(self._normalize(keyword)) for keyword in self.keywords]
+        self._needs_boundary = [
+            word_boundary and bool(_LATIN_CHAR.search(self._normalize(keyword)))
+            for keyword in self.keywords
+        ]
+        self._build_failure_links()
+    
+    def _normalize(self, text: str) -> str:
+        return text if self.case_sensitive else text.lower()
+    
+    def _insert(self, keyword: str, index: int):
+        """把关键词插入字典树"""
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(index)
+    
+    def _build_failure_links(self):
+        """按广度优先顺序计算失败指针，并合并后缀节点的输出"""
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+    
+    def __len__(self) -> int:
+        return len(self.keywords)
+    
+    def iter_matches(self, text: str) -> Iterator[KeywordMatch]:
+        """逐个产出文本中的关键词命中
+        
+        Args:
+            text: 待匹配文本
+        
+        Yields:
+            按结束位置排列的命中
+        """
+        if not self.keywords or not text:
+            return
+        
+        normalized = self._normalize(text)
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for position, char in enumerate(normalized):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in output[node]:
+                start = position + 1 - self._lengths[index]
+                if self._needs_boundary[index] and not self._at_word_boundary(normalized, start, position + 1):
+                    continue
+                yield KeywordMatch(start, position + 1, self.keywords[index], index)
+    
+    @staticmethod
+    def _at_word_boundary(text: str, start: int, end: int) -> bool:
+        """命中两侧不是拉丁字母、数字或下划线"""
+        if start > 0 and _LATIN_CHAR.match(text, start - 1):
+            return False
+        if end < len(text) and _LATIN_CHAR.match(text, end):
+            return False
+        return True
+    
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """找出文本中的全部命中（可重叠）"""
+        return list(self.iter_matches(text))
+    
+    def matched(self, text: str) -> List[str]:
+        """文本中出现过的关键词，按词典顺序排列"""
+        indices = {match.index for match in self.iter_matches(text)}
+        return [self.keywords[index] for index in sorted(indices)]
+    
+    def contains_any(self, text: str) -> bool:
+        """文本中是否出现任一关键词（命中即停止扫描）"""
+        return next(self.iter_matches(text), None) is not None
+
+
+def select_non_overlapping(matches: List[KeywordMatch]) -> List[KeywordMatch]:
+    """从左到右选取互不重叠的命中，同一起点优先取最长的关键词
+    
+    Args:
+        matches: 命中列表
+    
+    Returns:
+        按起始位置排列的命中
+    """
+    selected = []
+    covered_until = 0
+    for match in sorted(matches, key=lambda m: (m.start, m.start - m.end)):
+        if match.start >= covered_until:
+            selected.append(match)
+            covered_until = match.end
+    return selected
+
+
+@lru_cache(maxsize=None)
+def load_keyword_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """加载关键词词典配置
+    
+    Args:
+        config_path: 配置文件路径，为 None 时使用 get_keywords_config_path()
+    
+    Returns:
+        配置字典，文件不存在或格式错误时返回空字典
+    """
+    path = Path(config_path) if config_path else get_keywords_config_path()
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        logger.warning(f"关键词配置文件不存在: {path}")
+    except json.JSONDecodeError as e:
+        logger.warning(f"关键词配置文件格式错误: {e}")
+    return {}
+
+
+def get_keyword_dictionary(section: str, name: str) -> Union[List[str], Dict[str, List[str]]]:
+    """读取一个关键词词典
+    
+    Args:
+        section: 配置分区，如 "query_expansion"
+        name: 词典名称，如 "tech_terms"
+    
+    Returns:
+        关键词列表或 关键词 -> 关联词列表 的映射
+    """
+    return load_keyword_config().get(section, {}).get(name, [])
+
+
+@lru_cache(maxsize=None)
+def get_keyword_matcher(
+    section: str,
+    name: str,
+    include_keys: bool = True,
+    include_values: bool = False,
+    word_boundary: bool = False
+) -> KeywordMatcher:
+    """获取编译好的关键词匹配器，每个词典只编译一次
+    
+    Args:
+        section: 配置分区
+        name: 词典名称
+        include_keys: 映射型词典是否匹配键
+        include_values: 映射型词典是否匹配关联词
+        word_boundary: 含拉丁字母的关键词是否按整词匹配
+    
+    Returns:
+        关键词匹配器
+    """
+    dictionary = get_keyword_dictionary(section, name)
+    if isinstance(dictionary, dict):
+        keywords = list(dictionary) if include_keys else []
+        if include_values:
+            keywords += [value for values in dictionary.values() for value in values]
+    else:
+        keywords = list(dictionary)
+    return KeywordMatcher(keywords, word_boundary=word_boundary)
+
+
+def reload_keyword_config():
+    """清空词典和自动机缓存，下次使用时重新加载配置文件"""
+    load_keyword_config.cache_clear()
+    get_keyword_matcher.cache_clear()
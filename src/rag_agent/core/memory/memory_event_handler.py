@@ -11,6 +11,8 @@ from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 
 from ..agent_state import AgentState, EventType, EventStatus, EventMetadata
 from .memory_manager import MemoryManager
+from ..embedding_cache import embedding_request_scope
+from ..keyword_matcher import get_keyword_matcher
 
 
 class MemoryEventHandler:
@@ -47,15 +49,17 @@ class MemoryEventHandler:
         Returns:
             更新后的Agent状态
         """
-        # 1. 处理显式的记忆存储请求
-        state = self._handle_explicit_memory_requests(state)
-        
-        # 2. 自动存储重要信息
-        if self._auto_store_enabled:
-            state = self._auto_store_important_info(state)
-        
-        # 3. 处理记忆检索请求
-        state = self._handle_memory_retrieval_requests(state)
+        # 同一轮事件处理内重复出现的消息只嵌入一次
+        with embedding_request_scope():
+            # 1. 处理显式的记忆存储请求
+            state = self._handle_explicit_memory_requests(state)
+            
+            # 2. 自动存储重要信息
+            if self._auto_store_enabled:
+                state = self._auto_store_important_info(state)
+            
+            # 3. 处理记忆检索请求
+            state = self._handle_memory_retrieval_requests(state)
         
         return state
     
@@ -172,22 +176,14 @@ class MemoryEventHandler:
         content = message.content.lower()
         importance = 5  # 基础重要性
         
-        # 基于关键词提升重要性
-        high_importance_keywords = [
-            '重要', '关键', '核心', '必须', '紧急', '错误', '问题',
-            'important', 'critical', 'urgent', 'key', 'error', 'problem',
-            'decision', 'plan', 'strategy', 'goal', 'learn', 'discover'
-        ]
-        
-        for keyword in high_importance_keywords:
-            if keyword in content:
-                importance += 2
-                break
+        # 基于关键词提升重要性（词典见 keywords.config.json）
+        if get_keyword_matcher('message_importance', 'high').contains_any(content):
+            importance += 2
         
         # 基于消息类型
         if isinstance(message, AIMessage):
             # AI消息中的解决方案或建议通常重要
-            if any(word in content for word in ['解决', '建议', 'solution', 'recommend']):
+            if get_keyword_matcher('message_importance', 'solution').contains_any(content):
                 importance += 1
         elif isinstance(message, HumanMessage):
             # 用户的问题或需求通常重要
@@ -19,7 +19,8 @@ import json
 
 from langchain_core.messages import BaseMessage
 from ..agent_state import AgentState, EventType, EventStatus
-from ...storage import BaseStore, StorageDocument, SearchResult, get_memory_store
+from ..keyword_matcher import get_keyword_matcher
+from ...storage import BaseStore, StorageDocument, SearchResult, MemoryRecord, get_memory_store
 
 
 class MemoryUtils:
@@ -45,27 +46,12 @@ class MemoryUtils:
         elif len(content) < 50:
             importance -= 1
         
-        # 基于关键词
-        high_importance_keywords = [
-            '重要', '关键', '核心', '必须', '紧急', 
-            'important', 'critical', 'urgent', 'key',
-            'decision', 'plan', 'strategy', 'goal'
-        ]
-        low_importance_keywords = [
-            '可能', '也许', '或许', 
-            'maybe', 'perhaps', 'possibly'
-        ]
-        
-        content_lower = content.lower()
-        for keyword in high_importance_keywords:
-            if keyword in content_lower:
-                importance += 1
-                break
+        # 基于关键词（词典见 keywords.config.json）
+        if get_keyword_matcher('memory_importance', 'high').contains_any(content):
+            importance += 1
         
-        for keyword in low_importance_keywords:
-            if keyword in content_lower:
-                importance -= 1
-                break
+        if get_keyword_matcher('memory_importance', 'low').contains_any(content):
+            importance -= 1
         
         # 基于上下文
         if context:
@@ -203,6 +189,43 @@ class MemoryManager:
             print(f"存储记忆失败: {e}")
             return False
     
+    def store_memories(self, memories: List[Dict[str, Any]]) -> bool:
+        """
+        批量存储记忆
+        
+        适用于大批量导入和回填，嵌入请求按批发送而不是逐条发送
+        
+        Args:
+            memories: 记忆列表，每项包含 content，可选 memory_key、context、tags、importance、user_id、event_type
+            
+        Returns:
+            是否全部存储成功
+        """
+        try:
+            records = []
+            for memory in memories:
+                content = memory['content']
+                context = memory.get('context')
+                
+                importance = memory.get('importance')
+                if importance is None and self._auto_importance_enabled:
+                    importance = self._calculate_auto_importance(content, context or {})
+                
+                records.append(MemoryRecord(
+                    memory_key=memory.get('memory_key') or self._generate_memory_key(content, context or {}),
+                    content=content,
+                    context=context,
+                    tags=memory.get('tags'),
+                    importance=importance or 5,
+                    user_id=memory.get('user_id'),
+                    event_type=memory.get('event_type')
+                ))
+            
+            return self.memory_store.store_memories(records)
+        except Exception as e:
+            print(f"批量存储记忆失败: {e}")
+            return False
+    
     def store_memory_from_event(
         self, 
         state: AgentState, 
@@ -10,6 +10,7 @@ from langgraph.prebuilt import ToolNode
 from ..core.llm_provider import get_llm
 from ..tools.tool_registry import get_all_tools
 from ..tools.tool_manager import get_tool_manager
+from ..storage import StorageFactory
 
 # 导入图的"蓝图"
 from ..graphs.base_agent_graph import BaseAgentGraphBuilder
@@ -106,10 +107,13 @@ async def reset_agent_cache():
 
 async def shutdown_agent_services():
     """
-    提供一个全局的关闭函数，用于清理ToolManager资源
+    提供一个全局的关闭函数，用于清理ToolManager资源并落库存储的后写队列
     """
     global _tool_manager_instance
     
+    logger.info("Flushing storage write-behind queues...")
+    StorageFactory.close_all()
+    
     if _tool_manager_instance:
         logger.info("Shutting down ToolManager...")
         try:
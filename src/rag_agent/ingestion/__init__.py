@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+知识库导入模块
+
+该模块负责把原始文档同步到向量集合，包括：
+- 导入清单：记录源文件状态与块 ID 的对应关系
+- 增量导入：只嵌入新增或变化的块，删除失效的块
+- 批量流水线：多进程切分、分批嵌入写入、检查点续传和分阶段吞吐统计
+"""
+
+from .manifest import IngestionManifest, FileRecord, get_manifest_path
+from .ingestor import IncrementalIngestor, IngestionReport, StageStats, create_ingestor, make_chunk_ids
+
+__all__ = [
+    'IngestionManifest',
+    'FileRecord',
+    'get_manifest_path',
+    'IncrementalIngestor',
+    'IngestionReport',
+    'StageStats',
+    'create_ingestor',
+    'make_chunk_ids'
+]
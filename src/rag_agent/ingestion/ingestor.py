@@ -0,0 +1,696 @@
+#!/usr/bin/env python3
+"""
+增量知识库导入
+
+该模块把一个目录树中的文档增量同步到向量集合，导入按阶段流水线执行：
+- 读取和切分：文件逐个在进程池中读取、哈希和切分，结果按文件流式返回
+- 指纹：切分时为每个块计算 SimHash 指纹，与块序号一起写入元数据，供检索时去除近似重复块
+- 嵌入：待写入的块攒成大批次，以有界并发分批嵌入，失败时退避重试
+- 写入：嵌入完成的批次批量写入集合，与下一批的嵌入重叠执行
+- 检查点：每写完一批就保存导入清单，中断后重新运行从断点继续
+
+增量规则：
+- 按导入清单跳过未变化的文件，未变化时不发起任何嵌入请求
+- 块 ID 由文件路径和块内容决定，修改文件时只嵌入内容变化的块
+- 源文件删除或块内容变化时，从集合中删除不再存在的块
+- 复用的块在文件中的位置变化或缺少指纹时，只更新元数据，不重新嵌入；--full 会为旧语料补齐元数据
+- 集合有变化时重建 BM25 词法索引并更新集合版本
+"""
+
+import os
+import time
+import hashlib
+import multiprocessing
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple, Union
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from ..core.config import (
+    get_vector_db_path,
+    get_collection_name,
+    get_project_root,
+    get_ingest_source_dir,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_INGEST_PATTERNS,
+    DEFAULT_INGEST_BATCH_SIZE,
+    DEFAULT_INGEST_SPLIT_WORKERS,
+    DEFAULT_INGEST_MAX_RETRIES,
+    DEFAULT_INGEST_RETRY_BACKOFF
+)
+from ..core.embedding_provider import get_embedding_model
+from ..retrieval.cache import bump_collection_version
+from ..retrieval.lexical_index import LexicalIndex, get_lexical_index_dir
+from ..retrieval.near_duplicate import simhash, SIMHASH_METADATA_KEY, CHUNK_INDEX_METADATA_KEY
+from .manifest import IngestionManifest, FileRecord, get_manifest_path
+
+# 从集合分页读取块 ID 时的批大小
+_COLLECTION_PAGE_SIZE = 1000
+
+# 流水线阶段名称
+STAGES = ("split", "embed", "upsert")
+
+
+def content_hash(text: str) -> str:
+    """计算文本的 SHA-256"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_chunk_ids(rel_path: str, chunks: List[str]) -> List[str]:
+    """为文件的各个块生成稳定的 ID
+    
+    ID 由路径摘要、块内容摘要和同一内容在文件中的出现序号组成，
+    内容未变的块在文件修改后保持原 ID，不需要重新嵌入
+    
+    Args:
+        rel_path: 文件相对路径
+        chunks: 块文本列表
+    
+    Returns:
+        与块一一对应的 ID 列表
+    """
+    path_digest = content_hash(rel_path)[:12]
+    occurrences: Counter = Counter()
+    chunk_ids = []
+    for chunk in chunks:
+        chunk_digest = content_hash(chunk)[:16]
+        chunk_ids.append(f"{path_digest}-{chunk_digest}-{occurrences[chunk_digest]}")
+        occurrences[chunk_digest] += 1
+    return chunk_ids
+
+
+@lru_cache(maxsize=None)
+def _get_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """获取文本切分器，每个进程按参数只创建一次"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
+@dataclass
+class SplitResult:
+    """
+    单个文件的读取和切分结果
+    """
+    rel_path: str  # 文件相对路径
+    mtime_ns: int  # 读取时的修改时间（纳秒）
+    size: int  # 读取时的文件大小（字节）
+    content_hash: Optional[str] = None  # 内容的 SHA-256，读取失败时为 None
+    chunks: Optional[List[str]] = None  # 块文本，内容与已知哈希相同时不切分，为 None
+    fingerprints: Optional[List[int]] = None  # 与块一一对应的 SimHash 指纹
+    error: Optional[str] = None  # 读取失败的原因
+    seconds: float = 0.0  # 读取和切分耗时（秒）
+
+
+def load_and_split(
+    path: str,
+    rel_path: str,
+    known_hash: Optional[str],
+    chunk_size: int,
+    chunk_overlap: int
+) -> SplitResult:
+    """读取、哈希并切分单个文件（在工作进程中执行）
+    
+    Args:
+        path: 文件路径
+        rel_path: 文件相对路径
+        known_hash: 清单中记录的内容哈希，内容相同时跳过切分
+        chunk_size: 块大小
+        chunk_overlap: 块重叠长度
+    
+    Returns:
+        切分结果
+    """
+    started = time.perf_counter()
+    try:
+        # 扫描后文件可能被删除，stat 失败同样记为读取失败
+        stat = os.stat(path)
+        text = Path(path).read_text(encoding='utf-8')
+    except (OSError, UnicodeDecodeError) as e:
+        return SplitResult(rel_path, 0, 0, error=str(e))
+    
+    digest = content_hash(text)
+    chunks = fingerprints = None
+    if digest != known_hash:
+        chunks = _get_text_splitter(chunk_size, chunk_overlap).split_text(text)
+        fingerprints = [simhash(chunk) for chunk in chunks]
+    return SplitResult(
+        rel_path, stat.st_mtime_ns, stat.st_size, digest, chunks, fingerprints,
+        seconds=time.perf_counter() - started
+    )
+
+
+@dataclass
+class StageStats:
+    """
+    流水线单个阶段的处理量和耗时
+    """
+    chunks: int = 0  # 处理的块数
+    seconds: float = 0.0  # 累计耗时（秒），多进程阶段为各进程耗时之和
+    
+    @property
+    def throughput(self) -> float:
+        """每秒处理的块数"""
+        return self.chunks / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class IngestionReport:
+    """
+    一次增量导入的变更汇总
+    """
+    added_files: List[str] = field(default_factory=list)  # 新增的文件
+    updated_files: List[str] = field(default_factory=list)  # 内容变化的文件
+    removed_files: List[str] = field(default_factory=list)  # 已删除的文件
+    failed_files: List[str] = field(default_factory=list)  # 读取失败的文件
+    unchanged_files: int = 0  # 未变化的文件数
+    chunks_embedded: int = 0  # 新嵌入并写入的块数
+    chunks_reused: int = 0  # 集合中已存在、无需嵌入的新块数
+    chunks_deleted: int = 0  # 从集合中删除的块数
+    chunks_relabeled: int = 0  # 只更新元数据（块序号、指纹）的复用块数
+    total_chunks: int = 0  # 导入后清单中的块总数
+    resumed: bool = False  # 是否从中断的导入继续
+    dry_run: bool = False  # 是否只计算变更而不写入
+    elapsed_seconds: float = 0.0  # 总耗时（秒）
+    stages: Dict[str, StageStats] = field(default_factory=lambda: {stage: StageStats() for stage in STAGES})
+    
+    @property
+    def changed(self) -> bool:
+        """集合内容是否有变化"""
+        return bool(self.chunks_embedded or self.chunks_deleted or self.chunks_relabeled)
+    
+    def summary(self) -> str:
+        """生成可读的变更摘要"""
+        lines = [
+            f"新增文件: {len(self.added_files)}",
+            f"更新文件: {len(self.updated_files)}",
+            f"删除文件: {len(self.removed_files)}",
+            f"未变化文件: {self.unchanged_files}",
+            f"嵌入块数: {self.chunks_embedded}",
+            f"复用块数: {self.chunks_reused}",
+            f"删除块数: {self.chunks_deleted}",
+            f"更新元数据块数: {self.chunks_relabeled}",
+            f"块总数: {self.total_chunks}",
+        ]
+        for stage, stats in self.stages.items():
+            if stats.chunks:
+                lines.append(
+                    f"{stage}: {stats.chunks} 块, {stats.seconds:.2f} 秒, {stats.throughput:.1f} 块/秒"
+                )
+        lines.append(f"总耗时: {self.elapsed_seconds:.2f} 秒")
+        if self.failed_files:
+            lines.append(f"读取失败: {', '.join(self.failed_files)}")
+        if self.resumed:
+            lines.append("（从上次中断的导入继续）")
+        if self.dry_run:
+            lines.append("（试运行，未写入任何变更）")
+        return "\n".join(lines)
+
+
+class IncrementalIngestor:
+    """增量导入器
+    
+    职责：
+    - 扫描源目录并与导入清单比对
+    - 在进程池中切分变化的文件，只嵌入集合中不存在的块
+    - 分批嵌入和写入，每批完成后保存检查点
+    - 删除失效的块，维护词法索引和集合版本
+    """
+    
+    def __init__(
+        self,
+        source_dir: Union[str, Path],
+        vector_store_dir: Union[str, Path],
+        collection_name: str,
+        embeddings: Embeddings,
+        patterns: Iterable[str] = DEFAULT_INGEST_PATTERNS,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        batch_size: int = DEFAULT_INGEST_BATCH_SIZE,
+        split_workers: int = DEFAULT_INGEST_SPLIT_WORKERS,
+        max_retries: int = DEFAULT_INGEST_MAX_RETRIES,
+        retry_backoff: float = DEFAULT_INGEST_RETRY_BACKOFF
+    ):
+        """初始化增量导入器
+        
+        Args:
+            source_dir: 原始文档目录
+            vector_store_dir: 向量数据库目录
+            collection_name: 集合名称
+            embeddings: 嵌入模型，批次内的并发由嵌入模型控制
+            patterns: 匹配源文件的 glob 模式（递归匹配）
+            chunk_size: 块大小
+            chunk_overlap: 块重叠长度
+            batch_size: 每批嵌入并写入集合的块数
+            split_workers: 读取和切分文档的进程数，1 表示在当前进程中执行
+            max_retries: 单批嵌入失败后的重试次数
+            retry_backoff: 嵌入重试的初始等待时间（秒），每次重试翻倍
+        """
+        self.source_dir = Path(source_dir)
+        self.vector_store_dir = Path(vector_store_dir)
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self.patterns = tuple(patterns)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = max(1, batch_size)
+        self.split_workers = max(1, split_workers)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.manifest_path = get_manifest_path(self.vector_store_dir, collection_name)
+        
+        self.vector_store_dir.mkdir(parents=True, exist_ok=True)
+        self.vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=str(self.vector_store_dir)
+        )
+        self.collection = self.vectorstore._collection
+    
+    def _settings(self) -> Dict[str, Any]:
+        """影响切分结果的参数"""
+        return {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap}
+    
+    def scan(self) -> List[Path]:
+        """递归列出源目录中匹配的文件"""
+        if not self.source_dir.is_dir():
+            raise FileNotFoundError(f"文档目录不存在: {self.source_dir}")
+        paths = {path for pattern in self.patterns for path in self.source_dir.rglob(pattern) if path.is_file()}
+        return sorted(paths)
+    
+    def run(self, full_scan: bool = False, dry_run: bool = False) -> IngestionReport:
+        """执行一次增量导入
+        
+        导入中途失败时，已写入的批次会保存在检查点中，重新运行即可继续
+        
+        Args:
+            full_scan: 是否忽略修改时间，重新读取并比对所有文件的内容
+            dry_run: 是否只计算变更而不写入集合和清单
+        
+        Returns:
+            变更汇总
+        """
+        started = time.perf_counter()
+        manifest = IngestionManifest.load(self.manifest_path)
+        settings = self._settings()
+        # 切分参数变化时，内容未变的文件也需要重新切分
+        rechunk = full_scan or (manifest.exists and manifest.settings != settings)
+        report = IngestionReport(resumed=manifest.exists and not manifest.complete, dry_run=dry_run)
+        previous_records = dict(manifest.files)
+        
+        # 修改时间和大小都未变的文件不读取
+        seen = set()
+        candidates: List[Tuple[Path, str, Optional[FileRecord]]] = []
+        for path in self.scan():
+            rel_path = path.relative_to(self.source_dir).as_posix()
+            seen.add(rel_path)
+            record = previous_records.get(rel_path)
+            stat = path.stat()
+            if record and not rechunk and record.mtime_ns == stat.st_mtime_ns and record.size == stat.st_size:
+                report.unchanged_files += 1
+            else:
+                candidates.append((path, rel_path, record))
+        
+        writer = _BatchWriter(self, manifest, report, dry_run)
+        try:
+            for result in self._split_files(candidates, rechunk):
+                self._apply_split_result(result, previous_records.get(result.rel_path), writer, report)
+            writer.close()
+            
+            removed_ids: List[str] = []
+            for rel_path in sorted(set(previous_records) - seen):
+                report.removed_files.append(rel_path)
+                removed_ids.extend(previous_records[rel_path].chunk_ids)
+                manifest.files.pop(rel_path, None)
+            
+            # 没有完整清单时集合中可能残留旧版构建脚本或中断导入写入的块，一并清理
+            if not manifest.complete:
+                tracked = set(manifest.chunk_ids())
+                removed_ids.extend(chunk_id for chunk_id in self._collection_ids() if chunk_id not in tracked)
+            writer.delete(removed_ids)
+        except BaseException:
+            writer.abort()
+            if not dry_run:
+                manifest.save(complete=False)
+                if report.changed:
+                    bump_collection_version(self.vector_store_dir, self.collection_name)
+                print("导入中断，已写入的批次已保存到检查点，重新运行即可继续")
+            raise
+        
+        report.total_chunks = len(manifest.chunk_ids())
+        report.elapsed_seconds = time.perf_counter() - started
+        if dry_run:
+            return report
+        
+        lexical_index_dir = get_lexical_index_dir(self.vector_store_dir, self.collection_name)
+        if report.changed or report.resumed or not lexical_index_dir.exists():
+            LexicalIndex.build_from_collection(self.collection).save(lexical_index_dir)
+        if report.changed or report.resumed:
+            # 更新集合版本，使依赖该集合的检索缓存失效
+            bump_collection_version(self.vector_store_dir, self.collection_name)
+        
+        manifest.settings = settings
+        manifest.save()
+        report.elapsed_seconds = time.perf_counter() - started
+        return report
+    
+    def _split_files(
+        self,
+        candidates: List[Tuple[Path, str, Optional[FileRecord]]],
+        rechunk: bool
+    ) -> Iterator[SplitResult]:
+        """读取并切分候选文件，按文件顺序流式产出结果
+        
+        多个文件时在进程池中执行；工作进程以 spawn 方式启动，不继承向量库的线程和连接
+        """
+        arguments = [
+            (str(path), rel_path, None if rechunk or record is None else record.content_hash)
+            for path, rel_path, record in candidates
+        ]
+        if self.split_workers == 1 or len(arguments) <= 1:
+            for path, rel_path, known_hash in arguments:
+                yield load_and_split(path, rel_path, known_hash, self.chunk_size, self.chunk_overlap)
+            return
+        
+        with ProcessPoolExecutor(
+            max_workers=min(self.split_workers, len(arguments)),
+            mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            yield from executor.map(
+                load_and_split,
+                *zip(*arguments),
+                [self.chunk_size] * len(arguments),
+                [self.chunk_overlap] * len(arguments),
+                chunksize=max(1, len(arguments) // (self.split_workers * 4))
+            )
+    
+    def _apply_split_result(
+        self,
+        result: SplitResult,
+        record: Optional[FileRecord],
+        writer: "_BatchWriter",
+        report: IngestionReport
+    ):
+        """比对切分结果与清单记录，把新块交给写入器"""
+        if result.error is not None:
+            print(f"读取文件失败，保留原有的块: {result.rel_path}: {result.error}")
+            report.failed_files.append(result.rel_path)
+            return
+        
+        if result.chunks is None:
+            # 只有修改时间变化，内容未变
+            writer.commit_record(
+                result.rel_path,
+                FileRecord(result.mtime_ns, result.size, result.content_hash, record.chunk_ids)
+            )
+            report.unchanged_files += 1
+            return
+        
+        stats = report.stages["split"]
+        stats.chunks += len(result.chunks)
+        stats.seconds += result.seconds
+        
+        chunk_ids = make_chunk_ids(result.rel_path, result.chunks)
+        previous_ids = set(record.chunk_ids) if record else set()
+        current_ids = set(chunk_ids)
+        chunks = [
+            (chunk_id, chunk, {
+                "source": result.rel_path,
+                CHUNK_INDEX_METADATA_KEY: index,
+                SIMHASH_METADATA_KEY: fingerprint
+            })
+            for index, (chunk_id, chunk, fingerprint) in enumerate(zip(chunk_ids, result.chunks, result.fingerprints))
+        ]
+        new_chunks = [chunk for chunk in chunks if chunk[0] not in previous_ids]
+        # 复用的块可能因前面插入或删除内容而改变序号，旧语料的块可能还没有指纹
+        reused_metadata = [(chunk_id, metadata) for chunk_id, _, metadata in chunks if chunk_id in previous_ids]
+        stale_ids = [chunk_id for chunk_id in record.chunk_ids if chunk_id not in current_ids] if record else []
+        
+        writer.update_metadata(reused_metadata)
+        writer.add_file(
+            result.rel_path,
+            FileRecord(result.mtime_ns, result.size, result.content_hash, chunk_ids),
+            new_chunks,
+            stale_ids
+        )
+        (report.updated_files if record else report.added_files).append(result.rel_path)
+    
+    def embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        """嵌入一批文本，失败时按指数退避重试
+        
+        Args:
+            texts: 文本列表
+        
+        Returns:
+            向量列表
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                print(f"嵌入失败，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries}): {e}")
+                time.sleep(delay)
+    
+    def _collection_ids(self) -> List[str]:
+        """分页读取集合中的全部块 ID"""
+        ids: List[str] = []
+        offset = 0
+        while True:
+            page = self.collection.get(include=[], limit=_COLLECTION_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                return ids
+            ids.extend(page["ids"])
+            offset += len(page["ids"])
+    
+    def outdated_metadata(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """集合中元数据与期望不一致的块
+        
+        Args:
+            items: (块 ID, 期望的元数据) 列表
+        
+        Returns:
+            需要更新元数据的 (块 ID, 元数据) 列表，集合中不存在的块不包含在内
+        """
+        stored: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(items), _COLLECTION_PAGE_SIZE):
+            batch = [chunk_id for chunk_id, _ in items[start:start + _COLLECTION_PAGE_SIZE]]
+            page = self.collection.get(ids=batch, include=["metadatas"])
+            stored.update(zip(page["ids"], page["metadatas"]))
+        return [
+            (chunk_id, metadata) for chunk_id, metadata in items
+            if chunk_id in stored and any(stored[chunk_id].get(key) != value for key, value in metadata.items())
+        ]
+    
+    def existing_ids(self, chunk_ids: List[str]) -> set:
+        """集合中已经存在的块 ID"""
+        existing = set()
+        for start in range(0, len(chunk_ids), _COLLECTION_PAGE_SIZE):
+            batch = chunk_ids[start:start + _COLLECTION_PAGE_SIZE]
+            existing.update(self.collection.get(ids=batch, include=[])["ids"])
+        return existing
+
+
+class _BatchWriter:
+    """分批嵌入和写入块
+    
+    职责：
+    - 把各文件的新块攒成大批次，嵌入后批量写入集合
+    - 当前批次嵌入时，上一批次在后台线程中写入
+    - 文件的全部新块写入后删除它的失效块，并把文件记录提交到清单检查点
+    """
+    
+    def __init__(
+        self,
+        ingestor: IncrementalIngestor,
+        manifest: IngestionManifest,
+        report: IngestionReport,
+        dry_run: bool
+    ):
+        self.ingestor = ingestor
+        self.manifest = manifest
+        self.report = report
+        self.dry_run = dry_run
+        
+        # 待写入的块：(文件相对路径, 块 ID, 文本, 元数据)
+        self._buffer: List[Tuple[str, str, str, Dict[str, Any]]] = []
+        # 文件相对路径 -> (新记录, 失效块 ID, 未写入的块数)
+        self._open_files: Dict[str, Tuple[FileRecord, List[str], int]] = {}
+        self._upsert_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-upsert")
+        self._inflight: Optional[Tuple[Future, List[str]]] = None
+    
+    def add_file(
+        self,
+        rel_path: str,
+        record: FileRecord,
+        new_chunks: List[Tuple[str, str, Dict[str, Any]]],
+        stale_ids: List[str]
+    ):
+        """登记一个变化的文件及其新块"""
+        if not new_chunks:
+            self._commit(rel_path, record, stale_ids)
+            return
+        
+        self._open_files[rel_path] = (record, stale_ids, len(new_chunks))
+        self._buffer.extend((rel_path, chunk_id, text, metadata) for chunk_id, text, metadata in new_chunks)
+        while len(self._buffer) >= self.ingestor.batch_size:
+            batch = self._buffer[:self.ingestor.batch_size]
+            del self._buffer[:self.ingestor.batch_size]
+            self._write_batch(batch)
+    
+    def update_metadata(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """更新已存在块中过时的元数据，不重新嵌入
+        
+        先等待后台写入完成，避免与正在写入的批次并发修改集合
+        """
+        if not items:
+            return
+        self._wait_inflight()
+        outdated = self.ingestor.outdated_metadata(items)
+        self.report.chunks_relabeled += len(outdated)
+        if self.dry_run:
+            return
+        for start in range(0, len(outdated), self.ingestor.batch_size):
+            batch = outdated[start:start + self.ingestor.batch_size]
+            self.ingestor.collection.update(
+                ids=[chunk_id for chunk_id, _ in batch],
+                metadatas=[metadata for _, metadata in batch]
+            )
+    
+    def commit_record(self, rel_path: str, record: FileRecord):
+        """提交不需要写入块的文件记录"""
+        if not self.dry_run:
+            self.manifest.files[rel_path] = record
+    
+    def delete(self, chunk_ids: List[str]):
+        """分批删除块"""
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        self.report.chunks_deleted += len(chunk_ids)
+        if self.dry_run:
+            return
+        for start in range(0, len(chunk_ids), self.ingestor.batch_size):
+            self.ingestor.collection.delete(ids=chunk_ids[start:start + self.ingestor.batch_size])
+    
+    def close(self):
+        """写入剩余的块并等待后台写入完成"""
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            self._write_batch(batch)
+        self._wait_inflight()
+        self._upsert_executor.shutdown()
+    
+    def abort(self):
+        """导入失败时尽量完成已提交的写入，丢弃缓冲区"""
+        self._buffer = []
+        try:
+            self._wait_inflight()
+        except Exception as e:
+            print(f"写入最后一批块失败: {e}")
+        self._upsert_executor.shutdown()
+    
+    def _write_batch(self, batch: List[Tuple[str, str, str, Dict[str, Any]]]):
+        """嵌入一批块并提交到后台写入"""
+        existing = self.ingestor.existing_ids([chunk_id for _, chunk_id, _, _ in batch])
+        to_write = [item for item in batch if item[1] not in existing]
+        self.report.chunks_reused += len(batch) - len(to_write)
+        # 集合中已有的块（清单丢失或中断导入时写入的）同样补齐元数据
+        self.update_metadata([(chunk_id, metadata) for _, chunk_id, _, metadata in batch if chunk_id in existing])
+        self.report.chunks_embedded += len(to_write)
+        rel_paths = [rel_path for rel_path, _, _, _ in batch]
+        
+        if self.dry_run or not to_write:
+            self._wait_inflight()
+            self._finish(rel_paths)
+            return
+        
+        started = time.perf_counter()
+        vectors = self.ingestor.embed_with_retry([text for _, _, text, _ in to_write])
+        stats = self.report.stages["embed"]
+        stats.chunks += len(to_write)
+        stats.seconds += time.perf_counter() - started
+        
+        # 上一批写入完成后才提交下一批，保证检查点按顺序推进
+        self._wait_inflight()
+        future = self._upsert_executor.submit(self._upsert, to_write, vectors)
+        self._inflight = (future, rel_paths)
+        print(f"   已嵌入 {self.report.chunks_embedded} 个块")
+    
+    def _upsert(self, items: List[Tuple[str, str, str, Dict[str, Any]]], vectors: List[List[float]]):
+        """批量写入集合（在后台线程中执行）"""
+        started = time.perf_counter()
+        self.ingestor.collection.upsert(
+            ids=[chunk_id for _, chunk_id, _, _ in items],
+            embeddings=vectors,
+            documents=[text for _, _, text, _ in items],
+            metadatas=[metadata for _, _, _, metadata in items]
+        )
+        stats = self.report.stages["upsert"]
+        stats.chunks += len(items)
+        stats.seconds += time.perf_counter() - started
+    
+    def _wait_inflight(self):
+        """等待后台写入完成并推进检查点"""
+        if self._inflight is None:
+            return
+        future, rel_paths = self._inflight
+        self._inflight = None
+        future.result()
+        self._finish(rel_paths)
+    
+    def _finish(self, rel_paths: List[str]):
+        """记录已写入的块，提交全部新块都已写入的文件"""
+        completed = []
+        for rel_path in rel_paths:
+            record, stale_ids, remaining = self._open_files[rel_path]
+            self._open_files[rel_path] = (record, stale_ids, remaining - 1)
+            if remaining == 1:
+                completed.append(rel_path)
+        
+        for rel_path in dict.fromkeys(completed):
+            record, stale_ids, _ = self._open_files.pop(rel_path)
+            self._commit(rel_path, record, stale_ids)
+        
+        if completed and not self.dry_run:
+            self.manifest.save(complete=False)
+    
+    def _commit(self, rel_path: str, record: FileRecord, stale_ids: List[str]):
+        """删除文件的失效块并把新记录写入清单"""
+        self.delete(stale_ids)
+        if not self.dry_run:
+            self.manifest.files[rel_path] = record
+
+
+def create_ingestor(
+    source_dir: Optional[Union[str, Path]] = None,
+    embeddings: Optional[Embeddings] = None,
+    **kwargs
+) -> IncrementalIngestor:
+    """按项目配置创建增量导入器
+    
+    Args:
+        source_dir: 原始文档目录，为 None 时使用 get_ingest_source_dir()
+        embeddings: 嵌入模型，为 None 时使用 get_embedding_model()
+        **kwargs: 传给 IncrementalIngestor 的其他参数
+    
+    Returns:
+        增量导入器
+    """
+    return IncrementalIngestor(
+        source_dir=source_dir or get_ingest_source_dir(),
+        vector_store_dir=get_project_root() / get_vector_db_path(),
+        collection_name=get_collection_name(),
+        embeddings=embeddings or get_embedding_model(),
+        **kwargs
+    )
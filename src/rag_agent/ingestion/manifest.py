@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+知识库导入清单
+
+清单记录每个源文件上次导入时的状态和它产生的块 ID：
+- 修改时间和大小未变的文件直接跳过，不读取内容
+- 内容哈希未变的文件只刷新修改时间
+- 源文件消失时，按清单中的块 ID 从集合中删除
+- 导入过程中每写完一批块就保存一次检查点，中断后重新运行可以从断点继续
+"""
+
+import os
+import json
+import tempfile
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Union
+
+# 清单格式版本
+MANIFEST_VERSION = 1
+
+
+def get_manifest_path(vector_store_dir: Union[str, Path], collection_name: str) -> Path:
+    """获取集合对应的导入清单路径"""
+    return Path(vector_store_dir) / f"{collection_name}.manifest.json"
+
+
+@dataclass
+class FileRecord:
+    """
+    单个源文件的导入记录
+    """
+    mtime_ns: int  # 修改时间（纳秒）
+    size: int  # 文件大小（字节）
+    content_hash: str  # 内容的 SHA-256
+    chunk_ids: List[str] = field(default_factory=list)  # 该文件在集合中的块 ID
+
+
+class IngestionManifest:
+    """导入清单
+    
+    职责：
+    - 维护 相对路径 -> FileRecord 的映射
+    - 记录切分参数，参数变化时调用方需要重新切分全部文件
+    - 区分完整清单和中途保存的检查点
+    - 原子地读写清单文件
+    """
+    
+    def __init__(
+        self,
+        path: Union[str, Path],
+        files: Optional[Dict[str, FileRecord]] = None,
+        settings: Optional[Dict[str, Any]] = None,
+        exists: bool = False,
+        complete: bool = False
+    ):
+        """初始化导入清单
+        
+        Args:
+            path: 清单文件路径
+            files: 文件记录
+            settings: 上次完整导入使用的切分参数
+            exists: 清单文件是否已经存在
+            complete: 是否为完整导入后保存的清单（False 表示中断导入留下的检查点）
+        """
+        self.path = Path(path)
+        self.files: Dict[str, FileRecord] = files or {}
+        self.settings: Dict[str, Any] = settings or {}
+        self.exists = exists
+        self.complete = complete
+    
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "IngestionManifest":
+        """加载清单
+        
+        Args:
+            path: 清单文件路径
+        
+        Returns:
+            导入清单，文件不存在时返回空清单
+        """
+        path = Path(path)
+        if not path.exists():
+            return cls(path)
+        
+        data = json.loads(path.read_text(encoding='utf-8'))
+        files = {
+            rel_path: FileRecord(**record)
+            for rel_path, record in data.get("files", {}).items()
+        }
+        return cls(path, files, data.get("settings", {}), exists=True, complete=data.get("complete", True))
+    
+    def save(self, complete: bool = True):
+        """保存清单
+        
+        先写入同目录的临时文件再替换，中途失败不会留下损坏的清单
+        
+        Args:
+            complete: 是否为完整导入后的清单，导入过程中的检查点传 False
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "complete": complete,
+            "settings": self.settings,
+            "files": {rel_path: asdict(record) for rel_path, record in sorted(self.files.items())},
+        }
+        
+        fd, temp_path = tempfile.mkstemp(prefix=f".{self.path.name}-", dir=self.path.parent)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+        self.exists = True
+        self.complete = complete
+    
+    def chunk_ids(self) -> List[str]:
+        """清单中记录的全部块 ID"""
+        return [chunk_id for record in self.files.values() for chunk_id in record.chunk_ids]
+    
+    def __len__(self) -> int:
+        return len(self.files)
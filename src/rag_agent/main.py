@@ -11,9 +11,13 @@ from langchain_core.messages import HumanMessage, AIMessage
 
 from .factories.agent_factory import get_main_agent_runnable, shutdown_agent_services
 from .core.agent_state import AgentState
+from .tools.knowledge_base import RETRIEVAL_PROGRESS_EVENT
+from .retrieval.metrics import get_retrieval_metrics
+from .core.config import get_retrieval_log_level
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
+logging.getLogger("rag_agent.retrieval").setLevel(get_retrieval_log_level())
 logger = logging.getLogger(__name__)
 
 # API 数据模型 (DTOs)
@@ -77,6 +81,15 @@ def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics/retrieval")
+def retrieval_metrics():
+    """检索管道分阶段耗时统计
+    
+    Returns:
+        各阶段的耗时和候选数直方图、缓存命中次数以及最近的检索记录
+    """
+    return get_retrieval_metrics().snapshot()
+
 @app.post("/chat/invoke")
 async def chat_invoke(request: ChatRequest):
     """
@@ -109,10 +122,10 @@ async def chat_invoke(request: ChatRequest):
                     "data": json.dumps({"session_id": session_id, "query": request.query})
                 }
                 
-                # 5. 使用 astream_events 迭代 Agent 的输出事件
+                # 5. 使用 astream_events 迭代 Agent 的输出事件（v2 支持工具发出的自定义事件）
                 final_answer = ""
                 
-                async for event in app_runnable.astream_events(current_state, version="v1"):
+                async for event in app_runnable.astream_events(current_state, version="v2"):
                     kind = event["event"]
                     
                     # 处理工具调用开始事件
@@ -131,6 +144,8 @@ async def chat_invoke(request: ChatRequest):
                     elif kind == "on_tool_end":
                         tool_name = event.get("name", "unknown_tool")
                         tool_output = event.get("data", {}).get("output", "")
+                        # v2 中工具输出为 ToolMessage
+                        tool_output = getattr(tool_output, "content", tool_output)
                         # 截断输出以避免过长
                         tool_output_preview = str(tool_output)[:200] + "..." if len(str(tool_output)) > 200 else str(tool_output)
                         yield {
@@ -141,6 +156,13 @@ async def chat_invoke(request: ChatRequest):
                             })
                         }
                     
+                    # 处理检索进度事件：知识库检索每完成一个阶段就推送文档 ID 和分数
+                    elif kind == "on_custom_event" and event.get("name") == RETRIEVAL_PROGRESS_EVENT:
+                        yield {
+                            "event": "retrieval_progress",
+                            "data": json.dumps(event.get("data", {}))
+                        }
+                    
                     # 处理 LLM 流式输出
                     elif kind == "on_chat_model_stream":
                         chunk = event["data"]["chunk"]
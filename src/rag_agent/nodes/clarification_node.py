@@ -6,13 +6,13 @@
 """
 
 import uuid
-import re
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
 from ..core.agent_state import AgentState, EventType, EventStatus, EventMetadata
 from ..core.event_utils import EventQueryHelper
+from ..core.keyword_matcher import KeywordMatch, get_keyword_dictionary, get_keyword_matcher, select_non_overlapping
 
 
 class ClarificationEventFactory:
@@ -93,21 +93,27 @@ class AmbiguityDetector:
     """
     
     def __init__(self):
-        # 模糊指示词
-        self.ambiguous_patterns = [
-            r'这个|那个|它|他|她',  # 代词
-            r'某个|一些|几个|很多',  # 不确定数量
-            r'可能|也许|大概|估计',  # 不确定性词汇
-            r'什么|哪个|怎么|为什么',  # 疑问词
-            r'文件|东西|内容|资料',  # 泛指词
-        ]
+        # 模糊指示词，按类别分组：代词、不确定数量、不确定性词汇、疑问词、泛指词
+        # 词典见 keywords.config.json，第一组为代词
+        ambiguous_patterns = get_keyword_dictionary('clarification', 'ambiguous_patterns')
+        # 配置缺失时词典为空列表，按没有模糊指示词处理
+        if not isinstance(ambiguous_patterns, dict):
+            ambiguous_patterns = {}
+        self.ambiguous_groups = list(ambiguous_patterns.values())
+        self.ambiguous_patterns = ['|'.join(words) for words in self.ambiguous_groups]
+        
+        # 所有类别编译到同一个自动机中，单次扫描得到全部命中
+        self._ambiguity_matcher = get_keyword_matcher(
+            'clarification', 'ambiguous_patterns', include_keys=False, include_values=True
+        )
+        self._word_groups: Dict[str, List[int]] = {}
+        for group_index, words in enumerate(self.ambiguous_groups):
+            for word in words:
+                self._word_groups.setdefault(word, []).append(group_index)
         
         # 需要澄清的关键词
-        self.clarification_triggers = [
-            '文件', '报告', '数据', '图片', '视频', '音频',
-            '项目', '任务', '计划', '方案', '策略',
-            '时间', '地点', '人员', '部门', '公司'
-        ]
+        self.clarification_triggers = get_keyword_dictionary('clarification', 'clarification_triggers')
+        self._trigger_matcher = get_keyword_matcher('clarification', 'clarification_triggers')
     
     def detect_ambiguity(self, text: str) -> Dict[str, Any]:
         """
@@ -121,23 +127,26 @@ class AmbiguityDetector:
         """
         ambiguities = []
         
-        # 检查模糊模式
-        for pattern in self.ambiguous_patterns:
-            matches = re.findall(pattern, text)
+        # 检查模糊模式：按类别归组，每个类别内取从左到右互不重叠的命中
+        group_matches: List[List[KeywordMatch]] = [[] for _ in self.ambiguous_groups]
+        for match in self._ambiguity_matcher.iter_matches(text):
+            for group_index in self._word_groups[match.keyword]:
+                group_matches[group_index].append(match)
+        
+        for group_index, matches in enumerate(group_matches):
             if matches:
                 ambiguities.append({
-                    'type': 'pronoun' if pattern == self.ambiguous_patterns[0] else 'uncertainty',
-                    'matches': matches,
-                    'pattern': pattern
+                    'type': 'pronoun' if group_index == 0 else 'uncertainty',
+                    'matches': [text[match.start:match.end] for match in select_non_overlapping(matches)],
+                    'pattern': self.ambiguous_patterns[group_index]
                 })
         
         # 检查是否包含需要澄清的关键词但缺乏具体信息
         missing_specifics = []
-        for trigger in self.clarification_triggers:
-            if trigger in text:
-                # 检查是否有具体的描述
-                if not self._has_specific_description(text, trigger):
-                    missing_specifics.append(trigger)
+        for trigger in self._trigger_matcher.matched(text):
+            # 检查是否有具体的描述
+            if not self._has_specific_description(text, trigger):
+                missing_specifics.append(trigger)
         
         return {
             'has_ambiguity': len(ambiguities) > 0 or len(missing_specifics) > 0,
@@ -169,8 +178,7 @@ class AmbiguityDetector:
         descriptors = before + after
         
         # 如果有具体的修饰词，认为有具体描述
-        specific_words = ['具体', '详细', '特定', '明确', '准确']
-        return any(word in ' '.join(descriptors) for word in specific_words)
+        return get_keyword_matcher('clarification', 'specific_descriptors').contains_any(' '.join(descriptors))
     
     def _calculate_confidence(self, ambiguities: List[Dict], missing_specifics: List[str]) -> float:
         """
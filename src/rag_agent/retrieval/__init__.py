@@ -4,23 +4,62 @@ RAG 检索模块
 
 该模块提供模块化的检索功能，包括：
 - 基础向量数据库检索
+- BM25 词法检索与倒数排名融合
 - 查询转换和扩展
+- 查询复杂度路由
 - 文档重排序
 - 检索管道编排
+- 按 token 预算打包上下文
+- 近似重复块检测
+- 分阶段耗时统计
 """
 
-from .base_retriever import VectorDBRetriever
-from .query_transformer import QueryTransformer, query_expansion
+from .base_retriever import VectorDBRetriever, VectorQueryResult, AdaptiveFetchResult, merge_query_results
+from .query_transformer import QueryTransformer, ExpansionPlan, query_expansion
+from .query_router import QueryRouter, QueryFeatures, RouteDecision
 from .reranker import DocumentReranker, rerank_documents
-from .pipeline import RetrievalPipeline
+from .rerank_engine import RerankCandidates
+from .tokenizer import tokenize, contains_term
+from .pipeline import RetrievalPipeline, RetrievalProgress
+from .context_packer import ContextPacker, PackedContext, estimate_tokens
+from .cache import RetrievalCache
+from .semantic_cache import SemanticQueryCache
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .near_duplicate import simhash, simhash_similarity, suppress_near_duplicates
+from .metrics import RetrievalMetrics, RetrievalTrace, StageSpan, get_retrieval_metrics
 
 __all__ = [
     'VectorDBRetriever',
+    'VectorQueryResult',
+    'AdaptiveFetchResult',
+    'merge_query_results',
     'QueryTransformer',
+    'QueryRouter',
+    'QueryFeatures',
+    'RouteDecision',
+    'ExpansionPlan',
     'query_expansion',
     'DocumentReranker', 
     'rerank_documents',
-    'RetrievalPipeline'
+    'RerankCandidates',
+    'tokenize',
+    'contains_term',
+    'RetrievalPipeline',
+    'RetrievalProgress',
+    'ContextPacker',
+    'PackedContext',
+    'estimate_tokens',
+    'RetrievalCache',
+    'SemanticQueryCache',
+    'LexicalIndex',
+    'reciprocal_rank_fusion',
+    'simhash',
+    'simhash_similarity',
+    'suppress_near_duplicates',
+    'RetrievalMetrics',
+    'RetrievalTrace',
+    'StageSpan',
+    'get_retrieval_metrics'
 ]
 
 __version__ = '1.0.0'
@@ -2,24 +2,124 @@
 """
 基础向量数据库检索器
 
-该模块提供最基础的向量数据库检索功能，不包含复杂的优化逻辑
+该模块提供最基础的向量数据库检索功能，不包含复杂的优化逻辑。
+配置多个集合（分片）时，同一批查询向量并发查询各分片，按距离合并为全局前 k 个结果
 """
 
-import os
-from typing import Optional, List, Dict, Any
+import heapq
+import logging
+import threading
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable
 from pathlib import Path
 
+import numpy as np
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
 from ..core.config import (
     get_vector_db_path,
-    get_collection_name,
+    get_collection_names,
     get_embedding_model_name,
     get_project_root,
-    DEFAULT_RETRIEVAL_K
+    DEFAULT_RETRIEVAL_K,
+    DEFAULT_SHARD_TIMEOUT_MS,
+    DEFAULT_FANOUT_MAX_WORKERS,
+    DEFAULT_ADAPTIVE_INITIAL_K,
+    DEFAULT_ADAPTIVE_MIN_CANDIDATES,
+    DEFAULT_ADAPTIVE_MAX_K,
+    DEFAULT_ADAPTIVE_GROWTH
 )
 from ..core.embedding_provider import get_embedding_model
+from ..core.embedding_batch import embed_query_batch, aembed_query_batch
+from .cache import read_collection_version
+from .rerank_engine import embedding_mmr_select
+from .metrics import stage_span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class VectorQueryResult:
+    """
+    单个查询向量的集合查询结果
+    
+    各字段按相似度从高到低一一对应
+    """
+    ids: List[str]  # 块 ID
+    documents: List[str]  # 文档内容
+    metadatas: List[Dict[str, Any]]  # 元数据
+    distances: List[float]  # 与查询向量的距离
+    embeddings: Optional[np.ndarray] = None  # 文档向量 (n, dim)，未请求时为 None
+    
+    def to_documents(self, score_fn: Optional[Callable[[float], float]] = None) -> List[Document]:
+        """转换为 LangChain 文档列表
+        
+        Args:
+            score_fn: 距离到相关性分数的转换函数，提供时分数写入元数据 vector_score
+        
+        Returns:
+            文档列表
+        """
+        documents = [
+            Document(page_content=content, metadata=dict(metadata), id=doc_id)
+            for doc_id, content, metadata in zip(self.ids, self.documents, self.metadatas)
+        ]
+        if score_fn is not None:
+            for doc, distance in zip(documents, self.distances):
+                doc.metadata['vector_score'] = float(score_fn(distance))
+        return documents
+
+
+def merge_query_results(results: List[VectorQueryResult], k: int) -> VectorQueryResult:
+    """按距离合并同一查询向量在多个分片上的结果
+    
+    各分片的结果已按距离升序排列，用大小为 k 的堆取全局前 k 个，
+    距离相同时保持分片顺序
+    
+    Args:
+        results: 各分片的查询结果
+        k: 合并后保留的数量
+    
+    Returns:
+        合并后的查询结果
+    """
+    if len(results) == 1:
+        return results[0]
+    candidates = heapq.nsmallest(
+        k,
+        (
+            (distance, shard, row)
+            for shard, result in enumerate(results)
+            for row, distance in enumerate(result.distances[:k])
+        )
+    )
+    embeddings = None
+    if all(result.embeddings is not None for result in results):
+        embeddings = np.asarray(
+            [results[shard].embeddings[row] for _, shard, row in candidates], dtype=np.float32
+        )
+    return VectorQueryResult(
+        ids=[results[shard].ids[row] for _, shard, row in candidates],
+        documents=[results[shard].documents[row] for _, shard, row in candidates],
+        metadatas=[results[shard].metadatas[row] for _, shard, row in candidates],
+        distances=[distance for distance, _, _ in candidates],
+        embeddings=embeddings
+    )
+
+
+@dataclass
+class AdaptiveFetchResult:
+    """
+    单个查询的自适应检索结果
+    """
+    documents: List[Document]  # 检索到的文档，按相似度从高到低排列
+    rounds: int  # 执行的查询轮数
+    fetch_k: int  # 最后一轮获取的候选数
+    below_threshold: bool = False  # 没有候选达到阈值，返回的是得分最高的候选
 
 
 class VectorDBRetriever:
@@ -29,16 +129,31 @@ class VectorDBRetriever:
     - 初始化和管理 ChromaDB 连接
     - 提供基础的相似性检索功能
     - 支持不同的检索策略(similarity, mmr, threshold)
+    - 并发查询多个集合（分片）并合并结果
     """
     
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         """初始化向量数据库检索器
         
         Args:
-            config: 检索配置字典，如果为 None 则使用默认配置
+            config: 检索配置字典，如果为 None 则使用默认配置。
+                collections 指定要查询的集合列表（默认由 get_collection_names() 决定），
+                shard_timeout_ms 指定单个分片的查询超时
         """
         self.config = config or {}
         self.vectorstore: Optional[Chroma] = None
+        self.embeddings = None
+        self.vector_store_dir: Optional[Path] = None
+        self.collection_name: Optional[str] = None
+        
+        # 按配置顺序排列的分片，第一个为主集合（与 vectorstore 相同）
+        self.shards: Dict[str, Chroma] = {}
+        self.shard_timeout_ms = self.config.get('shard_timeout_ms', DEFAULT_SHARD_TIMEOUT_MS)
+        self._shard_stats: Dict[str, Counter] = {}
+        self._shard_lock = threading.Lock()
+        # 并发查询分片的线程池，首次多分片查询时创建
+        self._shard_executor: Optional[ThreadPoolExecutor] = None
+        
         self._initialize_vectorstore()
     
     def _initialize_vectorstore(self):
@@ -46,7 +161,8 @@ class VectorDBRetriever:
         try:
             # 加载配置
             vector_store_path = get_vector_db_path()
-            collection_name = get_collection_name()
+            collection_names = list(self.config.get('collections') or get_collection_names())
+            collection_name = collection_names[0]
             embedding_model_name = get_embedding_model_name()
             
             # 构建向量存储路径
@@ -59,22 +175,214 @@ class VectorDBRetriever:
                     "请先运行 tools/scripts/build_vectorstore.py 构建向量数据库"
                 )
             
+            self.vector_store_dir = vector_store_dir
+            self.collection_name = collection_name
+            
             # 获取嵌入模型
             embeddings = get_embedding_model()
+            self.embeddings = embeddings
             
             # 连接到现有的ChromaDB
             # collection_name：集合名称，用于存储和检索文档
             # embedding_function：嵌入模型，用于将文档转换为向量
             # persist_directory：持久化目录，用于存储向量数据库
-            self.vectorstore = Chroma(
-                collection_name=collection_name,
-                embedding_function=embeddings,
-                persist_directory=str(vector_store_dir)
-            )
-            
+            self.shards = {
+                name: Chroma(
+                    collection_name=name,
+                    embedding_function=embeddings,
+                    persist_directory=str(vector_store_dir)
+                )
+                for name in collection_names
+            }
+            self._shard_stats = {name: Counter() for name in collection_names}
+            self.vectorstore = self.shards[collection_name]
+        
         except Exception as e:
             raise RuntimeError(f"初始化向量数据库检索器失败: {e}")
     
+    def query_by_embeddings(
+        self,
+        query_embeddings: List[List[float]],
+        k: int = DEFAULT_RETRIEVAL_K,
+        include_embeddings: bool = False,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List["VectorQueryResult"]:
+        """直接以查询向量执行集合查询
+        
+        多个查询向量通过一次 collection.query 完成，不经过 LangChain 检索器包装。
+        有多个分片时并发查询各分片，按距离合并为前 k 个结果
+        
+        Args:
+            query_embeddings: 查询向量列表
+            k: 每个查询返回的数量
+            include_embeddings: 是否同时返回文档向量
+            where: 元数据过滤条件
+        
+        Returns:
+            与查询向量一一对应的查询结果
+        """
+        if not self.vectorstore:
+            raise RuntimeError("向量存储未初始化")
+        if len(query_embeddings) == 0:
+            return []
+        
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        
+        with stage_span("vector_query") as span:
+            if len(self.shards) <= 1:
+                query_results = self._query_collection(self.vectorstore, query_embeddings, k, include, where)
+            else:
+                shard_results = self._query_shards(query_embeddings, k, include, where)
+                query_results = [
+                    merge_query_results([results[i] for results in shard_results], k)
+                    for i in range(len(query_embeddings))
+                ]
+            span.candidates = sum(len(result.ids) for result in query_results)
+        return query_results
+    
+    @staticmethod
+    def _query_collection(
+        vectorstore: Chroma,
+        query_embeddings: List[List[float]],
+        k: int,
+        include: List[str],
+        where: Optional[Dict[str, Any]]
+    ) -> List[VectorQueryResult]:
+        """对单个集合执行多向量查询并解析结果"""
+        results = vectorstore._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            where=where,
+            include=include
+        )
+        
+        query_results = []
+        for i in range(len(query_embeddings)):
+            # 跳过内容为空的条目
+            rows = [row for row, content in enumerate(results["documents"][i]) if content is not None]
+            embeddings = None
+            if "embeddings" in include:
+                embeddings = np.asarray(results["embeddings"][i], dtype=np.float32)[rows]
+            query_results.append(VectorQueryResult(
+                ids=[results["ids"][i][row] for row in rows],
+                documents=[results["documents"][i][row] for row in rows],
+                metadatas=[results["metadatas"][i][row] or {} for row in rows],
+                distances=[results["distances"][i][row] for row in rows],
+                embeddings=embeddings
+            ))
+        return query_results
+    
+    def _get_shard_executor(self) -> ThreadPoolExecutor:
+        """获取查询分片的线程池
+        
+        超时的分片查询会继续占用线程直到返回，线程数留出一倍余量，
+        避免慢分片阻塞下一次检索
+        """
+        with self._shard_lock:
+            if self._shard_executor is None:
+                self._shard_executor = ThreadPoolExecutor(
+                    max_workers=len(self.shards) * 2, thread_name_prefix="retrieval-shard"
+                )
+            return self._shard_executor
+    
+    def _query_shard(
+        self,
+        name: str,
+        query_embeddings: List[List[float]],
+        k: int,
+        include: List[str],
+        where: Optional[Dict[str, Any]]
+    ) -> List[VectorQueryResult]:
+        """查询单个分片，结果的元数据中记录分片名称 collection"""
+        with stage_span(f"shard:{name}") as span:
+            results = self._query_collection(self.shards[name], query_embeddings, k, include, where)
+            span.candidates = sum(len(result.ids) for result in results)
+        for result in results:
+            for metadata in result.metadatas:
+                metadata['collection'] = name
+        return results
+    
+    def _query_shards(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        include: List[str],
+        where: Optional[Dict[str, Any]]
+    ) -> List[List[VectorQueryResult]]:
+        """以同一批查询向量并发查询所有分片
+        
+        每个分片在当前上下文的副本中执行，耗时计入同一次检索的 shard:<名称> 阶段。
+        超过 shard_timeout_ms 或查询失败的分片被跳过，只有全部分片都不可用时才抛出异常
+        
+        Returns:
+            可用分片的查询结果，每个元素与查询向量一一对应
+        
+        Raises:
+            RuntimeError: 所有分片都超时或失败时抛出
+        """
+        executor = self._get_shard_executor()
+        futures = {
+            name: executor.submit(
+                contextvars.copy_context().run,
+                self._query_shard, name, query_embeddings, k, include, where
+            )
+            for name in self.shards
+        }
+        timeout = self.shard_timeout_ms / 1000 if self.shard_timeout_ms and self.shard_timeout_ms > 0 else None
+        wait(futures.values(), timeout=timeout)
+        
+        shard_results = []
+        errors = []
+        for name, future in futures.items():
+            if not future.done():
+                future.cancel()
+                self._record_shard(name, "timeouts")
+                errors.append(f"{name}: 超时")
+                logger.warning(f"分片 {name} 查询超过 {self.shard_timeout_ms:.0f} ms，跳过")
+            elif future.exception() is not None:
+                self._record_shard(name, "failures")
+                errors.append(f"{name}: {future.exception()}")
+                logger.warning(f"分片 {name} 查询失败，跳过: {future.exception()}")
+            else:
+                self._record_shard(name, "queries")
+                shard_results.append(future.result())
+        
+        if not shard_results:
+            raise RuntimeError(f"所有分片查询均失败: {'; '.join(errors)}")
+        return shard_results
+    
+    def _record_shard(self, name: str, outcome: str):
+        """记录分片查询结果（queries、timeouts 或 failures）"""
+        with self._shard_lock:
+            self._shard_stats[name][outcome] += 1
+    
+    def get_shard_stats(self) -> Dict[str, Dict[str, int]]:
+        """获取各分片的查询、超时和失败次数
+        
+        各分片的耗时直方图记录在检索统计的 shard:<名称> 阶段中
+        
+        Returns:
+            以分片名称为键的统计字典
+        """
+        with self._shard_lock:
+            return {
+                name: {
+                    "queries": stats["queries"],
+                    "timeouts": stats["timeouts"],
+                    "failures": stats["failures"],
+                }
+                for name, stats in self._shard_stats.items()
+            }
+    
+    def close(self):
+        """关闭查询分片的线程池，正在执行的查询会继续完成"""
+        with self._shard_lock:
+            if self._shard_executor is not None:
+                self._shard_executor.shutdown(wait=False, cancel_futures=True)
+                self._shard_executor = None
+    
     def retrieve(
         self,
         query: str,
@@ -89,37 +397,294 @@ class VectorDBRetriever:
             k: 返回的文档数量
             search_type: 检索类型 ("similarity", "mmr", "similarity_score_threshold")
             search_kwargs: 检索参数
-            
+        
         Returns:
             检索到的文档列表
         """
+        try:
+            return self.retrieve_batch([query], k, search_type, search_kwargs)[0]
+        except ValueError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"基础检索失败: {e}")
+    
+    def embed_queries(
+        self,
+        queries: List[str],
+        known_embeddings: Optional[Dict[str, List[float]]] = None
+    ) -> List[List[float]]:
+        """批量生成查询向量
+        
+        查询走嵌入模型的查询模式（embed_query），由批处理包装器并发请求；
+        重复的查询和已知向量不再嵌入
+        
+        Args:
+            queries: 查询字符串列表
+            known_embeddings: 已知的查询向量，命中的查询不再重复嵌入
+        
+        Returns:
+            与查询一一对应的向量列表
+        """
+        if not self.embeddings:
+            raise RuntimeError("嵌入模型未初始化")
+        if not queries:
+            return []
+        
+        known_embeddings = known_embeddings or {}
+        missing = [query for query in dict.fromkeys(queries) if query not in known_embeddings]
+        vectors = dict(known_embeddings)
+        with stage_span("embed") as span:
+            span.candidates, span.cache_hit = len(missing), not missing
+            if missing:
+                vectors.update(zip(missing, embed_query_batch(self.embeddings, missing)))
+        return [vectors[query] for query in queries]
+    
+    async def aembed_queries(
+        self,
+        queries: List[str],
+        known_embeddings: Optional[Dict[str, List[float]]] = None
+    ) -> List[List[float]]:
+        """embed_queries 的异步版本，通过 aembed_query 嵌入，不占用事件循环
+        
+        Args:
+            queries: 查询字符串列表
+            known_embeddings: 已知的查询向量，命中的查询不再重复嵌入
+        
+        Returns:
+            与查询一一对应的向量列表
+        """
+        if not self.embeddings:
+            raise RuntimeError("嵌入模型未初始化")
+        if not queries:
+            return []
+        
+        known_embeddings = known_embeddings or {}
+        missing = [query for query in dict.fromkeys(queries) if query not in known_embeddings]
+        vectors = dict(known_embeddings)
+        with stage_span("embed") as span:
+            span.candidates, span.cache_hit = len(missing), not missing
+            if missing:
+                vectors.update(zip(missing, await aembed_query_batch(self.embeddings, missing)))
+        return [vectors[query] for query in queries]
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        k: int = DEFAULT_RETRIEVAL_K,
+        search_type: str = "similarity",
+        search_kwargs: Optional[Dict[str, Any]] = None,
+        max_workers: int = DEFAULT_FANOUT_MAX_WORKERS,
+        known_embeddings: Optional[Dict[str, List[float]]] = None
+    ) -> List[List[Document]]:
+        """批量检索多个查询
+        
+        先一次性嵌入全部查询，再通过一次多向量 collection 查询完成检索：
+        - similarity: 直接返回前 k 个结果
+        - similarity_score_threshold: 按相关性分数过滤
+        - mmr: 取回 fetch_k 个候选及其向量，在本地执行 MMR 选择
+        
+        每个文档的相关性分数 (0-1) 记录在元数据 vector_score 中
+        
+        Args:
+            queries: 查询字符串列表
+            k: 每个查询返回的文档数量
+            search_type: 检索类型 ("similarity", "mmr", "similarity_score_threshold")
+            search_kwargs: 检索参数
+            max_workers: 兼容保留，MMR 检索已改为一次批量查询，不再需要并发
+            known_embeddings: 已知的查询向量
+        
+        Returns:
+            与查询一一对应的文档列表
+        """
         if not self.vectorstore:
             raise RuntimeError("向量存储未初始化")
+        if search_type not in ("similarity", "mmr", "similarity_score_threshold"):
+            raise ValueError(f"不支持的检索类型: {search_type}")
+        if not queries:
+            return []
         
-        # 设置默认检索参数
-        if search_kwargs is None:
-            search_kwargs = {"k": k}
-        else:
-            search_kwargs = {"k": k, **search_kwargs}
+        search_kwargs = {"k": k, **(search_kwargs or {})}
+        k = search_kwargs["k"]
+        query_embeddings = self.embed_queries(queries, known_embeddings)
+        relevance_fn = self.vectorstore._select_relevance_score_fn()
         
-        try:
-            # 创建检索器
-            retriever = self.vectorstore.as_retriever(
-                search_type=search_type,
-                search_kwargs=search_kwargs
-            )
+        if search_type == "mmr":
+            fetch_k = max(search_kwargs.get("fetch_k", k * 2), k)
+            lambda_mult = search_kwargs.get("lambda_mult", 0.5)
+            results = self.query_by_embeddings(query_embeddings, fetch_k, include_embeddings=True)
             
-            # 执行检索
-            documents = retriever.invoke(query)
-            return documents
-            
-        except Exception as e:
-            # 如果特定检索类型失败，回退到基础相似性搜索
-            if search_type != "similarity":
-                print(f"检索类型 {search_type} 失败，回退到基础相似性搜索: {e}")
-                return self.retrieve(query, k, "similarity", {"k": k})
-            else:
-                raise RuntimeError(f"基础检索失败: {e}")
+            batch_documents = []
+            for query_embedding, result in zip(query_embeddings, results):
+                if not result.ids:
+                    batch_documents.append([])
+                    continue
+                selected = embedding_mmr_select(
+                    np.asarray(query_embedding, dtype=np.float32),
+                    result.embeddings,
+                    lambda_mult,
+                    top_k=k
+                )
+                # 与 LangChain 的 MMR 检索一致，选中的文档按相似度顺序返回
+                documents = result.to_documents(relevance_fn)
+                batch_documents.append([documents[index] for index in sorted(selected)])
+            return batch_documents
+        
+        results = self.query_by_embeddings(query_embeddings, k)
+        if search_type == "similarity":
+            return [result.to_documents(relevance_fn) for result in results]
+        
+        score_threshold = search_kwargs.get("score_threshold")
+        batch_documents = []
+        for result in results:
+            documents = result.to_documents(relevance_fn)
+            if score_threshold is not None:
+                documents = [doc for doc in documents if doc.metadata['vector_score'] >= score_threshold]
+            batch_documents.append(documents)
+        return batch_documents
+    
+    def retrieve_adaptive(
+        self,
+        queries: List[str],
+        k: int = DEFAULT_RETRIEVAL_K,
+        score_threshold: Optional[float] = None,
+        min_candidates: int = DEFAULT_ADAPTIVE_MIN_CANDIDATES,
+        initial_k: int = DEFAULT_ADAPTIVE_INITIAL_K,
+        max_k: int = DEFAULT_ADAPTIVE_MAX_K,
+        growth: int = DEFAULT_ADAPTIVE_GROWTH,
+        known_embeddings: Optional[Dict[str, List[float]]] = None
+    ) -> List[AdaptiveFetchResult]:
+        """按轮次自适应扩大获取数量的阈值检索
+        
+        每轮对尚未满足的查询执行一次多向量查询，获取数量按 growth 倍增长：
+        - 达到阈值的候选数不少于 min_candidates 时停止
+        - 本轮最弱的候选已低于阈值时停止，集合按相似度返回结果，继续扩大不会有新的达标候选
+        - 集合已取尽或获取数量达到 max_k 时停止
+        
+        没有候选达到阈值时返回得分最高的 min_candidates 个候选
+        （元数据 below_threshold 为 True），不返回空结果
+        
+        Args:
+            queries: 查询字符串列表
+            k: 每个查询最多返回的文档数量
+            score_threshold: 相关性分数阈值，为 None 时不过滤
+            min_candidates: 足够的达标候选数
+            initial_k: 首轮获取的候选数
+            max_k: 单个查询最多获取的候选数
+            growth: 每轮获取数量的增长倍数
+            known_embeddings: 已知的查询向量
+        
+        Returns:
+            与查询一一对应的自适应检索结果
+        """
+        if not self.vectorstore:
+            raise RuntimeError("向量存储未初始化")
+        if not queries:
+            return []
+        
+        query_embeddings = self.embed_queries(queries, known_embeddings)
+        relevance_fn = self.vectorstore._select_relevance_score_fn()
+        min_candidates = max(1, min(min_candidates, k))
+        max_k = max(1, max_k)
+        fetch_k = max(1, min(initial_k, max_k))
+        
+        results: List[Optional[AdaptiveFetchResult]] = [None] * len(queries)
+        pending = list(range(len(queries)))
+        rounds = 0
+        while pending:
+            rounds += 1
+            query_results = self.query_by_embeddings([query_embeddings[i] for i in pending], fetch_k)
+            unsatisfied = []
+            for index, query_result in zip(pending, query_results):
+                documents = query_result.to_documents(relevance_fn)
+                passed = [
+                    doc for doc in documents
+                    if score_threshold is None or doc.metadata['vector_score'] >= score_threshold
+                ]
+                done = (
+                    len(passed) >= min_candidates
+                    or len(passed) < len(documents)
+                    or len(documents) < fetch_k
+                    or fetch_k >= max_k
+                )
+                if not done:
+                    unsatisfied.append(index)
+                elif passed:
+                    results[index] = AdaptiveFetchResult(passed[:k], rounds, fetch_k)
+                else:
+                    for doc in documents:
+                        doc.metadata['below_threshold'] = True
+                    results[index] = AdaptiveFetchResult(
+                        documents[:min_candidates], rounds, fetch_k, below_threshold=True
+                    )
+            pending = unsatisfied
+            fetch_k = min(max_k, fetch_k * max(2, growth))
+        return results
+    
+    def get_document_embeddings(self, ids: List[str]) -> np.ndarray:
+        """读取集合中已存储的文档向量
+        
+        每个分片通过 include=['embeddings'] 一次读取，直接返回 NumPy 数组，
+        不经过逐元素的 Python 列表转换
+        
+        Args:
+            ids: 文档 ID 列表
+        
+        Returns:
+            形状为 (len(ids), dim) 的 float32 数组，行顺序与 ids 一致
+        
+        Raises:
+            KeyError: 集合中缺少部分文档时抛出
+        """
+        if not self.vectorstore:
+            raise RuntimeError("向量存储未初始化")
+        if not ids:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        unique_ids = list(dict.fromkeys(ids))
+        # 按分片顺序读取，前面分片中没有的 ID 再到后面的分片中读取
+        vectors: Dict[str, np.ndarray] = {}
+        for vectorstore in self.shards.values():
+            pending = [doc_id for doc_id in unique_ids if doc_id not in vectors]
+            if not pending:
+                break
+            result = vectorstore._collection.get(ids=pending, include=["embeddings"])
+            # collection.get 不保证返回顺序与请求顺序一致
+            vectors.update(zip(result["ids"], np.asarray(result["embeddings"], dtype=np.float32)))
+        
+        missing = [doc_id for doc_id in unique_ids if doc_id not in vectors]
+        if missing:
+            raise KeyError(f"集合中缺少文档向量: {missing[:5]}")
+        
+        return np.asarray([vectors[doc_id] for doc_id in ids], dtype=np.float32)
+    
+    def get_documents(self, ids: List[str]) -> List[Document]:
+        """按 ID 读取集合中的文档
+        
+        Args:
+            ids: 文档 ID 列表
+        
+        Returns:
+            文档列表，顺序与 ids 一致，集合中不存在的 ID 会被跳过
+        """
+        if not self.vectorstore:
+            raise RuntimeError("向量存储未初始化")
+        if not ids:
+            return []
+        
+        # 按分片顺序读取，前面分片中没有的 ID 再到后面的分片中读取
+        documents_by_id: Dict[str, Document] = {}
+        for vectorstore in self.shards.values():
+            pending = [doc_id for doc_id in dict.fromkeys(ids) if doc_id not in documents_by_id]
+            if not pending:
+                break
+            result = vectorstore._collection.get(ids=pending, include=["documents", "metadatas"])
+            # collection.get 不保证返回顺序与请求顺序一致
+            documents_by_id.update(
+                (doc_id, Document(page_content=content, metadata=metadata or {}, id=doc_id))
+                for doc_id, content, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+                if content is not None
+            )
+        return [documents_by_id[doc_id] for doc_id in ids if doc_id in documents_by_id]
     
     def similarity_search_with_score(
         self,
@@ -131,15 +696,16 @@ class VectorDBRetriever:
         Args:
             query: 查询字符串
             k: 返回的文档数量
-            
+        
         Returns:
-            (文档, 分数) 元组列表
+            (文档, 距离) 元组列表
         """
         if not self.vectorstore:
             raise RuntimeError("向量存储未初始化")
         
         try:
-            return self.vectorstore.similarity_search_with_score(query, k=k)
+            result = self.query_by_embeddings(self.embed_queries([query]), k)[0]
+            return list(zip(result.to_documents(), result.distances))
         except Exception as e:
             raise RuntimeError(f"带分数的相似性搜索失败: {e}")
     
@@ -153,6 +719,24 @@ class VectorDBRetriever:
             raise RuntimeError("向量存储未初始化")
         return self.vectorstore
     
+    def get_collection_version(self) -> str:
+        """获取集合版本
+        
+        由版本文件标识和集合文档数组成，构建脚本更新版本文件或
+        集合文档数发生变化时，版本随之改变。有多个分片时由各分片的版本拼接而成
+        
+        Returns:
+            集合版本字符串
+        """
+        if not self.vectorstore:
+            raise RuntimeError("向量存储未初始化")
+        
+        versions = [
+            f"{read_collection_version(self.vector_store_dir, name)}:{vectorstore._collection.count()}"
+            for name, vectorstore in self.shards.items()
+        ]
+        return "|".join(versions)
+    
     def is_initialized(self) -> bool:
         """检查向量存储是否已初始化
         
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+检索结果缓存
+
+该模块提供有界、带版本的检索结果缓存：
+- LRU + TTL 淘汰，并限制缓存占用的内存
+- 缓存键由标准化查询、有效配置指纹和集合版本组成
+- 集合版本变化（重建或增量导入）时整体失效
+"""
+
+import json
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Tuple, Union
+
+from langchain_core.documents import Document
+
+
+# 不影响检索结果的配置项，不参与配置指纹
+_NON_RESULT_CONFIG_KEYS = {
+    'enable_cache',
+    'cache_max_entries',
+    'cache_ttl_seconds',
+    'cache_max_bytes',
+    'fanout_max_workers',
+    'retrieval_executor_workers',
+    'context_token_budget',
+    'context_redundancy',
+    'use_semantic_cache',
+    'semantic_cache_max_entries',
+    'semantic_cache_distance',
+}
+
+
+def get_collection_version_path(vector_store_dir: Union[str, Path], collection_name: str) -> Path:
+    """获取集合版本文件路径"""
+    return Path(vector_store_dir) / f"{collection_name}.version"
+
+
+def read_collection_version(vector_store_dir: Union[str, Path], collection_name: str) -> str:
+    """读取集合版本标识
+    
+    Returns:
+        版本标识，版本文件不存在时返回 "0"
+    """
+    version_path = get_collection_version_path(vector_store_dir, collection_name)
+    try:
+        return version_path.read_text(encoding='utf-8').strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def bump_collection_version(vector_store_dir: Union[str, Path], collection_name: str) -> str:
+    """更新集合版本标识
+    
+    构建脚本或任何导入流程修改集合后都应调用该函数，使依赖该集合的缓存失效
+    
+    Returns:
+        新的版本标识
+    """
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:12]}"
+    version_path = get_collection_version_path(vector_store_dir, collection_name)
+    version_path.parent.mkdir(parents=True, exist_ok=True)
+    version_path.write_text(version, encoding='utf-8')
+    return version
+
+
+def fingerprint_config(config: Dict[str, Any]) -> str:
+    """计算有效检索配置的指纹"""
+    relevant = {
+        key: value for key, value in config.items()
+        if key not in _NON_RESULT_CONFIG_KEYS
+    }
+    payload = json.dumps(relevant, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _estimate_size(documents: List[Document]) -> int:
+    """估算文档列表占用的字节数"""
+    size = 0
+    for doc in documents:
+        size += len(doc.page_content.encode('utf-8'))
+        size += len(str(doc.metadata))
+    return size
+
+
+class RetrievalCache:
+    """检索结果缓存
+    
+    职责：
+    - 按 LRU 顺序和 TTL 淘汰条目
+    - 控制条目数量和估算内存占用的上限
+    - 跟踪集合版本，版本变化时清空缓存
+    - 统计命中、未命中和淘汰次数
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: Optional[float] = 600,
+        max_bytes: int = 16 * 1024 * 1024
+    ):
+        """初始化检索缓存
+        
+        Args:
+            max_entries: 最大条目数
+            ttl_seconds: 条目存活时间（秒），None 或 0 表示不过期
+            max_bytes: 估算内存占用上限（字节）
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        
+        # key -> (写入时间, 估算大小, 文档列表)
+        self._entries: "OrderedDict[str, Tuple[float, int, List[Document]]]" = OrderedDict()
+        self._current_bytes = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+    
+    def make_key(self, normalized_query: str, config: Dict[str, Any]) -> str:
+        """生成缓存键
+        
+        Args:
+            normalized_query: 标准化后的查询
+            config: 有效的运行时配置
+        
+        Returns:
+            缓存键
+        """
+        return f"{self._version or '0'}|{fingerprint_config(config)}|{normalized_query}"
+    
+    def sync_version(self, version: str):
+        """同步集合版本，版本变化时清空缓存
+        
+        Args:
+            version: 当前集合版本
+        """
+        with self._lock:
+            if self._version == version:
+                return
+            if self._version is not None and self._entries:
+                self._invalidations += 1
+            self._clear_locked()
+            self._version = version
+    
+    def get(self, key: str) -> Optional[List[Document]]:
+        """读取缓存
+        
+        Args:
+            key: 缓存键
+        
+        Returns:
+            缓存的文档列表副本，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            
+            created_at, size, documents = entry
+            if self.ttl_seconds and time.monotonic() - created_at > self.ttl_seconds:
+                self._remove_locked(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self._hits += 1
+        
+        return [doc.model_copy(deep=True) for doc in documents]
+    
+    def put(self, key: str, documents: List[Document]):
+        """写入缓存
+        
+        Args:
+            key: 缓存键
+            documents: 文档列表
+        """
+        stored = [doc.model_copy(deep=True) for doc in documents]
+        size = _estimate_size(stored)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            
+            self._entries[key] = (time.monotonic(), size, stored)
+            self._current_bytes += size
+            
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._current_bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove_locked(oldest_key)
+                self._evictions += 1
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._clear_locked()
+    
+    def _remove_locked(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._current_bytes -= size
+    
+    def _clear_locked(self):
+        self._entries.clear()
+        self._current_bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息
+        
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+                "collection_version": self._version,
+            }
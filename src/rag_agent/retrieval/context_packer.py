@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+上下文打包器
+
+该模块把检索到的文档压缩为发送给模型的上下文，在 token 预算内保留最有用的句子：
+- 每个候选文档切分为句子，用重排序的词法打分器按查询打分
+- 检索排名靠前的文档获得少量先验加分，没有词面重合的语义命中也有机会入选
+- 按分数从高到低贪心填充预算，跳过与已选句子高度重复的句子
+- 入选句子按原文顺序放回各自的文档，保留来源标注，省略的部分用省略号标出
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .rerank_engine import RerankCandidates
+from ..core.config import DEFAULT_CONTEXT_TOKEN_BUDGET, DEFAULT_CONTEXT_REDUNDANCY
+
+# 句子边界：中英文句末标点之后，或换行处
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[。！？；!?;])\s*|(?<=\.)\s+|\s*\n\s*')
+
+# 中日韩文字，估算时每个字约 1 个 token
+_CJK_CHAR = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]')
+
+# 检索排名先验：第 i 个文档的句子加 _RANK_PRIOR / (1 + i)
+_RANK_PRIOR = 0.2
+
+# 省略标记
+_ELLIPSIS = "……"
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数
+    
+    中日韩文字按每字 1 个 token，其他非空白字符按每 4 个字符 1 个 token 估算，
+    与常见中文模型的分词结果相比略偏保守
+    
+    Args:
+        text: 文本
+    
+    Returns:
+        估算的 token 数
+    """
+    cjk = len(_CJK_CHAR.findall(text))
+    others = len(text) - cjk - sum(1 for char in text if char.isspace())
+    return cjk + math.ceil(max(others, 0) / 4)
+
+
+def split_sentences(text: str) -> List[str]:
+    """把文本切分为句子
+    
+    Args:
+        text: 文本
+    
+    Returns:
+        去掉首尾空白后的非空句子列表
+    """
+    return [sentence.strip() for sentence in _SENTENCE_BOUNDARY.split(text) if sentence and sentence.strip()]
+
+
+@dataclass
+class PackedPassage:
+    """
+    单个文档中入选的句子
+    """
+    rank: int  # 文档在检索结果中的位置（从 0 开始）
+    source: Optional[str]  # 文档来源
+    sentences: List[Tuple[int, str]] = field(default_factory=list)  # (句子在文档中的序号, 句子)，按原文顺序
+    sentence_count: int = 0  # 文档的句子总数
+    
+    @property
+    def text(self) -> str:
+        """按原文顺序拼接入选的句子，不相邻的句子之间用省略号分隔"""
+        parts = []
+        previous = -1
+        for position, sentence in self.sentences:
+            if parts and position != previous + 1:
+                parts.append(_ELLIPSIS)
+            parts.append(sentence)
+            previous = position
+        if self.sentences and previous < self.sentence_count - 1:
+            parts.append(_ELLIPSIS)
+        return "".join(parts)
+    
+    def header(self, number: int) -> str:
+        """片段标题，包含来源"""
+        return f"[信息片段 {number}] 来源: {self.source}" if self.source else f"[信息片段 {number}]"
+
+
+@dataclass
+class PackedContext:
+    """
+    打包后的上下文
+    """
+    passages: List[PackedPassage]  # 入选的片段，按检索排名排列
+    tokens: int  # 估算的 token 数
+    budget: int  # token 预算
+    candidate_sentences: int  # 候选句子总数
+    
+    @property
+    def selected_sentences(self) -> int:
+        """入选的句子数"""
+        return sum(len(passage.sentences) for passage in self.passages)
+    
+    def format(self) -> str:
+        """格式化为工具输出"""
+        parts = [f"检索到 {len(self.passages)} 条相关信息：\n"]
+        for number, passage in enumerate(self.passages, 1):
+            parts.append(passage.header(number))
+            parts.append(passage.text)
+            parts.append("")  # 空行分隔
+        return "\n".join(parts)
+
+
+class ContextPacker:
+    """上下文打包器
+    
+    职责：
+    - 把候选文档切分为句子并按查询打分
+    - 在 token 预算内贪心选择高分且不重复的句子
+    - 按文档重新组织入选的句子并保留来源
+    """
+    
+    def __init__(
+        self,
+        token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+        redundancy_threshold: float = DEFAULT_CONTEXT_REDUNDANCY
+    ):
+        """初始化上下文打包器
+        
+        Args:
+            token_budget: 估算 token 上限（含片段标题）
+            redundancy_threshold: 与已选句子的词元 Jaccard 相似度超过该值的句子不再入选
+        """
+        self.token_budget = token_budget
+        self.redundancy_threshold = redundancy_threshold
+    
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]] = None) -> "ContextPacker":
+        """按检索配置创建打包器"""
+        config = config or {}
+        return cls(
+            token_budget=config.get('context_token_budget', DEFAULT_CONTEXT_TOKEN_BUDGET),
+            redundancy_threshold=config.get('context_redundancy', DEFAULT_CONTEXT_REDUNDANCY)
+        )
+    
+    def pack(self, query: str, documents: List[Document]) -> PackedContext:
+        """在 token 预算内打包检索结果
+        
+        Args:
+            query: 查询字符串
+            documents: 检索到的文档，按相关性从高到低排列
+        
+        Returns:
+            打包后的上下文
+        """
+        passages = [
+            PackedPassage(rank=rank, source=doc.metadata.get('source'))
+            for rank, doc in enumerate(documents)
+        ]
+        # (文档位置, 句子在文档中的序号, 句子)
+        sentences: List[Tuple[int, int, str]] = []
+        for rank, doc in enumerate(documents):
+            doc_sentences = split_sentences(doc.page_content)
+            passages[rank].sentence_count = len(doc_sentences)
+            sentences.extend((rank, position, sentence) for position, sentence in enumerate(doc_sentences))
+        
+        tokens = estimate_tokens(PackedContext([], 0, 0, 0).format())
+        if not sentences:
+            return PackedContext([], tokens, self.token_budget, 0)
+        
+        candidates = RerankCandidates([Document(page_content=sentence) for _, _, sentence in sentences])
+        priors = np.array([_RANK_PRIOR / (1 + rank) for rank, _, _ in sentences])
+        scores = candidates.relevance_scores(query) + priors
+        similarity = candidates.similarity_matrix()
+        
+        selected: List[int] = []
+        for index in np.argsort(-scores, kind='stable'):
+            if selected and similarity[index, selected].max() > self.redundancy_threshold:
+                continue
+            
+            rank, position, sentence = sentences[index]
+            passage = passages[rank]
+            cost = estimate_tokens(sentence)
+            if not passage.sentences:
+                # 片段标题和分隔行
+                cost += estimate_tokens(passage.header(len(documents))) + 2
+            if tokens + cost > self.token_budget:
+                if selected:
+                    continue
+                # 最相关的句子本身超出预算时截断，保证至少返回一句
+                sentence = self._truncate(sentence, self.token_budget - (tokens + cost - estimate_tokens(sentence)))
+                cost = self.token_budget - tokens
+            
+            passage.sentences.append((position, sentence))
+            tokens += cost
+            selected.append(int(index))
+        
+        packed = [passage for passage in passages if passage.sentences]
+        for passage in packed:
+            passage.sentences.sort()
+        return PackedContext(packed, tokens, self.token_budget, len(sentences))
+    
+    @staticmethod
+    def _truncate(sentence: str, max_tokens: int) -> str:
+        """按估算 token 数截断句子"""
+        if max_tokens <= 0:
+            return _ELLIPSIS
+        cost = estimate_tokens(sentence)
+        return sentence[:max(1, len(sentence) * max_tokens // cost)] + _ELLIPSIS
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+BM25 词法倒排索引
+
+该模块为向量集合提供一个紧凑的磁盘倒排索引，弥补稠密检索对精确术语
+（配置项、API 名称、错误码）召回不足的问题：
+- 使用共享分词器，中文按字符 n-gram 切分，与重排序器保持一致
+- 倒排表保存为 NumPy 数组文件，加载时以内存映射方式打开
+- 文档以集合中的块 ID 标识，检索结果可以直接与向量检索结果融合
+"""
+
+import os
+import json
+import shutil
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Tuple, Union
+
+import numpy as np
+
+from .tokenizer import tokenize
+from .rerank_engine import select_top_k
+
+# 索引文件
+_META_FILE = "meta.json"
+_VOCABULARY_FILE = "vocabulary.json"
+_DOC_IDS_FILE = "doc_ids.json"
+_ARRAY_FILES = ("offsets", "postings_docs", "postings_tf", "doc_lengths", "idf")
+
+# BM25 参数
+DEFAULT_BM25_K1 = 1.5
+DEFAULT_BM25_B = 0.75
+
+# 从集合分页读取文档时的批大小
+COLLECTION_READ_BATCH_SIZE = 1000
+
+
+def get_lexical_index_dir(vector_store_dir: Union[str, Path], collection_name: str) -> Path:
+    """获取集合对应的词法索引目录"""
+    return Path(vector_store_dir) / f"{collection_name}.bm25"
+
+
+class LexicalIndex:
+    """BM25 倒排索引
+    
+    职责：
+    - 从 (块 ID, 文本) 构建倒排表并预先计算 IDF
+    - 以 NumPy 数组文件的形式持久化和内存映射加载
+    - 按 BM25 分数返回 top-k 块 ID
+    """
+    
+    def __init__(
+        self,
+        doc_ids: List[str],
+        vocabulary: Dict[str, int],
+        arrays: Dict[str, np.ndarray],
+        k1: float = DEFAULT_BM25_K1,
+        b: float = DEFAULT_BM25_B
+    ):
+        """初始化倒排索引
+        
+        Args:
+            doc_ids: 块 ID 列表，下标即文档编号
+            vocabulary: 词元到词汇 ID 的映射
+            arrays: 倒排表数组（offsets、postings_docs、postings_tf、doc_lengths、idf）
+            k1: BM25 词频饱和参数
+            b: BM25 长度归一化参数
+        """
+        self.doc_ids = doc_ids
+        self.vocabulary = vocabulary
+        self.k1 = k1
+        self.b = b
+        
+        # 词汇 ID t 的倒排表位于 postings[offsets[t]:offsets[t + 1]]
+        self.offsets = arrays["offsets"]
+        self.postings_docs = arrays["postings_docs"]
+        self.postings_tf = arrays["postings_tf"]
+        self.doc_lengths = arrays["doc_lengths"]
+        self.idf = arrays["idf"]
+        
+        # 与查询无关的长度归一化项，加载时计算一次
+        average_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        if average_length > 0:
+            self._length_norms = (
+                k1 * (1 - b + b * self.doc_lengths / average_length)
+            ).astype(np.float32)
+        else:
+            self._length_norms = np.full(len(self.doc_lengths), k1, dtype=np.float32)
+    
+    @property
+    def size(self) -> int:
+        """索引中的文档数"""
+        return len(self.doc_ids)
+    
+    @classmethod
+    def build(
+        cls,
+        doc_ids: List[str],
+        texts: List[str],
+        k1: float = DEFAULT_BM25_K1,
+        b: float = DEFAULT_BM25_B
+    ) -> "LexicalIndex":
+        """从文本构建索引
+        
+        Args:
+            doc_ids: 块 ID 列表
+            texts: 与块 ID 一一对应的文本
+            k1: BM25 词频饱和参数
+            b: BM25 长度归一化参数
+        
+        Returns:
+            倒排索引
+        """
+        if len(doc_ids) != len(texts):
+            raise ValueError("doc_ids 与 texts 数量不一致")
+        
+        vocabulary: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        frequencies: List[int] = []
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+        
+        for doc_index, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_index] = len(tokens)
+            for token, count in Counter(tokens).items():
+                rows.append(doc_index)
+                cols.append(vocabulary.setdefault(token, len(vocabulary)))
+                frequencies.append(count)
+        
+        row_array = np.asarray(rows, dtype=np.int32)
+        col_array = np.asarray(cols, dtype=np.int64)
+        tf_array = np.asarray(frequencies, dtype=np.float32)
+        
+        # 按词汇 ID 分组，组内保持文档顺序
+        order = np.argsort(col_array, kind='stable')
+        document_frequency = np.bincount(col_array, minlength=len(vocabulary))
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=offsets[1:])
+        
+        # 非负 IDF，避免高频词拉低分数
+        doc_count = len(texts)
+        idf = np.log(
+            1 + (doc_count - document_frequency + 0.5) / (document_frequency + 0.5)
+        ).astype(np.float32)
+        
+        arrays = {
+            "offsets": offsets,
+            "postings_docs": row_array[order],
+            "postings_tf": tf_array[order],
+            "doc_lengths": doc_lengths,
+            "idf": idf,
+        }
+        return cls(list(doc_ids), vocabulary, arrays, k1=k1, b=b)
+    
+    @classmethod
+    def build_from_collection(cls, collection, batch_size: int = COLLECTION_READ_BATCH_SIZE) -> "LexicalIndex":
+        """从 ChromaDB 集合构建索引
+        
+        分页读取集合中的全部文档，保证索引与集合使用相同的块 ID
+        
+        Args:
+            collection: ChromaDB 集合
+            batch_size: 每次读取的文档数
+        
+        Returns:
+            倒排索引
+        """
+        doc_ids: List[str] = []
+        texts: List[str] = []
+        offset = 0
+        while True:
+            page = collection.get(include=["documents"], limit=batch_size, offset=offset)
+            if not page["ids"]:
+                break
+            for doc_id, text in zip(page["ids"], page["documents"]):
+                if text is not None:
+                    doc_ids.append(doc_id)
+                    texts.append(text)
+            offset += len(page["ids"])
+        return cls.build(doc_ids, texts)
+    
+    def save(self, index_dir: Union[str, Path]):
+        """保存索引
+        
+        先写入同级临时目录再整体替换，读取方不会看到写了一半的索引
+        
+        Args:
+            index_dir: 索引目录
+        """
+        index_dir = Path(index_dir)
+        index_dir.parent.mkdir(parents=True, exist_ok=True)
+        staging_dir = Path(tempfile.mkdtemp(prefix=f".{index_dir.name}-", dir=index_dir.parent))
+        
+        try:
+            for name in _ARRAY_FILES:
+                np.save(staging_dir / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+            (staging_dir / _VOCABULARY_FILE).write_text(
+                json.dumps(self.vocabulary, ensure_ascii=False), encoding='utf-8'
+            )
+            (staging_dir / _DOC_IDS_FILE).write_text(
+                json.dumps(self.doc_ids, ensure_ascii=False), encoding='utf-8'
+            )
+            (staging_dir / _META_FILE).write_text(
+                json.dumps({"k1": self.k1, "b": self.b, "doc_count": self.size}), encoding='utf-8'
+            )
+            
+            if index_dir.exists():
+                shutil.rmtree(index_dir)
+            os.replace(staging_dir, index_dir)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+    
+    @classmethod
+    def load(cls, index_dir: Union[str, Path], mmap: bool = True) -> Optional["LexicalIndex"]:
+        """加载索引
+        
+        Args:
+            index_dir: 索引目录
+            mmap: 是否以内存映射方式打开倒排表
+        
+        Returns:
+            倒排索引，索引不存在时返回 None
+        """
+        index_dir = Path(index_dir)
+        meta_path = index_dir / _META_FILE
+        if not meta_path.exists():
+            return None
+        
+        meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        vocabulary = json.loads((index_dir / _VOCABULARY_FILE).read_text(encoding='utf-8'))
+        doc_ids = json.loads((index_dir / _DOC_IDS_FILE).read_text(encoding='utf-8'))
+        arrays = {
+            name: np.load(index_dir / f"{name}.npy", mmap_mode='r' if mmap else None)
+            for name in _ARRAY_FILES
+        }
+        return cls(doc_ids, vocabulary, arrays, k1=meta["k1"], b=meta["b"])
+    
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """按 BM25 分数检索
+        
+        Args:
+            query: 查询字符串
+            k: 返回的数量
+        
+        Returns:
+            按分数降序排列的 (块 ID, 分数) 列表
+        """
+        term_ids = [
+            self.vocabulary[token] for token in dict.fromkeys(tokenize(query))
+            if token in self.vocabulary
+        ]
+        if not term_ids or k <= 0:
+            return []
+        
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            # 同一词汇的倒排表中文档不重复，可以直接按下标累加
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norms[docs])
+        
+        matched = np.flatnonzero(scores > 0)
+        ranked = matched[select_top_k(scores[matched], k)]
+        return [(self.doc_ids[i], float(scores[i])) for i in ranked]
+    
+    def document_frequencies(self, query: str) -> Dict[str, int]:
+        """查询中各词元在索引中出现的文档数
+        
+        只读取倒排表的偏移量，不计算 BM25 分数
+        
+        Args:
+            query: 查询字符串
+        
+        Returns:
+            词元 -> 文档数，索引词汇表中不存在的词元记为 0
+        """
+        frequencies = {}
+        for token in dict.fromkeys(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            frequencies[token] = 0 if term_id is None else int(self.offsets[term_id + 1] - self.offsets[term_id])
+        return frequencies
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息
+        
+        Returns:
+            统计信息字典
+        """
+        return {
+            "documents": self.size,
+            "vocabulary": len(self.vocabulary),
+            "postings": len(self.postings_docs),
+            "k1": self.k1,
+            "b": self.b,
+        }
+
+
+def reciprocal_rank_fusion(rankings: List[List[Any]], rrf_k: int = 60) -> Dict[Any, float]:
+    """倒数排名融合 (Reciprocal Rank Fusion)
+    
+    每个排名列表中排第 r 位（从 0 开始）的条目得到 1 / (rrf_k + r + 1) 分，
+    同一列表中重复出现的条目只按最靠前的位置计分
+    
+    Args:
+        rankings: 多个排名列表
+        rrf_k: 平滑常数，越大越弱化头部排名的优势
+    
+    Returns:
+        条目到融合分数的映射，按首次出现的顺序排列
+    """
+    fused: Dict[Any, float] = {}
+    for ranking in rankings:
+        seen = set()
+        for rank, key in enumerate(ranking):
+            if key in seen:
+                continue
+            seen.add(key)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return fused
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+检索耗时统计
+
+该模块为检索管道提供分阶段的耗时埋点：
+- 每个阶段（标准化、扩展、嵌入、向量查询、去重、过滤、重排序、截断等）记录为一个 span，
+  包含耗时、候选数和缓存命中情况
+- 一次检索的全部 span 组成一条 trace，通过上下文变量传递，线程池中执行的阶段同样归入当前 trace
+- 耗时和候选数按阶段聚合为直方图，可通过 get_stats() 和 /metrics/retrieval 查看
+- 阶段日志使用 DEBUG 级别，每次检索的汇总使用 INFO 级别，由日志级别控制输出
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, Iterator, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 耗时直方图的桶上界（毫秒）
+DEFAULT_LATENCY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 候选数直方图的桶上界
+DEFAULT_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# 保留的最近 trace 数
+RECENT_TRACES = 20
+
+
+class Histogram:
+    """固定分桶的直方图
+    
+    职责：
+    - 按桶上界累计观测值的个数
+    - 记录总和、最小值和最大值
+    - 在桶内线性插值估算分位数
+    """
+    
+    def __init__(self, bounds: Sequence[float]):
+        """初始化直方图
+        
+        Args:
+            bounds: 递增的桶上界，超过最大上界的观测值计入溢出桶
+        """
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+    
+    def observe(self, value: float):
+        """记录一个观测值"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """估算分位数
+        
+        Args:
+            q: 分位点 (0-1)
+        
+        Returns:
+            分位数估计值，没有观测值时返回 None
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else min(self.min, self.bounds[0])
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """导出统计值和累计分桶"""
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            buckets.append(["+Inf" if bound == float('inf') else bound, cumulative])
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": _round(self.quantile(0.5)),
+            "p95": _round(self.quantile(0.95)),
+            "p99": _round(self.quantile(0.99)),
+            "buckets": buckets,
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+@dataclass
+class StageSpan:
+    """
+    单个检索阶段的耗时记录
+    """
+    stage: str  # 阶段名称
+    duration_ms: float = 0.0  # 耗时（毫秒）
+    candidates: Optional[int] = None  # 阶段输出的候选数
+    cache_hit: Optional[bool] = None  # 缓存是否命中，不涉及缓存的阶段为 None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"stage": self.stage, "duration_ms": round(self.duration_ms, 3)}
+        if self.candidates is not None:
+            data["candidates"] = self.candidates
+        if self.cache_hit is not None:
+            data["cache_hit"] = self.cache_hit
+        return data
+
+
+@dataclass
+class RetrievalTrace:
+    """
+    一次检索的全部阶段记录
+    """
+    query: str  # 查询字符串
+    spans: List[StageSpan] = field(default_factory=list)  # 按完成顺序排列的阶段记录
+    total_ms: float = 0.0  # 总耗时（毫秒）
+    metrics: Optional["RetrievalMetrics"] = field(default=None, repr=False)  # 汇总到的统计器
+    
+    def stage_totals(self) -> Dict[str, float]:
+        """各阶段的累计耗时（毫秒），同一阶段执行多次时相加"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span.stage] = totals.get(span.stage, 0.0) + span.duration_ms
+        return totals
+    
+    def summary(self) -> str:
+        """单行的阶段耗时摘要"""
+        stages = ", ".join(f"{stage} {duration:.1f}" for stage, duration in self.stage_totals().items())
+        return f"检索 '{self.query[:30]}' 耗时 {self.total_ms:.1f} ms ({stages})"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "query": self.query,
+            "total_ms": round(self.total_ms, 3),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+class RetrievalMetrics:
+    """检索耗时统计器
+    
+    职责：
+    - 按阶段聚合耗时和候选数直方图
+    - 按阶段统计缓存命中和未命中次数
+    - 记录整次检索的耗时分布和最近的 trace
+    """
+    
+    def __init__(
+        self,
+        latency_buckets_ms: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS,
+        count_buckets: Sequence[float] = DEFAULT_COUNT_BUCKETS
+    ):
+        """初始化统计器
+        
+        Args:
+            latency_buckets_ms: 耗时直方图的桶上界（毫秒）
+            count_buckets: 候选数直方图的桶上界
+        """
+        self.latency_buckets_ms = tuple(latency_buckets_ms)
+        self.count_buckets = tuple(count_buckets)
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """清空全部统计"""
+        with self._lock:
+            self._latency: Dict[str, Histogram] = {}
+            self._candidates: Dict[str, Histogram] = {}
+            self._cache: Dict[str, Dict[str, int]] = {}
+            self._total = Histogram(self.latency_buckets_ms)
+            self._recent: deque = deque(maxlen=RECENT_TRACES)
+    
+    def record_span(self, span: StageSpan):
+        """记录一个阶段"""
+        with self._lock:
+            self._latency.setdefault(span.stage, Histogram(self.latency_buckets_ms)).observe(span.duration_ms)
+            if span.candidates is not None:
+                self._candidates.setdefault(span.stage, Histogram(self.count_buckets)).observe(span.candidates)
+            if span.cache_hit is not None:
+                counts = self._cache.setdefault(span.stage, {"hits": 0, "misses": 0})
+                counts["hits" if span.cache_hit else "misses"] += 1
+    
+    def record_trace(self, trace: RetrievalTrace):
+        """记录一次完整检索"""
+        with self._lock:
+            self._total.observe(trace.total_ms)
+            self._recent.append(trace.to_dict())
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """导出全部统计
+        
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            stages = {}
+            for stage, histogram in self._latency.items():
+                stages[stage] = {"latency_ms": histogram.snapshot()}
+                if stage in self._candidates:
+                    stages[stage]["candidates"] = self._candidates[stage].snapshot()
+                if stage in self._cache:
+                    stages[stage]["cache"] = dict(self._cache[stage])
+            return {
+                "queries": self._total.count,
+                "total_latency_ms": self._total.snapshot(),
+                "stages": stages,
+                "recent_traces": list(self._recent),
+            }
+
+
+_default_metrics = RetrievalMetrics()
+
+# 当前正在执行的检索 trace
+_current_trace: ContextVar[Optional[RetrievalTrace]] = ContextVar("retrieval_trace", default=None)
+
+
+def get_retrieval_metrics() -> RetrievalMetrics:
+    """获取进程内共享的检索统计器"""
+    return _default_metrics
+
+
+def get_current_trace() -> Optional[RetrievalTrace]:
+    """获取当前上下文中的检索 trace"""
+    return _current_trace.get()
+
+
+@contextmanager
+def retrieval_trace(query: str, metrics: Optional[RetrievalMetrics] = None) -> Iterator[RetrievalTrace]:
+    """开始一次检索的 trace，退出时汇总到统计器并输出摘要
+    
+    Args:
+        query: 查询字符串
+        metrics: 统计器，为 None 时使用共享统计器
+    
+    Yields:
+        检索 trace
+    """
+    trace = RetrievalTrace(query, metrics=metrics or _default_metrics)
+    token = _current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.total_ms = (time.perf_counter() - started) * 1000
+        _current_trace.reset(token)
+        trace.metrics.record_trace(trace)
+        logger.info(trace.summary())
+
+
+@contextmanager
+def stage_span(stage: str) -> Iterator[StageSpan]:
+    """记录一个检索阶段的耗时
+    
+    调用方可以在阶段内设置 span.candidates 和 span.cache_hit。
+    不在 trace 中执行时只汇总到共享统计器
+    
+    Args:
+        stage: 阶段名称
+    
+    Yields:
+        阶段记录
+    """
+    span = StageSpan(stage)
+    started = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span.duration_ms = (time.perf_counter() - started) * 1000
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(span)
+        (trace.metrics if trace is not None else _default_metrics).record_span(span)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("检索阶段 %s", span.to_dict())
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+近似重复块检测
+
+该模块识别内容重复的文档块：
+- 指纹由共享分词器的词元计算，64 位，导入时写入块元数据 simhash，查询时无需重新分词
+- 两个指纹的相似度为相同比特位的比例，比较只需一次异或和计数
+- 缺少指纹的文档（旧数据、记忆文档）在查询时现场计算
+- 指纹只用于筛选近似副本的候选，候选的词元还须全部出现在保留的块中，只改动关键词的块不会被去除
+- 同一来源中块序号相邻的块直接比较首尾的重叠文本，可按重叠部分拼接为一个块
+"""
+
+import hashlib
+from collections import Counter
+from typing import List, Optional, Dict, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .tokenizer import tokenize
+from ..core.config import DEFAULT_NEAR_DUPLICATE_MIN_OVERLAP
+
+# 指纹位数
+SIMHASH_BITS = 64
+
+# 块元数据中保存指纹和块序号的键
+SIMHASH_METADATA_KEY = "simhash"
+CHUNK_INDEX_METADATA_KEY = "chunk_index"
+
+# 近似重复的处理策略
+STRATEGY_KEEP_BEST = "keep_best"  # 近似副本只保留分数较高的块
+STRATEGY_MERGE = "merge"  # 另外把同一来源中相互重叠的相邻块拼接为一个
+
+_MASK = (1 << SIMHASH_BITS) - 1
+_SIGN_BIT = 1 << (SIMHASH_BITS - 1)
+
+
+def _feature_hash(token: str) -> int:
+    """词元的 64 位哈希（跨进程稳定，不受 PYTHONHASHSEED 影响）"""
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text: str) -> int:
+    """计算文本的 SimHash 指纹
+    
+    以词元为特征、词频为权重。返回值转换为有符号 64 位整数，
+    可以直接写入 Chroma 元数据
+    
+    Args:
+        text: 文本
+    
+    Returns:
+        有符号 64 位指纹，没有词元时为 0
+    """
+    counts = Counter(tokenize(text))
+    if not counts:
+        return 0
+    features = np.array([_feature_hash(token) for token in counts], dtype='>u8')
+    # 每行是一个词元哈希的比特位（高位在前），按词频加权求和
+    bits = np.unpackbits(features.view(np.uint8)).reshape(len(counts), SIMHASH_BITS)
+    weights = np.fromiter(counts.values(), dtype=np.int64, count=len(counts)) @ (2 * bits.astype(np.int64) - 1)
+    
+    fingerprint = 0
+    for weight in weights:
+        fingerprint = fingerprint << 1 | int(weight > 0)
+    return fingerprint - (1 << SIMHASH_BITS) if fingerprint & _SIGN_BIT else fingerprint
+
+
+def simhash_similarity(a: int, b: int) -> float:
+    """两个指纹的相似度，即相同比特位的比例 (0-1)"""
+    return 1.0 - bin((a ^ b) & _MASK).count('1') / SIMHASH_BITS
+
+
+def document_fingerprint(doc: Document) -> int:
+    """读取文档元数据中的指纹，缺少时现场计算"""
+    fingerprint = doc.metadata.get(SIMHASH_METADATA_KEY)
+    if isinstance(fingerprint, int):
+        return fingerprint
+    return simhash(doc.page_content)
+
+
+def _document_score(doc: Document) -> Optional[float]:
+    """文档的检索分数，优先使用融合分数 rrf_score，其次使用向量相关性分数 vector_score"""
+    return doc.metadata.get('rrf_score', doc.metadata.get('vector_score'))
+
+
+def chunk_overlap(first: str, second: str) -> int:
+    """相邻块的重叠长度，即 first 的后缀与 second 的前缀的最长重合字符数"""
+    for size in range(min(len(first), len(second)), 0, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def stitch_chunks(first: str, second: str) -> str:
+    """按重叠部分拼接两个相邻块
+    
+    找到 first 的后缀与 second 的前缀的最长重叠，重叠部分只保留一份
+    
+    Args:
+        first: 前一个块
+        second: 后一个块
+    
+    Returns:
+        拼接后的文本
+    """
+    size = chunk_overlap(first, second)
+    if size:
+        return first + second[size:]
+    return first + "\n" + second
+
+
+def _absorb_provenance(kept: Document, duplicate: Document):
+    """把被去除的块命中的查询变体记录到保留的块中"""
+    matched = kept.metadata.get('matched_queries')
+    ranks = kept.metadata.get('variant_ranks')
+    if matched is None or ranks is None:
+        return
+    for query, rank in duplicate.metadata.get('variant_ranks', {}).items():
+        if query not in ranks:
+            matched.append(query)
+            ranks[query] = rank
+
+
+def suppress_near_duplicates(
+    documents: List[Document],
+    similarity: float,
+    strategy: str = STRATEGY_KEEP_BEST,
+    min_overlap: int = DEFAULT_NEAR_DUPLICATE_MIN_OVERLAP
+) -> Tuple[List[Document], int]:
+    """去除近似重复的文档
+    
+    按分数从高到低（无分数时按原顺序）依次判断：
+    - merge 策略下，与已保留文档同一来源、块序号相邻且首尾重叠至少 min_overlap 个字符的块拼接到该文档中
+    - 与已保留文档的指纹相似度达到阈值、且词元全部出现在该文档中的块视为近似副本，只保留分数较高的一个
+    
+    被去除的文档命中的查询变体并入保留的文档。返回的文档保持原有顺序
+    
+    Args:
+        documents: 已按内容精确去重的文档列表
+        similarity: 视为近似副本的指纹相似度阈值 (0-1)，大于 1 时不检测近似副本
+        strategy: 处理策略，keep_best 或 merge
+        min_overlap: merge 策略下拼接相邻块所需的最少重叠字符数
+    
+    Returns:
+        (去重后的文档列表, 去除的文档数)
+    """
+    merge = strategy == STRATEGY_MERGE
+    if (similarity > 1 and not merge) or len(documents) < 2:
+        return documents, 0
+    
+    # 稳定排序：有分数的文档按分数降序在前，没有分数的保持原顺序在后
+    scores = [_document_score(doc) for doc in documents]
+    order = sorted(
+        range(len(documents)),
+        key=lambda i: -scores[i] if scores[i] is not None else float('inf')
+    )
+    
+    kept: Dict[int, Document] = {}
+    fingerprints: Dict[int, int] = {}
+    token_sets: Dict[int, Set[str]] = {}
+    spans: Dict[int, Tuple[int, int]] = {}  # 保留文档覆盖的块序号范围
+    for index in order:
+        doc = documents[index]
+        
+        if merge:
+            merged_into = _merge_into_neighbor(doc, kept, spans, min_overlap)
+            if merged_into is not None:
+                token_sets.pop(merged_into, None)
+                continue
+        
+        if similarity <= 1:
+            copy_of = _find_near_copy(doc, similarity, kept, fingerprints, token_sets)
+            if copy_of is not None:
+                _absorb_provenance(kept[copy_of], doc)
+                continue
+        
+        kept[index] = doc
+        if similarity <= 1:
+            fingerprints[index] = document_fingerprint(doc)
+        chunk_index = doc.metadata.get(CHUNK_INDEX_METADATA_KEY)
+        if isinstance(chunk_index, int):
+            spans[index] = (chunk_index, chunk_index)
+    
+    return [kept[index] for index in sorted(kept)], len(documents) - len(kept)
+
+
+def _merge_into_neighbor(
+    doc: Document,
+    kept: Dict[int, Document],
+    spans: Dict[int, Tuple[int, int]],
+    min_overlap: int
+) -> Optional[int]:
+    """把文档拼接到同一来源中与之相邻且重叠的已保留文档，返回该文档的位置，没有时返回 None"""
+    chunk_index = doc.metadata.get(CHUNK_INDEX_METADATA_KEY)
+    if not isinstance(chunk_index, int):
+        return None
+    source = doc.metadata.get('source')
+    for kept_index, (first, last) in spans.items():
+        neighbor = kept[kept_index]
+        if neighbor.metadata.get('source') != source:
+            continue
+        if chunk_index == last + 1:
+            texts = (neighbor.page_content, doc.page_content)
+        elif chunk_index == first - 1:
+            texts = (doc.page_content, neighbor.page_content)
+        else:
+            continue
+        if chunk_overlap(*texts) < min_overlap:
+            continue
+        
+        _absorb_provenance(neighbor, doc)
+        merged = Document(page_content=stitch_chunks(*texts), metadata=dict(neighbor.metadata), id=neighbor.id)
+        merged.metadata['merged_chunks'] = list(neighbor.metadata.get('merged_chunks', [neighbor.id])) + [doc.id]
+        kept[kept_index] = merged
+        spans[kept_index] = (min(first, chunk_index), max(last, chunk_index))
+        return kept_index
+    return None
+
+
+def _find_near_copy(
+    doc: Document,
+    similarity: float,
+    kept: Dict[int, Document],
+    fingerprints: Dict[int, int],
+    token_sets: Dict[int, Set[str]]
+) -> Optional[int]:
+    """查找文档是其近似副本的已保留文档，没有时返回 None
+    
+    指纹相似度只用于筛选候选：64 位指纹分辨不出只改动一个关键词的两个块，
+    因此还要求文档的词元全部出现在候选文档中，去除它不会丢失任何词元
+    """
+    fingerprint = document_fingerprint(doc)
+    tokens = None
+    for kept_index, kept_fingerprint in fingerprints.items():
+        if simhash_similarity(fingerprint, kept_fingerprint) < similarity:
+            continue
+        if tokens is None:
+            tokens = set(tokenize(doc.page_content))
+        if kept_index not in token_sets:
+            token_sets[kept_index] = set(tokenize(kept[kept_index].page_content))
+        if tokens <= token_sets[kept_index]:
+            return kept_index
+    return None
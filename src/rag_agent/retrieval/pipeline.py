@@ -6,13 +6,101 @@
 将查询转换、基础检索、去重、重排序等步骤串联成一个可配置的检索管道
 """
 
-from typing import List, Optional, Dict, Any, Set
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import Counter
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Set, Tuple, Callable, TypeVar, AsyncIterator
 from langchain_core.documents import Document
 
 from .base_retriever import VectorDBRetriever
-from .query_transformer import QueryTransformer
+from .query_transformer import QueryTransformer, ExpansionPlan
+from .query_router import QueryRouter, RouteDecision
 from .reranker import DocumentReranker
-from ..core.config import get_retrieval_config
+from .cache import RetrievalCache, fingerprint_config
+from .semantic_cache import SemanticQueryCache
+from .lexical_index import LexicalIndex, get_lexical_index_dir, reciprocal_rank_fusion
+from .near_duplicate import suppress_near_duplicates
+from .metrics import RetrievalMetrics, get_retrieval_metrics, retrieval_trace, stage_span
+from ..core.embedding_cache import embedding_request_scope
+from ..core.config import (
+    get_retrieval_config,
+    DEFAULT_FANOUT_MAX_WORKERS,
+    DEFAULT_RETRIEVAL_EXECUTOR_WORKERS,
+    DEFAULT_CACHE_MAX_ENTRIES,
+    DEFAULT_CACHE_TTL_SECONDS,
+    DEFAULT_CACHE_MAX_BYTES,
+    DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES,
+    DEFAULT_SEMANTIC_CACHE_DISTANCE,
+    DEFAULT_MAX_DOCS_BEFORE_RERANK,
+    DEFAULT_RERANK_STRATEGY,
+    DEFAULT_MMR_LAMBDA,
+    DEFAULT_USE_LEXICAL_SEARCH,
+    DEFAULT_LEXICAL_K,
+    DEFAULT_RRF_K,
+    DEFAULT_USE_ADAPTIVE_K,
+    DEFAULT_ADAPTIVE_INITIAL_K,
+    DEFAULT_ADAPTIVE_MIN_CANDIDATES,
+    DEFAULT_ADAPTIVE_MAX_K,
+    DEFAULT_ADAPTIVE_GROWTH,
+    DEFAULT_USE_QUERY_ROUTER,
+    DEFAULT_EXPANSION_MAX_SEARCHES,
+    DEFAULT_EXPANSION_TIME_BUDGET_MS,
+    DEFAULT_EXPANSION_DUPLICATE_SIMILARITY,
+    DEFAULT_NEAR_DUPLICATE_SIMILARITY,
+    DEFAULT_NEAR_DUPLICATE_STRATEGY,
+    DEFAULT_NEAR_DUPLICATE_MIN_OVERLAP
+)
+
+logger = logging.getLogger(__name__)
+
+# 单次检索耗时的滑动平均系数
+_SEARCH_LATENCY_SMOOTHING = 0.2
+
+T = TypeVar('T')
+
+
+@dataclass
+class RetrievalProgress:
+    """
+    检索管道的阶段性结果
+    
+    stage 取值：
+    - candidates: 基础检索（含词法融合）完成后的候选文档
+    - final: 重排序和截断后的最终结果（命中缓存或回退检索时只有这一阶段）
+    """
+    stage: str  # 阶段名称
+    documents: List[Document]  # 该阶段的文档
+    elapsed_ms: float  # 从检索开始到该阶段完成的耗时（毫秒）
+    
+    @property
+    def final(self) -> bool:
+        """是否为最终结果"""
+        return self.stage == "final"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可 JSON 序列化的摘要，只包含文档 ID、来源和分数
+        
+        分数优先使用融合分数 rrf_score，其次使用向量相关性分数 vector_score
+        """
+        documents = []
+        for doc in self.documents:
+            score = doc.metadata.get('rrf_score', doc.metadata.get('vector_score'))
+            documents.append({
+                "id": doc.id,
+                "source": doc.metadata.get('source'),
+                "score": score,
+            })
+        return {
+            "stage": self.stage,
+            "final": self.final,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+            "documents": documents,
+        }
 
 
 class RetrievalPipeline:
@@ -37,11 +125,42 @@ class RetrievalPipeline:
         # 初始化组件
         self.base_retriever = VectorDBRetriever(self.config)
         self.query_transformer = QueryTransformer(self.config)
+        self.query_router = QueryRouter(self.config)
         self.reranker = DocumentReranker(self.config)
         
-        # 缓存，用于避免重复检索
-        self._cache: Dict[str, List[Document]] = {}
+        # 缓存，用于避免重复检索（键包含配置指纹和集合版本）
+        self._cache = RetrievalCache(
+            max_entries=self.config.get('cache_max_entries', DEFAULT_CACHE_MAX_ENTRIES),
+            ttl_seconds=self.config.get('cache_ttl_seconds', DEFAULT_CACHE_TTL_SECONDS),
+            max_bytes=self.config.get('cache_max_bytes', DEFAULT_CACHE_MAX_BYTES)
+        )
         self._enable_cache = self.config.get('enable_cache', False)
+        
+        # 语义缓存，用于复用近似查询的检索结果
+        self._semantic_cache = SemanticQueryCache(
+            max_entries=self.config.get('semantic_cache_max_entries', DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES),
+            distance_threshold=self.config.get('semantic_cache_distance', DEFAULT_SEMANTIC_CACHE_DISTANCE)
+        )
+        
+        # BM25 词法索引，首次使用时加载，索引重建后自动重新加载
+        self._lexical_index: Optional[LexicalIndex] = None
+        self._lexical_index_stamp: Optional[Tuple[int, int]] = None
+        self._lexical_lock = threading.Lock()
+        
+        # 单个查询变体的平均检索耗时（毫秒），用于按耗时预算限制扩展数量
+        self._search_latency_ms: Optional[float] = None
+        
+        # 自适应检索的统计：每个查询变体所需轮数的分布和未达到阈值的查询数
+        self._fetch_rounds: Counter = Counter()
+        self._below_threshold_queries = 0
+        self._fetch_stats_lock = threading.Lock()
+        
+        # 分阶段耗时统计，默认使用进程内共享的统计器
+        self.metrics: RetrievalMetrics = get_retrieval_metrics()
+        
+        # 异步检索中执行阻塞操作的有界线程池，首次使用时创建
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
     
     def invoke(self, query: str, **kwargs) -> List[Document]:
         """执行完整的检索管道
@@ -49,51 +168,397 @@ class RetrievalPipeline:
         Args:
             query: 原始查询字符串
             **kwargs: 运行时参数，可以覆盖配置中的参数
-            
+        
         Returns:
             最终的检索结果文档列表
         """
+        # 同一次检索内重复出现的文本只嵌入一次
+        with embedding_request_scope(), retrieval_trace(query, self.metrics):
+            return self._invoke(query, **kwargs)
+    
+    def _invoke(self, query: str, **kwargs) -> List[Document]:
+        """依次执行检索管道的各个阶段"""
+        started = time.perf_counter()
         try:
             # 合并运行时参数和配置
             runtime_config = {**self.config, **kwargs}
             
-            # 检查缓存
-            if self._enable_cache and query in self._cache:
-                print(f"从缓存中获取查询结果: {query[:50]}...")
-                return self._cache[query]
-            
             # 1. 查询预处理和标准化
             normalized_query = self._preprocess_query(query, runtime_config)
             
+            # 按查询复杂度选择检索策略
+            decision, runtime_config = self._route_query(normalized_query, runtime_config, kwargs)
+            
+            # 检查缓存
+            cache_key = self._lookup_cache_key(normalized_query, runtime_config)
+            if cache_key is not None:
+                cached = self._get_cached_result(cache_key, query)
+                if cached is not None:
+                    return cached
+            
+            # 检查语义缓存
+            query_embedding = None
+            if cache_key is not None and runtime_config.get('use_semantic_cache', False):
+                query_embedding, cached = self._lookup_semantic_cache(normalized_query, runtime_config)
+                if cached is not None:
+                    self._cache.put(cache_key, cached)
+                    return cached
+            
             # 2. 查询转换（可选）
-            queries = self._transform_query(normalized_query, runtime_config)
+            known_embeddings = {normalized_query: query_embedding} if query_embedding is not None else None
+            queries, known_embeddings = self._transform_query(normalized_query, runtime_config, known_embeddings)
             
             # 3. 基础检索
-            all_documents = self._retrieve_documents(queries, runtime_config)
+            all_documents = self._retrieve_documents(queries, runtime_config, known_embeddings)
             
-            # 4. 后处理：去重、过滤
-            processed_documents = self._postprocess_documents(
-                all_documents, normalized_query, runtime_config
-            )
+            # 4-6. 后处理、重排序、最终过滤
+            result = self._process_documents(all_documents, normalized_query, runtime_config)
+            
+            # 缓存结果
+            self._store_result(cache_key, normalized_query, query_embedding, runtime_config, result)
+            self._record_route_latency(decision, started)
+            return result
+        
+        except Exception as e:
+            logger.warning(f"检索管道执行失败: {e}")
+            # 回退到基础检索
+            return self._fallback_retrieve(query, kwargs.get('k', self.config.get('k', 5)))
+    
+    async def ainvoke(self, query: str, **kwargs) -> List[Document]:
+        """异步执行完整的检索管道
+        
+        与 invoke 的阶段和结果相同，但不阻塞事件循环：
+        - 查询向量通过嵌入模型的异步接口生成
+        - 向量库查询、词法检索和重排序在有界线程池中执行
+        - 调用方取消时立即抛出 CancelledError，线程池中尚未开始的任务会被丢弃
+        
+        Args:
+            query: 原始查询字符串
+            **kwargs: 运行时参数，可以覆盖配置中的参数
+        
+        Returns:
+            最终的检索结果文档列表
+        """
+        with embedding_request_scope(), retrieval_trace(query, self.metrics):
+            return await self._ainvoke(query, **kwargs)
+    
+    async def astream(self, query: str, **kwargs) -> AsyncIterator[RetrievalProgress]:
+        """异步执行检索管道，逐个产出各阶段的结果
+        
+        基础检索完成后先产出候选文档，调用方无需等待重排序即可展示来源；
+        最后产出与 ainvoke 返回值相同的最终结果。
+        提前停止迭代时，后台的检索任务会被取消
+        
+        Args:
+            query: 原始查询字符串
+            **kwargs: 运行时参数，可以覆盖配置中的参数
+        
+        Yields:
+            各阶段的检索结果
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def run() -> List[Document]:
+            with embedding_request_scope(), retrieval_trace(query, self.metrics):
+                return await self._ainvoke(query, on_progress=queue.put_nowait, **kwargs)
+        
+        task = asyncio.ensure_future(run())
+        # 任务结束（包括异常和取消）时放入结束标记
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                progress = await queue.get()
+                if progress is None:
+                    break
+                yield progress
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    async def _ainvoke(
+        self,
+        query: str,
+        on_progress: Optional[Callable[[RetrievalProgress], Any]] = None,
+        **kwargs
+    ) -> List[Document]:
+        """依次执行检索管道的各个阶段（异步版本）
+        
+        Args:
+            query: 原始查询字符串
+            on_progress: 每个阶段完成时的回调
+            **kwargs: 运行时参数
+        
+        Returns:
+            最终的检索结果文档列表
+        """
+        started = time.perf_counter()
+        
+        def report(stage: str, documents: List[Document]) -> List[Document]:
+            if on_progress is not None:
+                on_progress(RetrievalProgress(stage, list(documents), (time.perf_counter() - started) * 1000))
+            return documents
+        
+        try:
+            runtime_config = {**self.config, **kwargs}
+            
+            # 1. 查询预处理和标准化
+            normalized_query = self._preprocess_query(query, runtime_config)
             
-            # 5. 重排序（可选）
-            final_documents = self._rerank_documents(
-                normalized_query, processed_documents, runtime_config
+            # 按查询复杂度选择检索策略
+            decision, runtime_config = self._route_query(normalized_query, runtime_config, kwargs)
+            
+            # 检查缓存（读取集合版本需要访问磁盘）
+            cache_key = await self._run_blocking(self._lookup_cache_key, normalized_query, runtime_config)
+            if cache_key is not None:
+                cached = self._get_cached_result(cache_key, query)
+                if cached is not None:
+                    return report("final", cached)
+            
+            # 检查语义缓存
+            query_embedding = None
+            if cache_key is not None and runtime_config.get('use_semantic_cache', False):
+                query_embedding, cached = await self._alookup_semantic_cache(normalized_query, runtime_config)
+                if cached is not None:
+                    self._cache.put(cache_key, cached)
+                    return report("final", cached)
+            
+            # 2. 查询转换（可选）
+            known_embeddings = {normalized_query: query_embedding} if query_embedding is not None else None
+            queries, known_embeddings = await self._atransform_query(
+                normalized_query, runtime_config, known_embeddings
             )
             
-            # 6. 最终过滤和限制数量
-            result = self._finalize_results(final_documents, runtime_config)
+            # 在事件循环中嵌入全部查询变体，线程池中的检索不再发起嵌入请求
+            try:
+                vectors = await self.base_retriever.aembed_queries(queries, known_embeddings)
+                known_embeddings = {**(known_embeddings or {}), **dict(zip(queries, vectors))}
+            except Exception as e:
+                logger.warning(f"异步嵌入查询失败，在检索阶段嵌入: {e}")
             
-            # 缓存结果
-            if self._enable_cache:
-                self._cache[query] = result
+            # 3. 基础检索
+            all_documents = await self._run_blocking(
+                self._retrieve_documents, queries, runtime_config, known_embeddings
+            )
+            report("candidates", all_documents)
             
-            return result
+            # 4-6. 后处理、重排序、最终过滤
+            result = await self._run_blocking(
+                self._process_documents, all_documents, normalized_query, runtime_config
+            )
             
+            self._store_result(cache_key, normalized_query, query_embedding, runtime_config, result)
+            self._record_route_latency(decision, started)
+            return report("final", result)
+        
         except Exception as e:
-            print(f"检索管道执行失败: {e}")
-            # 回退到基础检索
-            return self._fallback_retrieve(query, kwargs.get('k', self.config.get('k', 5)))
+            logger.warning(f"检索管道执行失败: {e}")
+            documents = await self._run_blocking(
+                self._fallback_retrieve, query, kwargs.get('k', self.config.get('k', 5))
+            )
+            return report("final", documents)
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取异步检索和并行词法检索共用的线程池"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.config.get('retrieval_executor_workers', DEFAULT_RETRIEVAL_EXECUTOR_WORKERS),
+                    thread_name_prefix="retrieval"
+                )
+            return self._executor
+    
+    async def _run_blocking(self, func: Callable[..., T], *args: Any) -> T:
+        """在线程池中执行阻塞函数
+        
+        函数在当前上下文的副本中运行，请求级嵌入缓存等上下文变量在线程中同样可见
+        
+        Args:
+            func: 阻塞函数
+            *args: 位置参数
+        
+        Returns:
+            函数的返回值
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._get_executor(), context.run, func, *args)
+    
+    def _process_documents(
+        self,
+        documents: List[Document],
+        query: str,
+        config: Dict[str, Any]
+    ) -> List[Document]:
+        """对检索结果执行后处理、重排序和最终过滤
+        
+        Args:
+            documents: 检索到的文档
+            query: 标准化后的查询
+            config: 运行时配置
+        
+        Returns:
+            最终的文档列表
+        """
+        # 4. 后处理：去重、过滤
+        processed_documents = self._postprocess_documents(documents, query, config)
+        
+        # 5. 重排序（可选）
+        final_documents = self._rerank_documents(query, processed_documents, config)
+        
+        # 6. 最终过滤和限制数量
+        return self._finalize_results(final_documents, config)
+    
+    def _store_result(
+        self,
+        cache_key: Optional[str],
+        normalized_query: str,
+        query_embedding: Optional[List[float]],
+        config: Dict[str, Any],
+        result: List[Document]
+    ):
+        """把检索结果写入结果缓存和语义缓存"""
+        if cache_key is None:
+            return
+        self._cache.put(cache_key, result)
+        if query_embedding is not None:
+            self._semantic_cache.put(normalized_query, query_embedding, fingerprint_config(config), result)
+    
+    def _get_cached_result(self, cache_key: str, query: str) -> Optional[List[Document]]:
+        """读取结果缓存，未命中时返回 None"""
+        with stage_span("cache") as span:
+            cached = self._cache.get(cache_key)
+            span.cache_hit = cached is not None
+            if cached is not None:
+                span.candidates = len(cached)
+        if cached is not None:
+            logger.info(f"从缓存中获取查询结果: {query[:50]}...")
+        return cached
+    
+    def _lookup_cache_key(self, normalized_query: str, config: Dict[str, Any]) -> Optional[str]:
+        """计算缓存键
+        
+        先同步集合版本（版本变化会使缓存整体失效），再生成缓存键
+        
+        Args:
+            normalized_query: 标准化后的查询
+            config: 运行时配置
+        
+        Returns:
+            缓存键，缓存未启用或无法获取集合版本时返回 None
+        """
+        if not config.get('enable_cache', self._enable_cache):
+            return None
+        
+        try:
+            collection_version = self.base_retriever.get_collection_version()
+            self._cache.sync_version(collection_version)
+            self._semantic_cache.sync_version(collection_version)
+        except Exception as e:
+            logger.warning(f"获取集合版本失败，跳过缓存: {e}")
+            return None
+        
+        return self._cache.make_key(normalized_query, config)
+    
+    def _lookup_semantic_cache(
+        self,
+        normalized_query: str,
+        config: Dict[str, Any]
+    ) -> Tuple[Optional[List[float]], Optional[List[Document]]]:
+        """查找语义相近的已缓存查询
+        
+        查询向量在未命中时会传给检索阶段复用，不会重复嵌入
+        
+        Args:
+            normalized_query: 标准化后的查询
+            config: 运行时配置
+            
+        Returns:
+            (查询向量, 命中的文档列表)，未命中时文档列表为 None
+        """
+        try:
+            query_embedding = self.base_retriever.embed_queries([normalized_query])[0]
+        except Exception as e:
+            logger.warning(f"生成查询向量失败，跳过语义缓存: {e}")
+            return None, None
+        
+        return query_embedding, self._semantic_cache_hit(normalized_query, query_embedding, config)
+    
+    async def _alookup_semantic_cache(
+        self,
+        normalized_query: str,
+        config: Dict[str, Any]
+    ) -> Tuple[Optional[List[float]], Optional[List[Document]]]:
+        """_lookup_semantic_cache 的异步版本，查询向量通过异步接口生成"""
+        try:
+            query_embedding = (await self.base_retriever.aembed_queries([normalized_query]))[0]
+        except Exception as e:
+            logger.warning(f"生成查询向量失败，跳过语义缓存: {e}")
+            return None, None
+        
+        return query_embedding, self._semantic_cache_hit(normalized_query, query_embedding, config)
+    
+    def _semantic_cache_hit(
+        self,
+        normalized_query: str,
+        query_embedding: List[float],
+        config: Dict[str, Any]
+    ) -> Optional[List[Document]]:
+        """按查询向量查找语义缓存，未命中时返回 None"""
+        with stage_span("semantic_cache") as span:
+            hit = self._semantic_cache.lookup(query_embedding, fingerprint_config(config))
+            span.cache_hit = hit is not None
+            if hit is not None:
+                span.candidates = len(hit[2])
+        if hit is None:
+            return None
+        
+        cached_query, distance, documents = hit
+        logger.info(f"语义缓存命中: '{normalized_query[:30]}' ≈ '{cached_query[:30]}' (距离 {distance:.3f})")
+        return documents
+    
+    def _route_query(
+        self,
+        query: str,
+        config: Dict[str, Any],
+        overrides: Dict[str, Any]
+    ) -> Tuple[Optional[RouteDecision], Dict[str, Any]]:
+        """按查询复杂度选择检索策略
+        
+        路由只覆盖全局配置，调用方显式传入的运行时参数仍然优先
+        
+        Args:
+            query: 标准化后的查询
+            config: 合并后的配置
+            overrides: 调用方传入的运行时参数
+        
+        Returns:
+            (路由结果, 应用路由后的配置)，未启用路由或路由失败时路由结果为 None
+        """
+        if not config.get('use_query_router', DEFAULT_USE_QUERY_ROUTER):
+            return None, config
+        try:
+            with stage_span("route"):
+                decision = self.query_router.route(query, self._get_lexical_index())
+        except Exception as e:
+            logger.warning(f"查询路由失败，使用全局检索配置: {e}")
+            return None, config
+        
+        features = decision.features
+        logger.debug(
+            f"查询路由 '{query[:30]}...' -> {decision.route}（{decision.reason}；"
+            f"长度 {features.length}，实体 {features.entities}，比较标记 {features.comparison_markers}，"
+            f"词法覆盖率 {features.lexical_coverage}；判断耗时 {decision.elapsed_ms:.2f} ms）"
+        )
+        return decision, {**config, **decision.overrides, **overrides}
+    
+    def _record_route_latency(self, decision: Optional[RouteDecision], started: float):
+        """记录路由后完整检索的耗时，便于比较各路由的开销"""
+        if decision is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.query_router.record_latency(decision.route, elapsed_ms)
+        logger.debug(f"查询路由 {decision.route} 检索耗时 {elapsed_ms:.1f} ms")
     
     def _preprocess_query(self, query: str, config: Dict[str, Any]) -> str:
         """查询预处理
@@ -101,44 +566,162 @@ class RetrievalPipeline:
         Args:
             query: 原始查询
             config: 配置参数
-            
+        
         Returns:
             预处理后的查询
         """
         # 标准化查询
         if config.get('normalize_query', True):
-            return self.query_transformer.normalize_query(query)
+            with stage_span("normalize"):
+                return self.query_transformer.normalize_query(query)
         return query
     
-    def _transform_query(self, query: str, config: Dict[str, Any]) -> List[str]:
+    def _transform_query(
+        self,
+        query: str,
+        config: Dict[str, Any],
+        known_embeddings: Optional[Dict[str, List[float]]] = None
+    ) -> Tuple[List[str], Optional[Dict[str, List[float]]]]:
         """查询转换
         
+        扩展查询在检索预算内规划：按新颖度排序、合并近似重复的变体，
+        规划时计算的查询向量交给检索阶段复用
+        
         Args:
             query: 标准化后的查询
             config: 配置参数
-            
+            known_embeddings: 已经计算过的查询向量
+        
         Returns:
-            转换后的查询列表
+            (转换后的查询列表, 已知的查询向量)
         """
-        if config.get('use_query_expansion', False):
-            expanded_queries = self.query_transformer.expand_query(query)
-            print(f"查询扩展: {len(expanded_queries)} 个查询")
-            return expanded_queries
-        else:
-            return [query]
+        if not config.get('use_query_expansion', False):
+            return [query], known_embeddings
+        
+        with stage_span("expand") as span:
+            plan = self.query_transformer.plan_expansion(
+                query,
+                embed_fn=lambda texts: self.base_retriever.embed_queries(texts, known_embeddings),
+                max_searches=self._expansion_search_budget(config),
+                duplicate_similarity=config.get(
+                    'expansion_duplicate_similarity', DEFAULT_EXPANSION_DUPLICATE_SIMILARITY
+                )
+            )
+            span.candidates = len(plan.queries)
+        return self._apply_expansion_plan(plan, known_embeddings)
+    
+    async def _atransform_query(
+        self,
+        query: str,
+        config: Dict[str, Any],
+        known_embeddings: Optional[Dict[str, List[float]]] = None
+    ) -> Tuple[List[str], Optional[Dict[str, List[float]]]]:
+        """_transform_query 的异步版本，候选查询通过异步接口嵌入"""
+        if not config.get('use_query_expansion', False):
+            return [query], known_embeddings
+        
+        with stage_span("expand") as span:
+            plan = await self.query_transformer.aplan_expansion(
+                query,
+                aembed_fn=lambda texts: self.base_retriever.aembed_queries(texts, known_embeddings),
+                max_searches=self._expansion_search_budget(config),
+                duplicate_similarity=config.get(
+                    'expansion_duplicate_similarity', DEFAULT_EXPANSION_DUPLICATE_SIMILARITY
+                )
+            )
+            span.candidates = len(plan.queries)
+        return self._apply_expansion_plan(plan, known_embeddings)
+    
+    def _apply_expansion_plan(
+        self,
+        plan: ExpansionPlan,
+        known_embeddings: Optional[Dict[str, List[float]]]
+    ) -> Tuple[List[str], Dict[str, List[float]]]:
+        """记录扩展计划，返回检索的查询列表和合并后的已知查询向量"""
+        logger.debug(
+            f"查询扩展: {plan.candidates} 个候选，检索 {len(plan.queries)} 个，"
+            f"合并 {plan.collapsed} 个近似重复，节省 {plan.searches_saved} 次检索"
+        )
+        return plan.queries, {**(known_embeddings or {}), **plan.embeddings}
+    
+    def _expansion_search_budget(self, config: Dict[str, Any]) -> int:
+        """计算查询扩展的检索次数预算
+        
+        取最大检索次数和耗时预算可容纳的检索次数中较小的一个，至少保留原始查询
+        
+        Args:
+            config: 配置参数
+        
+        Returns:
+            最多检索次数
+        """
+        max_searches = config.get('expansion_max_searches', DEFAULT_EXPANSION_MAX_SEARCHES)
+        time_budget_ms = config.get('expansion_time_budget_ms', DEFAULT_EXPANSION_TIME_BUDGET_MS)
+        if time_budget_ms and self._search_latency_ms:
+            max_searches = min(max_searches, int(time_budget_ms // self._search_latency_ms))
+        return max(1, max_searches)
     
-    def _retrieve_documents(self, queries: List[str], config: Dict[str, Any]) -> List[Document]:
+    def _retrieve_documents(
+        self,
+        queries: List[str],
+        config: Dict[str, Any],
+        known_embeddings: Optional[Dict[str, List[float]]] = None
+    ) -> List[Document]:
         """基础文档检索
         
+        所有查询变体先批量嵌入，再通过一次多向量查询完成检索，
+        最后合并结果并记录每个文档命中的查询变体。
+        启用词法检索时，原始查询的 BM25 检索与向量检索并行执行，
+        两路结果按倒数排名融合后排序。词法检索在管道的线程池中、当前上下文的副本中执行，
+        耗时计入同一次检索
+        
         Args:
-            queries: 查询列表
+            queries: 查询列表，第一个为原始查询
             config: 配置参数
-            
+            known_embeddings: 已经计算过的查询向量，不再重复嵌入
+        
         Returns:
             检索到的文档列表
         """
-        all_documents = []
+        use_lexical = bool(queries) and config.get('use_lexical_search', DEFAULT_USE_LEXICAL_SEARCH)
         
+        lexical_future = self._get_executor().submit(
+            contextvars.copy_context().run, self._lexical_search, queries[0], config
+        ) if use_lexical else None
+        started = time.perf_counter()
+        batch_documents = self._vector_search(queries, config, known_embeddings)
+        self._record_search_latency((time.perf_counter() - started) * 1000, len(queries))
+        if lexical_future is None:
+            lexical_hits = []
+        elif lexical_future.cancel():
+            # 线程池被其他请求占满时词法检索尚未开始，直接在当前线程执行，避免互相等待
+            lexical_hits = self._lexical_search(queries[0], config)
+        else:
+            lexical_hits = lexical_future.result()
+        
+        documents = self._merge_variant_results(queries, batch_documents)
+        if lexical_hits:
+            with stage_span("fuse") as span:
+                documents = self._fuse_lexical_results(documents, batch_documents, lexical_hits, config)
+                span.candidates = len(documents)
+        return documents
+    
+    def _vector_search(
+        self,
+        queries: List[str],
+        config: Dict[str, Any],
+        known_embeddings: Optional[Dict[str, List[float]]] = None
+    ) -> List[List[Document]]:
+        """向量检索所有查询变体
+        
+        Args:
+            queries: 查询列表
+            config: 配置参数
+            known_embeddings: 已经计算过的查询向量
+        
+        Returns:
+            与查询一一对应的文档列表
+        """
         # 检索参数
         k = config.get('k', 5)
         search_type = "similarity"
@@ -154,12 +737,190 @@ class RetrievalPipeline:
         
         # 配置阈值过滤
         elif config.get('score_threshold') is not None:
+            if config.get('use_adaptive_k', DEFAULT_USE_ADAPTIVE_K):
+                try:
+                    return self._adaptive_search(queries, config, known_embeddings)
+                except Exception as e:
+                    logger.warning(f"自适应检索失败，使用固定数量检索: {e}")
             search_type = "similarity_score_threshold"
             search_kwargs.update({
                 "score_threshold": config.get('score_threshold')
             })
         
-        # 对每个查询执行检索
+        try:
+            batch_documents = self.base_retriever.retrieve_batch(
+                queries=queries,
+                k=k,
+                search_type=search_type,
+                search_kwargs=search_kwargs,
+                max_workers=config.get('fanout_max_workers', DEFAULT_FANOUT_MAX_WORKERS),
+                known_embeddings=known_embeddings
+            )
+        except Exception as e:
+            logger.warning(f"批量检索失败，逐条检索: {e}")
+            batch_documents = self._retrieve_sequentially(queries, k, search_type, search_kwargs)
+        
+        for query, documents in zip(queries, batch_documents):
+            logger.debug(f"查询 '{query[:30]}...' 检索到 {len(documents)} 个文档")
+        
+        return batch_documents
+    
+    def _adaptive_search(
+        self,
+        queries: List[str],
+        config: Dict[str, Any],
+        known_embeddings: Optional[Dict[str, List[float]]] = None
+    ) -> List[List[Document]]:
+        """按轮次自适应扩大获取数量的阈值检索，并记录每个查询变体所需的轮数
+        
+        Args:
+            queries: 查询列表
+            config: 配置参数
+            known_embeddings: 已经计算过的查询向量
+        
+        Returns:
+            与查询一一对应的文档列表
+        """
+        results = self.base_retriever.retrieve_adaptive(
+            queries=queries,
+            k=config.get('k', 5),
+            score_threshold=config.get('score_threshold'),
+            min_candidates=config.get('adaptive_min_candidates', DEFAULT_ADAPTIVE_MIN_CANDIDATES),
+            initial_k=config.get('adaptive_initial_k', DEFAULT_ADAPTIVE_INITIAL_K),
+            max_k=config.get('adaptive_max_k', DEFAULT_ADAPTIVE_MAX_K),
+            growth=config.get('adaptive_growth', DEFAULT_ADAPTIVE_GROWTH),
+            known_embeddings=known_embeddings
+        )
+        
+        with self._fetch_stats_lock:
+            self._fetch_rounds.update(result.rounds for result in results)
+            self._below_threshold_queries += sum(result.below_threshold for result in results)
+        
+        for query, result in zip(queries, results):
+            note = "，均未达到阈值" if result.below_threshold else ""
+            logger.debug(
+                f"查询 '{query[:30]}...' 检索到 {len(result.documents)} 个文档"
+                f"（{result.rounds} 轮，k={result.fetch_k}{note}）"
+            )
+        return [result.documents for result in results]
+    
+    def _record_search_latency(self, elapsed_ms: float, searches: int):
+        """按滑动平均更新单个查询变体的检索耗时"""
+        if searches <= 0:
+            return
+        per_search_ms = elapsed_ms / searches
+        if self._search_latency_ms is None:
+            self._search_latency_ms = per_search_ms
+        else:
+            self._search_latency_ms += _SEARCH_LATENCY_SMOOTHING * (per_search_ms - self._search_latency_ms)
+    
+    def _get_lexical_index(self) -> Optional[LexicalIndex]:
+        """获取词法索引
+        
+        索引目录被构建脚本整体替换后，按目录的 inode 和修改时间识别并重新加载
+        
+        Returns:
+            词法索引，索引不存在时返回 None
+        """
+        index_dir = get_lexical_index_dir(
+            self.base_retriever.vector_store_dir, self.base_retriever.collection_name
+        )
+        try:
+            stat = index_dir.stat()
+        except OSError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        
+        with self._lexical_lock:
+            if self._lexical_index_stamp != stamp:
+                self._lexical_index = LexicalIndex.load(index_dir)
+                self._lexical_index_stamp = stamp
+            return self._lexical_index
+    
+    def _lexical_search(self, query: str, config: Dict[str, Any]) -> List[Tuple[str, float]]:
+        """BM25 词法检索
+        
+        Args:
+            query: 查询字符串
+            config: 配置参数
+        
+        Returns:
+            (块 ID, 分数) 列表，索引不存在或检索失败时返回空列表
+        """
+        try:
+            index = self._get_lexical_index()
+            if index is None:
+                return []
+            with stage_span("lexical") as span:
+                hits = index.search(query, config.get('lexical_k', DEFAULT_LEXICAL_K))
+                span.candidates = len(hits)
+            logger.debug(f"词法检索 '{query[:30]}...' 命中 {len(hits)} 个文档")
+            return hits
+        except Exception as e:
+            logger.warning(f"词法检索失败: {e}")
+            return []
+    
+    def _fuse_lexical_results(
+        self,
+        documents: List[Document],
+        batch_documents: List[List[Document]],
+        lexical_hits: List[Tuple[str, float]],
+        config: Dict[str, Any]
+    ) -> List[Document]:
+        """按倒数排名融合向量检索和词法检索的结果
+        
+        每个查询变体的向量结果和词法结果各作为一个排名列表参与融合，
+        只被词法检索命中的文档从集合中按 ID 读取。融合信息记录在元数据中：
+        - lexical_rank: 文档在词法结果中的排名
+        - rrf_score: 融合分数
+        
+        Args:
+            documents: 合并后的向量检索文档
+            batch_documents: 与查询变体一一对应的向量检索文档
+            lexical_hits: 词法检索结果
+            config: 配置参数
+        
+        Returns:
+            按融合分数降序排列的文档列表
+        """
+        lexical_ids = [doc_id for doc_id, _ in lexical_hits]
+        rankings = [[self._document_key(doc) for doc in variant_documents] for variant_documents in batch_documents]
+        rankings.append(lexical_ids)
+        fused_scores = reciprocal_rank_fusion(rankings, config.get('rrf_k', DEFAULT_RRF_K))
+        
+        merged = {self._document_key(doc): doc for doc in documents}
+        missing = [doc_id for doc_id in lexical_ids if doc_id not in merged]
+        if missing:
+            try:
+                for doc in self.base_retriever.get_documents(missing):
+                    doc.metadata['matched_queries'] = []
+                    doc.metadata['variant_ranks'] = {}
+                    merged[doc.id] = doc
+            except Exception as e:
+                logger.warning(f"读取词法检索文档失败: {e}")
+        
+        for rank, doc_id in enumerate(lexical_ids):
+            if doc_id in merged:
+                merged[doc_id].metadata['lexical_rank'] = rank
+        for key, doc in merged.items():
+            doc.metadata['rrf_score'] = fused_scores[key]
+        
+        return sorted(merged.values(), key=lambda doc: doc.metadata['rrf_score'], reverse=True)
+    
+    @staticmethod
+    def _document_key(doc: Document) -> Any:
+        """文档的合并标识，优先使用集合中的块 ID"""
+        return doc.id or doc.page_content.strip()
+    
+    def _retrieve_sequentially(
+        self,
+        queries: List[str],
+        k: int,
+        search_type: str,
+        search_kwargs: Dict[str, Any]
+    ) -> List[List[Document]]:
+        """逐条检索每个查询变体（批量检索失败时的回退路径）"""
+        batch_documents = []
         for query in queries:
             try:
                 documents = self.base_retriever.retrieve(
@@ -168,19 +929,50 @@ class RetrievalPipeline:
                     search_type=search_type,
                     search_kwargs=search_kwargs
                 )
-                all_documents.extend(documents)
-                print(f"查询 '{query[:30]}...' 检索到 {len(documents)} 个文档")
-                
             except Exception as e:
-                print(f"查询 '{query[:30]}...' 检索失败: {e}")
+                logger.warning(f"查询 '{query[:30]}...' 检索失败: {e}")
                 # 回退到基础检索
                 try:
                     documents = self.base_retriever.retrieve(query, k, "similarity")
-                    all_documents.extend(documents)
                 except Exception as fallback_e:
-                    print(f"回退检索也失败: {fallback_e}")
+                    logger.warning(f"回退检索也失败: {fallback_e}")
+                    documents = []
+            batch_documents.append(documents)
+        return batch_documents
+    
+    def _merge_variant_results(
+        self,
+        queries: List[str],
+        batch_documents: List[List[Document]]
+    ) -> List[Document]:
+        """合并各查询变体的检索结果
+        
+        按首次出现的顺序合并，同一文档只保留一份，并在元数据中记录来源：
+        - matched_queries: 命中该文档的查询变体
+        - variant_ranks: 文档在每个变体结果中的排名
         
-        return all_documents
+        Args:
+            queries: 查询列表
+            batch_documents: 与查询一一对应的文档列表
+        
+        Returns:
+            合并后的文档列表
+        """
+        merged: Dict[Any, Document] = {}
+        
+        for query, documents in zip(queries, batch_documents):
+            for rank, doc in enumerate(documents):
+                key = self._document_key(doc)
+                if key not in merged:
+                    doc.metadata['matched_queries'] = []
+                    doc.metadata['variant_ranks'] = {}
+                    merged[key] = doc
+                provenance = merged[key].metadata
+                if query not in provenance['variant_ranks']:
+                    provenance['matched_queries'].append(query)
+                    provenance['variant_ranks'][query] = rank
+        
+        return list(merged.values())
     
     def _postprocess_documents(
         self, 
@@ -194,7 +986,7 @@ class RetrievalPipeline:
             documents: 原始检索文档
             query: 查询字符串
             config: 配置参数
-            
+        
         Returns:
             后处理后的文档列表
         """
@@ -202,23 +994,27 @@ class RetrievalPipeline:
             return []
         
         # 去重
-        unique_documents = self._deduplicate_documents(documents)
-        print(f"去重后文档数量: {len(unique_documents)}")
+        with stage_span("dedupe") as span:
+            unique_documents = self._deduplicate_documents(documents, config)
+            span.candidates = len(unique_documents)
         
         # 内容过滤
-        filtered_documents = self._filter_documents(unique_documents, query, config)
-        print(f"过滤后文档数量: {len(filtered_documents)}")
+        with stage_span("filter") as span:
+            filtered_documents = self._filter_documents(unique_documents, query, config)
+            span.candidates = len(filtered_documents)
         
         return filtered_documents
     
-    def _deduplicate_documents(self, documents: List[Document]) -> List[Document]:
+    def _deduplicate_documents(self, documents: List[Document], config: Dict[str, Any]) -> List[Document]:
         """文档去重
         
-        基于文档内容进行去重
+        先去除内容完全相同的文档，再去除近似副本（保留分数较高的文档），
+        merge 策略下还把同一来源中相互重叠的相邻块拼接为一个
         
         Args:
             documents: 文档列表
-            
+            config: 配置参数
+        
         Returns:
             去重后的文档列表
         """
@@ -233,6 +1029,15 @@ class RetrievalPipeline:
                 seen_content.add(content_hash)
                 unique_documents.append(doc)
         
+        unique_documents, suppressed = suppress_near_duplicates(
+            unique_documents,
+            config.get('near_duplicate_similarity', DEFAULT_NEAR_DUPLICATE_SIMILARITY),
+            config.get('near_duplicate_strategy', DEFAULT_NEAR_DUPLICATE_STRATEGY),
+            config.get('near_duplicate_min_overlap', DEFAULT_NEAR_DUPLICATE_MIN_OVERLAP)
+        )
+        if suppressed:
+            logger.debug(f"去除 {suppressed} 个近似重复文档")
+        
         return unique_documents
     
     def _filter_documents(
@@ -249,7 +1054,7 @@ class RetrievalPipeline:
             documents: 文档列表
             query: 查询字符串
             config: 配置参数
-            
+        
         Returns:
             过滤后的文档列表
         """
@@ -264,7 +1069,7 @@ class RetrievalPipeline:
             ]
         
         # 最大文档数量限制（预过滤，为重排序准备）
-        max_docs_before_rerank = config.get('max_docs_before_rerank', 20)
+        max_docs_before_rerank = config.get('max_docs_before_rerank', DEFAULT_MAX_DOCS_BEFORE_RERANK)
         if len(filtered) > max_docs_before_rerank:
             # 简单截取前N个文档
             filtered = filtered[:max_docs_before_rerank]
@@ -283,7 +1088,7 @@ class RetrievalPipeline:
             query: 查询字符串
             documents: 文档列表
             config: 配置参数
-            
+        
         Returns:
             重排序后的文档列表
         """
@@ -292,40 +1097,79 @@ class RetrievalPipeline:
         
         try:
             # 重排序策略
-            rerank_strategy = config.get('rerank_strategy', 'relevance')
+            rerank_strategy = config.get('rerank_strategy', DEFAULT_RERANK_STRATEGY)
             rerank_top_k = config.get('rerank_top_k', len(documents))
             
-            reranked_documents = self.reranker.rerank(
-                query=query,
-                documents=documents,
-                strategy=rerank_strategy,
-                top_k=rerank_top_k
-            )
-            
-            print(f"重排序完成: {len(reranked_documents)} 个文档")
+            with stage_span("rerank") as span:
+                strategy_kwargs = {}
+                if rerank_strategy == 'embedding_mmr':
+                    strategy_kwargs = self._embedding_rerank_inputs(query, documents, config)
+                
+                reranked_documents = self.reranker.rerank(
+                    query=query,
+                    documents=documents,
+                    strategy=rerank_strategy,
+                    top_k=rerank_top_k,
+                    **strategy_kwargs
+                )
+                span.candidates = len(reranked_documents)
             return reranked_documents
-            
+        
         except Exception as e:
-            print(f"重排序失败: {e}")
+            logger.warning(f"重排序失败: {e}")
             return documents
     
+    def _embedding_rerank_inputs(
+        self,
+        query: str,
+        documents: List[Document],
+        config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """准备嵌入空间 MMR 所需的向量
+        
+        文档向量直接从集合读取，查询向量在检索阶段已经计算过，会命中请求级嵌入缓存
+        
+        Args:
+            query: 查询字符串
+            documents: 候选文档列表
+            config: 配置参数
+        
+        Returns:
+            传给重排序器的参数，无法获取向量时返回空字典（重排序器会回退到词汇多样性排序）
+        """
+        if any(doc.id is None for doc in documents):
+            return {}
+        
+        try:
+            return {
+                'query_embedding': self.base_retriever.embed_queries([query])[0],
+                'document_embeddings': self.base_retriever.get_document_embeddings(
+                    [doc.id for doc in documents]
+                ),
+                'lambda_mult': config.get('mmr_lambda', DEFAULT_MMR_LAMBDA),
+            }
+        except Exception as e:
+            logger.warning(f"获取文档向量失败: {e}")
+            return {}
+    
     def _finalize_results(self, documents: List[Document], config: Dict[str, Any]) -> List[Document]:
         """最终结果处理
         
         Args:
             documents: 文档列表
             config: 配置参数
-            
+        
         Returns:
             最终的文档列表
         """
         # 最终数量限制
-        final_k = config.get('final_k') or config.get('k', 5)
-        
-        if len(documents) > final_k:
-            documents = documents[:final_k]
+        with stage_span("finalize") as span:
+            final_k = config.get('final_k') or config.get('k', 5)
+            
+            if len(documents) > final_k:
+                documents = documents[:final_k]
+            span.candidates = len(documents)
         
-        print(f"最终返回 {len(documents)} 个文档")
         return documents
     
     def _fallback_retrieve(self, query: str, k: int = 5) -> List[Document]:
@@ -336,21 +1180,45 @@ class RetrievalPipeline:
         Args:
             query: 查询字符串
             k: 返回文档数量
-            
+        
         Returns:
             检索到的文档列表
         """
         try:
-            print(f"使用回退检索策略")
-            return self.base_retriever.retrieve(query, k, "similarity")
+            logger.info("使用回退检索策略")
+            with stage_span("fallback") as span:
+                documents = self.base_retriever.retrieve(query, k, "similarity")
+                span.candidates = len(documents)
+            return documents
         except Exception as e:
-            print(f"回退检索也失败: {e}")
+            logger.warning(f"回退检索也失败: {e}")
             return []
     
     def clear_cache(self):
         """清空缓存"""
         self._cache.clear()
-        print("检索缓存已清空")
+        self._semantic_cache.clear()
+        logger.info("检索缓存已清空")
+    
+    def close(self):
+        """关闭异步检索和分片查询使用的线程池，正在执行的任务会继续完成"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        self.base_retriever.close()
+    
+    def _get_fetch_stats(self) -> Dict[str, Any]:
+        """自适应检索的轮数统计"""
+        with self._fetch_stats_lock:
+            queries = sum(self._fetch_rounds.values())
+            rounds = sum(rounds * count for rounds, count in self._fetch_rounds.items())
+            return {
+                "queries": queries,
+                "rounds_histogram": dict(sorted(self._fetch_rounds.items())),
+                "avg_rounds": rounds / queries if queries else 0.0,
+                "below_threshold_queries": self._below_threshold_queries,
+            }
     
     def get_stats(self) -> Dict[str, Any]:
         """获取管道统计信息
@@ -358,9 +1226,21 @@ class RetrievalPipeline:
         Returns:
             统计信息字典
         """
+        embeddings = self.base_retriever.embeddings
+        lexical_index = self._get_lexical_index()
         return {
             "cache_size": len(self._cache),
             "cache_enabled": self._enable_cache,
+            "cache": self._cache.get_stats(),
+            "semantic_cache": self._semantic_cache.get_stats(),
+            "embedding_cache": embeddings.get_stats() if hasattr(embeddings, 'get_stats') else {},
+            "lexical_index": lexical_index.get_stats() if lexical_index is not None else {},
+            "query_expansion": self.query_transformer.get_stats(),
+            "query_router": self.query_router.get_stats(),
+            "search_latency_ms": self._search_latency_ms,
+            "adaptive_fetch": self._get_fetch_stats(),
+            "shards": self.base_retriever.get_shard_stats(),
+            "metrics": self.metrics.snapshot(),
             "base_retriever_initialized": self.base_retriever.is_initialized(),
             "config": self.config
         }
\ No newline at end of file
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+查询复杂度路由
+
+该模块在检索管道前用本地规则（不调用大模型）判断查询复杂度，为每个查询选择检索策略：
+- simple: 短的事实性查询，知识库词法覆盖充分，只执行一次相似度检索
+- complex: 比较类或多实体查询，使用 MMR 检索并启用查询扩展
+- standard: 其他查询，沿用全局检索配置
+
+判断依据包括查询长度、实体数、比较标记（"区别"、"vs"、"A 和 B"）和词法索引命中情况
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any
+
+from .lexical_index import LexicalIndex
+from ..core.config import (
+    DEFAULT_ROUTER_SIMPLE_MAX_CHARS,
+    DEFAULT_ROUTER_COMPLEX_MIN_ENTITIES,
+    DEFAULT_ROUTER_MIN_LEXICAL_COVERAGE
+)
+from ..core.keyword_matcher import get_keyword_matcher
+
+ROUTE_SIMPLE = "simple"
+ROUTE_STANDARD = "standard"
+ROUTE_COMPLEX = "complex"
+
+# 各路由覆盖的检索配置，运行时参数仍然优先
+ROUTE_OVERRIDES: Dict[str, Dict[str, Any]] = {
+    ROUTE_SIMPLE: {
+        'use_query_expansion': False,
+        'use_mmr': False,
+        'use_reranking': False,
+        'use_lexical_search': False,
+    },
+    ROUTE_STANDARD: {},
+    ROUTE_COMPLEX: {
+        'use_query_expansion': True,
+        'use_mmr': True,
+    },
+}
+
+# 查询中的英文术语、产品名和缩写，如 HNSW、ChromaDB、GPT-4（全小写的普通单词不算）
+_LATIN_ENTITY = re.compile(r'[A-Za-z][A-Za-z0-9_.\-]*[A-Za-z0-9]')
+
+# 延迟的滑动平均系数
+_LATENCY_SMOOTHING = 0.2
+
+
+@dataclass
+class QueryFeatures:
+    """
+    路由使用的查询特征
+    """
+    length: int  # 查询长度（字符）
+    entities: List[str] = field(default_factory=list)  # 识别出的实体
+    comparison_markers: List[str] = field(default_factory=list)  # 命中的比较标记
+    conjunctions: List[str] = field(default_factory=list)  # 命中的并列连词
+    lexical_coverage: Optional[float] = None  # 词元在词法索引中出现的比例，没有索引时为 None
+    
+    @property
+    def is_comparison(self) -> bool:
+        """是否为比较类查询：有明确的比较标记，或用并列连词连接多个实体"""
+        return bool(self.comparison_markers) or (bool(self.conjunctions) and len(self.entities) >= 2)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "length": self.length,
+            "entities": self.entities,
+            "comparison_markers": self.comparison_markers,
+            "conjunctions": self.conjunctions,
+            "lexical_coverage": self.lexical_coverage,
+        }
+
+
+@dataclass
+class RouteDecision:
+    """
+    单个查询的路由结果
+    """
+    route: str  # 路由名称
+    reason: str  # 选择该路由的原因
+    features: QueryFeatures  # 查询特征
+    overrides: Dict[str, Any] = field(default_factory=dict)  # 覆盖的检索配置
+    elapsed_ms: float = 0.0  # 路由判断耗时（毫秒）
+
+
+class QueryRouter:
+    """查询复杂度路由器
+    
+    职责：
+    - 提取查询长度、实体、比较标记和词法覆盖率
+    - 按规则选择检索策略
+    - 统计各路由的查询数和检索耗时
+    """
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """初始化路由器
+        
+        Args:
+            config: 检索配置字典
+        """
+        self.config = config or {}
+        self.simple_max_chars = self.config.get('router_simple_max_chars', DEFAULT_ROUTER_SIMPLE_MAX_CHARS)
+        self.complex_min_entities = self.config.get('router_complex_min_entities', DEFAULT_ROUTER_COMPLEX_MIN_ENTITIES)
+        self.min_lexical_coverage = self.config.get('router_min_lexical_coverage', DEFAULT_ROUTER_MIN_LEXICAL_COVERAGE)
+        
+        # 路由名称 -> [查询数, 平均检索耗时（毫秒）]
+        self._route_stats: Dict[str, List[float]] = {}
+        self._stats_lock = threading.Lock()
+    
+    def extract_features(self, query: str, lexical_index: Optional[LexicalIndex] = None) -> QueryFeatures:
+        """提取查询特征
+        
+        Args:
+            query: 查询字符串
+            lexical_index: 词法索引，为 None 时不计算词法覆盖率
+        
+        Returns:
+            查询特征
+        """
+        entities = {}
+        for term in get_keyword_matcher('query_expansion', 'tech_terms', word_boundary=True).matched(query):
+            entities.setdefault(term.lower(), term)
+        
+        markers = get_keyword_matcher('query_router', 'comparison_markers', word_boundary=True).matched(query)
+        ignored = {marker.lower() for marker in markers}
+        for match in _LATIN_ENTITY.finditer(query):
+            term = match.group()
+            if term.islower() or term.lower() in ignored:
+                continue
+            entities.setdefault(term.lower(), term)
+        
+        coverage = None
+        if lexical_index is not None:
+            frequencies = lexical_index.document_frequencies(query)
+            if frequencies:
+                coverage = sum(1 for count in frequencies.values() if count > 0) / len(frequencies)
+        
+        return QueryFeatures(
+            length=len(query),
+            entities=list(entities.values()),
+            comparison_markers=markers,
+            conjunctions=get_keyword_matcher('query_router', 'conjunctions').matched(query),
+            lexical_coverage=coverage
+        )
+    
+    def route(self, query: str, lexical_index: Optional[LexicalIndex] = None) -> RouteDecision:
+        """为查询选择检索策略
+        
+        Args:
+            query: 查询字符串（已标准化）
+            lexical_index: 词法索引
+        
+        Returns:
+            路由结果
+        """
+        started = time.perf_counter()
+        features = self.extract_features(query, lexical_index)
+        
+        if features.is_comparison:
+            route, reason = ROUTE_COMPLEX, "比较类查询"
+        elif len(features.entities) >= self.complex_min_entities:
+            route, reason = ROUTE_COMPLEX, f"多实体查询（{len(features.entities)} 个实体）"
+        elif features.length > self.simple_max_chars:
+            route, reason = ROUTE_STANDARD, "查询较长"
+        elif len(features.entities) > 1:
+            route, reason = ROUTE_STANDARD, "包含多个实体"
+        elif features.lexical_coverage is not None and features.lexical_coverage < self.min_lexical_coverage:
+            route, reason = ROUTE_STANDARD, f"词法覆盖率低（{features.lexical_coverage:.0%}）"
+        else:
+            route, reason = ROUTE_SIMPLE, "短的事实性查询"
+        
+        return RouteDecision(
+            route=route,
+            reason=reason,
+            features=features,
+            overrides=dict(ROUTE_OVERRIDES[route]),
+            elapsed_ms=(time.perf_counter() - started) * 1000
+        )
+    
+    def record_latency(self, route: str, elapsed_ms: float):
+        """记录一次完整检索的耗时
+        
+        Args:
+            route: 路由名称
+            elapsed_ms: 检索耗时（毫秒）
+        """
+        with self._stats_lock:
+            stats = self._route_stats.setdefault(route, [0, elapsed_ms])
+            stats[0] += 1
+            stats[1] += _LATENCY_SMOOTHING * (elapsed_ms - stats[1])
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各路由的统计信息
+        
+        Returns:
+            路由名称 -> {查询数, 平均检索耗时}
+        """
+        with self._stats_lock:
+            return {
+                route: {"queries": int(count), "avg_latency_ms": round(latency, 2)}
+                for route, (count, latency) in sorted(self._route_stats.items())
+            }
@@ -5,8 +5,37 @@
 该模块负责对原始查询进行各种转换和优化，包括查询扩展等技术
 """
 
+import logging
 import re
-from typing import List, Optional, Dict, Any
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, Callable, Awaitable, Tuple
+
+import numpy as np
+
+from .tokenizer import tokenize
+from ..core.config import DEFAULT_EXPANSION_MAX_SEARCHES, DEFAULT_EXPANSION_DUPLICATE_SIMILARITY
+from ..core.keyword_matcher import get_keyword_dictionary, get_keyword_matcher
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExpansionPlan:
+    """
+    查询扩展计划
+    
+    记录实际要检索的查询变体，以及预算裁剪掉的检索次数
+    """
+    queries: List[str]  # 要检索的查询，第一个为原始查询
+    embeddings: Dict[str, List[float]] = field(default_factory=dict)  # 已计算的查询向量
+    candidates: int = 1  # 生成的候选查询数（含原始查询）
+    collapsed: int = 0  # 与已选查询近似重复而被合并的变体数
+    
+    @property
+    def searches_saved(self) -> int:
+        """相比检索全部候选节省的检索次数"""
+        return self.candidates - len(self.queries)
 
 
 class QueryTransformer:
@@ -26,6 +55,13 @@ class QueryTransformer:
             config: 转换器配置
         """
         self.config = config or {}
+        
+        # 扩展预算统计
+        self._stats_lock = threading.Lock()
+        self._plans = 0
+        self._candidates = 0
+        self._searches = 0
+        self._collapsed = 0
     
     def expand_query(self, query: str) -> List[str]:
         """查询扩展
@@ -64,7 +100,7 @@ class QueryTransformer:
             return unique_queries
             
         except Exception as e:
-            print(f"查询扩展失败: {e}")
+            logger.warning(f"查询扩展失败: {e}")
             return [query]  # 失败时返回原始查询
     
     def _expand_by_keywords(self, query: str) -> List[str]:
@@ -72,24 +108,20 @@ class QueryTransformer:
         expanded_queries = []
         
         # 技术术语映射
-        tech_mappings = {
-            'AI': ['人工智能', 'Artificial Intelligence', '机器学习', 'ML'],
-            '人工智能': ['AI', 'Artificial Intelligence', '机器学习', 'ML'],
-            'LangChain': ['langchain', 'Lang Chain', '语言链'],
-            'LangGraph': ['langgraph', 'Lang Graph', '语言图'],
-            'RAG': ['检索增强生成', 'Retrieval Augmented Generation', '检索增强'],
-            '向量数据库': ['vector database', 'vectorstore', '向量存储'],
-            'Agent': ['智能体', '代理', 'agent'],
-            '智能体': ['Agent', '代理', 'agent'],
+        tech_mappings = get_keyword_dictionary('query_expansion', 'tech_terms')
+        
+        # 一次扫描找出查询中出现的术语和关联词（按整词匹配，避免 "AI" 命中 "detail"）
+        present = {
+            term.lower() for term in
+            get_keyword_matcher('query_expansion', 'tech_terms', include_values=True, word_boundary=True).matched(query)
         }
         
         # 查找并扩展技术术语
-        for term, expansions in tech_mappings.items():
-            if term.lower() in query.lower():
-                for expansion in expansions:
-                    if expansion.lower() not in query.lower():
-                        expanded_query = query + f" {expansion}"
-                        expanded_queries.append(expanded_query)
+        for term in get_keyword_matcher('query_expansion', 'tech_terms', word_boundary=True).matched(query):
+            for expansion in tech_mappings[term]:
+                if expansion.lower() not in present:
+                    expanded_query = query + f" {expansion}"
+                    expanded_queries.append(expanded_query)
         
         return expanded_queries
     
@@ -98,24 +130,14 @@ class QueryTransformer:
         expanded_queries = []
         
         # 同义词映射
-        synonym_mappings = {
-            '优势': ['好处', '优点', '特点', '特色'],
-            '特点': ['特色', '特征', '优势', '优点'],
-            '使用': ['应用', '运用', '利用', '采用'],
-            '方法': ['方式', '策略', '技术', '手段'],
-            '实现': ['完成', '达成', '构建', '开发'],
-            '配置': ['设置', '配制', '设定', '调整'],
-            '问题': ['困难', '挑战', '难题', '故障'],
-            '解决': ['处理', '解答', '修复', '应对'],
-        }
+        synonym_mappings = get_keyword_dictionary('query_expansion', 'synonyms')
         
         # 查找并扩展同义词
-        for word, synonyms in synonym_mappings.items():
-            if word in query:
-                for synonym in synonyms:
-                    expanded_query = query.replace(word, synonym)
-                    if expanded_query != query:
-                        expanded_queries.append(expanded_query)
+        for word in get_keyword_matcher('query_expansion', 'synonyms').matched(query):
+            for synonym in synonym_mappings[word]:
+                expanded_query = query.replace(word, synonym)
+                if expanded_query != query:
+                    expanded_queries.append(expanded_query)
         
         return expanded_queries
     
@@ -123,25 +145,183 @@ class QueryTransformer:
         """基于上下文的查询扩展"""
         expanded_queries = []
         
-        # 上下文扩展规则
-        context_rules = {
-            # 如果查询包含某些关键词，添加相关上下文
-            'LangGraph': ['工作流', '状态管理', '节点', '边'],
-            'Agent': ['工具', '推理', '决策', '执行'],
-            'RAG': ['检索', '生成', '知识库', '向量'],
-            '配置': ['参数', '设置', '环境变量', '初始化'],
-            '错误': ['调试', '日志', '异常', '故障排除'],
+        # 上下文扩展规则：如果查询包含某些关键词，添加相关上下文
+        context_rules = get_keyword_dictionary('query_expansion', 'context_rules')
+        present = {
+            term.lower() for term in
+            get_keyword_matcher('query_expansion', 'context_rules', include_values=True, word_boundary=True).matched(query)
         }
         
-        for keyword, contexts in context_rules.items():
-            if keyword.lower() in query.lower():
-                for context in contexts:
-                    if context not in query:
-                        expanded_query = f"{query} {context}"
-                        expanded_queries.append(expanded_query)
+        for keyword in get_keyword_matcher('query_expansion', 'context_rules', word_boundary=True).matched(query):
+            for context in context_rules[keyword]:
+                if context.lower() not in present:
+                    expanded_query = f"{query} {context}"
+                    expanded_queries.append(expanded_query)
         
         return expanded_queries
     
+    def rank_expansions(self, query: str, variants: List[str]) -> List[str]:
+        """按预期新颖度对扩展查询排序
+        
+        新颖度为变体中未被原始查询和已选变体覆盖的词元比例，每轮贪心选出新颖度最高的变体，
+        只追加一个已覆盖词的变体会排到后面，不带来新词元的变体被丢弃
+        
+        Args:
+            query: 原始查询
+            variants: 扩展查询列表（不含原始查询）
+        
+        Returns:
+            按新颖度排序的扩展查询列表
+        """
+        covered = set(tokenize(query))
+        remaining = [(variant, set(tokenize(variant))) for variant in dict.fromkeys(variants) if variant != query]
+        ranked = []
+        
+        while remaining:
+            novelties = [
+                len(tokens - covered) / len(tokens) if tokens else 0.0
+                for _, tokens in remaining
+            ]
+            best = max(range(len(remaining)), key=novelties.__getitem__)
+            if novelties[best] <= 0:
+                break
+            variant, tokens = remaining.pop(best)
+            ranked.append(variant)
+            covered |= tokens
+        
+        return ranked
+    
+    def plan_expansion(
+        self,
+        query: str,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        max_searches: int = DEFAULT_EXPANSION_MAX_SEARCHES,
+        duplicate_similarity: float = DEFAULT_EXPANSION_DUPLICATE_SIMILARITY
+    ) -> ExpansionPlan:
+        """在检索预算内规划查询扩展
+        
+        1. 生成全部候选变体并按新颖度排序
+        2. 批量嵌入候选，合并与已选查询余弦相似度过高的变体
+        3. 检索次数（含原始查询）不超过 max_searches
+        
+        Args:
+            query: 原始查询
+            embed_fn: 批量嵌入函数，为 None 时跳过近似重复合并
+            max_searches: 最多检索次数
+            duplicate_similarity: 视为近似重复的余弦相似度阈值
+        
+        Returns:
+            查询扩展计划
+        """
+        candidates, ranked = self._rank_candidates(query, max_searches)
+        
+        embeddings: Dict[str, List[float]] = {}
+        if embed_fn is not None and len(ranked) > 1:
+            try:
+                embeddings = dict(zip(ranked, embed_fn(ranked)))
+            except Exception as e:
+                logger.warning(f"嵌入扩展查询失败，跳过近似重复合并: {e}")
+        
+        return self._build_plan(query, candidates, ranked, embeddings, max_searches, duplicate_similarity)
+    
+    async def aplan_expansion(
+        self,
+        query: str,
+        aembed_fn: Optional[Callable[[List[str]], Awaitable[List[List[float]]]]] = None,
+        max_searches: int = DEFAULT_EXPANSION_MAX_SEARCHES,
+        duplicate_similarity: float = DEFAULT_EXPANSION_DUPLICATE_SIMILARITY
+    ) -> ExpansionPlan:
+        """plan_expansion 的异步版本，候选查询通过异步嵌入函数批量嵌入
+        
+        Args:
+            query: 原始查询
+            aembed_fn: 异步批量嵌入函数，为 None 时跳过近似重复合并
+            max_searches: 最多检索次数
+            duplicate_similarity: 视为近似重复的余弦相似度阈值
+        
+        Returns:
+            查询扩展计划
+        """
+        candidates, ranked = self._rank_candidates(query, max_searches)
+        
+        embeddings: Dict[str, List[float]] = {}
+        if aembed_fn is not None and len(ranked) > 1:
+            try:
+                embeddings = dict(zip(ranked, await aembed_fn(ranked)))
+            except Exception as e:
+                logger.warning(f"嵌入扩展查询失败，跳过近似重复合并: {e}")
+        
+        return self._build_plan(query, candidates, ranked, embeddings, max_searches, duplicate_similarity)
+    
+    def _rank_candidates(self, query: str, max_searches: int) -> Tuple[List[str], List[str]]:
+        """生成候选查询并按新颖度排序
+        
+        Returns:
+            (全部候选查询, 参与嵌入的已排序候选)，两者的第一个都是原始查询
+        """
+        candidates = self.expand_query(query)
+        ranked = [query] + self.rank_expansions(query, candidates[1:])
+        # 近似重复会被合并，预留一倍的候选用于嵌入
+        return candidates, ranked[:max(1, max_searches) * 2]
+    
+    def _build_plan(
+        self,
+        query: str,
+        candidates: List[str],
+        ranked: List[str],
+        embeddings: Dict[str, List[float]],
+        max_searches: int,
+        duplicate_similarity: float
+    ) -> ExpansionPlan:
+        """合并近似重复的候选并按预算截断，生成扩展计划"""
+        selected = [query]
+        collapsed = 0
+        if embeddings:
+            vectors = np.asarray([embeddings[variant] for variant in ranked], dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms > 0, norms, 1.0)
+            kept_rows = [0]
+            for row in range(1, len(ranked)):
+                if len(selected) >= max_searches:
+                    break
+                if float(np.max(vectors[kept_rows] @ vectors[row])) >= duplicate_similarity:
+                    collapsed += 1
+                    continue
+                kept_rows.append(row)
+                selected.append(ranked[row])
+        else:
+            selected = ranked[:max(1, max_searches)]
+        
+        plan = ExpansionPlan(
+            queries=selected,
+            embeddings={variant: embeddings[variant] for variant in selected if variant in embeddings},
+            candidates=len(candidates),
+            collapsed=collapsed
+        )
+        
+        with self._stats_lock:
+            self._plans += 1
+            self._candidates += plan.candidates
+            self._searches += len(plan.queries)
+            self._collapsed += plan.collapsed
+        
+        return plan
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取查询扩展统计信息
+        
+        Returns:
+            统计信息字典
+        """
+        with self._stats_lock:
+            return {
+                "plans": self._plans,
+                "candidates": self._candidates,
+                "searches": self._searches,
+                "searches_saved": self._candidates - self._searches,
+                "collapsed": self._collapsed,
+            }
+    
     def normalize_query(self, query: str) -> str:
         """查询标准化
         
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+重排序计算引擎
+
+该模块为 DocumentReranker 提供向量化的打分和选择实现：
+- 使用共享分词器（中文字符 n-gram + 拉丁单词），分词结果按文本缓存
+- 每个候选文档只分词一次，词汇映射为整数 ID
+- 关键词匹配和文档两两 Jaccard 相似度用 NumPy 矩阵运算一次算出
+- top-k 使用部分排序，MMR 每轮只做一次向量化更新
+- 支持直接在集合中已存储的文档向量上执行 MMR，无需重新嵌入或分词
+
+打分公式与 DocumentReranker 的逐文档实现使用相同的分词规则，排序结果（包括同分时的先后顺序）保持一致
+"""
+
+import math
+from itertools import chain
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .tokenizer import tokenize
+
+
+class RerankCandidates:
+    """一组待重排序的候选文档
+    
+    职责：
+    - 预先完成小写化、分词和词汇 ID 映射
+    - 计算并缓存与查询无关的长度惩罚和两两相似度矩阵
+    - 按查询计算并缓存相关性分数
+    """
+    
+    def __init__(self, documents: List[Document]):
+        """初始化候选文档集合
+        
+        Args:
+            documents: 候选文档列表
+        """
+        self.documents = documents
+        self.size = len(documents)
+        self.contents = [doc.page_content.lower() for doc in documents]
+        
+        # 分词结果由分词器缓存，重复出现的候选文档不会重新分词
+        token_lists = [tokenize(doc.page_content) for doc in documents]
+        token_sets = [set(tokens) for tokens in token_lists]
+        
+        unique_tokens = dict.fromkeys(chain.from_iterable(token_sets))
+        self.vocabulary: Dict[str, int] = dict(zip(unique_tokens, range(len(unique_tokens))))
+        
+        # (文档下标, 词汇 ID) 对，每个文档内去重，用于关键词匹配和相似度矩阵
+        self._rows = np.repeat(
+            np.arange(self.size, dtype=np.int64),
+            [len(tokens) for tokens in token_sets]
+        )
+        self._cols = self._token_ids(token_sets, len(self._rows))
+        self.token_set_sizes = np.bincount(self._rows, minlength=self.size)
+        
+        # (文档下标, 词汇 ID) 对，保留重复词元，用于词频统计
+        token_counts = [len(tokens) for tokens in token_lists]
+        self._occurrence_rows = np.repeat(np.arange(self.size, dtype=np.int64), token_counts)
+        self._occurrence_cols = self._token_ids(token_lists, len(self._occurrence_rows))
+        
+        # 超越函数使用 math 计算，保证逐文档打分与批量打分的结果逐位一致
+        self.length_penalties = np.array(
+            [1.0 / (1.0 + math.log(1 + count / 100)) for count in token_counts],
+            dtype=np.float64
+        )
+        
+        self._relevance_cache: Dict[str, np.ndarray] = {}
+        self._similarity: Optional[np.ndarray] = None
+    
+    def relevance_scores(self, query: str) -> np.ndarray:
+        """计算所有候选文档与查询的相关性分数
+        
+        Args:
+            query: 查询字符串
+        
+        Returns:
+            相关性分数数组 (0-1)
+        """
+        cached = self._relevance_cache.get(query)
+        if cached is not None:
+            return cached
+        
+        query_lower = query.lower()
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        
+        # 1. 精确匹配分数
+        exact_match_scores = np.array(
+            [1.0 if query_lower in content else 0.0 for content in self.contents],
+            dtype=np.float64
+        )
+        
+        keyword_scores = np.zeros(self.size, dtype=np.float64)
+        word_freq_scores = np.zeros(self.size, dtype=np.float64)
+        query_ids = [self.vocabulary[token] for token in query_tokens if token in self.vocabulary]
+        if query_ids:
+            # 2. 关键词匹配分数：命中的查询词元比例
+            matched = np.isin(self._cols, query_ids)
+            matched_counts = np.bincount(self._rows[matched], minlength=self.size)
+            keyword_scores = matched_counts / len(query_tokens)
+            
+            # 3. 词频分数：按查询词元顺序逐个累加 log(1 + 词频)
+            for token_id in query_ids:
+                frequencies = np.bincount(
+                    self._occurrence_rows[self._occurrence_cols == token_id],
+                    minlength=self.size
+                )
+                log_table = np.array(
+                    [math.log(1 + count) for count in range(int(frequencies.max()) + 1)],
+                    dtype=np.float64
+                )
+                word_freq_scores += log_table[frequencies]
+            word_freq_scores = np.minimum(word_freq_scores / len(query_tokens), 1.0)
+        
+        # 4. 综合分数
+        final_scores = (
+            0.4 * exact_match_scores +
+            0.3 * keyword_scores +
+            0.2 * word_freq_scores +
+            0.1 * self.length_penalties
+        )
+        scores = np.minimum(final_scores, 1.0)
+        
+        self._relevance_cache[query] = scores
+        return scores
+    
+    def _token_ids(self, token_groups: List[Any], count: int) -> np.ndarray:
+        """把分组的词元映射为扁平的词汇 ID 数组"""
+        return np.fromiter(
+            map(self.vocabulary.__getitem__, chain.from_iterable(token_groups)),
+            dtype=np.int64,
+            count=count
+        )
+    
+    def similarity_matrix(self) -> np.ndarray:
+        """计算候选文档两两之间的 Jaccard 相似度矩阵
+        
+        只有出现在两个及以上文档中的词汇会影响交集，矩阵乘法只在这些列上进行
+        
+        Returns:
+            形状为 (n, n) 的相似度矩阵
+        """
+        if self._similarity is not None:
+            return self._similarity
+        
+        document_frequency = np.bincount(self._cols, minlength=len(self.vocabulary))
+        shared_columns = np.flatnonzero(document_frequency >= 2)
+        
+        incidence = np.zeros((self.size, len(shared_columns)), dtype=np.float32)
+        if len(shared_columns):
+            column_map = np.full(len(self.vocabulary), -1, dtype=np.int64)
+            column_map[shared_columns] = np.arange(len(shared_columns))
+            shared = column_map[self._cols] >= 0
+            incidence[self._rows[shared], column_map[self._cols[shared]]] = 1.0
+        
+        # float32 累加整数计数在 2^24 以内是精确的
+        intersections = (incidence @ incidence.T).astype(np.float64)
+        sizes = self.token_set_sizes.astype(np.float64)
+        unions = sizes[:, None] + sizes[None, :] - intersections
+        
+        valid = (sizes[:, None] > 0) & (sizes[None, :] > 0) & (unions > 0)
+        similarity = np.zeros((self.size, self.size), dtype=np.float64)
+        np.divide(intersections, unions, out=similarity, where=valid)
+        
+        self._similarity = similarity
+        return similarity
+
+
+def select_top_k(scores: np.ndarray, top_k: Optional[int] = None) -> np.ndarray:
+    """按分数降序选出前 top_k 个下标
+    
+    分数相同时保持原始顺序，与 Python 稳定排序的结果一致
+    
+    Args:
+        scores: 分数数组
+        top_k: 返回的数量，None 表示全部排序
+    
+    Returns:
+        下标数组
+    """
+    negated = -scores
+    if top_k is None or top_k >= len(scores):
+        return np.argsort(negated, kind='stable')
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    
+    # 部分排序找到第 k 大的分数，再只对不低于它的候选做稳定排序
+    kth_value = np.partition(negated, top_k - 1)[top_k - 1]
+    candidates = np.flatnonzero(negated <= kth_value)
+    ordered = candidates[np.argsort(negated[candidates], kind='stable')]
+    return ordered[:top_k]
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    similarity: np.ndarray,
+    diversity_threshold: float,
+    top_k: Optional[int] = None,
+    similarity_floor: float = 0.0
+) -> List[int]:
+    """MMR (Maximal Marginal Relevance) 选择
+    
+    Args:
+        relevance: 相关性分数数组
+        similarity: 文档两两相似度矩阵
+        diversity_threshold: 多样性阈值 (0-1)
+        top_k: 选择的数量，None 表示全部
+        similarity_floor: 最大相似度的下限，词汇相似度为 0，余弦相似度可以为 -inf
+    
+    Returns:
+        按选择顺序排列的下标列表
+    """
+    size = len(relevance)
+    if size == 0:
+        return []
+    
+    first_index = int(np.argmax(relevance))
+    selected = [first_index]
+    remaining = np.ones(size, dtype=bool)
+    remaining[first_index] = False
+    
+    # 每个文档与已选文档的最大相似度，每轮只用新选中的一行更新
+    max_similarity = np.maximum(similarity_floor, similarity[first_index])
+    relevance_term = diversity_threshold * relevance
+    limit = size if top_k is None else min(top_k, size)
+    
+    while len(selected) < limit:
+        mmr_scores = relevance_term - (1 - diversity_threshold) * max_similarity
+        mmr_scores[~remaining] = -np.inf
+        best_index = int(mmr_scores.argmax())
+        if not remaining[best_index] or mmr_scores[best_index] == -np.inf:
+            break
+        
+        selected.append(best_index)
+        remaining[best_index] = False
+        np.maximum(max_similarity, similarity[best_index], out=max_similarity)
+    
+    return selected
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行做 L2 归一化，零向量保持不变"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def embedding_mmr_select(
+    query_embedding: np.ndarray,
+    document_embeddings: np.ndarray,
+    lambda_mult: float = 0.5,
+    top_k: Optional[int] = None
+) -> List[int]:
+    """在嵌入空间中执行 MMR 选择
+    
+    相关性和文档间相似度都使用余弦相似度，一次矩阵乘法得到全部相似度
+    
+    Args:
+        query_embedding: 查询向量
+        document_embeddings: 形状为 (n, dim) 的文档向量
+        lambda_mult: 相关性权重 (0-1)，越低越注重多样性
+        top_k: 选择的数量，None 表示全部
+    
+    Returns:
+        按选择顺序排列的下标列表
+    """
+    documents = normalize_rows(document_embeddings)
+    query = normalize_rows(query_embedding)
+    relevance = documents @ query
+    similarity = documents @ documents.T
+    return mmr_select(relevance, similarity, lambda_mult, top_k, similarity_floor=-np.inf)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+语义查询缓存
+
+该模块在检索管道前提供基于查询向量的近似缓存：
+- 新查询与已缓存查询的余弦距离低于阈值时直接复用结果
+- 查询向量保存在固定容量的 NumPy 矩阵中，一次矩阵向量乘完成查找
+- 按 LRU 顺序淘汰，并随集合版本整体失效
+"""
+
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class SemanticQueryCache:
+    """语义查询缓存
+    
+    职责：
+    - 维护有界的查询向量索引
+    - 仅在配置指纹相同的条目之间做近似匹配
+    - 跟踪集合版本，版本变化时清空缓存
+    - 统计命中率和淘汰次数
+    """
+    
+    def __init__(self, max_entries: int = 512, distance_threshold: float = 0.05):
+        """初始化语义查询缓存
+        
+        Args:
+            max_entries: 最大缓存条目数
+            distance_threshold: 命中所需的最大余弦距离
+        """
+        self.max_entries = max_entries
+        self.distance_threshold = distance_threshold
+        
+        self._vectors: Optional[np.ndarray] = None
+        self._active = np.zeros(max_entries, dtype=bool)
+        # 配置指纹编码为整数，查找时用向量化比较筛选候选条目
+        self._fingerprint_codes = np.full(max_entries, -1, dtype=np.int64)
+        # 只记录仍被有效条目引用的指纹，最后一个条目释放时一并删除
+        self._fingerprint_ids: Dict[str, int] = {}
+        self._fingerprint_refs: Dict[str, int] = {}
+        self._next_fingerprint_code = 0
+        # (配置指纹, 查询) -> slot，重复写入同一查询时覆盖原条目
+        self._slot_index: Dict[Tuple[str, str], int] = {}
+        self._fingerprints: List[Optional[str]] = [None] * max_entries
+        self._queries: List[Optional[str]] = [None] * max_entries
+        self._documents: List[Optional[List[Document]]] = [None] * max_entries
+        # slot -> None，按最近使用顺序排列
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def sync_version(self, version: str):
+        """同步集合版本，版本变化时清空缓存
+        
+        Args:
+            version: 当前集合版本
+        """
+        with self._lock:
+            if self._version == version:
+                return
+            if self._version is not None and self._lru:
+                self._invalidations += 1
+            self._clear_locked()
+            self._version = version
+    
+    def lookup(
+        self,
+        embedding: List[float],
+        fingerprint: str
+    ) -> Optional[Tuple[str, float, List[Document]]]:
+        """查找语义相近的已缓存查询
+        
+        Args:
+            embedding: 新查询的向量
+            fingerprint: 有效配置指纹
+        
+        Returns:
+            (命中的原始查询, 余弦距离, 文档列表副本)，未命中时返回 None
+        """
+        vector = self._normalize(embedding)
+        
+        with self._lock:
+            if self._vectors is None or not self._lru or self._vectors.shape[1] != vector.shape[0]:
+                self._misses += 1
+                return None
+            
+            code = self._fingerprint_ids.get(fingerprint)
+            candidates = np.flatnonzero(self._active & (self._fingerprint_codes == code)) if code is not None else []
+            if len(candidates) == 0:
+                self._misses += 1
+                return None
+            
+            similarities = self._vectors[candidates] @ vector
+            best = int(np.argmax(similarities))
+            distance = float(1.0 - similarities[best])
+            if distance > self.distance_threshold:
+                self._misses += 1
+                return None
+            
+            slot = int(candidates[best])
+            self._lru.move_to_end(slot)
+            self._hits += 1
+            cached_query = self._queries[slot]
+            documents = self._documents[slot]
+        
+        return cached_query, distance, [doc.model_copy(deep=True) for doc in documents]
+    
+    def put(
+        self,
+        query: str,
+        embedding: List[float],
+        fingerprint: str,
+        documents: List[Document]
+    ):
+        """写入缓存，同一配置下的相同查询覆盖原条目
+        
+        Args:
+            query: 标准化后的查询
+            embedding: 查询向量
+            fingerprint: 有效配置指纹
+            documents: 检索结果文档列表
+        """
+        vector = self._normalize(embedding)
+        stored = [doc.model_copy(deep=True) for doc in documents]
+        
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._clear_locked()
+            
+            existing = self._slot_index.get((fingerprint, query))
+            if existing is not None:
+                self._lru.pop(existing)
+                self._release_locked(existing)
+            elif not self._free_slots:
+                oldest_slot, _ = self._lru.popitem(last=False)
+                self._release_locked(oldest_slot)
+                self._evictions += 1
+            
+            if fingerprint not in self._fingerprint_ids:
+                self._fingerprint_ids[fingerprint] = self._next_fingerprint_code
+                self._next_fingerprint_code += 1
+            self._fingerprint_refs[fingerprint] = self._fingerprint_refs.get(fingerprint, 0) + 1
+            
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._active[slot] = True
+            self._fingerprint_codes[slot] = self._fingerprint_ids[fingerprint]
+            self._fingerprints[slot] = fingerprint
+            self._queries[slot] = query
+            self._documents[slot] = stored
+            self._slot_index[(fingerprint, query)] = slot
+            self._lru[slot] = None
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._clear_locked()
+    
+    def _release_locked(self, slot: int):
+        fingerprint = self._fingerprints[slot]
+        self._slot_index.pop((fingerprint, self._queries[slot]), None)
+        self._fingerprint_refs[fingerprint] -= 1
+        if not self._fingerprint_refs[fingerprint]:
+            del self._fingerprint_refs[fingerprint]
+            del self._fingerprint_ids[fingerprint]
+        
+        self._active[slot] = False
+        self._fingerprint_codes[slot] = -1
+        self._fingerprints[slot] = None
+        self._queries[slot] = None
+        self._documents[slot] = None
+        self._free_slots.append(slot)
+    
+    def _clear_locked(self):
+        self._active[:] = False
+        self._fingerprint_codes[:] = -1
+        self._fingerprint_ids.clear()
+        self._fingerprint_refs.clear()
+        self._slot_index.clear()
+        self._fingerprints = [None] * self.max_entries
+        self._queries = [None] * self.max_entries
+        self._documents = [None] * self.max_entries
+        self._lru.clear()
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+    
+    def __len__(self) -> int:
+        return len(self._lru)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息
+        
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._lru),
+                "max_entries": self.max_entries,
+                "distance_threshold": self.distance_threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "collection_version": self._version,
+            }
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+词法分词器
+
+该模块为重排序、查询转换和词法索引提供统一的分词规则：
+- 中日韩文字按字符 n-gram 切分（默认二元组），单字片段保留为一元组
+- 拉丁文字、数字和下划线按单词切分，保留 config_key、api.name、E-1024 这类整体
+- 所有文本先转为小写
+- 分词结果按文本缓存，同一文档在不同查询间不会重复分词
+"""
+
+import re
+from functools import lru_cache
+from typing import Tuple, Dict, Any
+
+# 中日韩统一表意文字（含扩展 A 区和兼容区）、日文假名、韩文音节
+_CJK_CHARS = r'\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+
+_TOKEN_PATTERN = re.compile(
+    rf'(?P<cjk>[{_CJK_CHARS}]+)|(?P<word>[0-9a-z_]+(?:[.\-][0-9a-z_]+)*)'
+)
+_LATIN_PATTERN = re.compile(r'[0-9a-z_]')
+
+# 中日韩文字的 n-gram 长度
+CJK_NGRAM_SIZE = 2
+
+# 分词缓存的最大条目数
+TOKEN_CACHE_SIZE = 8192
+
+
+def _cjk_ngrams(run: str, n: int = CJK_NGRAM_SIZE) -> Tuple[str, ...]:
+    """把连续的中日韩文字切分为 n-gram"""
+    if len(run) <= n:
+        return (run,)
+    return tuple(run[i:i + n] for i in range(len(run) - n + 1))
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def tokenize(text: str) -> Tuple[str, ...]:
+    """对文本分词
+    
+    Args:
+        text: 待分词文本
+    
+    Returns:
+        按出现顺序排列的词元元组（可能包含重复词元）
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        cjk_run = match.group('cjk')
+        if cjk_run:
+            tokens.extend(_cjk_ngrams(cjk_run))
+        else:
+            tokens.append(match.group('word'))
+    return tuple(tokens)
+
+
+def contains_term(text: str, term: str) -> bool:
+    """判断文本是否提及某个术语
+    
+    含拉丁字母或数字的术语按词元序列匹配，避免 "AI" 命中 "detail" 这类子串；
+    纯中日韩术语按子串匹配
+    
+    Args:
+        text: 文本
+        term: 术语
+    
+    Returns:
+        是否提及
+    """
+    term_lower = term.lower()
+    if not _LATIN_PATTERN.search(term_lower):
+        return term_lower in text.lower()
+    
+    term_tokens = tokenize(term)
+    text_tokens = tokenize(text)
+    if not term_tokens or len(term_tokens) > len(text_tokens):
+        return False
+    
+    width = len(term_tokens)
+    first = term_tokens[0]
+    return any(
+        text_tokens[i:i + width] == term_tokens
+        for i in range(len(text_tokens) - width + 1)
+        if text_tokens[i] == first
+    )
+
+
+def get_tokenizer_stats() -> Dict[str, Any]:
+    """获取分词缓存统计信息
+    
+    Returns:
+        统计信息字典
+    """
+    info = tokenize.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
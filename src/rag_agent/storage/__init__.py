@@ -5,12 +5,18 @@
 提供可插拔的持久化存储接口和实现：
 - BaseStore: 抽象存储接口
 - ChromaStore: 基于 ChromaDB 的向量存储实现
+- NumpyStore: 基于内存映射 NumPy 矩阵的进程内向量存储实现
+- WriteBehindQueue: 后写队列，合并写入后批量落库，溢写到磁盘防止丢失
+- SessionLog: 会话消息追加日志（SQLite），按需为会话建立向量索引
 - StorageFactory: 存储工厂，支持依赖注入
 - 支持向量相似性搜索和元数据过滤
 """
 
-from .base import BaseStore, StorageDocument, SearchResult
+from .base import BaseStore, StorageDocument, SearchResult, MemoryRecord
 from .chroma_store import ChromaStore
+from .numpy_store import NumpyStore, VectorTable
+from .write_behind import PendingWrite, WriteBehindQueue
+from .session_log import SessionLog, SessionEntry
 from .factory import (
     StorageFactory, 
     StorageType, 
@@ -24,7 +30,14 @@ __all__ = [
     'BaseStore',
     'StorageDocument', 
     'SearchResult',
+    'MemoryRecord',
     'ChromaStore',
+    'NumpyStore',
+    'VectorTable',
+    'PendingWrite',
+    'WriteBehindQueue',
+    'SessionLog',
+    'SessionEntry',
     'StorageFactory',
     'StorageType',
     'get_default_store',
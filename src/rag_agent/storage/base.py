@@ -51,6 +51,22 @@ class StorageDocument:
         )
 
 
+@dataclass
+class MemoryRecord:
+    """
+    记忆记录数据结构
+    
+    批量写入长期记忆时使用，字段与 store_memory 的参数一致
+    """
+    memory_key: str  # 记忆唯一标识
+    content: str  # 记忆内容
+    context: Optional[Dict[str, Any]] = None  # 上下文信息
+    tags: Optional[List[str]] = None  # 标签列表
+    importance: int = 5  # 重要性评分 (1-10)
+    user_id: Optional[str] = None  # 用户 ID
+    event_type: Optional[str] = None  # 事件类型
+
+
 @dataclass
 class SearchResult:
     """
@@ -254,6 +270,32 @@ class BaseStore(ABC):
         """
         pass
     
+    def store_memories(self, memories: List[MemoryRecord]) -> bool:
+        """
+        批量存储长期记忆
+        
+        默认逐条调用 store_memory，支持批量嵌入的后端应覆盖该方法
+        
+        Args:
+            memories: 记忆记录列表
+        
+        Returns:
+            是否全部存储成功
+        """
+        results = [
+            self.store_memory(
+                memory_key=memory.memory_key,
+                content=memory.content,
+                context=memory.context,
+                tags=memory.tags,
+                importance=memory.importance,
+                user_id=memory.user_id,
+                event_type=memory.event_type
+            )
+            for memory in memories
+        ]
+        return all(results)
+    
     @abstractmethod
     def search_memories(
         self,
@@ -299,4 +341,21 @@ class BaseStore(ABC):
         Returns:
             是否清空成功
         """
-        pass
\ No newline at end of file
+        pass
+    
+    def flush(self) -> bool:
+        """
+        同步落库尚未写入的记录
+        
+        默认直接返回，带写入缓冲的后端应覆盖该方法
+        
+        Returns:
+            是否全部写入成功
+        """
+        return True
+    
+    def close(self):
+        """
+        关闭存储，释放后台资源
+        """
+        self.flush()
\ No newline at end of file
@@ -6,12 +6,12 @@ ChromaDB 存储实现
 - 向量相似性搜索
 - 元数据过滤
 - 混合查询
-- 会话历史管理
+- 会话历史管理（追加日志，按需嵌入）
 - 长期记忆存储
+- 记忆的后写批量落库（可选）
 """
 
 import json
-import uuid
 from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
 from pathlib import Path
@@ -21,7 +21,9 @@ from chromadb.config import Settings
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
 from langchain_core.embeddings import Embeddings
 
-from .base import BaseStore, StorageDocument, SearchResult
+from .base import BaseStore, StorageDocument, SearchResult, MemoryRecord
+from .write_behind import PendingWrite, WriteBehindQueue
+from .session_log import SessionLog
 try:
     from ..core.embedding_provider import get_embedding_model
 except ImportError:
@@ -41,7 +43,10 @@ class ChromaStore(BaseStore):
         self,
         storage_dir: Optional[Union[str, Path]] = None,
         collection_name: str = "synapseagent_storage",
-        embedding_model: Optional[Embeddings] = None
+        embedding_model: Optional[Embeddings] = None,
+        write_behind: bool = False,
+        write_behind_interval_ms: float = 1000,
+        write_behind_batch_size: int = 64
     ):
         """
         初始化 ChromaDB 存储
@@ -50,6 +55,9 @@ class ChromaStore(BaseStore):
             storage_dir: 存储目录路径
             collection_name: 集合名称
             embedding_model: 嵌入模型
+            write_behind: 记忆是否经后写队列批量落库
+            write_behind_interval_ms: 后写队列的刷新间隔（毫秒）
+            write_behind_batch_size: 后写队列待写入记录数达到该值时立即刷新
         """
         # 设置存储目录
         if storage_dir is None:
@@ -83,6 +91,19 @@ class ChromaStore(BaseStore):
         # 专用集合
         self.session_collection = self._get_or_create_collection(f"{collection_name}_sessions")
         self.memory_collection = self._get_or_create_collection(f"{collection_name}_memories")
+        
+        # 会话消息追加日志，会话集合只保存按需建立的向量索引
+        self.session_log = SessionLog(self.storage_dir / f"{collection_name}_session_log.sqlite3")
+        
+        # 后写队列：写入先追加到溢写文件，后台合并后一次嵌入、按集合批量 upsert
+        self.write_queue: Optional[WriteBehindQueue] = None
+        if write_behind:
+            self.write_queue = WriteBehindQueue(
+                writer=self._write_pending,
+                spill_path=self.storage_dir / f"{collection_name}_write_behind.jsonl",
+                flush_interval_ms=write_behind_interval_ms,
+                max_batch_size=write_behind_batch_size
+            )
     
     def _get_or_create_collection(self, name: str):
         """获取或创建集合"""
@@ -97,13 +118,78 @@ class ChromaStore(BaseStore):
     def _embed_text(self, text: str) -> List[float]:
         """生成文本嵌入"""
         try:
-            embeddings = self.embedding_model.embed_documents([text])
-            return embeddings[0]
+            return self._embed_texts([text])[0]
         except Exception as e:
             print(f"生成嵌入时出错: {e}")
             # 返回零向量作为后备
             return [0.0] * 1536  # 假设使用 OpenAI 嵌入维度
     
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """批量生成文本嵌入
+        
+        整批交给嵌入模型，由嵌入模型按服务商上限分批并发请求
+        """
+        if not texts:
+            return []
+        return self.embedding_model.embed_documents(texts)
+    
+    def _add_in_batches(
+        self,
+        collection,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        upsert: bool = False
+    ):
+        """按 ChromaDB 单次写入上限分批写入集合，upsert 时覆盖已存在的 ID"""
+        write = collection.upsert if upsert else collection.add
+        max_batch_size = self.client.get_max_batch_size()
+        for start in range(0, len(ids), max_batch_size):
+            end = start + max_batch_size
+            write(
+                ids=ids[start:end],
+                documents=documents[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=metadatas[start:end]
+            )
+    
+    def _write_pending(self, writes: List[PendingWrite]):
+        """落库后写队列中的一批记录：一次嵌入，每个集合一次 upsert"""
+        embeddings = self._embed_texts([write.text for write in writes])
+        
+        grouped: Dict[str, List[int]] = {}
+        for index, write in enumerate(writes):
+            grouped.setdefault(write.collection, []).append(index)
+        
+        max_batch_size = self.client.get_max_batch_size()
+        for collection_name, indices in grouped.items():
+            collection = self._get_or_create_collection(collection_name)
+            for start in range(0, len(indices), max_batch_size):
+                batch = indices[start:start + max_batch_size]
+                collection.upsert(
+                    ids=[writes[i].id for i in batch],
+                    documents=[writes[i].document for i in batch],
+                    embeddings=[embeddings[i] for i in batch],
+                    metadatas=[writes[i].metadata for i in batch]
+                )
+    
+    def flush(self) -> bool:
+        """
+        同步落库后写队列中的记录
+        """
+        if self.write_queue is None:
+            return True
+        return self.write_queue.flush()
+    
+    def close(self):
+        """
+        关闭后写队列（剩余记录落库）和会话日志
+        """
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.session_log.close()
+    
     def _message_to_dict(self, message: BaseMessage) -> Dict[str, Any]:
         """将消息转换为字典"""
         return {
@@ -164,11 +250,12 @@ class ChromaStore(BaseStore):
             embeddings = []
             metadatas = []
             
+            # 一次性为缺少嵌入的文档生成向量
+            pending = [doc for doc in documents if doc.embedding is None]
+            for doc, embedding in zip(pending, self._embed_texts([doc.content for doc in pending])):
+                doc.embedding = embedding
+            
             for doc in documents:
-                # 生成嵌入
-                if doc.embedding is None:
-                    doc.embedding = self._embed_text(doc.content)
-                
                 # 准备数据
                 metadata = doc.metadata.copy()
                 metadata['timestamp'] = doc.timestamp.isoformat()
@@ -179,12 +266,7 @@ class ChromaStore(BaseStore):
                 metadatas.append(metadata)
             
             # 批量存储
-            self.collection.add(
-                ids=ids,
-                documents=contents,
-                embeddings=embeddings,
-                metadatas=metadatas
-            )
+            self._add_in_batches(self.collection, ids, contents, embeddings, metadatas)
             
             return True
             
@@ -358,35 +440,11 @@ class ChromaStore(BaseStore):
     ) -> bool:
         """
         存储会话消息
+        
+        追加到会话日志，不调用嵌入接口；需要语义搜索时由 index_session_messages 按需嵌入
         """
         try:
-            # 生成消息 ID
-            message_id = f"{session_id}_{uuid.uuid4().hex[:8]}"
-            
-            # 准备消息内容
-            message_dict = self._message_to_dict(message)
-            content = json.dumps(message_dict, ensure_ascii=False)
-            
-            # 准备元数据
-            msg_metadata = {
-                'session_id': session_id,
-                'message_type': message.__class__.__name__,
-                'timestamp': datetime.now().isoformat()
-            }
-            if metadata:
-                msg_metadata.update(metadata)
-            
-            # 生成嵌入
-            embedding = self._embed_text(message.content)
-            
-            # 存储到会话集合
-            self.session_collection.add(
-                ids=[message_id],
-                documents=[content],
-                embeddings=[embedding],
-                metadatas=[msg_metadata]
-            )
-            
+            self.session_log.append(session_id, self._message_to_dict(message), metadata)
             return True
             
         except Exception as e:
@@ -401,42 +459,125 @@ class ChromaStore(BaseStore):
         end_time: Optional[datetime] = None
     ) -> List[BaseMessage]:
         """
-        获取会话历史
+        获取会话历史，按写入顺序返回
         """
         try:
-            # 构建查询条件
-            where_filter = {'session_id': session_id}
-            
-            if start_time or end_time:
-                time_filter = {}
-                if start_time:
-                    time_filter['$gte'] = start_time.isoformat()
-                if end_time:
-                    time_filter['$lte'] = end_time.isoformat()
-                where_filter['timestamp'] = time_filter
-            
-            # 查询消息
-            results = self.session_collection.get(
-                where=where_filter,
-                limit=limit,
-                include=['documents', 'metadatas']
-            )
+            entries = self.session_log.read(session_id, start_time=start_time, end_time=end_time, limit=limit)
+            if entries or self.session_log.count(session_id):
+                return [self._dict_to_message(entry.message) for entry in entries]
             
-            # 转换为消息对象
-            messages = []
-            for i in range(len(results['ids'])):
-                content = results['documents'][i]
-                message_dict = json.loads(content)
-                message = self._dict_to_message(message_dict)
-                messages.append(message)
+            # 会话日志启用前写入会话集合的旧消息
+            return self._get_legacy_session_history(session_id, limit, start_time, end_time)
+        
+        except Exception as e:
+            print(f"获取会话历史时出错: {e}")
+            return []
+    
+    def _get_legacy_session_history(
+        self,
+        session_id: str,
+        limit: Optional[int] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> List[BaseMessage]:
+        """从会话集合读取会话日志启用前写入的消息"""
+        # 构建查询条件
+        where_filter = {'session_id': session_id}
+        
+        if start_time or end_time:
+            time_filter = {}
+            if start_time:
+                time_filter['$gte'] = start_time.isoformat()
+            if end_time:
+                time_filter['$lte'] = end_time.isoformat()
+            where_filter['timestamp'] = time_filter
+        
+        # 查询消息
+        results = self.session_collection.get(
+            where=where_filter,
+            limit=limit,
+            include=['documents', 'metadatas']
+        )
+        
+        return [self._dict_to_message(json.loads(content)) for content in results['documents']]
+    
+    def index_session_messages(self, session_id: str) -> int:
+        """
+        为会话中尚未嵌入的消息建立向量索引
+        
+        一次嵌入全部新消息并写入会话集合，已建立索引的消息不会重复嵌入
+        
+        Args:
+            session_id: 会话 ID
+        
+        Returns:
+            本次建立索引的消息数
+        """
+        entries = self.session_log.unembedded(session_id)
+        if not entries:
+            return 0
+        
+        embeddings = self._embed_texts([str(entry.message.get('content', '')) for entry in entries])
+        metadatas = []
+        for entry in entries:
+            metadata = {
+                **entry.metadata,
+                'session_id': session_id,
+                'seq': entry.seq,
+                'message_type': entry.message.get('type', 'HumanMessage'),
+                'timestamp': entry.timestamp
+            }
+            metadatas.append(metadata)
+        
+        max_batch_size = self.client.get_max_batch_size()
+        for start in range(0, len(entries), max_batch_size):
+            end = start + max_batch_size
+            self.session_collection.upsert(
+                ids=[f"{session_id}_{entry.seq}" for entry in entries[start:end]],
+                documents=[json.dumps(entry.message, ensure_ascii=False) for entry in entries[start:end]],
+                embeddings=embeddings[start:end],
+                metadatas=metadatas[start:end]
+            )
+        
+        self.session_log.mark_embedded(session_id, [entry.seq for entry in entries])
+        return len(entries)
+    
+    def search_session_messages(self, session_id: str, query: str, k: int = 5) -> List[SearchResult]:
+        """
+        在一个会话内按语义搜索消息
+        
+        首次搜索时为该会话建立向量索引，之后只嵌入新增的消息
+        """
+        try:
+            self.index_session_messages(session_id)
             
-            # 按时间戳排序
-            messages.sort(key=lambda m: getattr(m, 'timestamp', datetime.now()))
+            results = self.session_collection.query(
+                query_embeddings=[self._embed_text(query)],
+                n_results=k,
+                where={'session_id': session_id},
+                include=['documents', 'metadatas', 'distances']
+            )
             
-            return messages
+            search_results = []
+            for i in range(len(results['ids'][0])):
+                metadata = results['metadatas'][0][i].copy()
+                timestamp_str = metadata.pop('timestamp', datetime.now().isoformat())
+                distance = results['distances'][0][i]
+                search_results.append(SearchResult(
+                    document=StorageDocument(
+                        id=results['ids'][0][i],
+                        content=json.loads(results['documents'][0][i]).get('content', ''),
+                        metadata=metadata,
+                        timestamp=datetime.fromisoformat(timestamp_str)
+                    ),
+                    score=1.0 - distance,
+                    distance=distance
+                ))
             
+            return search_results
+        
         except Exception as e:
-            print(f"获取会话历史时出错: {e}")
+            print(f"搜索会话消息时出错: {e}")
             return []
     
     def store_memory(
@@ -453,25 +594,33 @@ class ChromaStore(BaseStore):
         存储长期记忆
         """
         try:
-            # 准备元数据（ChromaDB只支持基本类型）
-            metadata = {
-                'memory_key': memory_key,
-                'importance': importance,
-                'timestamp': datetime.now().isoformat(),
-                'tags': ','.join(tags) if tags else '',  # 转换为字符串
-                'context': json.dumps(context or {})  # 转换为JSON字符串
-            }
+            metadata = self._build_memory_metadata(
+                MemoryRecord(
+                    memory_key=memory_key,
+                    content=content,
+                    context=context,
+                    tags=tags,
+                    importance=importance,
+                    user_id=user_id,
+                    event_type=event_type
+                )
+            )
             
-            if user_id:
-                metadata['user_id'] = user_id
-            if event_type:
-                metadata['event_type'] = event_type
+            if self.write_queue is not None:
+                self.write_queue.put(PendingWrite(
+                    collection=self.memory_collection.name,
+                    id=memory_key,
+                    document=content,
+                    metadata=metadata,
+                    text=content
+                ))
+                return True
             
             # 生成嵌入
             embedding = self._embed_text(content)
             
-            # 存储到记忆集合
-            self.memory_collection.add(
+            # 存储到记忆集合，相同记忆键覆盖旧内容
+            self.memory_collection.upsert(
                 ids=[memory_key],
                 documents=[content],
                 embeddings=[embedding],
@@ -484,6 +633,65 @@ class ChromaStore(BaseStore):
             print(f"存储记忆时出错: {e}")
             return False
     
+    def store_memories(self, memories: List[MemoryRecord]) -> bool:
+        """
+        批量存储长期记忆
+        
+        所有记忆内容一次性交给嵌入模型，按批大小和并发上限请求嵌入接口；
+        启用后写队列时与 store_memory 一样入队，由队列合并落库
+        """
+        if not memories:
+            return True
+        
+        try:
+            # 同一批次内重复的记忆键只保留最后一条
+            unique_memories = list({memory.memory_key: memory for memory in memories}.values())
+            
+            if self.write_queue is not None:
+                for memory in unique_memories:
+                    self.write_queue.put(PendingWrite(
+                        collection=self.memory_collection.name,
+                        id=memory.memory_key,
+                        document=memory.content,
+                        metadata=self._build_memory_metadata(memory),
+                        text=memory.content
+                    ))
+                return True
+            
+            embeddings = self._embed_texts([memory.content for memory in unique_memories])
+            
+            self._add_in_batches(
+                self.memory_collection,
+                ids=[memory.memory_key for memory in unique_memories],
+                documents=[memory.content for memory in unique_memories],
+                embeddings=embeddings,
+                metadatas=[self._build_memory_metadata(memory) for memory in unique_memories],
+                upsert=True
+            )
+            
+            return True
+        
+        except Exception as e:
+            print(f"批量存储记忆时出错: {e}")
+            return False
+    
+    def _build_memory_metadata(self, memory: MemoryRecord) -> Dict[str, Any]:
+        """构建记忆元数据（ChromaDB只支持基本类型）"""
+        metadata = {
+            'memory_key': memory.memory_key,
+            'importance': memory.importance,
+            'timestamp': datetime.now().isoformat(),
+            'tags': ','.join(memory.tags) if memory.tags else '',  # 转换为字符串
+            'context': json.dumps(memory.context or {})  # 转换为JSON字符串
+        }
+        
+        if memory.user_id:
+            metadata['user_id'] = memory.user_id
+        if memory.event_type:
+            metadata['event_type'] = memory.event_type
+        
+        return metadata
+    
     def search_memories(
         self,
         query: str,
@@ -494,8 +702,13 @@ class ChromaStore(BaseStore):
     ) -> List[SearchResult]:
         """
         搜索长期记忆
+        
+        后写队列中还有未落库的记忆时先同步写入，保证刚写入的记忆可以被搜索到
         """
         try:
+            if self.write_queue is not None and self.write_queue.pending(self.memory_collection.name):
+                self.write_queue.flush()
+            
             # 构建元数据过滤条件
             where_filter = {}
             
@@ -577,12 +790,13 @@ class ChromaStore(BaseStore):
         try:
             # 获取各集合的统计信息
             main_count = self.collection.count()
-            session_count = self.session_collection.count()
+            session_count = self.session_log.count()
             memory_count = self.memory_collection.count()
             
-            return {
+            stats = {
                 'total_documents': main_count,
                 'session_messages': session_count,
+                'indexed_session_messages': self.session_collection.count(),
                 'stored_memories': memory_count,
                 'storage_directory': str(self.storage_dir),
                 'collections': {
@@ -591,7 +805,11 @@ class ChromaStore(BaseStore):
                     'memories': f"{self.collection_name}_memories"
                 }
             }
+            if self.write_queue is not None:
+                stats['write_behind'] = self.write_queue.get_stats()
             
+            return stats
+        
         except Exception as e:
             print(f"获取统计信息时出错: {e}")
             return {}
@@ -609,6 +827,7 @@ class ChromaStore(BaseStore):
                 self.collection.delete()
                 self.session_collection.delete()
                 self.memory_collection.delete()
+                self.session_log.clear()
             
             return True
             
@@ -13,15 +13,18 @@ from langchain_core.embeddings import Embeddings
 
 from .base import BaseStore
 from .chroma_store import ChromaStore
+from .numpy_store import NumpyStore
 try:
     from ..core.embedding_provider import get_embedding_model
 except ImportError:
     get_embedding_model = None
+from ..core.config import get_write_behind_config
 
 
 class StorageType(Enum):
     """存储类型枚举"""
     CHROMA = "chroma"
+    NUMPY = "numpy"  # 进程内 NumPy 暴力搜索，适合小规模的记忆和会话数据
     # 未来可以扩展其他存储类型
     # PINECONE = "pinecone"
     # WEAVIATE = "weaviate"
@@ -76,6 +79,13 @@ class StorageFactory:
                 embedding_model=embedding_model,
                 **kwargs
             )
+        elif storage_type == StorageType.NUMPY:
+            store = cls._create_numpy_store(
+                storage_dir=storage_dir,
+                collection_name=collection_name,
+                embedding_model=embedding_model,
+                **kwargs
+            )
         else:
             raise ValueError(f"不支持的存储类型: {storage_type}")
         
@@ -91,10 +101,18 @@ class StorageFactory:
         storage_dir: Optional[Union[str, Path]] = None,
         collection_name: str = "synapseagent_storage",
         embedding_model: Optional[Embeddings] = None,
+        write_behind: bool = False,
+        write_behind_interval_ms: float = 1000,
+        write_behind_batch_size: int = 64,
         **kwargs
     ) -> ChromaStore:
         """
         创建 ChromaDB 存储实例
+        
+        Args:
+            write_behind: 记忆是否经后写队列批量落库
+            write_behind_interval_ms: 后写队列的刷新间隔（毫秒）
+            write_behind_batch_size: 后写队列立即刷新的记录数
         """
         if embedding_model is None:
             if get_embedding_model:
@@ -105,7 +123,38 @@ class StorageFactory:
         return ChromaStore(
             storage_dir=storage_dir,
             collection_name=collection_name,
-            embedding_model=embedding_model
+            embedding_model=embedding_model,
+            write_behind=write_behind,
+            write_behind_interval_ms=write_behind_interval_ms,
+            write_behind_batch_size=write_behind_batch_size
+        )
+    
+    @classmethod
+    def _create_numpy_store(
+        cls,
+        storage_dir: Optional[Union[str, Path]] = None,
+        collection_name: str = "synapseagent_storage",
+        embedding_model: Optional[Embeddings] = None,
+        dtype: str = "float32",
+        **kwargs
+    ) -> NumpyStore:
+        """
+        创建 NumPy 存储实例
+        
+        Args:
+            dtype: 向量存储精度，float32 或 float16
+        """
+        if embedding_model is None:
+            if get_embedding_model:
+                embedding_model = get_embedding_model()
+            else:
+                raise ValueError("No embedding model provided and get_embedding_model is not available")
+        
+        return NumpyStore(
+            storage_dir=storage_dir,
+            collection_name=collection_name,
+            embedding_model=embedding_model,
+            dtype=dtype
         )
     
     @classmethod
@@ -135,6 +184,8 @@ class StorageFactory:
         """
         获取专用于长期记忆的存储实例
         
+        默认按配置启用后写队列，记忆写入不阻塞请求
+        
         Args:
             **kwargs: 其他配置参数
             
@@ -144,7 +195,7 @@ class StorageFactory:
         return cls.create_store(
             storage_type=StorageType.CHROMA,
             collection_name="synapseagent_memory",
-            **kwargs
+            **{**get_write_behind_config(), **kwargs}
         )
     
     @classmethod
@@ -164,6 +215,18 @@ class StorageFactory:
             **kwargs
         )
     
+    @classmethod
+    def close_all(cls):
+        """
+        关闭并移除所有缓存的实例，落库后写队列中的剩余记录
+        """
+        for instance_key, store in list(cls._instances.items()):
+            try:
+                store.close()
+            except Exception as e:
+                print(f"关闭存储实例 {instance_key} 时出错: {e}")
+        cls._instances.clear()
+    
     @classmethod
     def clear_instances(cls):
         """
@@ -182,7 +245,7 @@ class StorageFactory:
         return {
             'total_instances': len(cls._instances),
             'instance_keys': list(cls._instances.keys()),
-            'storage_types': [StorageType.CHROMA.value]  # 当前支持的存储类型
+            'storage_types': [storage_type.value for storage_type in StorageType]  # 当前支持的存储类型
         }
 
 
@@ -214,7 +277,7 @@ def create_storage_backend(
     支持字符串类型参数，自动转换为相应的枚举类型。
     
     Args:
-        storage_type: 存储类型（"chroma"）
+        storage_type: 存储类型（"chroma" 或 "numpy"）
         collection_name: 集合名称
         **kwargs: 其他配置参数
         
@@ -230,12 +293,16 @@ def create_storage_backend(
         >>> 
         >>> # 创建会话存储
         >>> session_store = create_storage_backend(collection_name="sessions")
+        >>> 
+        >>> # 创建进程内 NumPy 存储（半精度向量）
+        >>> numpy_store = create_storage_backend("numpy", dtype="float16")
     """
     # 转换字符串类型为枚举
     if isinstance(storage_type, str):
         storage_type_map = {
             "chroma": StorageType.CHROMA,
             "chromadb": StorageType.CHROMA,
+            "numpy": StorageType.NUMPY,
         }
         storage_type_enum = storage_type_map.get(storage_type.lower())
         if storage_type_enum is None:
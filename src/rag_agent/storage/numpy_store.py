@@ -0,0 +1,911 @@
+#!/usr/bin/env python3
+"""
+NumPy 进程内向量存储实现
+
+面向每个用户几百到几十万条向量的记忆和会话数据，不经过 ChromaDB 的 SQLite 和 HNSW：
+- 向量按行归一化后追加写入内存映射的 float32（可选 float16）矩阵文件
+- 元数据按列保存在 JSON 快照中，写入和删除只追加到日志文件，日志超过快照大小时合并为新快照；
+  过滤条件在 NumPy 列上向量化求值，写入时增量扩展已转换的列
+- 相似性搜索为精确的暴力搜索，一次矩阵-向量乘积加 argpartition 取前 k 个
+- 删除只做标记，失效行超过一半时整体重写压缩
+
+元数据过滤支持 ChromaDB 的 where 语法子集：
+键值相等、$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin/$contains，以及 $and/$or 组合
+"""
+
+import os
+import json
+import operator
+import threading
+from datetime import datetime
+from numbers import Number
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Union, Tuple, Iterable
+
+import numpy as np
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_core.embeddings import Embeddings
+
+from .base import BaseStore, StorageDocument, SearchResult, MemoryRecord
+from .session_log import SessionLog
+try:
+    from ..core.embedding_provider import get_embedding_model
+except ImportError:
+    get_embedding_model = None
+from ..core.config import get_project_root
+
+# 向量矩阵、元数据快照和追加日志文件名
+VECTORS_FILE = "vectors.bin"
+TABLE_FILE = "table.json"
+TABLE_LOG_FILE = "table.log.jsonl"
+
+# 日志超过该大小且超过快照大小时合并为新快照
+_CHECKPOINT_MIN_LOG_BYTES = 1024 * 1024
+
+# 半精度矩阵搜索时每次转换为 float32 的行数
+_SEARCH_BLOCK_ROWS = 65536
+
+# 失效行数达到该值且超过总行数一半时自动压缩
+_COMPACT_MIN_DEAD_ROWS = 64
+
+_COMPARISONS = {
+    '$eq': operator.eq,
+    '$ne': operator.ne,
+    '$gt': operator.gt,
+    '$gte': operator.ge,
+    '$lt': operator.lt,
+    '$lte': operator.le,
+}
+
+
+class VectorTable:
+    """
+    单个集合的向量表
+    
+    职责：
+    - 以内存映射矩阵保存归一化向量，行号即插入顺序
+    - 以列式结构保存 ID、内容和元数据
+    - 在列上求值元数据过滤条件
+    - 执行精确的余弦相似度搜索
+    """
+    
+    def __init__(self, table_dir: Union[str, Path], dtype: str = "float32"):
+        """初始化向量表，目录中已有数据时直接加载
+        
+        Args:
+            table_dir: 数据目录
+            dtype: 向量存储精度，float32 或 float16
+        """
+        self.table_dir = Path(table_dir)
+        self.table_dir.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.dtype(np.float32), np.dtype(np.float16)):
+            raise ValueError(f"不支持的向量精度: {dtype}")
+        
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.columns: Dict[str, List[Any]] = {}  # 元数据列，缺失值为 None
+        self.live = np.zeros(0, dtype=bool)  # 行是否有效（未被删除或覆盖）
+        self._row_by_id: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._typed_columns: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # 快照代数，日志中只有与当前快照同代的记录有效
+        self._generation = 0
+        self._snapshot_bytes = 0
+        self._log_bytes = 0
+        self._lock = threading.RLock()
+        self._load()
+    
+    @property
+    def vectors_path(self) -> Path:
+        return self.table_dir / VECTORS_FILE
+    
+    @property
+    def table_path(self) -> Path:
+        return self.table_dir / TABLE_FILE
+    
+    @property
+    def log_path(self) -> Path:
+        return self.table_dir / TABLE_LOG_FILE
+    
+    def _load(self):
+        """加载元数据快照、重放追加日志并映射向量矩阵"""
+        if not self.table_path.exists():
+            return
+        data = json.loads(self.table_path.read_text(encoding='utf-8'))
+        if data.get("dtype", self.dtype.name) != self.dtype.name:
+            raise ValueError(f"向量表精度为 {data['dtype']}，与请求的 {self.dtype.name} 不一致")
+        self.dim = data.get("dim")
+        self.ids = data["ids"]
+        self.documents = data["documents"]
+        self.columns = data["columns"]
+        self.live = np.asarray(data["live"], dtype=bool)
+        self._generation = data.get("generation", 0)
+        self._snapshot_bytes = self.table_path.stat().st_size
+        self._row_by_id = {doc_id: row for row, doc_id in enumerate(self.ids) if self.live[row]}
+        
+        if self.log_path.exists():
+            with open(self.log_path, encoding='utf-8') as log:
+                for line in log:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 写入中断时可能留下不完整的最后一行
+                        break
+                    if entry.get("generation") != self._generation:
+                        continue
+                    if entry["op"] == "add":
+                        self.dim = entry["dim"]
+                        self._apply_add(entry["ids"], entry["documents"], entry["metadatas"])
+                    elif entry["op"] == "delete":
+                        self._apply_delete(entry["ids"])
+            self._log_bytes = self.log_path.stat().st_size
+        self._remap()
+    
+    def _remap(self):
+        """按当前行数重新映射向量文件（文件尾部未提交的行会被忽略）"""
+        self._matrix = None
+        if self.ids and self.dim:
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode='r', shape=(len(self.ids), self.dim))
+    
+    def _save_table(self):
+        """原子地写入新一代元数据快照并清空追加日志"""
+        self._generation += 1
+        data = {
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "generation": self._generation,
+            "ids": self.ids,
+            "documents": self.documents,
+            "live": self.live.tolist(),
+            "columns": self.columns,
+        }
+        temp_path = self.table_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        os.replace(temp_path, self.table_path)
+        # 快照替换后旧日志的代数已失效，中断在这里也不会被重放
+        with open(self.log_path, 'w', encoding='utf-8'):
+            pass
+        self._snapshot_bytes = self.table_path.stat().st_size
+        self._log_bytes = 0
+    
+    def _append_log(self, entry: Dict[str, Any]):
+        """追加一条日志，日志超过快照大小时合并为新快照"""
+        if not self.table_path.exists():
+            self._save_table()
+            return
+        line = json.dumps({**entry, "generation": self._generation}, ensure_ascii=False) + "\n"
+        with open(self.log_path, 'a', encoding='utf-8') as log:
+            log.write(line)
+        self._log_bytes += len(line.encode('utf-8'))
+        if self._log_bytes > max(self._snapshot_bytes, _CHECKPOINT_MIN_LOG_BYTES):
+            self._save_table()
+    
+    def _normalize(self, embeddings: Iterable[List[float]]) -> np.ndarray:
+        """把向量转换为按行归一化的存储精度矩阵"""
+        matrix = np.asarray(list(embeddings), dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError("向量必须是二维矩阵")
+        if self.dim is not None and matrix.shape[1] != self.dim:
+            raise ValueError(f"向量维度 {matrix.shape[1]} 与表的维度 {self.dim} 不一致")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(self.dtype)
+    
+    def add(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """写入多行，已存在的 ID 会被新行覆盖
+        
+        向量先追加到矩阵文件尾部，再追加元数据日志；
+        写入中断时日志仍指向旧的行数，多出的向量在下次写入时被截断
+        """
+        if not ids:
+            return
+        with self._lock:
+            matrix = self._normalize(embeddings)
+            self.dim = matrix.shape[1]
+            row_bytes = self.dim * self.dtype.itemsize
+            
+            mode = 'r+b' if self.vectors_path.exists() else 'wb'
+            with open(self.vectors_path, mode) as f:
+                f.seek(len(self.ids) * row_bytes)
+                f.truncate()
+                f.write(matrix.tobytes())
+            
+            self._apply_add(ids, documents, metadatas)
+            self._append_log({
+                "op": "add",
+                "dim": self.dim,
+                "ids": ids,
+                "documents": documents,
+                "metadatas": metadatas,
+            })
+            self._remap()
+    
+    def _apply_add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """在内存中追加行并更新 ID 索引和已转换的列"""
+        start = len(self.ids)
+        live = np.ones(start + len(ids), dtype=bool)
+        live[:start] = self.live
+        for offset, doc_id in enumerate(ids):
+            previous = self._row_by_id.get(doc_id)
+            if previous is not None:
+                live[previous] = False
+            self._row_by_id[doc_id] = start + offset
+        # 同一批次内重复的 ID 只保留最后一行
+        for offset, doc_id in enumerate(ids):
+            if self._row_by_id[doc_id] != start + offset:
+                live[start + offset] = False
+        self.live = live
+        
+        self.ids.extend(ids)
+        self.documents.extend(documents)
+        for key in {key for metadata in metadatas for key in metadata}:
+            self.columns.setdefault(key, [None] * start)
+        for key, column in self.columns.items():
+            column.extend(metadata.get(key) for metadata in metadatas)
+        
+        for key in list(self._typed_columns):
+            self._extend_typed_column(key, [metadata.get(key) for metadata in metadatas])
+    
+    def delete(self, ids: List[str]) -> int:
+        """标记删除多行，失效行过多时压缩
+        
+        Returns:
+            删除的行数
+        """
+        with self._lock:
+            ids = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in self._row_by_id]
+            if not ids:
+                return 0
+            self._apply_delete(ids)
+            dead = len(self.ids) - int(self.live.sum())
+            if dead >= _COMPACT_MIN_DEAD_ROWS and dead * 2 > len(self.ids):
+                self.compact()
+            else:
+                self._append_log({"op": "delete", "ids": ids})
+            return len(ids)
+    
+    def _apply_delete(self, ids: List[str]):
+        rows = [self._row_by_id.pop(doc_id) for doc_id in ids if doc_id in self._row_by_id]
+        self.live[rows] = False
+    
+    def compact(self):
+        """重写向量文件和旁路文件，只保留有效行"""
+        with self._lock:
+            rows = np.flatnonzero(self.live)
+            if self._matrix is not None:
+                temp_path = self.vectors_path.with_suffix(".tmp")
+                with open(temp_path, 'wb') as f:
+                    f.write(np.ascontiguousarray(self._matrix[rows]).tobytes())
+                self._matrix = None
+                os.replace(temp_path, self.vectors_path)
+            self.ids = [self.ids[row] for row in rows]
+            self.documents = [self.documents[row] for row in rows]
+            self.columns = {key: [column[row] for row in rows] for key, column in self.columns.items()}
+            self.live = np.ones(len(rows), dtype=bool)
+            self._row_by_id = {doc_id: row for row, doc_id in enumerate(self.ids)}
+            self._typed_columns = {
+                key: (values[rows], present[rows]) for key, (values, present) in self._typed_columns.items()
+            }
+            self._save_table()
+            self._remap()
+    
+    def clear(self):
+        """删除全部数据"""
+        with self._lock:
+            self._matrix = None
+            for path in (self.vectors_path, self.table_path, self.log_path):
+                if path.exists():
+                    path.unlink()
+            self.dim = None
+            self.ids, self.documents, self.columns = [], [], {}
+            self.live = np.zeros(0, dtype=bool)
+            self._row_by_id = {}
+            self._typed_columns.clear()
+    
+    def count(self) -> int:
+        """有效行数"""
+        return int(self.live.sum())
+    
+    def row_of(self, doc_id: str) -> Optional[int]:
+        """ID 对应的有效行号"""
+        return self._row_by_id.get(doc_id)
+    
+    def metadata(self, row: int) -> Dict[str, Any]:
+        """读取一行的元数据（不含缺失值）"""
+        return {key: column[row] for key, column in self.columns.items() if column[row] is not None}
+    
+    def vector(self, row: int) -> List[float]:
+        """读取一行的（归一化）向量"""
+        return self._matrix[row].astype(np.float32).tolist()
+    
+    def _typed_column(self, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        """把元数据列转换为 NumPy 数组，结果缓存并在写入时增量扩展
+        
+        Returns:
+            (值数组, 是否存在的掩码)。数值列为 float64，字符串列为定长 Unicode，
+            类型混杂的列为 object
+        """
+        if key not in self._typed_columns:
+            self._typed_columns[key] = self._to_typed(self.columns.get(key, [None] * len(self.ids)))
+        return self._typed_columns[key]
+    
+    def _extend_typed_column(self, key: str, raw: List[Any]):
+        """把新写入的值追加到已转换的列，类型不再一致时丢弃缓存，下次使用时重新转换"""
+        values, present = self._typed_columns[key]
+        new_values, new_present = self._to_typed(raw)
+        if not new_present.any():
+            # 新行都缺少该字段，按原列类型填充
+            fill = {'f': np.nan, 'U': ""}.get(values.dtype.kind)
+            new_values = np.full(len(raw), fill, dtype=values.dtype)
+        elif present.any() and new_values.dtype.kind != values.dtype.kind:
+            del self._typed_columns[key]
+            return
+        elif not present.any() and new_values.dtype.kind != values.dtype.kind:
+            values = np.full(len(values), {'f': np.nan, 'U': ""}.get(new_values.dtype.kind), dtype=new_values.dtype)
+        self._typed_columns[key] = (np.concatenate([values, new_values]), np.concatenate([present, new_present]))
+    
+    @staticmethod
+    def _to_typed(raw: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+        present = np.fromiter((value is not None for value in raw), dtype=bool, count=len(raw))
+        values_present = [value for value in raw if value is not None]
+        if all(isinstance(value, Number) for value in values_present):
+            values = np.array([np.nan if value is None else float(value) for value in raw], dtype=np.float64)
+        elif all(isinstance(value, str) for value in values_present):
+            values = np.array(["" if value is None else value for value in raw], dtype=str)
+        else:
+            values = np.empty(len(raw), dtype=object)
+            values[:] = raw
+        return values, present
+    
+    def _compare(self, key: str, op: str, expected: Any) -> np.ndarray:
+        """在列上求值单个比较条件，缺少该字段的行不匹配"""
+        values, present = self._typed_column(key)
+        if op in ('$in', '$nin'):
+            matched = np.zeros(len(values), dtype=bool)
+            for item in expected:
+                matched |= self._compare(key, '$eq', item)
+            return matched if op == '$in' else present & ~matched
+        if op == '$contains':
+            if values.dtype.kind == 'U':
+                return present & (np.char.find(values, str(expected)) >= 0)
+            return present & np.fromiter(
+                (isinstance(value, str) and str(expected) in value for value in values), dtype=bool, count=len(values)
+            )
+        if op not in _COMPARISONS:
+            raise ValueError(f"不支持的过滤运算符: {op}")
+        
+        compare = _COMPARISONS[op]
+        if values.dtype.kind == 'f':
+            if not isinstance(expected, Number):
+                return np.zeros(len(values), dtype=bool) if op != '$ne' else present.copy()
+            return present & compare(values, float(expected))
+        if values.dtype.kind == 'U':
+            if not isinstance(expected, str):
+                return np.zeros(len(values), dtype=bool) if op != '$ne' else present.copy()
+            return present & compare(values, expected)
+        
+        def safe(value):
+            try:
+                return bool(compare(value, expected))
+            except TypeError:
+                return op == '$ne'
+        return present & np.fromiter((safe(value) for value in values), dtype=bool, count=len(values))
+    
+    def evaluate(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """求值过滤条件
+        
+        Args:
+            where: ChromaDB 风格的过滤条件，顶层多个键按 AND 组合
+        
+        Returns:
+            与行一一对应的布尔掩码（包含已删除的行，需再与 live 相与）
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in (where or {}).items():
+            if key == '$and':
+                for sub in condition:
+                    mask &= self.evaluate(sub)
+            elif key == '$or':
+                matched = np.zeros(len(self.ids), dtype=bool)
+                for sub in condition:
+                    matched |= self.evaluate(sub)
+                mask &= matched
+            elif isinstance(condition, dict):
+                for op, expected in condition.items():
+                    mask &= self._compare(key, op, expected)
+            else:
+                mask &= self._compare(key, '$eq', condition)
+        return mask
+    
+    def select(self, where: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> List[int]:
+        """按插入顺序返回满足过滤条件的有效行号"""
+        with self._lock:
+            rows = np.flatnonzero(self.live & self.evaluate(where))
+            return rows[:limit].tolist() if limit is not None else rows.tolist()
+    
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[int, float]]:
+        """精确的余弦相似度搜索
+        
+        过滤后的候选不足总行数四分之一时只计算候选行，否则对整个矩阵做一次乘积后屏蔽
+        
+        Args:
+            query_embedding: 查询向量
+            k: 返回数量
+            where: 元数据过滤条件
+        
+        Returns:
+            按相似度降序排列的 (行号, 余弦相似度) 列表
+        """
+        with self._lock:
+            if self._matrix is None or k <= 0:
+                return []
+            mask = self.live & self.evaluate(where)
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return []
+            
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query = query / norm
+            
+            if len(candidates) * 4 < len(self.ids):
+                scores = self._scores(self._matrix[candidates], query)
+            else:
+                scores = self._scores(self._matrix, query)[candidates]
+            
+            k = min(k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(int(candidates[index]), float(scores[index])) for index in top]
+    
+    def _scores(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """矩阵与查询向量的内积，半精度矩阵分块转换为 float32 计算"""
+        if matrix.dtype == np.float32:
+            return np.asarray(matrix @ query)
+        return np.concatenate([
+            matrix[start:start + _SEARCH_BLOCK_ROWS].astype(np.float32) @ query
+            for start in range(0, len(matrix), _SEARCH_BLOCK_ROWS)
+        ]) if len(matrix) else np.zeros(0, dtype=np.float32)
+
+
+class NumpyStore(BaseStore):
+    """
+    基于 NumPy 的进程内存储实现
+    
+    与 ChromaStore 的接口和元数据格式一致，可通过 create_storage_backend("numpy") 替换。
+    每个集合保存在存储目录下的同名子目录中
+    """
+    
+    def __init__(
+        self,
+        storage_dir: Optional[Union[str, Path]] = None,
+        collection_name: str = "synapseagent_storage",
+        embedding_model: Optional[Embeddings] = None,
+        dtype: str = "float32"
+    ):
+        """
+        初始化 NumPy 存储
+        
+        Args:
+            storage_dir: 存储目录路径
+            collection_name: 集合名称
+            embedding_model: 嵌入模型
+            dtype: 向量存储精度，float32 或 float16（内存减半，相似度误差约 1e-3）
+        """
+        if storage_dir is None:
+            project_root = get_project_root()
+            storage_dir = project_root / "data" / "numpy_storage"
+        
+        self.storage_dir = Path(storage_dir)
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 初始化嵌入模型
+        if embedding_model:
+            self.embedding_model = embedding_model
+        elif get_embedding_model:
+            self.embedding_model = get_embedding_model()
+        else:
+            raise ValueError("No embedding model provided and get_embedding_model is not available")
+        
+        # 初始化集合
+        self.collection_name = collection_name
+        self.dtype = dtype
+        self.collection = VectorTable(self.storage_dir / collection_name, dtype)
+        
+        # 专用集合
+        self.session_collection = VectorTable(self.storage_dir / f"{collection_name}_sessions", dtype)
+        self.memory_collection = VectorTable(self.storage_dir / f"{collection_name}_memories", dtype)
+        
+        # 会话消息追加日志，会话集合只保存按需建立的向量索引
+        self.session_log = SessionLog(self.storage_dir / f"{collection_name}_session_log.sqlite3")
+    
+    def _embed_text(self, text: str) -> List[float]:
+        """生成文本嵌入"""
+        return self._embed_texts([text])[0]
+    
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """批量生成文本嵌入"""
+        if not texts:
+            return []
+        return self.embedding_model.embed_documents(texts)
+    
+    def _dict_to_message(self, data: Dict[str, Any]) -> BaseMessage:
+        """将字典转换为消息"""
+        message_type = data.get('type', 'HumanMessage')
+        content = data.get('content', '')
+        additional_kwargs = data.get('additional_kwargs', {})
+        
+        if message_type == 'AIMessage':
+            return AIMessage(content=content, additional_kwargs=additional_kwargs)
+        elif message_type == 'ToolMessage':
+            return ToolMessage(content=content, additional_kwargs=additional_kwargs)
+        return HumanMessage(content=content, additional_kwargs=additional_kwargs)
+    
+    def _to_document(self, table: VectorTable, row: int, parse: bool = False) -> StorageDocument:
+        """把一行转换为文档对象
+        
+        Args:
+            table: 向量表
+            row: 行号
+            parse: 是否把记忆元数据中的 tags 和 context 解析回列表和字典
+        """
+        metadata = table.metadata(row)
+        timestamp_str = metadata.pop('timestamp', datetime.now().isoformat())
+        if parse:
+            metadata['tags'] = metadata['tags'].split(',') if metadata.get('tags') else []
+            try:
+                metadata['context'] = json.loads(metadata['context']) if metadata.get('context') else {}
+            except (json.JSONDecodeError, TypeError):
+                metadata['context'] = {}
+        return StorageDocument(
+            id=table.ids[row],
+            content=table.documents[row],
+            metadata=metadata,
+            timestamp=datetime.fromisoformat(timestamp_str)
+        )
+    
+    def _search(
+        self,
+        table: VectorTable,
+        query: str,
+        k: int,
+        where: Optional[Dict[str, Any]]
+    ) -> List[SearchResult]:
+        """在向量表中搜索并构造结果，距离为余弦距离"""
+        hits = table.search(self._embed_text(query), k, where)
+        return [
+            SearchResult(document=self._to_document(table, row, parse=True), score=score, distance=1.0 - score)
+            for row, score in hits
+        ]
+    
+    def store_document(self, document: StorageDocument) -> bool:
+        """
+        存储文档
+        """
+        return self.store_documents([document])
+    
+    def store_documents(self, documents: List[StorageDocument]) -> bool:
+        """
+        批量存储文档
+        """
+        try:
+            pending = [doc for doc in documents if doc.embedding is None]
+            for doc, embedding in zip(pending, self._embed_texts([doc.content for doc in pending])):
+                doc.embedding = embedding
+            
+            self.collection.add(
+                ids=[doc.id for doc in documents],
+                documents=[doc.content for doc in documents],
+                embeddings=[doc.embedding for doc in documents],
+                metadatas=[{**doc.metadata, 'timestamp': doc.timestamp.isoformat()} for doc in documents]
+            )
+            return True
+        
+        except Exception as e:
+            print(f"批量存储文档时出错: {e}")
+            return False
+    
+    def get_document(self, doc_id: str) -> Optional[StorageDocument]:
+        """
+        根据 ID 获取文档
+        """
+        row = self.collection.row_of(doc_id)
+        if row is None:
+            return None
+        document = self._to_document(self.collection, row)
+        document.embedding = self.collection.vector(row)
+        return document
+    
+    def delete_document(self, doc_id: str) -> bool:
+        """
+        删除文档
+        """
+        try:
+            self.collection.delete([doc_id])
+            return True
+        except Exception as e:
+            print(f"删除文档时出错: {e}")
+            return False
+    
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 10,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[SearchResult]:
+        """
+        向量相似性搜索
+        """
+        try:
+            return self._search(self.collection, query, k, metadata_filter)
+        except Exception as e:
+            print(f"相似性搜索时出错: {e}")
+            return []
+    
+    def metadata_search(
+        self,
+        metadata_filter: Dict[str, Any],
+        limit: int = 10
+    ) -> List[StorageDocument]:
+        """
+        基于元数据的精确搜索
+        """
+        try:
+            return [
+                self._to_document(self.collection, row)
+                for row in self.collection.select(metadata_filter, limit)
+            ]
+        except Exception as e:
+            print(f"元数据搜索时出错: {e}")
+            return []
+    
+    def hybrid_search(
+        self,
+        query: str,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        k: int = 10,
+        similarity_threshold: float = 0.0
+    ) -> List[SearchResult]:
+        """
+        混合搜索（语义相似性 + 元数据过滤）
+        """
+        results = self.similarity_search(query, k, metadata_filter)
+        return [result for result in results if result.score >= similarity_threshold]
+    
+    def store_session_message(
+        self,
+        session_id: str,
+        message: BaseMessage,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """
+        存储会话消息
+        
+        追加到会话日志，不调用嵌入接口；需要语义搜索时由 index_session_messages 按需嵌入
+        """
+        try:
+            self.session_log.append(session_id, {
+                'type': message.__class__.__name__,
+                'content': message.content,
+                'additional_kwargs': getattr(message, 'additional_kwargs', {})
+            }, metadata)
+            return True
+        
+        except Exception as e:
+            print(f"存储会话消息时出错: {e}")
+            return False
+    
+    def get_session_history(
+        self,
+        session_id: str,
+        limit: Optional[int] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> List[BaseMessage]:
+        """
+        获取会话历史，按写入顺序返回
+        """
+        try:
+            return [
+                self._dict_to_message(entry.message)
+                for entry in self.session_log.read(session_id, start_time=start_time, end_time=end_time, limit=limit)
+            ]
+        
+        except Exception as e:
+            print(f"获取会话历史时出错: {e}")
+            return []
+    
+    def index_session_messages(self, session_id: str) -> int:
+        """
+        为会话中尚未嵌入的消息建立向量索引
+        
+        Returns:
+            本次建立索引的消息数
+        """
+        entries = self.session_log.unembedded(session_id)
+        if not entries:
+            return 0
+        
+        self.session_collection.add(
+            ids=[f"{session_id}_{entry.seq}" for entry in entries],
+            documents=[json.dumps(entry.message, ensure_ascii=False) for entry in entries],
+            embeddings=self._embed_texts([str(entry.message.get('content', '')) for entry in entries]),
+            metadatas=[
+                {
+                    **entry.metadata,
+                    'session_id': session_id,
+                    'seq': entry.seq,
+                    'message_type': entry.message.get('type', 'HumanMessage'),
+                    'timestamp': entry.timestamp
+                }
+                for entry in entries
+            ]
+        )
+        self.session_log.mark_embedded(session_id, [entry.seq for entry in entries])
+        return len(entries)
+    
+    def search_session_messages(self, session_id: str, query: str, k: int = 5) -> List[SearchResult]:
+        """
+        在一个会话内按语义搜索消息
+        
+        首次搜索时为该会话建立向量索引，之后只嵌入新增的消息
+        """
+        try:
+            self.index_session_messages(session_id)
+            results = self._search(self.session_collection, query, k, {'session_id': session_id})
+            for result in results:
+                result.document.content = json.loads(result.document.content).get('content', '')
+            return results
+        
+        except Exception as e:
+            print(f"搜索会话消息时出错: {e}")
+            return []
+    
+    def store_memory(
+        self,
+        memory_key: str,
+        content: str,
+        context: Optional[Dict[str, Any]] = None,
+        tags: Optional[List[str]] = None,
+        importance: int = 5,
+        user_id: Optional[str] = None,
+        event_type: Optional[str] = None
+    ) -> bool:
+        """
+        存储长期记忆
+        """
+        return self.store_memories([MemoryRecord(
+            memory_key=memory_key,
+            content=content,
+            context=context,
+            tags=tags,
+            importance=importance,
+            user_id=user_id,
+            event_type=event_type
+        )])
+    
+    def store_memories(self, memories: List[MemoryRecord]) -> bool:
+        """
+        批量存储长期记忆
+        
+        所有记忆内容一次性交给嵌入模型，一次追加写入向量表
+        """
+        if not memories:
+            return True
+        
+        try:
+            unique_memories = list({memory.memory_key: memory for memory in memories}.values())
+            self.memory_collection.add(
+                ids=[memory.memory_key for memory in unique_memories],
+                documents=[memory.content for memory in unique_memories],
+                embeddings=self._embed_texts([memory.content for memory in unique_memories]),
+                metadatas=[self._build_memory_metadata(memory) for memory in unique_memories]
+            )
+            return True
+        
+        except Exception as e:
+            print(f"批量存储记忆时出错: {e}")
+            return False
+    
+    def _build_memory_metadata(self, memory: MemoryRecord) -> Dict[str, Any]:
+        """构建记忆元数据（与 ChromaStore 的格式一致）"""
+        metadata = {
+            'memory_key': memory.memory_key,
+            'importance': memory.importance,
+            'timestamp': datetime.now().isoformat(),
+            'tags': ','.join(memory.tags) if memory.tags else '',
+            'context': json.dumps(memory.context or {})
+        }
+        
+        if memory.user_id:
+            metadata['user_id'] = memory.user_id
+        if memory.event_type:
+            metadata['event_type'] = memory.event_type
+        
+        return metadata
+    
+    def search_memories(
+        self,
+        query: str,
+        user_id: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        importance_threshold: Optional[int] = None,
+        limit: int = 10
+    ) -> List[SearchResult]:
+        """
+        搜索长期记忆
+        """
+        try:
+            where_filter: Dict[str, Any] = {}
+            if user_id:
+                where_filter['user_id'] = user_id
+            if importance_threshold:
+                where_filter['importance'] = {'$gte': importance_threshold}
+            if tags:
+                where_filter['$or'] = [{'tags': {'$contains': tag}} for tag in tags]
+            
+            return self._search(self.memory_collection, query, limit, where_filter or None)
+        
+        except Exception as e:
+            print(f"搜索记忆时出错: {e}")
+            return []
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取存储统计信息
+        """
+        return {
+            'total_documents': self.collection.count(),
+            'session_messages': self.session_log.count(),
+            'indexed_session_messages': self.session_collection.count(),
+            'stored_memories': self.memory_collection.count(),
+            'storage_directory': str(self.storage_dir),
+            'dtype': self.dtype,
+            'collections': {
+                'main': self.collection_name,
+                'sessions': f"{self.collection_name}_sessions",
+                'memories': f"{self.collection_name}_memories"
+            }
+        }
+    
+    def clear_collection(self, collection_name: Optional[str] = None) -> bool:
+        """
+        清空集合
+        """
+        try:
+            tables = {
+                self.collection_name: self.collection,
+                f"{self.collection_name}_sessions": self.session_collection,
+                f"{self.collection_name}_memories": self.memory_collection,
+            }
+            if collection_name:
+                tables[collection_name].clear()
+            else:
+                for table in tables.values():
+                    table.clear()
+                self.session_log.clear()
+            return True
+        
+        except Exception as e:
+            print(f"清空集合时出错: {e}")
+            return False
+    
+    def close(self):
+        """
+        关闭会话日志
+        """
+        self.session_log.close()
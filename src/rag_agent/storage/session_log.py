@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+会话消息日志
+
+会话历史只按会话 ID 顺序读取，不需要向量检索，因此单独以追加日志保存：
+- SQLite（WAL 模式）存储，主键为 (会话 ID, 序号)，写入不调用嵌入接口
+- 序号在会话内从 1 递增，按序号或时间的范围读取走主键和索引，复杂度 O(log n)
+- 支持按序号分页（after_seq / before_seq）和读取最近 N 条
+- 记录每条消息是否已建立向量索引，需要语义搜索时再按会话批量嵌入
+"""
+
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+
+@dataclass
+class SessionEntry:
+    """
+    会话日志条目
+    """
+    session_id: str  # 会话 ID
+    seq: int  # 会话内序号，从 1 开始
+    message: Dict[str, Any]  # 消息字典（type、content、additional_kwargs）
+    metadata: Dict[str, Any]  # 额外的元数据
+    timestamp: str  # 写入时间（ISO 格式）
+
+
+class SessionLog:
+    """会话消息追加日志
+    
+    职责：
+    - 追加消息并分配会话内序号
+    - 按序号或时间范围分页读取
+    - 跟踪尚未嵌入的消息，供按需建立向量索引
+    """
+    
+    def __init__(self, db_path: Union[str, Path]):
+        """初始化会话日志
+        
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                embedded INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS session_messages_time ON session_messages (session_id, timestamp)"
+        )
+        # 部分索引只包含未嵌入的消息，已全部嵌入的会话不占用索引空间
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS session_messages_unembedded "
+            "ON session_messages (session_id, seq) WHERE embedded = 0"
+        )
+    
+    def append(
+        self,
+        session_id: str,
+        message: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[datetime] = None
+    ) -> SessionEntry:
+        """追加一条消息
+        
+        Args:
+            session_id: 会话 ID
+            message: 消息字典
+            metadata: 额外的元数据
+            timestamp: 写入时间，默认当前时间
+        
+        Returns:
+            写入的日志条目
+        """
+        entry = SessionEntry(
+            session_id=session_id,
+            seq=0,
+            message=message,
+            metadata=metadata or {},
+            timestamp=(timestamp or datetime.now()).isoformat()
+        )
+        
+        with self._lock:
+            # IMMEDIATE 事务在读取最大序号前取得写锁，多进程写同一会话时序号不冲突
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                entry.seq = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) + 1 FROM session_messages WHERE session_id = ?",
+                    (session_id,)
+                ).fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO session_messages (session_id, seq, message, metadata, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        session_id,
+                        entry.seq,
+                        json.dumps(message, ensure_ascii=False),
+                        json.dumps(entry.metadata, ensure_ascii=False),
+                        entry.timestamp
+                    )
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return entry
+    
+    def read(
+        self,
+        session_id: str,
+        after_seq: Optional[int] = None,
+        before_seq: Optional[int] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = False
+    ) -> List[SessionEntry]:
+        """按范围读取消息
+        
+        Args:
+            session_id: 会话 ID
+            after_seq: 只返回序号大于该值的消息（向后翻页）
+            before_seq: 只返回序号小于该值的消息（向前翻页）
+            start_time: 开始时间
+            end_time: 结束时间
+            limit: 返回消息数量限制
+            newest_first: 是否从最新的消息开始读取
+        
+        Returns:
+            日志条目列表，按序号排序（newest_first 时倒序）
+        """
+        conditions = ["session_id = ?"]
+        params: List[Any] = [session_id]
+        if after_seq is not None:
+            conditions.append("seq > ?")
+            params.append(after_seq)
+        if before_seq is not None:
+            conditions.append("seq < ?")
+            params.append(before_seq)
+        if start_time is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start_time.isoformat())
+        if end_time is not None:
+            conditions.append("timestamp <= ?")
+            params.append(end_time.isoformat())
+        
+        sql = (
+            "SELECT session_id, seq, message, metadata, timestamp FROM session_messages "
+            f"WHERE {' AND '.join(conditions)} ORDER BY seq {'DESC' if newest_first else 'ASC'}"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_entry(row) for row in rows]
+    
+    def latest(self, session_id: str, limit: int) -> List[SessionEntry]:
+        """读取最近的 limit 条消息，按序号升序返回"""
+        return list(reversed(self.read(session_id, limit=limit, newest_first=True)))
+    
+    def unembedded(self, session_id: str, limit: Optional[int] = None) -> List[SessionEntry]:
+        """读取会话中尚未建立向量索引的消息"""
+        sql = (
+            "SELECT session_id, seq, message, metadata, timestamp FROM session_messages "
+            "WHERE session_id = ? AND embedded = 0 ORDER BY seq"
+        )
+        params: List[Any] = [session_id]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_entry(row) for row in rows]
+    
+    def mark_embedded(self, session_id: str, seqs: List[int]):
+        """把消息标记为已建立向量索引"""
+        if not seqs:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE session_messages SET embedded = 1 WHERE session_id = ? AND seq = ?",
+                [(session_id, seq) for seq in seqs]
+            )
+            self._conn.execute("COMMIT")
+    
+    def count(self, session_id: Optional[str] = None) -> int:
+        """统计消息数量"""
+        with self._lock:
+            if session_id is None:
+                return self._conn.execute("SELECT COUNT(*) FROM session_messages").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM session_messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+    
+    def delete_session(self, session_id: str):
+        """删除一个会话的全部消息"""
+        with self._lock:
+            self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+    
+    def clear(self):
+        """删除全部消息"""
+        with self._lock:
+            self._conn.execute("DELETE FROM session_messages")
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+    
+    @staticmethod
+    def _to_entry(row) -> SessionEntry:
+        session_id, seq, message, metadata, timestamp = row
+        return SessionEntry(
+            session_id=session_id,
+            seq=seq,
+            message=json.loads(message),
+            metadata=json.loads(metadata),
+            timestamp=timestamp
+        )
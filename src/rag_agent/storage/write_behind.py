@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+后写队列
+
+长期记忆的写入先进入队列立即返回，由后台线程合并后批量落库：
+- 每条写入先追加到磁盘溢写文件，进程崩溃后重启时重放，不会丢失
+- 每个队列实例使用独立的溢写文件并持有文件锁，多进程共用同一目录时互不覆盖；
+  启动时只接管锁已释放（所属进程已退出）的溢写文件
+- 同一集合中相同 ID 的写入只保留最后一条
+- 达到批大小或刷新间隔时，由写入函数一次性嵌入并按集合批量 upsert
+- 写入失败时保留在队列中，下个间隔重试；flush() 用于关闭时同步落库
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为单进程使用
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingWrite:
+    """
+    待写入的记录
+    
+    元数据在入队时生成，重放和重试时保持不变
+    """
+    collection: str  # 目标集合名称
+    id: str  # 记录 ID，同一集合中相同 ID 的写入会被合并
+    document: str  # 存储的文档内容
+    metadata: Dict[str, Any]  # 元数据
+    text: str  # 用于生成嵌入的文本
+
+
+class WriteBehindQueue:
+    """后写队列
+    
+    职责：
+    - 接收写入并追加到溢写文件
+    - 按 (集合, ID) 合并待写入记录
+    - 后台线程按批大小或刷新间隔调用写入函数
+    """
+    
+    def __init__(
+        self,
+        writer: Callable[[List[PendingWrite]], None],
+        spill_path: Path,
+        flush_interval_ms: float = 1000,
+        max_batch_size: int = 64
+    ):
+        """初始化后写队列
+        
+        Args:
+            writer: 写入函数，接收一批记录，失败时抛出异常
+            spill_path: 溢写文件基础路径，实际文件名追加进程号和实例标识；
+                启动时重放同名前缀下已无进程持有的溢写文件
+            flush_interval_ms: 刷新间隔（毫秒）
+            max_batch_size: 待写入记录数达到该值时立即刷新
+        """
+        self.writer = writer
+        base_path = Path(spill_path)
+        self.spill_path = base_path.with_name(
+            f"{base_path.stem}.{os.getpid()}-{uuid.uuid4().hex[:8]}{base_path.suffix}"
+        )
+        self.flush_interval = max(0.001, flush_interval_ms / 1000)
+        self.max_batch_size = max(1, max_batch_size)
+        
+        self._pending: Dict[Tuple[str, str], PendingWrite] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._stats = {'enqueued': 0, 'flushed': 0, 'flushes': 0, 'failures': 0, 'replayed': 0}
+        
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock_file = self._acquire_lock(self.spill_path)
+        self._replay(base_path)
+        # 接管的记录先写入本实例的溢写文件，再删除原文件
+        self._rewrite_spill_file()
+        for orphan_path, orphan_lock in self._orphans:
+            orphan_path.unlink(missing_ok=True)
+            self._release_lock(orphan_path, orphan_lock)
+        self._orphans = []
+        self._spill = open(self.spill_path, 'a', encoding='utf-8')
+        
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+    
+    @staticmethod
+    def _acquire_lock(spill_path: Path):
+        """对溢写文件对应的锁文件加排他锁，已被其他进程持有时返回 None"""
+        lock_file = open(spill_path.with_name(spill_path.name + ".lock"), 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+    
+    @staticmethod
+    def _release_lock(spill_path: Path, lock_file, remove: bool = True):
+        """释放锁，remove 时先删除锁文件"""
+        if remove:
+            spill_path.with_name(spill_path.name + ".lock").unlink(missing_ok=True)
+        lock_file.close()
+    
+    def _replay(self, base_path: Path):
+        """接管无进程持有的溢写文件，读取其中上次未落库的记录"""
+        self._orphans: List[Tuple[Path, Any]] = []
+        candidates = sorted(base_path.parent.glob(f"{base_path.stem}.*{base_path.suffix}"))
+        # 兼容旧版本按集合命名的溢写文件
+        candidates.insert(0, base_path)
+        
+        for orphan_path in candidates:
+            if orphan_path == self.spill_path or not orphan_path.exists():
+                continue
+            orphan_lock = self._acquire_lock(orphan_path)
+            if orphan_lock is None:
+                continue
+            try:
+                with open(orphan_path, encoding='utf-8') as spill:
+                    lines = spill.readlines()
+            except FileNotFoundError:
+                # 已被同时启动的其他进程接管
+                self._release_lock(orphan_path, orphan_lock)
+                continue
+            
+            for line in lines:
+                try:
+                    write = PendingWrite(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    # 崩溃时可能留下不完整的最后一行
+                    continue
+                self._pending[(write.collection, write.id)] = write
+            self._orphans.append((orphan_path, orphan_lock))
+        
+        self._stats['replayed'] = len(self._pending)
+        if self._pending:
+            logger.info(f"后写队列接管 {len(self._orphans)} 个溢写文件中的 {len(self._pending)} 条记录")
+    
+    def put(self, write: PendingWrite):
+        """写入一条记录，追加到溢写文件后立即返回"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("后写队列已关闭")
+            self._spill.write(json.dumps(asdict(write), ensure_ascii=False) + "\n")
+            self._spill.flush()
+            self._pending[(write.collection, write.id)] = write
+            self._stats['enqueued'] += 1
+            if len(self._pending) >= self.max_batch_size:
+                self._wakeup.notify()
+    
+    def pending(self, collection: Optional[str] = None) -> List[PendingWrite]:
+        """尚未落库的记录（按入队顺序），可按集合筛选"""
+        with self._lock:
+            return [
+                write for write in self._pending.values()
+                if collection is None or write.collection == collection
+            ]
+    
+    def _run(self):
+        """后台刷新循环"""
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                if len(self._pending) < self.max_batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+    
+    def flush(self) -> bool:
+        """把当前待写入的记录同步落库
+        
+        Returns:
+            是否全部写入成功，失败的记录保留在队列中等待重试
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.values())
+                self._pending.clear()
+            if not batch:
+                return True
+            
+            try:
+                self.writer(batch)
+            except Exception as e:
+                logger.warning(f"后写队列刷新失败，{len(batch)} 条记录将重试: {e}")
+                with self._lock:
+                    # 刷新期间入队的同 ID 记录更新，保留较新的一条
+                    for write in batch:
+                        self._pending.setdefault((write.collection, write.id), write)
+                    self._stats['failures'] += 1
+                return False
+            
+            with self._lock:
+                # 溢写文件只保留刷新期间新入队的记录
+                self._rewrite_spill()
+                self._stats['flushed'] += len(batch)
+                self._stats['flushes'] += 1
+            return True
+    
+    def _rewrite_spill(self):
+        """用当前待写入的记录原子替换溢写文件（调用方持有 _lock）"""
+        self._spill.close()
+        self._rewrite_spill_file()
+        self._spill = open(self.spill_path, 'a', encoding='utf-8')
+    
+    def _rewrite_spill_file(self):
+        temp_path = self.spill_path.with_suffix(self.spill_path.suffix + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as temp:
+            for write in self._pending.values():
+                temp.write(json.dumps(asdict(write), ensure_ascii=False) + "\n")
+        temp_path.replace(self.spill_path)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列统计信息"""
+        with self._lock:
+            return {**self._stats, 'pending': len(self._pending)}
+    
+    def close(self):
+        """停止后台线程并落库剩余记录，失败的记录留在溢写文件中，下次启动时重放"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join()
+        self.flush()
+        with self._lock:
+            self._spill.close()
+            if self._pending:
+                # 保留溢写文件，释放锁后由下次启动的实例接管
+                self._release_lock(self.spill_path, self._lock_file, remove=False)
+            else:
+                self.spill_path.unlink(missing_ok=True)
+                self._release_lock(self.spill_path, self._lock_file)
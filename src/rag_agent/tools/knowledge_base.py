@@ -6,12 +6,20 @@ RAG知识库检索工具
 现在使用模块化的检索管道架构
 """
 
+import logging
 from typing import Optional, Type
 
+from langchain_core.callbacks.manager import AsyncCallbackManagerForToolRun, adispatch_custom_event
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
 
-from ..retrieval.pipeline import RetrievalPipeline
+from ..retrieval.pipeline import RetrievalPipeline, RetrievalProgress
+from ..retrieval.context_packer import ContextPacker
+
+logger = logging.getLogger(__name__)
+
+# 检索阶段性结果的自定义回调事件名称
+RETRIEVAL_PROGRESS_EVENT = "retrieval_progress"
 
 
 class KnowledgeBaseSearchInput(BaseModel):
@@ -40,11 +48,15 @@ class KnowledgeBaseTool(BaseTool):
     # 检索管道
     retrieval_pipeline: Optional[RetrievalPipeline] = None
     
+    # 上下文打包器，按 token 预算压缩检索结果
+    context_packer: Optional[ContextPacker] = None
+    
     def __init__(self, **kwargs):
         """初始化知识库工具"""
         super().__init__(**kwargs)
         # 初始化检索管道
         self.retrieval_pipeline = RetrievalPipeline()
+        self.context_packer = ContextPacker.from_config(self.retrieval_pipeline.config)
     
     def _run(self, query: str) -> str:
         """执行知识库检索
@@ -63,39 +75,80 @@ class KnowledgeBaseTool(BaseTool):
                 return "未找到相关信息。建议尝试使用不同的关键词或更具体的问题。"
             
             # 格式化输出
-            return self._format_results(documents)
+            return self._format_results(documents, query)
         
         except Exception as e:
             return f"检索知识库时发生错误: {e}"
     
-    def _format_results(self, documents) -> str:
+    def _format_results(self, documents, query: str) -> str:
         """格式化检索结果
         
+        按 token 预算选出与查询最相关且不重复的句子，保留来源标注，
+        不再按固定字符数截断每个片段
+        
         Args:
             documents: 检索到的文档列表
+            query: 搜索查询
             
         Returns:
             格式化的结果字符串
         """
-        result_parts = []
-        result_parts.append(f"检索到 {len(documents)} 条相关信息：\n")
+        packed = self.context_packer.pack(query, documents)
+        if not packed.passages:
+            return "未找到相关信息。建议尝试使用不同的关键词或更具体的问题。"
         
-        for i, doc in enumerate(documents, 1):
-            content = doc.page_content.strip()
-            # 限制每个文档片段的长度
-            if len(content) > 500:
-                content = content[:500] + "..."
+        logger.debug(
+            f"上下文打包: {packed.selected_sentences}/{packed.candidate_sentences} 个句子，"
+            f"约 {packed.tokens}/{packed.budget} tokens"
+        )
+        return packed.format()
+    
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None
+    ) -> str:
+        """异步执行知识库检索
+        
+        使用检索管道的异步接口，检索期间不阻塞事件循环。
+        每个检索阶段完成时发出 retrieval_progress 自定义事件，
+        可以通过 astream_events 提前获取文档 ID 和分数
+        
+        Args:
+            query: 搜索查询
+            run_manager: 工具运行的回调管理器，由 LangChain 注入，进度事件挂在该运行下
             
-            result_parts.append(f"[信息片段 {i}]")
-            result_parts.append(content)
-            result_parts.append("")  # 空行分隔
+        Returns:
+            格式化的检索结果字符串
+        """
+        try:
+            documents = []
+            async for progress in self.retrieval_pipeline.astream(query):
+                documents = progress.documents
+                await self._dispatch_progress(query, progress, run_manager)
+            
+            if not documents:
+                return "未找到相关信息。建议尝试使用不同的关键词或更具体的问题。"
+            
+            return self._format_results(documents, query)
         
-        return "\n".join(result_parts)
+        except Exception as e:
+            return f"检索知识库时发生错误: {e}"
     
-    async def _arun(self, query: str) -> str:
-        """异步执行知识库检索"""
-        # 对于这个简单的实现，我们直接调用同步版本
-        return self._run(query)
+    async def _dispatch_progress(
+        self,
+        query: str,
+        progress: RetrievalProgress,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None
+    ):
+        """发出检索进度事件，不在可追踪的运行中调用时忽略"""
+        config = {"callbacks": run_manager.get_child()} if run_manager is not None else None
+        try:
+            await adispatch_custom_event(
+                RETRIEVAL_PROGRESS_EVENT, {"query": query, **progress.to_dict()}, config=config
+            )
+        except RuntimeError:
+            pass
     
     def get_pipeline_stats(self) -> dict:
         """获取检索管道统计信息
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+测试用的确定性嵌入模型
+
+按文本内容生成固定的随机向量，并记录每次调用的文本，供各存储和导入测试共用
+"""
+
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """按文本生成确定性随机向量的嵌入模型，记录每次调用"""
+    
+    def __init__(self, dim: int = 16, query_offset: float = 0.0):
+        """初始化嵌入模型
+        
+        Args:
+            dim: 向量维度
+            query_offset: 查询向量第一维的偏移量，非零时同一文本的查询向量与文档向量不同
+        """
+        self.dim = dim
+        self.query_offset = query_offset
+        self.calls: List[List[str]] = []  # 全部调用，查询记为单元素列表
+        self.document_calls: List[List[str]] = []  # embed_documents 调用
+    
+    @property
+    def embedded_texts(self) -> List[str]:
+        """按顺序嵌入过的全部文档文本"""
+        return [text for texts in self.document_calls for text in texts]
+    
+    def reset(self):
+        """清空调用记录"""
+        self.calls.clear()
+        self.document_calls.clear()
+    
+    def _embed(self, text: str) -> List[float]:
+        seed = sum(ord(char) * (index + 1) for index, char in enumerate(text)) % (2 ** 32)
+        return np.random.default_rng(seed).standard_normal(self.dim).tolist()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        self.document_calls.append(list(texts))
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        self.calls.append([text])
+        vector = self._embed(text)
+        vector[0] += self.query_offset
+        return vector
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+批量嵌入单元测试
+
+测试 BatchedEmbeddings 的分批与并发控制，以及记忆的批量写入
+"""
+
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from langchain_core.embeddings import Embeddings
+
+from rag_agent.core.embedding_batch import BatchedEmbeddings
+from rag_agent.core.memory import MemoryManager
+from rag_agent.storage import ChromaStore, MemoryRecord
+
+
+class RecordingEmbeddings(Embeddings):
+    """记录请求批次和并发数的嵌入模型"""
+    
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches: List[List[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.batches.append(list(texts))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class TestBatchedEmbeddings(unittest.TestCase):
+    """批处理嵌入模型测试类"""
+    
+    def test_splits_by_batch_size_and_keeps_order(self):
+        """测试按批大小切分并保持输入顺序"""
+        base = RecordingEmbeddings()
+        embeddings = BatchedEmbeddings(base, batch_size=25, max_concurrency=4)
+        texts = [f"文本{i}" for i in range(60)]
+        
+        vectors = embeddings.embed_documents(texts)
+        
+        self.assertEqual(sorted(len(batch) for batch in base.batches), [10, 25, 25])
+        self.assertEqual(vectors, base.embed_documents(texts))
+    
+    def test_bounds_in_flight_requests(self):
+        """测试同时在途的请求数不超过上限"""
+        base = RecordingEmbeddings(delay=0.02)
+        embeddings = BatchedEmbeddings(base, batch_size=2, max_concurrency=3)
+        
+        embeddings.embed_documents([f"文本{i}" for i in range(20)])
+        
+        self.assertEqual(len(base.batches), 10)
+        self.assertLessEqual(base.max_in_flight, 3)
+        self.assertGreater(base.max_in_flight, 1)
+    
+    def test_queries_use_query_mode_concurrently(self):
+        """测试多个查询逐条走查询模式，并发数不超过上限"""
+        base = RecordingEmbeddings(delay=0.02)
+        embeddings = BatchedEmbeddings(base, batch_size=25, max_concurrency=3)
+        queries = [f"查询{i}" for i in range(9)]
+        
+        with patch.object(base, "embed_query", wraps=base.embed_query) as embed_query:
+            vectors = embeddings.embed_queries(queries)
+        
+        self.assertEqual(embed_query.call_count, 9)
+        self.assertEqual(vectors, [base.embed_query(query) for query in queries])
+        self.assertLessEqual(base.max_in_flight, 3)
+        self.assertGreater(base.max_in_flight, 1)
+
+
+class TestBulkMemoryWrites(unittest.TestCase):
+    """记忆批量写入测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.base = RecordingEmbeddings()
+        self.store = ChromaStore(
+            storage_dir=self.temp_dir,
+            collection_name="bulk_test",
+            embedding_model=BatchedEmbeddings(self.base, batch_size=25, max_concurrency=2)
+        )
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_store_memories_batches_embedding_requests(self):
+        """测试批量存储记忆时按批请求嵌入"""
+        memories = [
+            MemoryRecord(memory_key=f"memory-{i}", content=f"记忆内容{i}", tags=["import"], user_id="u1")
+            for i in range(30)
+        ]
+        
+        self.assertTrue(self.store.store_memories(memories))
+        
+        self.assertEqual(len(self.base.batches), 2)
+        self.assertEqual(self.store.memory_collection.count(), 30)
+        stored = self.store.memory_collection.get(ids=["memory-7"], include=["metadatas"])
+        self.assertEqual(stored["metadatas"][0]["user_id"], "u1")
+        self.assertEqual(stored["metadatas"][0]["tags"], "import")
+    
+    def test_memory_manager_store_memories(self):
+        """测试记忆管理器的批量存储接口"""
+        manager = MemoryManager(storage_backend=self.store)
+        
+        success = manager.store_memories([
+            {"content": "用户偏好使用中文回答", "context": {"user_id": "u1"}},
+            {"content": "项目截止日期是下周五", "importance": 9, "tags": ["deadline"]},
+        ])
+        
+        self.assertTrue(success)
+        self.assertEqual(len(self.base.batches), 1)
+        self.assertEqual(self.store.memory_collection.count(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+上下文打包器单元测试
+"""
+
+import unittest
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from langchain_core.documents import Document
+
+from rag_agent.retrieval.context_packer import ContextPacker, estimate_tokens, split_sentences
+
+
+DOCUMENTS = [
+    Document(
+        page_content=(
+            "项目启动于去年春天。团队成员来自不同部门。"
+            "HNSW 索引通过分层图结构实现近似最近邻搜索。会议室预订需要提前一天。"
+        ),
+        metadata={"source": "notes/a.md"}
+    ),
+    Document(
+        page_content="ChromaDB 默认使用 HNSW 索引。HNSW 索引通过分层图结构实现近似最近邻搜索。",
+        metadata={"source": "docs/chroma.md"}
+    ),
+    Document(
+        page_content="午餐时间为十二点到一点。停车场位于地下二层。",
+        metadata={"source": "notes/office.md"}
+    ),
+]
+
+
+class TestContextPacker(unittest.TestCase):
+    """上下文打包器测试类"""
+    
+    def test_split_sentences(self):
+        """按中英文句末标点和换行切分"""
+        self.assertEqual(
+            split_sentences("第一句。第二句！Third one. Fourth\n- 列表项"),
+            ["第一句。", "第二句！", "Third one.", "Fourth", "- 列表项"]
+        )
+    
+    def test_relevant_sentence_kept_within_budget(self):
+        """预算有限时保留与查询相关的句子，丢弃无关句子"""
+        packed = ContextPacker(token_budget=80).pack("HNSW 索引", DOCUMENTS)
+        text = packed.format()
+        
+        self.assertLessEqual(packed.tokens, 80)
+        self.assertLessEqual(estimate_tokens(text), 80)
+        self.assertIn("HNSW 索引通过分层图结构实现近似最近邻搜索。", text)
+        self.assertNotIn("停车场", text)
+        self.assertNotIn("会议室", text)
+    
+    def test_redundant_sentences_and_attribution(self):
+        """重复的句子只保留一次，入选句子标注来源并按原文顺序排列"""
+        packed = ContextPacker(token_budget=1000).pack("HNSW 索引", DOCUMENTS)
+        text = packed.format()
+        
+        self.assertEqual(text.count("HNSW 索引通过分层图结构实现近似最近邻搜索。"), 1)
+        self.assertIn("[信息片段 1] 来源: notes/a.md", text)
+        self.assertIn("[信息片段 2] 来源: docs/chroma.md", text)
+        positions = [position for position, _ in packed.passages[0].sentences]
+        self.assertEqual(positions, sorted(positions))
+    
+    def test_oversized_sentence_truncated(self):
+        """最相关的句子超出预算时截断，至少返回一句"""
+        document = Document(page_content="HNSW " + "分层图结构" * 200 + "。", metadata={"source": "long.md"})
+        packed = ContextPacker(token_budget=60).pack("HNSW", [document])
+        
+        self.assertEqual(packed.selected_sentences, 1)
+        self.assertLessEqual(estimate_tokens(packed.format()), 60)
+        self.assertTrue(packed.passages[0].text.endswith("……"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+嵌入向量缓存单元测试
+
+测试 CachedEmbeddings 的多级缓存、持久化和统计功能
+"""
+
+import asyncio
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root))
+
+from rag_agent.core.embedding_cache import (
+    CachedEmbeddings,
+    EmbeddingCacheStore,
+    embedding_request_scope
+)
+from tests.unit.fake_embeddings import CountingEmbeddings
+
+
+class TestCachedEmbeddings(unittest.TestCase):
+    """缓存嵌入模型测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = Path(self.temp_dir) / "embedding_cache.sqlite3"
+        self.base = CountingEmbeddings(query_offset=0.25)
+        self.store = EmbeddingCacheStore(self.db_path)
+        self.embeddings = CachedEmbeddings(self.base, "test-model", store=self.store)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_only_missing_texts_are_embedded(self):
+        """只把未命中缓存的文本交给底层模型，批内重复文本只计算一次"""
+        first = self.embeddings.embed_documents(["a", "bb", "a"])
+        second = self.embeddings.embed_documents(["bb", "ccc"])
+        
+        self.assertEqual(self.base.calls, [["a", "bb"], ["ccc"]])
+        self.assertEqual(first[0], first[2])
+        self.assertEqual(first[1], second[0])
+    
+    def test_persistent_tier_survives_restart(self):
+        """重新创建实例后从持久化缓存读取，不调用嵌入接口"""
+        expected = self.embeddings.embed_documents(["文档一", "文档二"])
+        
+        fresh_base = CountingEmbeddings()
+        fresh = CachedEmbeddings(fresh_base, "test-model", store=EmbeddingCacheStore(self.db_path))
+        result = fresh.embed_documents(["文档一", "文档二"])
+        
+        self.assertEqual(fresh_base.calls, [])
+        self.assertEqual(result, expected)
+        self.assertEqual(fresh.get_stats()["disk_hits"], 2)
+    
+    def test_model_name_isolates_entries(self):
+        """不同模型名称之间不共享缓存"""
+        self.embeddings.embed_documents(["a"])
+        other_base = CountingEmbeddings()
+        other = CachedEmbeddings(other_base, "other-model", store=self.store)
+        
+        other.embed_documents(["a"])
+        
+        self.assertEqual(other_base.calls, [["a"]])
+    
+    def test_query_and_document_vectors_are_separate(self):
+        """查询向量与文档向量分开缓存"""
+        document_vector = self.embeddings.embed_documents(["a"])[0]
+        query_vector = self.embeddings.embed_query("a")
+        
+        self.assertNotEqual(document_vector, query_vector)
+        self.assertEqual(self.embeddings.embed_query("a"), query_vector)
+        self.assertEqual(len(self.base.calls), 2)
+    
+    def test_batched_queries_share_query_cache(self):
+        """批量查询嵌入走查询模式，与单条查询共用缓存"""
+        query_vector = self.embeddings.embed_query("a")
+        
+        vectors = self.embeddings.embed_queries(["a", "bb", "bb"])
+        
+        self.assertEqual(vectors[0], query_vector)
+        self.assertEqual(vectors[1], vectors[2])
+        self.assertEqual(self.base.calls, [["a"], ["bb"]])
+        self.assertEqual(asyncio.run(self.embeddings.aembed_queries(["bb"])), [vectors[1]])
+    
+    def test_request_scope_hits(self):
+        """请求范围内命中请求级缓存"""
+        memory_only = CachedEmbeddings(self.base, "test-model", store=None, memory_max_entries=0)
+        with embedding_request_scope():
+            memory_only.embed_documents(["a"])
+            memory_only.embed_documents(["a"])
+        memory_only.embed_documents(["a"])
+        
+        stats = memory_only.get_stats()
+        self.assertEqual(stats["request_hits"], 1)
+        self.assertEqual(stats["api_calls"], 2)
+    
+    def test_async_embedding(self):
+        """异步接口共享同一缓存"""
+        self.embeddings.embed_documents(["a"])
+        result = asyncio.run(self.embeddings.aembed_documents(["a", "b"]))
+        
+        self.assertEqual(len(result), 2)
+        self.assertEqual(self.base.calls, [["a"], ["b"]])
+        self.assertGreater(self.embeddings.get_stats()["hit_rate"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
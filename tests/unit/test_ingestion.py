@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+增量导入单元测试
+
+使用确定性的本地嵌入模型和临时 ChromaDB 测试清单驱动的增量导入
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root))
+
+from langchain_chroma import Chroma
+
+from rag_agent.ingestion import IncrementalIngestor, IngestionManifest, get_manifest_path, make_chunk_ids
+from rag_agent.ingestion.ingestor import load_and_split
+from rag_agent.retrieval.cache import read_collection_version
+from rag_agent.retrieval.lexical_index import LexicalIndex, get_lexical_index_dir
+from rag_agent.retrieval.near_duplicate import simhash
+from tests.unit.fake_embeddings import CountingEmbeddings
+
+
+class FlakyEmbeddings(CountingEmbeddings):
+    """第 fail_on_call 次嵌入请求失败的嵌入模型"""
+    
+    def __init__(self, fail_on_call: int):
+        super().__init__()
+        self.requests = 0
+        self.fail_on_call = fail_on_call
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        if self.requests == self.fail_on_call:
+            raise ConnectionError("嵌入服务不可用")
+        return super().embed_documents(texts)
+
+
+PARAGRAPHS = [
+    "LangGraph 使用状态图组织 Agent 工作流。" * 3,
+    "RAG 检索增强生成通过向量数据库召回相关知识片段。" * 3,
+    "ChromaDB 使用 HNSW 索引实现近似最近邻搜索。" * 3,
+]
+
+
+class TestIncrementalIngestor(unittest.TestCase):
+    """增量导入器测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.source_dir = self.temp_dir / "raw"
+        self.store_dir = self.temp_dir / "store"
+        (self.source_dir / "guides").mkdir(parents=True)
+        self.write("a.txt", "\n\n".join(PARAGRAPHS))
+        self.write("guides/b.md", PARAGRAPHS[1])
+        self.embeddings = CountingEmbeddings()
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def write(self, rel_path: str, text: str):
+        (self.source_dir / rel_path).write_text(text, encoding='utf-8')
+    
+    def make_ingestor(self, **kwargs) -> IncrementalIngestor:
+        kwargs.setdefault("split_workers", 1)
+        return IncrementalIngestor(
+            self.source_dir, self.store_dir, "docs", self.embeddings, chunk_size=80, chunk_overlap=0, **kwargs
+        )
+    
+    def collection_sources(self, ingestor: IncrementalIngestor) -> List[str]:
+        return sorted(metadata["source"] for metadata in ingestor.collection.get()["metadatas"])
+    
+    def test_initial_ingest_and_no_change_rebuild(self):
+        """首次导入全部文件，再次导入时不发起嵌入请求"""
+        report = self.make_ingestor().run()
+        self.assertEqual(report.added_files, ["a.txt", "guides/b.md"])
+        self.assertEqual(report.chunks_embedded, report.total_chunks)
+        self.assertEqual(len(self.embeddings.embedded_texts), report.total_chunks)
+        version = read_collection_version(self.store_dir, "docs")
+        
+        self.embeddings.reset()
+        report = self.make_ingestor().run()
+        
+        self.assertFalse(report.changed)
+        self.assertEqual(report.unchanged_files, 2)
+        self.assertEqual(len(self.embeddings.embedded_texts), 0)
+        self.assertEqual(read_collection_version(self.store_dir, "docs"), version)
+    
+    def test_modified_file_embeds_only_changed_chunks(self):
+        """修改文件时只嵌入内容变化的块，并删除旧块"""
+        ingestor = self.make_ingestor()
+        ingestor.run()
+        before = set(ingestor.collection.get()["ids"])
+        
+        self.embeddings.reset()
+        self.write("a.txt", "\n\n".join([PARAGRAPHS[0], "新增的段落介绍词法索引与倒数排名融合。"]))
+        report = self.make_ingestor().run()
+        
+        self.assertEqual(report.updated_files, ["a.txt"])
+        self.assertEqual(len(self.embeddings.embedded_texts), report.chunks_embedded)
+        self.assertEqual(report.chunks_embedded, 1)
+        after = set(ingestor.collection.get()["ids"])
+        self.assertEqual(len(after), report.total_chunks)
+        self.assertEqual(len(before - after), report.chunks_deleted)
+    
+    def test_removed_file_chunks_deleted(self):
+        """源文件删除后，其块从集合和词法索引中移除"""
+        ingestor = self.make_ingestor()
+        ingestor.run()
+        (self.source_dir / "guides" / "b.md").unlink()
+        
+        report = self.make_ingestor().run()
+        
+        self.assertEqual(report.removed_files, ["guides/b.md"])
+        self.assertNotIn("guides/b.md", self.collection_sources(ingestor))
+        self.assertNotIn("guides/b.md", IngestionManifest.load(ingestor.manifest_path).files)
+        index = LexicalIndex.load(get_lexical_index_dir(self.store_dir, "docs"))
+        self.assertEqual(sorted(index.doc_ids), sorted(ingestor.collection.get()["ids"]))
+    
+    def test_first_run_replaces_untracked_chunks(self):
+        """没有清单时，清理旧版构建脚本追加到集合中的块"""
+        Chroma.from_texts(
+            ["旧版构建脚本写入的块"], self.embeddings, collection_name="docs",
+            persist_directory=str(self.store_dir)
+        )
+        
+        report = self.make_ingestor().run()
+        
+        self.assertEqual(report.chunks_deleted, 1)
+        self.assertEqual(len(self.make_ingestor().collection.get()["ids"]), report.total_chunks)
+    
+    def test_lost_manifest_reuses_existing_chunks(self):
+        """清单丢失后重新导入，集合中已有的块不再嵌入"""
+        ingestor = self.make_ingestor()
+        ingestor.run()
+        os.remove(ingestor.manifest_path)
+        
+        self.embeddings.reset()
+        report = self.make_ingestor().run()
+        
+        self.assertEqual(len(self.embeddings.embedded_texts), 0)
+        self.assertEqual(report.chunks_reused, report.total_chunks)
+        self.assertFalse(report.changed)
+    
+    def test_dry_run_writes_nothing(self):
+        """试运行只计算变更"""
+        ingestor = self.make_ingestor()
+        report = ingestor.run(dry_run=True)
+        
+        self.assertGreater(report.chunks_embedded, 0)
+        self.assertEqual(len(self.embeddings.embedded_texts), 0)
+        self.assertFalse(ingestor.manifest_path.exists())
+    
+    def test_resume_after_embedding_failure(self):
+        """嵌入中途失败后重新运行，只嵌入尚未写入的块"""
+        self.embeddings = FlakyEmbeddings(fail_on_call=2)
+        with self.assertRaises(ConnectionError):
+            self.make_ingestor(batch_size=2, max_retries=0).run()
+        
+        manifest = IngestionManifest.load(get_manifest_path(self.store_dir, "docs"))
+        self.assertFalse(manifest.complete)
+        written = len(self.embeddings.embedded_texts)
+        self.assertGreater(written, 0)
+        
+        report = self.make_ingestor(batch_size=2, max_retries=0).run()
+        
+        self.assertTrue(report.resumed)
+        self.assertEqual(written + report.chunks_embedded, report.total_chunks)
+        self.assertEqual(len(self.embeddings.embedded_texts), report.total_chunks)
+        self.assertTrue(IngestionManifest.load(get_manifest_path(self.store_dir, "docs")).complete)
+        index = LexicalIndex.load(get_lexical_index_dir(self.store_dir, "docs"))
+        self.assertEqual(len(index.doc_ids), report.total_chunks)
+    
+    def test_file_deleted_after_scan_is_reported(self):
+        """扫描后被删除的文件记为读取失败，不中断导入"""
+        def delete_then_split(path, rel_path, *args):
+            if rel_path == "guides/b.md":
+                os.remove(path)
+            return load_and_split(path, rel_path, *args)
+        
+        with patch("rag_agent.ingestion.ingestor.load_and_split", side_effect=delete_then_split):
+            report = self.make_ingestor().run()
+        
+        self.assertEqual(report.added_files, ["a.txt"])
+        self.assertEqual(report.failed_files, ["guides/b.md"])
+    
+    def test_embedding_retried_with_backoff(self):
+        """单批嵌入失败后重试，不中断导入"""
+        self.embeddings = FlakyEmbeddings(fail_on_call=1)
+        report = self.make_ingestor(max_retries=1, retry_backoff=0).run()
+        
+        self.assertEqual(self.embeddings.requests, 2)
+        self.assertEqual(report.chunks_embedded, report.total_chunks)
+    
+    def test_process_pool_split_and_stage_throughput(self):
+        """多进程切分与单进程切分结果一致，并汇报各阶段吞吐"""
+        ingestor = self.make_ingestor(split_workers=2, batch_size=3)
+        report = ingestor.run()
+        serial = IncrementalIngestor(
+            self.source_dir, self.temp_dir / "serial", "docs", self.embeddings,
+            chunk_size=80, chunk_overlap=0, split_workers=1
+        )
+        serial.run()
+        
+        self.assertEqual(sorted(ingestor.collection.get()["ids"]), sorted(serial.collection.get()["ids"]))
+        for stage in ("split", "embed", "upsert"):
+            self.assertEqual(report.stages[stage].chunks, report.total_chunks)
+            self.assertGreater(report.stages[stage].throughput, 0)
+        self.assertIn("块/秒", report.summary())
+    
+    def test_chunk_ids_stable_for_repeated_content(self):
+        """相同内容的块按出现顺序得到不同且稳定的 ID"""
+        ids = make_chunk_ids("a.txt", ["x", "y", "x"])
+        self.assertEqual(len(set(ids)), 3)
+        self.assertEqual(ids, make_chunk_ids("a.txt", ["x", "y", "x"]))
+        self.assertNotEqual(ids, make_chunk_ids("b.txt", ["x", "y", "x"]))
+    
+    def test_chunks_carry_fingerprint_metadata(self):
+        """每个块的元数据包含块序号和 SimHash 指纹"""
+        ingestor = self.make_ingestor()
+        ingestor.run()
+        
+        result = ingestor.collection.get(include=["documents", "metadatas"])
+        indexes = {}
+        for text, metadata in zip(result["documents"], result["metadatas"]):
+            self.assertEqual(metadata["simhash"], simhash(text))
+            indexes.setdefault(metadata["source"], []).append(metadata["chunk_index"])
+        for source_indexes in indexes.values():
+            self.assertEqual(sorted(source_indexes), list(range(len(source_indexes))))
+    
+    def test_prepended_text_updates_reused_chunk_indexes(self):
+        """在文件开头插入内容后，复用的块更新序号而不重新嵌入"""
+        ingestor = self.make_ingestor()
+        ingestor.run()
+        
+        self.embeddings.reset()
+        self.write("a.txt", "\n\n".join(["新的开头介绍知识库的维护方式。"] + PARAGRAPHS))
+        report = self.make_ingestor().run()
+        
+        self.assertEqual(report.chunks_embedded, len(self.embeddings.embedded_texts))
+        self.assertGreater(report.chunks_relabeled, 0)
+        self.assertTrue(report.changed)
+        
+        result = ingestor.collection.get(where={"source": "a.txt"}, include=["documents", "metadatas"])
+        by_index = sorted(zip((m["chunk_index"] for m in result["metadatas"]), result["documents"]))
+        self.assertEqual([index for index, _ in by_index], list(range(len(by_index))))
+        self.assertTrue(by_index[0][1].startswith("新的开头"))
+    
+    def test_full_scan_backfills_missing_metadata(self):
+        """--full 为缺少块序号和指纹的旧语料补齐元数据"""
+        ingestor = self.make_ingestor()
+        ingestor.run()
+        # 模拟旧版导入写入的块：只有 source 元数据
+        legacy = ingestor.collection.get(include=["documents", "metadatas", "embeddings"])
+        ingestor.collection.delete(ids=legacy["ids"])
+        ingestor.collection.add(
+            ids=legacy["ids"],
+            documents=legacy["documents"],
+            embeddings=legacy["embeddings"],
+            metadatas=[{"source": metadata["source"]} for metadata in legacy["metadatas"]]
+        )
+        
+        self.embeddings.reset()
+        report = self.make_ingestor().run(full_scan=True)
+        
+        self.assertEqual(len(self.embeddings.embedded_texts), 0)
+        self.assertEqual(report.chunks_relabeled, report.total_chunks)
+        result = ingestor.collection.get(include=["documents", "metadatas"])
+        for text, metadata in zip(result["documents"], result["metadatas"]):
+            self.assertEqual(metadata["simhash"], simhash(text))
+            self.assertIn("chunk_index", metadata)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+关键词匹配引擎单元测试
+
+测试 Aho-Corasick 自动机与逐词子串检查的结果一致，以及各组件的词典加载
+"""
+
+import os
+import random
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from rag_agent.core.keyword_matcher import (
+    KeywordMatcher, get_keyword_matcher, reload_keyword_config, select_non_overlapping
+)
+from rag_agent.core.memory.memory_manager import MemoryUtils
+from rag_agent.nodes.clarification_node import AmbiguityDetector
+from rag_agent.retrieval.query_transformer import QueryTransformer
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    """多模式匹配器测试类"""
+    
+    def test_matches_naive_substring_search(self):
+        """测试全部命中与逐词子串查找一致"""
+        rng = random.Random(11)
+        alphabet = "abc向量检"
+        for _ in range(50):
+            keywords = list(dict.fromkeys(
+                "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(8)
+            ))
+            text = "".join(rng.choice(alphabet) for _ in range(40))
+            matcher = KeywordMatcher(keywords)
+            
+            expected = sorted(
+                (start, start + len(keyword), keyword)
+                for keyword in keywords
+                for start in range(len(text))
+                if text.startswith(keyword, start)
+            )
+            actual = sorted((m.start, m.end, m.keyword) for m in matcher.find_all(text))
+            self.assertEqual(actual, expected)
+    
+    def test_case_insensitive_and_word_boundary(self):
+        """测试大小写不敏感和整词匹配"""
+        matcher = KeywordMatcher(["AI", "LangGraph", "智能体"], word_boundary=True)
+        
+        self.assertEqual(matcher.matched("什么是ai和langgraph智能体"), ["AI", "LangGraph", "智能体"])
+        self.assertFalse(matcher.contains_any("show more detail"))
+        self.assertTrue(KeywordMatcher(["AI"]).contains_any("show more detail"))
+    
+    def test_select_non_overlapping_prefers_leftmost_longest(self):
+        """测试选取互不重叠的命中"""
+        matcher = KeywordMatcher(["什么", "为什么", "怎么"])
+        
+        selected = select_non_overlapping(matcher.find_all("为什么怎么"))
+        
+        self.assertEqual([match.keyword for match in selected], ["为什么", "怎么"])
+    
+    def test_components_use_configured_dictionaries(self):
+        """测试各组件使用配置文件中的词典"""
+        self.assertGreater(len(get_keyword_matcher('query_expansion', 'tech_terms')), 0)
+        
+        transformer = QueryTransformer()
+        self.assertEqual(transformer._expand_by_keywords("show more detail"), [])
+        self.assertIn("什么是 AI 智能体 人工智能", transformer._expand_by_keywords("什么是 AI 智能体"))
+        self.assertNotIn("AI 人工智能 人工智能", transformer._expand_by_keywords("AI 人工智能"))
+        
+        self.assertEqual(MemoryUtils.calculate_auto_importance("这是一个重要的决定", {}), 5)
+        self.assertEqual(MemoryUtils.calculate_auto_importance("这也许是一个决定", {}), 3)
+        
+        result = AmbiguityDetector().detect_ambiguity("为什么这个文件打不开")
+        self.assertEqual(result['ambiguous_patterns'][0]['type'], 'pronoun')
+        question_matches = [amb['matches'] for amb in result['ambiguous_patterns'] if '为什么' in amb['pattern']]
+        self.assertEqual(question_matches, [['为什么']])
+        self.assertEqual(result['missing_specifics'], ['文件'])
+    
+    def test_missing_config_falls_back_to_empty_dictionaries(self):
+        """测试配置文件缺失时记录警告，各组件按空词典工作"""
+        self.addCleanup(reload_keyword_config)
+        with patch.dict(os.environ, {"KEYWORDS_CONFIG_FILE": str(project_root / "missing.config.json")}):
+            reload_keyword_config()
+            with self.assertLogs("rag_agent.core.keyword_matcher", level="WARNING"):
+                detector = AmbiguityDetector()
+        
+        self.assertEqual(detector.ambiguous_groups, [])
+        self.assertEqual(detector.detect_ambiguity("为什么这个文件打不开")['ambiguous_patterns'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
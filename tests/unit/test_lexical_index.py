@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+词法索引单元测试
+
+测试 BM25 倒排索引的构建、持久化和倒数排名融合
+"""
+
+import math
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+import numpy as np
+
+from rag_agent.retrieval.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from rag_agent.retrieval.tokenizer import tokenize
+
+
+TEXTS = [
+    "LangGraph 使用状态图组织 Agent 工作流",
+    "配置环境变量 DASHSCOPE_API_KEY 以启用嵌入模型",
+    "错误码 E-1024 表示向量数据库连接超时",
+    "向量数据库使用 HNSW 索引",
+]
+IDS = [f"chunk-{i}" for i in range(len(TEXTS))]
+
+
+class TestLexicalIndex(unittest.TestCase):
+    """BM25 倒排索引测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.index = LexicalIndex.build(IDS, TEXTS)
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_exact_terms_rank_first(self):
+        """测试配置项和错误码这类精确术语排在首位"""
+        self.assertEqual(self.index.search("DASHSCOPE_API_KEY 怎么配置", k=2)[0][0], "chunk-1")
+        self.assertEqual(self.index.search("E-1024", k=2)[0][0], "chunk-2")
+        self.assertEqual(self.index.search("完全无关的内容 xyz", k=2), [])
+    
+    def test_scores_match_bm25_formula(self):
+        """测试分数与 BM25 公式一致"""
+        query = "向量数据库"
+        doc_lengths = [len(tokenize(text)) for text in TEXTS]
+        average_length = sum(doc_lengths) / len(doc_lengths)
+        expected = {}
+        for doc_id, text, length in zip(IDS, TEXTS, doc_lengths):
+            tokens = tokenize(text)
+            score = 0.0
+            for term in dict.fromkeys(tokenize(query)):
+                df = sum(term in tokenize(other) for other in TEXTS)
+                tf = tokens.count(term)
+                if tf:
+                    idf = math.log(1 + (len(TEXTS) - df + 0.5) / (df + 0.5))
+                    score += idf * tf * 2.5 / (tf + 1.5 * (0.25 + 0.75 * length / average_length))
+            if score > 0:
+                expected[doc_id] = score
+        
+        actual = dict(self.index.search(query, k=10))
+        
+        self.assertEqual(set(actual), set(expected))
+        for doc_id, score in expected.items():
+            self.assertAlmostEqual(actual[doc_id], score, places=5)
+    
+    def test_save_and_mmap_load(self):
+        """测试保存后以内存映射方式加载"""
+        index_dir = Path(self.temp_dir) / "docs.bm25"
+        self.index.save(index_dir)
+        self.index.save(index_dir)
+        
+        loaded = LexicalIndex.load(index_dir)
+        
+        self.assertIsInstance(loaded.postings_docs, np.memmap)
+        self.assertEqual(loaded.search("HNSW 索引", k=3), self.index.search("HNSW 索引", k=3))
+        self.assertIsNone(LexicalIndex.load(Path(self.temp_dir) / "missing.bm25"))
+    
+    def test_reciprocal_rank_fusion(self):
+        """测试倒数排名融合"""
+        fused = reciprocal_rank_fusion([["a", "b", "a"], ["b", "c"]], rrf_k=60)
+        
+        self.assertAlmostEqual(fused["a"], 1 / 61)
+        self.assertAlmostEqual(fused["b"], 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(fused["c"], 1 / 62)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+近似重复检测单元测试
+
+测试 SimHash 指纹、近似重复去除和相邻块拼接
+"""
+
+import unittest
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from rag_agent.retrieval.near_duplicate import (
+    simhash,
+    simhash_similarity,
+    chunk_overlap,
+    stitch_chunks,
+    suppress_near_duplicates,
+    STRATEGY_MERGE
+)
+
+BASE_TEXT = (
+    "LangGraph 使用状态图组织 Agent 工作流，节点和边描述执行顺序。"
+    "每个节点读取共享状态并返回更新，条件边根据状态决定下一个节点。"
+    "检查点保存每一步的状态，支持中断后恢复和人工审核。"
+)
+
+INDEX_TEXT = (
+    "ChromaDB 默认使用 HNSW 索引实现近似最近邻搜索，查询时按余弦距离返回最相近的文档块。"
+    "索引参数决定召回率和内存占用，集合创建后不能再修改，需要重建集合才能生效。"
+)
+
+# 按导入时的切分参数切出的长文档，相邻块之间有真实的重叠
+LONG_TEXT = "\n".join(
+    f"第 {i} 条：节点 {i} 读取共享状态中的第 {i % 7} 个字段，返回更新后由条件边决定是否进入节点 {i + 1}。"
+    for i in range(60)
+)
+
+
+def make_doc(doc_id: str, text: str, score: float = None, **metadata) -> Document:
+    if score is not None:
+        metadata['vector_score'] = score
+    return Document(page_content=text, metadata=metadata, id=doc_id)
+
+
+class TestSimHash(unittest.TestCase):
+    """SimHash 指纹测试类"""
+    
+    def test_fingerprint_is_stable_signed_int64(self):
+        """指纹在多次计算间稳定，并落在有符号 64 位范围内"""
+        fingerprint = simhash(BASE_TEXT)
+        self.assertEqual(fingerprint, simhash(BASE_TEXT))
+        self.assertTrue(-(1 << 63) <= fingerprint < (1 << 63))
+        self.assertEqual(simhash(""), 0)
+    
+    def test_similar_texts_have_close_fingerprints(self):
+        """改动少量文字的文本指纹相近，无关文本指纹相差较远"""
+        edited = BASE_TEXT.replace("审核", "审查")
+        unrelated = "ChromaDB 使用 HNSW 索引实现近似最近邻搜索，配置环境变量以启用嵌入模型。"
+        
+        self.assertGreaterEqual(simhash_similarity(simhash(BASE_TEXT), simhash(edited)), 0.9)
+        self.assertLess(simhash_similarity(simhash(BASE_TEXT), simhash(unrelated)), 0.9)
+        self.assertEqual(simhash_similarity(simhash(BASE_TEXT), simhash(BASE_TEXT)), 1.0)
+
+
+class TestSuppressNearDuplicates(unittest.TestCase):
+    """近似重复去除测试类"""
+    
+    def test_keeps_higher_scoring_duplicate(self):
+        """近似重复时保留分数较高的文档，并合并命中的查询变体"""
+        low = make_doc("a", BASE_TEXT, 0.5, matched_queries=["q1"], variant_ranks={"q1": 0})
+        other = make_doc("b", "ChromaDB 使用 HNSW 索引实现近似最近邻搜索。", 0.7)
+        high = make_doc("c", BASE_TEXT + "。", 0.9, matched_queries=["q2"], variant_ranks={"q2": 1})
+        
+        documents, suppressed = suppress_near_duplicates([low, other, high], 0.9)
+        
+        self.assertEqual(suppressed, 1)
+        self.assertEqual([doc.id for doc in documents], ["b", "c"])
+        self.assertEqual(high.metadata["matched_queries"], ["q2", "q1"])
+    
+    def test_threshold_above_one_disables(self):
+        """阈值大于 1 时不做处理"""
+        documents = [make_doc("a", BASE_TEXT), make_doc("b", BASE_TEXT + "。")]
+        self.assertEqual(suppress_near_duplicates(documents, 1.01), (documents, 0))
+    
+    def test_key_term_change_is_kept(self):
+        """只改动一个关键词的块指纹相近，但不视为近似副本"""
+        edited = INDEX_TEXT.replace("HNSW", "IVF")
+        self.assertGreaterEqual(simhash_similarity(simhash(INDEX_TEXT), simhash(edited)), 0.9)
+        
+        documents = [make_doc("a", INDEX_TEXT, 0.9), make_doc("b", edited, 0.8)]
+        self.assertEqual(suppress_near_duplicates(documents, 0.9), (documents, 0))
+    
+    def test_merge_adjacent_chunks(self):
+        """merge 策略下同一来源中相互重叠的相邻块拼接为原文中连续的一段"""
+        chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(LONG_TEXT)
+        self.assertGreaterEqual(len(chunks), 4)
+        self.assertGreaterEqual(chunk_overlap(chunks[1], chunks[2]), 50)
+        documents = [
+            make_doc(f"c{i}", chunks[i], score, source="a.txt", chunk_index=i)
+            for i, score in ((2, 0.9), (1, 0.8), (3, 0.7))
+        ]
+        other = make_doc("x", chunks[0], 0.6, source="b.txt", chunk_index=1)
+        
+        merged, suppressed = suppress_near_duplicates(documents + [other], 1.01, STRATEGY_MERGE)
+        
+        self.assertEqual(suppressed, 2)
+        self.assertEqual([doc.id for doc in merged], ["c2", "x"])
+        self.assertEqual(merged[0].metadata["merged_chunks"], ["c2", "c1", "c3"])
+        self.assertIn(merged[0].page_content, LONG_TEXT)
+        self.assertTrue(merged[0].page_content.startswith(chunks[1]))
+        self.assertTrue(merged[0].page_content.endswith(chunks[3]))
+    
+    def test_keep_best_keeps_adjacent_chunks(self):
+        """相邻块各有不同的内容，keep_best 策略下都保留"""
+        chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(LONG_TEXT)
+        documents = [
+            make_doc(f"c{i}", chunks[i], 1.0 - i / 10, source="a.txt", chunk_index=i) for i in range(3)
+        ]
+        self.assertEqual(suppress_near_duplicates(documents, 0.9), (documents, 0))
+    
+    def test_stitch_chunks_removes_overlap(self):
+        """拼接相邻块时重叠部分只保留一份"""
+        self.assertEqual(stitch_chunks("abcdef", "defgh"), "abcdefgh")
+        self.assertEqual(stitch_chunks("abc", "xyz"), "abc\nxyz")
+
+
+if __name__ == '__main__':
+    unittest.main()
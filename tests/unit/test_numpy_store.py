@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+NumPy 存储单元测试
+
+测试内存映射向量表的写入、持久化、元数据过滤和精确搜索，
+并与 ChromaStore 的搜索结果对照
+"""
+
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from langchain_core.messages import HumanMessage, AIMessage
+
+from rag_agent.storage import (
+    ChromaStore, NumpyStore, VectorTable, StorageDocument, MemoryRecord, create_storage_backend
+)
+from tests.unit.fake_embeddings import CountingEmbeddings
+
+
+TEXTS = [f"记忆内容 {i}: 用户偏好第 {i} 项" for i in range(40)]
+
+
+class TestVectorTable(unittest.TestCase):
+    """向量表测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.rng = np.random.default_rng(0)
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def add_rows(self, table: VectorTable, count: int) -> np.ndarray:
+        vectors = self.rng.standard_normal((count, 8))
+        table.add(
+            ids=[f"id-{i}" for i in range(count)],
+            documents=[f"doc {i}" for i in range(count)],
+            embeddings=vectors.tolist(),
+            metadatas=[
+                {"group": "even" if i % 2 == 0 else "odd", "rank": i, **({"tags": "a,b"} if i % 5 == 0 else {})}
+                for i in range(count)
+            ]
+        )
+        return vectors
+    
+    def test_search_matches_brute_force_cosine(self):
+        """搜索结果与逐行计算的余弦相似度一致"""
+        table = VectorTable(self.temp_dir / "t")
+        vectors = self.add_rows(table, 50)
+        query = self.rng.standard_normal(8)
+        
+        cosine = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+        hits = table.search(query.tolist(), k=5)
+        
+        self.assertEqual([row for row, _ in hits], np.argsort(-cosine)[:5].tolist())
+        np.testing.assert_allclose([score for _, score in hits], np.sort(cosine)[::-1][:5], rtol=1e-5)
+    
+    def test_metadata_filters(self):
+        """过滤条件在列上求值"""
+        table = VectorTable(self.temp_dir / "t")
+        self.add_rows(table, 20)
+        
+        self.assertEqual(table.select({"group": "even", "rank": {"$gte": 10}}), [10, 12, 14, 16, 18])
+        self.assertEqual(table.select({"$or": [{"rank": {"$lt": 2}}, {"rank": {"$in": [19]}}]}), [0, 1, 19])
+        self.assertEqual(table.select({"tags": {"$contains": "b"}}), [0, 5, 10, 15])
+        self.assertEqual(table.select({"rank": {"$ne": 3}}, limit=4), [0, 1, 2, 4])
+        self.assertEqual(table.select({"missing": "x"}), [])
+        rows = {row for row, _ in table.search(self.rng.standard_normal(8).tolist(), k=20, where={"group": "odd"})}
+        self.assertEqual(rows, set(range(1, 20, 2)))
+    
+    def test_persistence_overwrite_and_delete(self):
+        """数据在重新打开后保留，覆盖和删除的行不再返回"""
+        table = VectorTable(self.temp_dir / "t", dtype="float16")
+        self.add_rows(table, 10)
+        table.add(["id-3"], ["new doc 3"], [[1.0] * 8], [{"group": "new"}])
+        table.delete(["id-4"])
+        
+        reopened = VectorTable(self.temp_dir / "t", dtype="float16")
+        self.assertEqual(reopened.count(), 9)
+        self.assertIsNone(reopened.row_of("id-4"))
+        row = reopened.row_of("id-3")
+        self.assertEqual(reopened.documents[row], "new doc 3")
+        self.assertEqual(reopened.metadata(row), {"group": "new"})
+        self.assertEqual(reopened.search([1.0] * 8, k=1)[0][0], row)
+        
+        reopened.compact()
+        self.assertEqual(len(reopened.ids), 9)
+        self.assertEqual(reopened.documents[reopened.row_of("id-3")], "new doc 3")
+        with self.assertRaises(ValueError):
+            VectorTable(self.temp_dir / "t", dtype="float32")
+    
+    def test_writes_append_to_log(self):
+        """写入和删除只追加日志，已转换的列随写入增量扩展"""
+        table = VectorTable(self.temp_dir / "t")
+        self.add_rows(table, 10)
+        snapshot = table.table_path.read_text(encoding='utf-8')
+        self.assertEqual(table.select({"rank": {"$gte": 8}}), [8, 9])
+        
+        table.add(["id-10", "id-11"], ["doc 10", "doc 11"], self.rng.standard_normal((2, 8)).tolist(),
+                  [{"rank": 10, "group": "even"}, {"group": "odd"}])
+        table.add(["id-12"], ["doc 12"], self.rng.standard_normal((1, 8)).tolist(), [{"rank": "十二"}])
+        table.delete(["id-9"])
+        
+        self.assertEqual(table.table_path.read_text(encoding='utf-8'), snapshot)
+        self.assertEqual(len(table.log_path.read_text(encoding='utf-8').splitlines()), 3)
+        self.assertEqual(table.select({"group": "even", "rank": {"$gte": 8}}), [8, 10])
+        self.assertEqual(table.select({"rank": "十二"}), [12])
+        
+        # 模拟写入中断留下的不完整日志行
+        with open(table.log_path, 'a', encoding='utf-8') as log:
+            log.write('{"op": "delete", "ids": ["id-')
+        reopened = VectorTable(self.temp_dir / "t")
+        self.assertEqual(reopened.count(), 12)
+        self.assertEqual(reopened.select({"group": "even", "rank": {"$gte": 8}}), [8, 10])
+        
+        reopened.compact()
+        self.assertEqual(reopened.table_path.read_text(encoding='utf-8').count("id-"), 12)
+        self.assertEqual(reopened.log_path.read_text(encoding='utf-8'), "")
+        self.assertEqual(VectorTable(self.temp_dir / "t").count(), 12)
+
+
+class TestNumpyStore(unittest.TestCase):
+    """NumPy 存储测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.embeddings = CountingEmbeddings()
+        self.store = create_storage_backend(
+            "numpy",
+            collection_name="test_numpy",
+            storage_dir=self.temp_dir / "numpy",
+            embedding_model=self.embeddings,
+            enable_cache=False
+        )
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_factory_creates_numpy_store(self):
+        """create_storage_backend("numpy") 返回 NumpyStore"""
+        self.assertIsInstance(self.store, NumpyStore)
+    
+    def test_memory_search_matches_chroma(self):
+        """记忆搜索结果与 ChromaStore 一致"""
+        chroma = ChromaStore(
+            storage_dir=self.temp_dir / "chroma",
+            collection_name="test_numpy",
+            embedding_model=self.embeddings
+        )
+        memories = [
+            MemoryRecord(f"m{i}", text, tags=["pref"] if i % 3 == 0 else None, importance=i % 10, user_id=f"u{i % 2}")
+            for i, text in enumerate(TEXTS)
+        ]
+        self.assertTrue(self.store.store_memories(memories))
+        self.assertTrue(chroma.store_memories(memories))
+        
+        for kwargs in ({}, {"user_id": "u1"}, {"importance_threshold": 5}):
+            expected = chroma.search_memories("用户偏好", limit=5, **kwargs)
+            actual = self.store.search_memories("用户偏好", limit=5, **kwargs)
+            self.assertEqual([r.document.id for r in actual], [r.document.id for r in expected], kwargs)
+            np.testing.assert_allclose([r.score for r in actual], [r.score for r in expected], atol=1e-4)
+        
+        # 标签过滤在字符串列上按子串匹配
+        tagged = self.store.search_memories("用户偏好", tags=["pref"], limit=20)
+        self.assertEqual(sorted(int(r.document.id[1:]) for r in tagged), list(range(0, 40, 3))[:len(tagged)])
+        self.assertTrue(all(r.document.metadata["tags"] == ["pref"] for r in tagged))
+    
+    def test_documents_and_sessions(self):
+        """文档读写、元数据搜索和会话历史"""
+        document = StorageDocument("d1", "内容", {"kind": "note"}, datetime(2024, 1, 1))
+        self.assertTrue(self.store.store_document(document))
+        self.assertEqual(self.store.get_document("d1").metadata, {"kind": "note"})
+        self.assertEqual([doc.id for doc in self.store.metadata_search({"kind": "note"})], ["d1"])
+        self.assertTrue(self.store.delete_document("d1"))
+        self.assertIsNone(self.store.get_document("d1"))
+        
+        self.store.store_session_message("s1", HumanMessage(content="你好"))
+        self.store.store_session_message("s2", HumanMessage(content="其他会话"))
+        self.store.store_session_message("s1", AIMessage(content="你好，有什么可以帮你？"))
+        history = self.store.get_session_history("s1")
+        self.assertEqual([type(m).__name__ for m in history], ["HumanMessage", "AIMessage"])
+        self.assertEqual(self.store.get_stats()["session_messages"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+文档重排序单元测试
+
+测试向量化重排序引擎与逐文档打分实现给出相同的排序结果
+"""
+
+import math
+import random
+import unittest
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag_agent.retrieval.reranker import DocumentReranker
+from rag_agent.retrieval.rerank_engine import RerankCandidates, select_top_k
+from rag_agent.retrieval.tokenizer import tokenize
+
+
+def make_documents(count: int, seed: int = 7) -> List[Document]:
+    """生成带重复内容和空文档的候选文档"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(40)] + ["向量", "检索", "数据库", "Agent", "RAG"]
+    documents = [
+        Document(page_content=" ".join(rng.choice(vocabulary) for _ in range(rng.randint(3, 60))))
+        for _ in range(count)
+    ]
+    # 内容相同的文档用于检验同分时的顺序
+    documents.append(Document(page_content=documents[2].page_content))
+    documents.append(Document(page_content=documents[5].page_content))
+    documents.append(Document(page_content=""))
+    return documents
+
+
+class LegacyReranker:
+    """逐文档打分的参考实现，用于对比排序结果"""
+    
+    def relevance_score(self, query: str, document: Document) -> float:
+        """精确匹配、关键词覆盖、词频和长度惩罚的加权和 (0-1)"""
+        doc_content = document.page_content.lower()
+        exact_match_score = 1.0 if query.lower() in doc_content else 0.0
+        
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        doc_tokens = tokenize(document.page_content)
+        token_counts = Counter(doc_tokens)
+        
+        if not query_tokens:
+            keyword_score = 0.0
+        else:
+            matched_tokens = [token for token in query_tokens if token in token_counts]
+            keyword_score = len(matched_tokens) / len(query_tokens)
+        
+        word_freq_score = 0.0
+        for token in query_tokens:
+            if token in token_counts:
+                word_freq_score += math.log(1 + token_counts[token])
+        if query_tokens:
+            word_freq_score /= len(query_tokens)
+            word_freq_score = min(word_freq_score, 1.0)
+        
+        length_penalty = 1.0 / (1.0 + math.log(1 + len(doc_tokens) / 100))
+        
+        final_score = (
+            0.4 * exact_match_score +
+            0.3 * keyword_score +
+            0.2 * word_freq_score +
+            0.1 * length_penalty
+        )
+        return min(final_score, 1.0)
+    
+    def document_similarity(self, doc1: Document, doc2: Document) -> float:
+        """两个文档词元集合的 Jaccard 相似度"""
+        content1 = set(tokenize(doc1.page_content))
+        content2 = set(tokenize(doc2.page_content))
+        if not content1 or not content2:
+            return 0.0
+        return len(content1 & content2) / len(content1 | content2)
+    
+    def relevance(self, query: str, documents: List[Document], top_k: Optional[int] = None) -> List[Document]:
+        scored = [(doc, self.relevance_score(query, doc)) for doc in documents]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        if top_k is not None:
+            scored = scored[:top_k]
+        return [doc for doc, _ in scored]
+    
+    def diversity(
+        self,
+        query: str,
+        documents: List[Document],
+        top_k: Optional[int] = None,
+        diversity_threshold: float = 0.7
+    ) -> List[Document]:
+        if len(documents) <= 1:
+            return documents
+        scores = [self.relevance_score(query, doc) for doc in documents]
+        remaining = list(range(len(documents)))
+        selected = [max(remaining, key=lambda i: scores[i])]
+        remaining.remove(selected[0])
+        while remaining and (top_k is None or len(selected) < top_k):
+            best_idx, best_score = None, float('-inf')
+            for idx in remaining:
+                max_similarity = 0
+                for selected_idx in selected:
+                    max_similarity = max(
+                        max_similarity,
+                        self.document_similarity(documents[idx], documents[selected_idx])
+                    )
+                mmr_score = diversity_threshold * scores[idx] - (1 - diversity_threshold) * max_similarity
+                if mmr_score > best_score:
+                    best_idx, best_score = idx, mmr_score
+            selected.append(best_idx)
+            remaining.remove(best_idx)
+        return [documents[i] for i in selected]
+    
+    def hybrid(self, query: str, documents: List[Document], top_k: Optional[int] = None) -> List[Document]:
+        relevance_ranked = self.relevance(query, documents)
+        diversity_ranked = self.diversity(query, documents)
+        scores = {}
+        for i, doc in enumerate(relevance_ranked):
+            scores[id(doc)] = 0.7 * ((len(relevance_ranked) - i) / len(relevance_ranked))
+        for i, doc in enumerate(diversity_ranked):
+            scores[id(doc)] += 0.3 * ((len(diversity_ranked) - i) / len(diversity_ranked))
+        ranked = sorted(documents, key=lambda doc: scores[id(doc)], reverse=True)
+        return ranked[:top_k] if top_k else ranked
+
+
+class TestRerankEquivalence(unittest.TestCase):
+    """向量化重排序与参考实现一致性测试类"""
+    
+    QUERIES = ["term1 term2 向量", "检索", "TERM3 term4 term5 term6", "term7 term7", ""]
+    
+    def setUp(self):
+        """测试前准备"""
+        self.documents = make_documents(40)
+        self.reranker = DocumentReranker()
+        self.legacy = LegacyReranker()
+    
+    def assertSameOrder(self, expected: List[Document], actual: List[Document]):
+        self.assertEqual([id(doc) for doc in expected], [id(doc) for doc in actual])
+    
+    def test_relevance_matches_reference(self):
+        """测试相关性排序结果一致"""
+        for query in self.QUERIES:
+            for top_k in (None, 1, 5, 100):
+                with self.subTest(query=query, top_k=top_k):
+                    self.assertSameOrder(
+                        self.legacy.relevance(query, self.documents, top_k),
+                        self.reranker.rerank(query, self.documents, "relevance", top_k)
+                    )
+    
+    def test_diversity_matches_reference(self):
+        """测试 MMR 多样性排序结果一致"""
+        for query in self.QUERIES:
+            for top_k in (None, 3, 10):
+                with self.subTest(query=query, top_k=top_k):
+                    self.assertSameOrder(
+                        self.legacy.diversity(query, self.documents, top_k),
+                        self.reranker.rerank(query, self.documents, "diversity", top_k)
+                    )
+    
+    def test_hybrid_matches_reference(self):
+        """测试混合排序结果一致"""
+        for query in self.QUERIES:
+            for top_k in (None, 0, 6):
+                with self.subTest(query=query, top_k=top_k):
+                    self.assertSameOrder(
+                        self.legacy.hybrid(query, self.documents, top_k),
+                        self.reranker.rerank(query, self.documents, "hybrid", top_k)
+                    )
+    
+    def test_similarity_matrix_matches_pairwise_jaccard(self):
+        """测试相似度矩阵与逐对计算的 Jaccard 相似度一致"""
+        candidates = RerankCandidates(self.documents)
+        matrix = candidates.similarity_matrix()
+        for i in range(0, len(self.documents), 7):
+            for j in range(len(self.documents)):
+                expected = self.legacy.document_similarity(self.documents[i], self.documents[j])
+                self.assertEqual(matrix[i, j], expected)
+    
+    def test_select_top_k_keeps_tie_order(self):
+        """测试部分排序在同分时保持原始顺序"""
+        scores = np.array([0.5, 0.9, 0.5, 0.1, 0.9, 0.5])
+        self.assertEqual(select_top_k(scores, 3).tolist(), [1, 4, 0])
+        self.assertEqual(select_top_k(scores, 4).tolist(), [1, 4, 0, 2])
+        self.assertEqual(select_top_k(scores).tolist(), [1, 4, 0, 2, 5, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
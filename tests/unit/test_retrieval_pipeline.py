@@ -0,0 +1,799 @@
+#!/usr/bin/env python3
+"""
+检索管道单元测试
+
+使用确定性的本地嵌入模型和临时 ChromaDB 测试检索管道的各个阶段
+"""
+
+import os
+import asyncio
+import hashlib
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from rag_agent.retrieval.pipeline import RetrievalPipeline
+from rag_agent.retrieval.query_transformer import QueryTransformer
+from rag_agent.retrieval.query_router import QueryRouter, ROUTE_SIMPLE, ROUTE_STANDARD, ROUTE_COMPLEX
+from rag_agent.retrieval.cache import RetrievalCache, bump_collection_version
+from rag_agent.retrieval.semantic_cache import SemanticQueryCache
+from rag_agent.retrieval.rerank_engine import embedding_mmr_select
+from rag_agent.retrieval.lexical_index import LexicalIndex, get_lexical_index_dir
+from rag_agent.retrieval.metrics import Histogram, get_retrieval_metrics
+from rag_agent.tools.knowledge_base import KnowledgeBaseTool
+
+
+class HashEmbeddings(Embeddings):
+    """基于字符哈希的确定性嵌入模型，记录调用次数"""
+    
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+        self.document_calls = 0
+        self.query_calls = 0
+        self.embedded_texts = 0
+        self.query_texts = []
+    
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for char in text:
+            digest = hashlib.md5(char.encode('utf-8')).digest()
+            vector[digest[0] % self.dim] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.document_calls += 1
+        self.embedded_texts += len(texts)
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        self.query_calls += 1
+        self.embedded_texts += 1
+        self.query_texts.append(text)
+        return self._embed(text)
+
+
+SAMPLE_TEXTS = [
+    "LangGraph 使用状态图组织 Agent 工作流，节点和边描述执行顺序。",
+    "RAG 检索增强生成通过向量数据库召回相关知识片段。",
+    "Agent 可以调用工具完成推理、决策和执行。",
+    "ChromaDB 使用 HNSW 索引实现近似最近邻搜索。",
+    "配置环境变量 DASHSCOPE_API_KEY 以启用嵌入模型。",
+    "查询扩展会为原始查询生成多个变体以提高召回率。",
+]
+
+
+class RetrievalTestCase(unittest.TestCase):
+    """带有临时向量数据库的测试基类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.embeddings = HashEmbeddings()
+        self.collection_name = "test_internal_docs"
+        
+        Chroma.from_documents(
+            documents=[Document(page_content=text, metadata={"source": f"doc_{i}"}) for i, text in enumerate(SAMPLE_TEXTS)],
+            embedding=self.embeddings,
+            ids=[f"chunk-{i}" for i in range(len(SAMPLE_TEXTS))],
+            collection_name=self.collection_name,
+            persist_directory=self.temp_dir
+        )
+        self.embeddings.document_calls = 0
+        self.embeddings.embedded_texts = 0
+        
+        self.patchers = [
+            patch.dict(os.environ, {
+                "VECTOR_DB_PATH": self.temp_dir,
+                "COLLECTION_NAME": self.collection_name
+            }),
+            patch("rag_agent.retrieval.base_retriever.get_embedding_model", return_value=self.embeddings),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+    
+    def tearDown(self):
+        """测试后清理"""
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def make_pipeline(self, **overrides) -> RetrievalPipeline:
+        config = {
+            'k': 3,
+            'use_query_expansion': True,
+            'use_reranking': False,
+            'use_mmr': False,
+            'score_threshold': None,
+            'use_query_router': False,
+        }
+        config.update(overrides)
+        return RetrievalPipeline(config)
+
+
+class TestQueryFanOut(RetrievalTestCase):
+    """扩展查询批量检索测试"""
+    
+    def test_variants_embedded_once_in_query_mode(self):
+        """所有查询变体以查询模式嵌入，每个变体只嵌入一次"""
+        pipeline = self.make_pipeline()
+        queries = pipeline.query_transformer.expand_query("LangGraph Agent RAG")
+        self.assertGreater(len(queries), 1)
+        
+        pipeline.invoke("LangGraph Agent RAG")
+        
+        self.assertEqual(self.embeddings.document_calls, 0)
+        self.assertGreater(self.embeddings.query_calls, 1)
+        self.assertEqual(len(self.embeddings.query_texts), len(set(self.embeddings.query_texts)))
+    
+    def test_merged_results_carry_provenance(self):
+        """合并结果记录命中的查询变体"""
+        pipeline = self.make_pipeline()
+        queries = ["LangGraph 工作流", "Agent 工具"]
+        
+        documents = pipeline._retrieve_documents(queries, pipeline.config)
+        
+        ids = [doc.id for doc in documents]
+        self.assertEqual(len(ids), len(set(ids)))
+        for doc in documents:
+            self.assertTrue(doc.metadata['matched_queries'])
+            for query in doc.metadata['matched_queries']:
+                self.assertIn(query, queries)
+                self.assertIn(query, doc.metadata['variant_ranks'])
+    
+    def test_mmr_fan_out(self):
+        """MMR 检索通过一次批量查询完成"""
+        pipeline = self.make_pipeline(use_mmr=True, mmr_fetch_k=6, fanout_max_workers=2)
+        
+        batch = pipeline.base_retriever.retrieve_batch(
+            ["LangGraph", "向量数据库", "Agent"],
+            k=2,
+            search_type="mmr",
+            search_kwargs={"fetch_k": 6, "lambda_mult": 0.5},
+            max_workers=2
+        )
+        
+        self.assertEqual(len(batch), 3)
+        self.assertTrue(all(len(documents) == 2 for documents in batch))
+        self.assertEqual(self.embeddings.document_calls, 0)
+        self.assertEqual(self.embeddings.query_calls, 3)
+
+
+
+class TestExpansionBudget(RetrievalTestCase):
+    """查询扩展预算测试"""
+    
+    QUERY = "Agent 配置问题"
+    
+    def test_rank_expansions_prefers_novel_variants(self):
+        """新颖度高的变体排在前面，不带来新词元的变体被丢弃"""
+        transformer = QueryTransformer()
+        
+        ranked = transformer.rank_expansions("Agent 配置", ["Agent 配置 agent", "Agent 配置 工具", "Agent 设置 工具"])
+        
+        self.assertEqual(ranked, ["Agent 设置 工具"])
+    
+    def test_plan_caps_searches_and_reports_savings(self):
+        """检索次数不超过预算，并报告节省的检索次数"""
+        transformer = QueryTransformer()
+        candidates = transformer.expand_query(self.QUERY)
+        self.assertGreater(len(candidates), 10)
+        
+        plan = transformer.plan_expansion(self.QUERY, embed_fn=self.embeddings.embed_documents, max_searches=3)
+        
+        self.assertEqual(plan.queries[0], self.QUERY)
+        self.assertLessEqual(len(plan.queries), 3)
+        self.assertEqual(plan.candidates, len(candidates))
+        self.assertEqual(plan.searches_saved, len(candidates) - len(plan.queries))
+        self.assertEqual(set(plan.embeddings), set(plan.queries))
+        self.assertEqual(transformer.get_stats()["searches_saved"], plan.searches_saved)
+    
+    def test_near_duplicate_variants_collapse(self):
+        """嵌入几乎相同的变体被合并"""
+        transformer = QueryTransformer()
+        
+        plan = transformer.plan_expansion(
+            self.QUERY,
+            embed_fn=lambda texts: [[1.0, 0.0, 0.001 * i] for i in range(len(texts))],
+            max_searches=4
+        )
+        
+        self.assertEqual(plan.queries, [self.QUERY])
+        self.assertGreater(plan.collapsed, 0)
+    
+    def test_pipeline_applies_search_and_time_budget(self):
+        """管道按检索次数和耗时预算限制扩展"""
+        pipeline = self.make_pipeline(expansion_max_searches=3, expansion_time_budget_ms=25)
+        self.assertEqual(pipeline._expansion_search_budget(pipeline.config), 3)
+        pipeline._search_latency_ms = 10.0
+        self.assertEqual(pipeline._expansion_search_budget(pipeline.config), 2)
+        pipeline._search_latency_ms = 100.0
+        self.assertEqual(pipeline._expansion_search_budget(pipeline.config), 1)
+        
+        pipeline._search_latency_ms = None
+        pipeline.invoke(self.QUERY)
+        
+        self.assertEqual(len(self.embeddings.query_texts), len(set(self.embeddings.query_texts)))
+        stats = pipeline.get_stats()["query_expansion"]
+        self.assertLessEqual(stats["searches"], 3)
+        self.assertGreater(stats["searches_saved"], 0)
+        self.assertIsNotNone(pipeline.get_stats()["search_latency_ms"])
+
+
+class TestDirectCollectionQuery(RetrievalTestCase):
+    """直接集合查询接口测试"""
+    
+    def test_query_by_embeddings_returns_compact_results(self):
+        """批量查询返回 ID、距离和可选的文档向量"""
+        retriever = self.make_pipeline().base_retriever
+        query_embeddings = retriever.embed_queries(["LangGraph 工作流", "向量数据库"])
+        
+        results = retriever.query_by_embeddings(query_embeddings, k=3, include_embeddings=True)
+        
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertEqual(len(result.ids), 3)
+            self.assertEqual(result.distances, sorted(result.distances))
+            self.assertEqual(result.embeddings.shape, (3, self.embeddings.dim))
+            self.assertEqual([doc.id for doc in result.to_documents()], result.ids)
+        self.assertIsNone(retriever.query_by_embeddings(query_embeddings, k=3)[0].embeddings)
+    
+    def test_retrieve_matches_langchain_vectorstore(self):
+        """retrieve 的结果与 LangChain 向量存储接口一致"""
+        retriever = self.make_pipeline().base_retriever
+        vectorstore = retriever.get_vectorstore()
+        query = "Agent 调用工具"
+        embedding = self.embeddings._embed(query)
+        
+        similarity = retriever.retrieve(query, k=3)
+        mmr = retriever.retrieve(query, k=3, search_type="mmr", search_kwargs={"fetch_k": 6, "lambda_mult": 0.3})
+        
+        self.assertEqual(
+            [doc.id for doc in similarity],
+            [doc.id for doc in vectorstore.similarity_search_by_vector(embedding, k=3)]
+        )
+        self.assertEqual(
+            [doc.id for doc in mmr],
+            [doc.id for doc in vectorstore.max_marginal_relevance_search_by_vector(
+                embedding, k=3, fetch_k=6, lambda_mult=0.3
+            )]
+        )
+        with self.assertRaises(ValueError):
+            retriever.retrieve(query, search_type="unknown")
+
+
+class TestShardedRetrieval(RetrievalTestCase):
+    """多集合（分片）检索测试"""
+    
+    def setUp(self):
+        super().setUp()
+        # 把同样的文档按奇偶拆分到两个分片
+        for name, offset in (("shard_a", 0), ("shard_b", 1)):
+            indexes = range(offset, len(SAMPLE_TEXTS), 2)
+            Chroma.from_documents(
+                documents=[Document(page_content=SAMPLE_TEXTS[i], metadata={"source": f"doc_{i}"}) for i in indexes],
+                embedding=self.embeddings,
+                ids=[f"chunk-{i}" for i in indexes],
+                collection_name=name,
+                persist_directory=self.temp_dir
+            )
+    
+    def make_sharded_retriever(self, **overrides):
+        pipeline = self.make_pipeline(collections=["shard_a", "shard_b"], **overrides)
+        self.addCleanup(pipeline.close)
+        return pipeline.base_retriever
+    
+    def test_sharded_results_match_single_collection(self):
+        """分片合并后的前 k 个结果与单个集合的结果一致"""
+        single = self.make_pipeline().base_retriever
+        sharded = self.make_sharded_retriever()
+        query_embeddings = single.embed_queries(["LangGraph 工作流", "向量数据库 HNSW"])
+        
+        expected = single.query_by_embeddings(query_embeddings, k=4, include_embeddings=True)
+        merged = sharded.query_by_embeddings(query_embeddings, k=4, include_embeddings=True)
+        
+        for expected_result, merged_result in zip(expected, merged):
+            self.assertEqual(merged_result.ids, expected_result.ids)
+            np.testing.assert_allclose(merged_result.distances, expected_result.distances, rtol=1e-5)
+            np.testing.assert_allclose(merged_result.embeddings, expected_result.embeddings, rtol=1e-5)
+            self.assertTrue(all(metadata["collection"] in ("shard_a", "shard_b") for metadata in merged_result.metadatas))
+        self.assertEqual(sharded.get_documents(["chunk-1", "chunk-0"])[0].id, "chunk-1")
+        self.assertEqual(sharded.get_document_embeddings(["chunk-3", "chunk-2"]).shape, (2, self.embeddings.dim))
+        self.assertEqual(sharded.get_shard_stats()["shard_b"]["queries"], 1)
+    
+    def test_slow_and_failed_shards_are_skipped(self):
+        """超时或失败的分片被跳过，其余分片的结果照常返回"""
+        sharded = self.make_sharded_retriever(shard_timeout_ms=50)
+        query_embeddings = sharded.embed_queries(["Agent 工具"])
+        slow_collection = sharded.shards["shard_b"]._collection
+        original_query = slow_collection.query
+        
+        def slow_query(*args, **kwargs):
+            time.sleep(0.3)
+            return original_query(*args, **kwargs)
+        
+        with patch.object(slow_collection, "query", side_effect=slow_query):
+            result = sharded.query_by_embeddings(query_embeddings, k=3)[0]
+        self.assertTrue(all(int(doc_id.split("-")[1]) % 2 == 0 for doc_id in result.ids))
+        
+        with patch.object(sharded.shards["shard_a"]._collection, "query", side_effect=RuntimeError("不可用")):
+            result = sharded.query_by_embeddings(query_embeddings, k=3)[0]
+        self.assertTrue(all(int(doc_id.split("-")[1]) % 2 == 1 for doc_id in result.ids))
+        
+        stats = sharded.get_shard_stats()
+        self.assertEqual(stats["shard_b"]["timeouts"], 1)
+        self.assertEqual(stats["shard_a"]["failures"], 1)
+        with patch.object(slow_collection, "query", side_effect=RuntimeError("不可用")), \
+                patch.object(sharded.shards["shard_a"]._collection, "query", side_effect=RuntimeError("不可用")):
+            with self.assertRaises(RuntimeError):
+                sharded.query_by_embeddings(query_embeddings, k=3)
+
+
+class TestAdaptiveFetch(RetrievalTestCase):
+    """自适应 top-k 检索测试"""
+    
+    def test_easy_query_stops_after_first_round(self):
+        """首轮候选全部达标时只执行一轮"""
+        retriever = self.make_pipeline().base_retriever
+        result = retriever.retrieve_adaptive(["LangGraph 工作流"], k=5, score_threshold=-1.0)[0]
+        
+        self.assertEqual((result.rounds, result.fetch_k), (1, 3))
+        self.assertEqual(len(result.documents), 3)
+        self.assertFalse(result.below_threshold)
+    
+    def test_over_fetch_grows_until_enough_candidates(self):
+        """达标候选不足且最弱候选仍达标时逐轮扩大，不超过 max_k"""
+        retriever = self.make_pipeline().base_retriever
+        grown = retriever.retrieve_adaptive(
+            ["LangGraph 工作流"], k=5, score_threshold=-1.0, min_candidates=3, initial_k=1
+        )[0]
+        self.assertEqual((grown.rounds, grown.fetch_k, len(grown.documents)), (3, 4, 4))
+        
+        capped = retriever.retrieve_adaptive(
+            ["向量数据库"], k=5, score_threshold=-1.0, min_candidates=3, initial_k=1, max_k=2
+        )[0]
+        self.assertEqual((capped.rounds, capped.fetch_k), (2, 2))
+    
+    def test_hard_query_returns_best_effort_instead_of_empty(self):
+        """没有候选达到阈值时返回得分最高的候选，而不是空结果"""
+        query = "完全无关的查询内容"
+        strict = self.make_pipeline(
+            score_threshold=0.99, use_query_expansion=False, use_lexical_search=False, use_adaptive_k=False
+        )
+        self.assertEqual(strict.invoke(query), [])
+        
+        pipeline = self.make_pipeline(score_threshold=0.99, use_query_expansion=False, use_lexical_search=False)
+        documents = pipeline.invoke(query)
+        
+        self.assertGreater(len(documents), 0)
+        self.assertTrue(all(doc.metadata['below_threshold'] for doc in documents))
+        stats = pipeline.get_stats()["adaptive_fetch"]
+        self.assertEqual(stats["queries"], 1)
+        self.assertEqual(stats["rounds_histogram"], {1: 1})
+        self.assertEqual(stats["below_threshold_queries"], 1)
+
+
+class TestQueryRouter(RetrievalTestCase):
+    """查询复杂度路由测试"""
+    
+    def test_routes_by_query_features(self):
+        """事实性查询走简单路由，比较类和多实体查询走复杂路由"""
+        router = QueryRouter()
+        cases = {
+            "HNSW 是什么": ROUTE_SIMPLE,
+            "HNSW 和 IVF 有什么区别": ROUTE_COMPLEX,
+            "LangChain vs LangGraph": ROUTE_COMPLEX,
+            "RAG、Agent 与 ChromaDB 如何配合": ROUTE_COMPLEX,
+            "如何在生产环境中部署一个支持多租户隔离并且能够水平扩展的检索增强生成服务": ROUTE_STANDARD,
+        }
+        for query, route in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(router.route(query).route, route)
+        
+        features = router.extract_features("HNSW 和 IVF 各有什么优缺点")
+        self.assertEqual(features.entities, ["HNSW", "IVF"])
+        self.assertEqual(features.comparison_markers, ["优缺点"])
+    
+    def test_low_lexical_coverage_keeps_global_strategy(self):
+        """短查询的词元在知识库中很少出现时不走简单路由"""
+        index = LexicalIndex.build(["chunk-0"], [SAMPLE_TEXTS[0]])
+        router = QueryRouter()
+        
+        self.assertEqual(router.route("LangGraph 状态图", index).route, ROUTE_SIMPLE)
+        decision = router.route("量子纠缠通信", index)
+        self.assertEqual(decision.route, ROUTE_STANDARD)
+        self.assertEqual(decision.features.lexical_coverage, 0.0)
+    
+    def test_pipeline_applies_route_overrides(self):
+        """简单查询只执行一次相似度检索，运行时参数优先于路由"""
+        pipeline = self.make_pipeline(use_query_router=True, enable_cache=False)
+        
+        transformer = pipeline.query_transformer
+        with patch.object(transformer, 'plan_expansion', wraps=transformer.plan_expansion) as plan:
+            pipeline.invoke("LangGraph 是什么")
+            plan.assert_not_called()
+            pipeline.invoke("LangGraph 是什么", use_query_expansion=True)
+            plan.assert_called_once()
+        
+        stats = pipeline.get_stats()["query_router"]
+        self.assertEqual(stats[ROUTE_SIMPLE]["queries"], 2)
+
+
+class TestRetrievalCache(RetrievalTestCase):
+    """检索结果缓存测试"""
+    
+    def test_repeated_query_hits_cache(self):
+        """相同查询和配置命中缓存"""
+        pipeline = self.make_pipeline(enable_cache=True)
+        
+        first = pipeline.invoke("LangGraph 工作流")
+        calls_after_first = self.embeddings.query_calls
+        second = pipeline.invoke("  LangGraph   工作流 ")
+        
+        self.assertEqual([doc.id for doc in first], [doc.id for doc in second])
+        self.assertEqual(self.embeddings.query_calls, calls_after_first)
+        stats = pipeline.get_stats()["cache"]
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+    
+    def test_runtime_kwargs_change_key(self):
+        """运行时参数不同则不共享缓存"""
+        pipeline = self.make_pipeline(enable_cache=True)
+        
+        pipeline.invoke("LangGraph 工作流")
+        pipeline.invoke("LangGraph 工作流", k=2)
+        
+        self.assertEqual(pipeline.get_stats()["cache"]["hits"], 0)
+        self.assertEqual(pipeline.get_stats()["cache"]["size"], 2)
+    
+    def test_collection_version_invalidates(self):
+        """集合版本变化后缓存失效"""
+        pipeline = self.make_pipeline(enable_cache=True)
+        
+        pipeline.invoke("LangGraph 工作流")
+        bump_collection_version(self.temp_dir, self.collection_name)
+        pipeline.invoke("LangGraph 工作流")
+        
+        stats = pipeline.get_stats()["cache"]
+        self.assertEqual(stats["hits"], 0)
+        self.assertEqual(stats["invalidations"], 1)
+    
+    def test_lru_eviction(self):
+        """超过条目上限时淘汰最久未使用的条目"""
+        cache = RetrievalCache(max_entries=2, ttl_seconds=None)
+        cache.sync_version("v1")
+        for query in ["a", "b", "c"]:
+            cache.put(cache.make_key(query, {}), [Document(page_content=query)])
+        
+        self.assertIsNone(cache.get(cache.make_key("a", {})))
+        self.assertEqual(cache.get(cache.make_key("c", {}))[0].page_content, "c")
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+
+class TestSemanticQueryCache(RetrievalTestCase):
+    """语义查询缓存测试"""
+    
+    def test_near_duplicate_query_hits(self):
+        """近似查询复用已缓存的结果，且不再触发检索阶段的嵌入"""
+        pipeline = self.make_pipeline(
+            enable_cache=True, use_semantic_cache=True, semantic_cache_distance=0.1
+        )
+        
+        first = pipeline.invoke("LangGraph的核心优势")
+        calls_after_first = self.embeddings.query_calls
+        second = pipeline.invoke("LangGraph 的核心优势")
+        
+        self.assertEqual([doc.id for doc in first], [doc.id for doc in second])
+        # 仅为新查询生成一次查询向量
+        self.assertEqual(self.embeddings.query_calls, calls_after_first + 1)
+        self.assertEqual(pipeline.get_stats()["semantic_cache"]["hits"], 1)
+    
+    def test_distant_query_misses(self):
+        """语义距离较远的查询不命中"""
+        pipeline = self.make_pipeline(
+            enable_cache=True, use_semantic_cache=True, semantic_cache_distance=0.01
+        )
+        
+        pipeline.invoke("LangGraph的核心优势")
+        pipeline.invoke("ChromaDB 如何配置")
+        
+        stats = pipeline.get_stats()["semantic_cache"]
+        self.assertEqual(stats["hits"], 0)
+        self.assertEqual(stats["size"], 2)
+    
+    def test_bounded_capacity(self):
+        """超过容量时淘汰最久未使用的条目"""
+        cache = SemanticQueryCache(max_entries=2, distance_threshold=0.01)
+        cache.sync_version("v1")
+        for i, query in enumerate(["a", "b", "c"]):
+            vector = [0.0, 0.0, 0.0]
+            vector[i] = 1.0
+            cache.put(query, vector, "cfg", [Document(page_content=query)])
+        
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.lookup([1.0, 0.0, 0.0], "cfg"))
+        self.assertEqual(cache.lookup([0.0, 0.0, 1.0], "cfg")[0], "c")
+        self.assertIsNone(cache.lookup([0.0, 0.0, 1.0], "other"))
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+    
+    def test_repeated_put_replaces_entry(self):
+        """同一配置下重复写入相同查询时覆盖原条目，淘汰后不保留失效指纹"""
+        cache = SemanticQueryCache(max_entries=2, distance_threshold=0.01)
+        cache.sync_version("v1")
+        cache.put("a", [1.0, 0.0], "cfg-1", [Document(page_content="旧结果")])
+        cache.put("a", [1.0, 0.0], "cfg-1", [Document(page_content="新结果")])
+        
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.lookup([1.0, 0.0], "cfg-1")[2][0].page_content, "新结果")
+        
+        for index in range(2, 10):
+            cache.put("b", [0.0, 1.0], f"cfg-{index}", [Document(page_content="b")])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(len(cache._fingerprint_ids), 2)
+        self.assertEqual(cache.get_stats()["evictions"], 7)
+
+
+class TestEmbeddingMMR(RetrievalTestCase):
+    """基于已存储向量的 MMR 重排序测试"""
+    
+    def test_document_embeddings_follow_requested_order(self):
+        """按请求顺序返回集合中存储的向量"""
+        pipeline = self.make_pipeline()
+        ids = ["chunk-4", "chunk-1", "chunk-4"]
+        
+        embeddings = pipeline.base_retriever.get_document_embeddings(ids)
+        
+        self.assertIsInstance(embeddings, np.ndarray)
+        self.assertEqual(embeddings.shape, (3, self.embeddings.dim))
+        expected = np.asarray(self.embeddings._embed(SAMPLE_TEXTS[4]), dtype=np.float32)
+        np.testing.assert_allclose(embeddings[0], expected, rtol=1e-6)
+        np.testing.assert_array_equal(embeddings[0], embeddings[2])
+    
+    def test_matches_reference_mmr(self):
+        """选择顺序与 LangChain 的 MMR 实现一致"""
+        rng = np.random.default_rng(3)
+        vectors = rng.normal(size=(30, 16)).astype(np.float32)
+        query = rng.normal(size=16).astype(np.float32)
+        
+        for lambda_mult in (0.2, 0.5, 0.9):
+            self.assertEqual(
+                embedding_mmr_select(query, vectors, lambda_mult, top_k=8),
+                maximal_marginal_relevance(query, vectors.tolist(), lambda_mult, k=8)
+            )
+    
+    def test_pipeline_reranks_without_reembedding_documents(self):
+        """管道使用存储的向量重排序，不重新嵌入候选文档"""
+        pipeline = self.make_pipeline(
+            use_query_expansion=False,
+            use_reranking=True,
+            rerank_strategy="embedding_mmr",
+            k=5
+        )
+        
+        documents = pipeline.invoke("Agent 工作流")
+        
+        self.assertEqual(len(documents), 5)
+        # 只有查询被嵌入（测试未启用嵌入缓存，检索和重排序各一次），候选文档不再嵌入
+        self.assertEqual(self.embeddings.embedded_texts, 2)
+
+
+class TestLexicalFusion(RetrievalTestCase):
+    """词法检索与向量检索融合测试"""
+    
+    def build_lexical_index(self, pipeline: RetrievalPipeline):
+        collection = pipeline.base_retriever.vectorstore._collection
+        LexicalIndex.build_from_collection(collection, batch_size=4).save(
+            get_lexical_index_dir(self.temp_dir, self.collection_name)
+        )
+    
+    def test_exact_term_recalled_through_fusion(self):
+        """向量检索未命中的精确术语通过词法检索召回"""
+        pipeline = self.make_pipeline(use_query_expansion=False, k=1)
+        query = "HNSW 调优配置环境变量参数"
+        vector_ids = [doc.id for doc in pipeline._retrieve_documents([query], pipeline.config)]
+        self.assertNotIn("chunk-4", vector_ids)
+        
+        self.build_lexical_index(pipeline)
+        documents = pipeline._retrieve_documents([query], pipeline.config)
+        
+        fused = {doc.id: doc for doc in documents}
+        self.assertIn("chunk-4", fused)
+        self.assertIn('lexical_rank', fused["chunk-4"].metadata)
+        self.assertEqual(fused["chunk-4"].metadata['matched_queries'], [])
+        self.assertEqual(fused["chunk-4"].page_content, SAMPLE_TEXTS[4])
+        scores = [doc.metadata['rrf_score'] for doc in documents]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(pipeline.get_stats()["lexical_index"]["documents"], len(SAMPLE_TEXTS))
+    
+    def test_lexical_search_can_be_disabled(self):
+        """关闭词法检索后只使用向量检索结果"""
+        pipeline = self.make_pipeline(use_query_expansion=False, use_lexical_search=False)
+        self.build_lexical_index(pipeline)
+        
+        documents = pipeline._retrieve_documents(["DASHSCOPE_API_KEY"], pipeline.config)
+        
+        self.assertTrue(documents)
+        self.assertTrue(all('rrf_score' not in doc.metadata for doc in documents))
+
+
+class TestAsyncPipeline(RetrievalTestCase):
+    """异步检索管道测试"""
+    
+    def test_ainvoke_matches_invoke(self):
+        """异步检索与同步检索返回相同的文档"""
+        pipeline = self.make_pipeline(use_reranking=True)
+        self.addCleanup(pipeline.close)
+        
+        for query in ("LangGraph Agent RAG", "向量数据库 检索"):
+            with self.subTest(query=query):
+                expected = [doc.id for doc in pipeline.invoke(query)]
+                actual = [doc.id for doc in asyncio.run(pipeline.ainvoke(query))]
+                self.assertEqual(actual, expected)
+    
+    def test_variants_embedded_once_async(self):
+        """异步路径同样以查询模式嵌入，每个变体只嵌入一次"""
+        pipeline = self.make_pipeline()
+        self.addCleanup(pipeline.close)
+        
+        asyncio.run(pipeline.ainvoke("LangGraph Agent RAG"))
+        
+        self.assertEqual(self.embeddings.document_calls, 0)
+        self.assertEqual(len(self.embeddings.query_texts), len(set(self.embeddings.query_texts)))
+    
+    def test_concurrent_requests(self):
+        """并发的异步请求互不干扰"""
+        pipeline = self.make_pipeline(retrieval_executor_workers=2)
+        self.addCleanup(pipeline.close)
+        queries = ["LangGraph 工作流", "Agent 工具", "HNSW 索引", "查询扩展"]
+        expected = [[doc.id for doc in pipeline.invoke(query)] for query in queries]
+        
+        async def run_all():
+            return await asyncio.gather(*(pipeline.ainvoke(query) for query in queries))
+        
+        results = asyncio.run(run_all())
+        self.assertEqual([[doc.id for doc in documents] for documents in results], expected)
+    
+    def test_cancellation_propagates(self):
+        """取消请求时抛出 CancelledError，而不是回退到基础检索"""
+        pipeline = self.make_pipeline()
+        self.addCleanup(pipeline.close)
+        started = asyncio.Event()
+        
+        async def slow_embed(text):
+            started.set()
+            await asyncio.sleep(10)
+        
+        async def run():
+            task = asyncio.create_task(pipeline.ainvoke("LangGraph Agent RAG"))
+            await started.wait()
+            task.cancel()
+            await task
+        
+        with patch.object(self.embeddings, "aembed_query", side_effect=slow_embed):
+            with patch.object(pipeline, "_fallback_retrieve") as fallback:
+                with self.assertRaises(asyncio.CancelledError):
+                    asyncio.run(run())
+        fallback.assert_not_called()
+    
+    def test_tool_arun_uses_async_pipeline(self):
+        """知识库工具的异步接口使用异步检索管道"""
+        tool = KnowledgeBaseTool()
+        tool.retrieval_pipeline = self.make_pipeline(use_query_expansion=False)
+        self.addCleanup(tool.retrieval_pipeline.close)
+        
+        with patch.object(tool.retrieval_pipeline, "invoke") as invoke:
+            result = asyncio.run(tool._arun("LangGraph 工作流"))
+        
+        invoke.assert_not_called()
+        self.assertIn("[信息片段 1]", result)
+    
+    def test_astream_yields_candidates_before_final(self):
+        """流式检索先产出候选文档，最终结果与 ainvoke 一致"""
+        pipeline = self.make_pipeline(use_reranking=True, k=2)
+        self.addCleanup(pipeline.close)
+        query = "LangGraph Agent RAG"
+        
+        async def collect():
+            return [progress async for progress in pipeline.astream(query)]
+        
+        stages = asyncio.run(collect())
+        
+        self.assertEqual([progress.stage for progress in stages], ["candidates", "final"])
+        self.assertTrue(stages[-1].final)
+        self.assertEqual(
+            [doc.id for doc in stages[-1].documents],
+            [doc.id for doc in asyncio.run(pipeline.ainvoke(query))]
+        )
+        payload = stages[0].to_dict()
+        self.assertGreaterEqual(len(payload["documents"]), len(stages[-1].documents))
+        for entry in payload["documents"]:
+            self.assertTrue(entry["id"].startswith("chunk-"))
+            self.assertIsInstance(entry["score"], float)
+    
+    def test_astream_cache_hit_yields_final_only(self):
+        """命中缓存时只产出最终结果"""
+        pipeline = self.make_pipeline(enable_cache=True)
+        self.addCleanup(pipeline.close)
+        pipeline.invoke("向量数据库")
+        
+        async def collect():
+            return [progress.stage async for progress in pipeline.astream("向量数据库")]
+        
+        self.assertEqual(asyncio.run(collect()), ["final"])
+    
+    def test_tool_emits_progress_events(self):
+        """知识库工具在检索过程中发出 retrieval_progress 事件"""
+        tool = KnowledgeBaseTool()
+        tool.retrieval_pipeline = self.make_pipeline(use_query_expansion=False)
+        self.addCleanup(tool.retrieval_pipeline.close)
+        
+        async def collect():
+            return [
+                event async for event in tool.astream_events({"query": "LangGraph 工作流"}, version="v2")
+                if event["event"] == "on_custom_event"
+            ]
+        
+        events = asyncio.run(collect())
+        
+        self.assertEqual([event["name"] for event in events], ["retrieval_progress"] * 2)
+        self.assertEqual([event["data"]["stage"] for event in events], ["candidates", "final"])
+        self.assertEqual(events[0]["data"]["query"], "LangGraph 工作流")
+
+
+class TestStageMetrics(RetrievalTestCase):
+    """分阶段耗时统计测试"""
+    
+    def setUp(self):
+        super().setUp()
+        get_retrieval_metrics().reset()
+    
+    def test_invoke_records_stage_spans(self):
+        """一次检索记录各阶段的耗时、候选数和缓存命中"""
+        pipeline = self.make_pipeline(use_reranking=True, enable_cache=True)
+        self.addCleanup(pipeline.close)
+        
+        pipeline.invoke("LangGraph Agent")
+        pipeline.invoke("LangGraph Agent")
+        metrics = pipeline.get_stats()["metrics"]
+        
+        self.assertEqual(metrics["queries"], 2)
+        for stage in ("normalize", "expand", "embed", "vector_query", "dedupe", "filter", "rerank", "finalize"):
+            self.assertIn(stage, metrics["stages"])
+            self.assertGreaterEqual(metrics["stages"][stage]["latency_ms"]["count"], 1)
+        self.assertEqual(metrics["stages"]["cache"]["cache"], {"hits": 1, "misses": 1})
+        self.assertIn("candidates", metrics["stages"]["vector_query"])
+        trace = metrics["recent_traces"][0]
+        self.assertEqual(trace["query"], "LangGraph Agent")
+        self.assertGreaterEqual(trace["total_ms"], sum(span["duration_ms"] for span in trace["spans"] if span["stage"] == "finalize"))
+    
+    def test_histogram_quantiles(self):
+        """直方图按桶累计并估算分位数"""
+        histogram = Histogram((1, 10, 100))
+        for value in (0.5, 5, 5, 50, 500):
+            histogram.observe(value)
+        
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["buckets"], [[1, 1], [10, 3], [100, 4], ["+Inf", 5]])
+        self.assertEqual(snapshot["min"], 0.5)
+        self.assertEqual(snapshot["max"], 500)
+        self.assertTrue(1 <= histogram.quantile(0.5) <= 10)
+        self.assertIsNone(Histogram((1,)).quantile(0.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
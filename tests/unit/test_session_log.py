@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+会话日志单元测试
+
+测试会话内序号分配、按序号和时间的范围读取、分页、持久化，
+以及 ChromaStore 写入会话消息不调用嵌入接口、按需建立向量索引
+"""
+
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root))
+
+from langchain_core.messages import HumanMessage, AIMessage
+
+from rag_agent.storage import ChromaStore, SessionLog
+from tests.unit.fake_embeddings import CountingEmbeddings
+
+
+class TestSessionLog(unittest.TestCase):
+    """会话日志测试"""
+    
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.log = SessionLog(self.temp_dir / "sessions.sqlite3")
+    
+    def tearDown(self):
+        self.log.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def append_messages(self, session_id: str, count: int, start: datetime = datetime(2024, 1, 1)):
+        for index in range(count):
+            self.log.append(
+                session_id,
+                {'type': 'HumanMessage', 'content': f"{session_id}-{index}"},
+                timestamp=start + timedelta(minutes=index)
+            )
+    
+    def test_sequence_numbers_per_session(self):
+        self.append_messages("s1", 3)
+        self.append_messages("s2", 2)
+        
+        self.assertEqual([entry.seq for entry in self.log.read("s1")], [1, 2, 3])
+        self.assertEqual([entry.seq for entry in self.log.read("s2")], [1, 2])
+        self.assertEqual(self.log.count(), 5)
+        self.assertEqual(self.log.count("s1"), 3)
+    
+    def test_pagination_and_ranges(self):
+        self.append_messages("s1", 10)
+        
+        first_page = self.log.read("s1", limit=4)
+        second_page = self.log.read("s1", after_seq=first_page[-1].seq, limit=4)
+        self.assertEqual([entry.seq for entry in first_page], [1, 2, 3, 4])
+        self.assertEqual([entry.seq for entry in second_page], [5, 6, 7, 8])
+        
+        self.assertEqual([entry.seq for entry in self.log.latest("s1", 3)], [8, 9, 10])
+        self.assertEqual([entry.seq for entry in self.log.read("s1", before_seq=8, limit=2, newest_first=True)], [7, 6])
+        
+        in_range = self.log.read(
+            "s1",
+            start_time=datetime(2024, 1, 1, 0, 2),
+            end_time=datetime(2024, 1, 1, 0, 4)
+        )
+        self.assertEqual([entry.message['content'] for entry in in_range], ["s1-2", "s1-3", "s1-4"])
+    
+    def test_persistence_and_embedding_state(self):
+        self.append_messages("s1", 3)
+        self.log.mark_embedded("s1", [1, 2])
+        self.log.close()
+        
+        self.log = SessionLog(self.temp_dir / "sessions.sqlite3")
+        self.assertEqual([entry.seq for entry in self.log.unembedded("s1")], [3])
+        self.assertEqual(self.log.append("s1", {'content': "新消息"}).seq, 4)
+        
+        self.log.delete_session("s1")
+        self.assertEqual(self.log.count("s1"), 0)
+
+
+class TestChromaStoreSessionLog(unittest.TestCase):
+    """ChromaStore 会话日志测试"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.embeddings = CountingEmbeddings()
+        self.store = ChromaStore(
+            storage_dir=self.temp_dir,
+            collection_name="session_log_test",
+            embedding_model=self.embeddings
+        )
+    
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_messages_are_not_embedded_on_write(self):
+        self.store.store_session_message("s1", HumanMessage(content="你好"))
+        self.store.store_session_message("s2", HumanMessage(content="其他会话"))
+        self.store.store_session_message("s1", AIMessage(content="你好，有什么可以帮你？"))
+        
+        self.assertEqual(self.embeddings.embedded_texts, [])
+        history = self.store.get_session_history("s1")
+        self.assertEqual([type(message).__name__ for message in history], ["HumanMessage", "AIMessage"])
+        self.assertEqual([message.content for message in self.store.get_session_history("s1", limit=1)], ["你好"])
+        
+        stats = self.store.get_stats()
+        self.assertEqual(stats['session_messages'], 3)
+        self.assertEqual(stats['indexed_session_messages'], 0)
+    
+    def test_semantic_search_indexes_lazily(self):
+        self.store.store_session_message("s1", HumanMessage(content="我想订一张去上海的机票"))
+        self.store.store_session_message("s1", AIMessage(content="好的，请问出发日期是哪天？"))
+        self.store.store_session_message("s2", HumanMessage(content="我想订一张去上海的机票"))
+        
+        results = self.store.search_session_messages("s1", "我想订一张去上海的机票", k=1)
+        self.assertEqual(results[0].document.content, "我想订一张去上海的机票")
+        self.assertEqual(results[0].document.metadata['session_id'], "s1")
+        # 只嵌入 s1 的两条消息和查询本身
+        self.assertEqual(len(self.embeddings.embedded_texts), 3)
+        
+        # 再次搜索只嵌入新增的消息
+        self.store.store_session_message("s1", HumanMessage(content="下周一"))
+        self.store.search_session_messages("s1", "出发日期", k=3)
+        self.assertEqual(self.embeddings.embedded_texts[3:], ["下周一", "出发日期"])
+        self.assertEqual(self.store.get_stats()['indexed_session_messages'], 3)
+    
+    def test_legacy_session_collection_fallback(self):
+        self.store.session_collection.add(
+            ids=["old_1"],
+            documents=['{"type": "AIMessage", "content": "旧消息"}'],
+            embeddings=[self.embeddings.embed_query("旧消息")],
+            metadatas=[{'session_id': "old", 'message_type': "AIMessage", 'timestamp': "2024-01-01T00:00:00"}]
+        )
+        
+        history = self.store.get_session_history("old")
+        self.assertEqual([message.content for message in history], ["旧消息"])
+        self.assertIsInstance(history[0], AIMessage)
+
+
+if __name__ == '__main__':
+    unittest.main()
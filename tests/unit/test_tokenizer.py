@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+分词器单元测试
+
+测试中文 n-gram 切分、拉丁单词切分和术语匹配
+"""
+
+import unittest
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from langchain_core.documents import Document
+
+from rag_agent.retrieval.reranker import DocumentReranker
+from rag_agent.retrieval.rerank_engine import RerankCandidates
+from rag_agent.retrieval.tokenizer import tokenize, contains_term
+
+
+class TestTokenizer(unittest.TestCase):
+    """分词器测试类"""
+    
+    def test_cjk_text_is_split_into_bigrams(self):
+        """测试中文按二元组切分"""
+        self.assertEqual(tokenize("向量数据库"), ("向量", "量数", "数据", "据库"))
+        self.assertEqual(tokenize("库"), ("库",))
+    
+    def test_mixed_text(self):
+        """测试中英文混排文本"""
+        self.assertEqual(
+            tokenize("LangGraph的config_key是v1.2"),
+            ("langgraph", "的", "config_key", "是", "v1.2")
+        )
+    
+    def test_contains_term_matches_whole_tokens(self):
+        """测试术语按词元匹配"""
+        self.assertTrue(contains_term("什么是AI？", "AI"))
+        self.assertFalse(contains_term("show more detail", "AI"))
+        self.assertTrue(contains_term("Retrieval Augmented Generation 的原理", "retrieval augmented"))
+        self.assertTrue(contains_term("介绍向量数据库", "数据库"))
+    
+    def test_unsegmented_chinese_query_scores_keywords(self):
+        """测试未分词的中文查询也能得到关键词分数"""
+        reranker = DocumentReranker()
+        relevant = Document(page_content="向量数据库用于存储文档的嵌入向量")
+        unrelated = Document(page_content="今天天气晴朗")
+        
+        ranked = reranker.rerank("数据库如何存储向量", [unrelated, relevant], "relevance")
+        
+        self.assertIs(ranked[0], relevant)
+        scores = RerankCandidates([relevant, unrelated]).relevance_scores("数据库如何存储向量")
+        self.assertGreater(scores[0], scores[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+后写队列单元测试
+
+测试写入合并、按批大小和间隔刷新、失败重试、溢写文件重放和多实例隔离，
+以及 ChromaStore 经后写队列批量落库长期记忆、搜索前写入未落库的记忆
+"""
+
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from typing import List
+
+# 添加项目根目录到Python路径
+import sys
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root))
+
+from rag_agent.storage import ChromaStore, MemoryRecord, PendingWrite, WriteBehindQueue
+from tests.unit.fake_embeddings import CountingEmbeddings
+
+
+def make_write(record_id: str, text: str = "内容", collection: str = "memories") -> PendingWrite:
+    return PendingWrite(collection=collection, id=record_id, document=text, metadata={'key': record_id}, text=text)
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+    """后写队列测试"""
+    
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.spill_path = self.temp_dir / "spill.jsonl"
+        self.batches = []
+        self.written = threading.Event()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def writer(self, writes: List[PendingWrite]):
+        self.batches.append(writes)
+        self.written.set()
+    
+    def test_coalesces_writes_until_flush(self):
+        queue = WriteBehindQueue(self.writer, self.spill_path, flush_interval_ms=60000)
+        queue.put(make_write("a", "旧内容"))
+        queue.put(make_write("b"))
+        queue.put(make_write("a", "新内容"))
+        
+        self.assertEqual(self.batches, [])
+        self.assertEqual(len(queue.pending("memories")), 2)
+        self.assertTrue(queue.flush())
+        
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual({write.id: write.document for write in self.batches[0]}, {"a": "新内容", "b": "内容"})
+        self.assertEqual(queue.get_stats()['pending'], 0)
+        self.assertEqual(queue.spill_path.read_text(encoding='utf-8'), "")
+        queue.close()
+        self.assertEqual(list(self.temp_dir.iterdir()), [])
+    
+    def test_background_flush_by_batch_size(self):
+        queue = WriteBehindQueue(self.writer, self.spill_path, flush_interval_ms=60000, max_batch_size=3)
+        for index in range(3):
+            queue.put(make_write(f"id-{index}"))
+        
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(len(self.batches[0]), 3)
+        queue.close()
+    
+    def test_background_flush_by_interval(self):
+        queue = WriteBehindQueue(self.writer, self.spill_path, flush_interval_ms=20)
+        queue.put(make_write("a"))
+        
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual([write.id for write in self.batches[0]], ["a"])
+        queue.close()
+    
+    def test_failed_writes_survive_crash_and_replay(self):
+        def failing_writer(writes):
+            raise ConnectionError("嵌入服务不可用")
+        
+        queue = WriteBehindQueue(failing_writer, self.spill_path, flush_interval_ms=60000)
+        queue.put(make_write("a"))
+        queue.put(make_write("b", collection="sessions"))
+        self.assertFalse(queue.flush())
+        self.assertEqual(queue.get_stats()['pending'], 2)
+        queue.close()
+        
+        # 模拟崩溃时写到一半的最后一行
+        with open(queue.spill_path, 'a', encoding='utf-8') as spill:
+            spill.write('{"collection": "memories", "id"')
+        
+        replayed = WriteBehindQueue(self.writer, self.spill_path, flush_interval_ms=60000)
+        self.assertEqual(replayed.get_stats()['replayed'], 2)
+        self.assertFalse(queue.spill_path.exists())
+        replayed.close()
+        self.assertEqual(sorted(write.id for write in self.batches[0]), ["a", "b"])
+        self.assertEqual(list(self.temp_dir.iterdir()), [])
+    
+    def test_live_instance_spill_is_not_taken_over(self):
+        """同一基础路径上的多个实例各自写溢写文件，不接管仍在运行的实例"""
+        first = WriteBehindQueue(self.writer, self.spill_path, flush_interval_ms=60000)
+        first.put(make_write("a"))
+        second = WriteBehindQueue(self.writer, self.spill_path, flush_interval_ms=60000)
+        second.put(make_write("b"))
+        
+        self.assertNotEqual(first.spill_path, second.spill_path)
+        self.assertEqual(second.get_stats()['replayed'], 0)
+        self.assertTrue(second.flush())
+        self.assertEqual([write.id for write in first.pending()], ["a"])
+        self.assertIn('"a"', first.spill_path.read_text(encoding='utf-8'))
+        first.close()
+        second.close()
+
+
+class TestChromaStoreWriteBehind(unittest.TestCase):
+    """ChromaStore 后写测试"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.embeddings = CountingEmbeddings()
+        self.store = ChromaStore(
+            storage_dir=self.temp_dir,
+            collection_name="write_behind_test",
+            embedding_model=self.embeddings,
+            write_behind=True,
+            write_behind_interval_ms=60000
+        )
+    
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_writes_are_batched_into_one_embedding_call(self):
+        self.assertTrue(self.store.store_memory("m1", "用户喜欢简洁的回答", user_id="u1"))
+        self.assertTrue(self.store.store_memory("m2", "用户使用 Python 开发"))
+        self.assertTrue(self.store.store_memory("m1", "用户喜欢简洁的回答，不要列表", user_id="u1"))
+        
+        self.assertEqual(self.embeddings.document_calls, [])
+        self.assertEqual(self.store.memory_collection.count(), 0)
+        
+        self.assertTrue(self.store.flush())
+        self.assertEqual(len(self.embeddings.document_calls), 1)
+        self.assertEqual(len(self.embeddings.document_calls[0]), 2)
+        self.assertEqual(self.store.memory_collection.count(), 2)
+        
+        results = self.store.search_memories("用户喜欢简洁的回答，不要列表", user_id="u1", limit=1)
+        self.assertEqual(results[0].document.id, "m1")
+        self.assertEqual(self.store.get_stats()['write_behind']['flushed'], 2)
+    
+    def test_search_sees_pending_memories(self):
+        self.store.store_memory("m1", "用户喜欢简洁的回答", user_id="u1")
+        
+        results = self.store.search_memories("用户喜欢简洁的回答", user_id="u1", limit=1)
+        
+        self.assertEqual([result.document.id for result in results], ["m1"])
+        self.assertEqual(self.store.write_queue.pending(), [])
+        self.assertEqual(self.store.get_stats()['write_behind']['flushed'], 1)
+    
+    def test_bulk_memories_go_through_queue(self):
+        self.store.store_memory("m1", "旧内容")
+        self.assertTrue(self.store.store_memories([
+            MemoryRecord(memory_key="m1", content="新内容"),
+            MemoryRecord(memory_key="m2", content="另一条记忆"),
+        ]))
+        
+        self.assertEqual(self.store.memory_collection.count(), 0)
+        self.assertTrue(self.store.flush())
+        self.assertEqual(len(self.embeddings.document_calls), 1)
+        self.assertEqual(self.store.memory_collection.get(ids=["m1"])['documents'], ["新内容"])
+        self.assertEqual(self.store.memory_collection.count(), 2)
+    
+    def test_pending_writes_replayed_after_restart(self):
+        self.store.store_memory("m1", "重启前写入的记忆")
+        # 不调用 flush/close，释放文件锁模拟进程崩溃后用同一目录重新打开
+        self.store.write_queue._lock_file.close()
+        reopened = ChromaStore(
+            storage_dir=self.temp_dir,
+            collection_name="write_behind_test",
+            embedding_model=self.embeddings,
+            write_behind=True,
+            write_behind_interval_ms=60000
+        )
+        self.assertTrue(reopened.flush())
+        self.assertEqual(reopened.memory_collection.get(ids=["m1"])['documents'], ["重启前写入的记忆"])
+        reopened.close()
+
+
+if __name__ == '__main__':
+    unittest.main()